@@ -3,6 +3,7 @@ import os
 import httpx
 from fastapi import Request, HTTPException, Depends
 from dotenv import load_dotenv
+from .utils.resilience import CircuitOpenError, DeadlineExceededError, supabase_policy
 
 def get_supabase_config():
     load_dotenv(os.path.join(os.path.dirname(os.path.dirname(__file__)), '.env'))
@@ -24,14 +25,22 @@ async def get_current_user(request: Request):
 
     token = auth_header.split(" ")[1]
 
-    async with httpx.AsyncClient(timeout=10.0) as client:
-        res = await client.get(
-            f"{SUPABASE_URL}/auth/v1/user",
-            headers={
-                "Authorization": f"Bearer {token}",
-                "apikey": SUPABASE_SERVICE_ROLE_KEY,
-            },
-        )
+    async with httpx.AsyncClient() as client:
+        async def fetch_user(timeout: float) -> httpx.Response:
+            return await client.get(
+                f"{SUPABASE_URL}/auth/v1/user",
+                headers={
+                    "Authorization": f"Bearer {token}",
+                    "apikey": SUPABASE_SERVICE_ROLE_KEY,
+                },
+                timeout=timeout,
+            )
+
+        try:
+            res = await supabase_policy.run(fetch_user)
+        except (CircuitOpenError, DeadlineExceededError, httpx.HTTPError) as e:
+            print(f"❌ [AUTH] No se pudo validar el token con Supabase: {e}")
+            raise HTTPException(status_code=503, detail="Servicio de autenticación no disponible")
 
     if res.status_code != 200:
         raise HTTPException(status_code=401, detail="Token inválido")
@@ -0,0 +1,39 @@
+# src/jobs/knowledge_consolidation.py
+"""
+Consolidación periódica de baby_knowledge: fusiona duplicados y casi-duplicados
+para que el contexto inyectado en el prompt no crezca con datos repetidos.
+
+Uso manual:
+    python -m src.jobs.knowledge_consolidation [--user-id UUID]
+"""
+import argparse
+import asyncio
+import os
+
+from ..services.knowledge_service import BabyKnowledgeService
+
+# Cada cuántas horas corre la consolidación dentro de la app (0 = desactivada)
+KNOWLEDGE_CONSOLIDATION_INTERVAL_HOURS = float(os.getenv("KNOWLEDGE_CONSOLIDATION_INTERVAL_HOURS", "24"))
+
+
+async def run_consolidation_loop(interval_hours: float = KNOWLEDGE_CONSOLIDATION_INTERVAL_HOURS) -> None:
+    while True:
+        await asyncio.sleep(interval_hours * 3600)
+        # El hilo no se puede interrumpir: si cancelan la tarea se espera a que termine
+        job = asyncio.ensure_future(asyncio.to_thread(BabyKnowledgeService.consolidate_knowledge))
+        try:
+            await asyncio.shield(job)
+        except asyncio.CancelledError:
+            print("⏳ [KNOWLEDGE-CONSOLIDATION] Esperando a que termine la consolidación en curso")
+            await asyncio.wait({job})
+            raise
+        except Exception as e:
+            print(f"❌ [KNOWLEDGE-CONSOLIDATION] Error consolidando conocimiento: {e}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fusiona conocimiento duplicado de los bebés")
+    parser.add_argument("--user-id", help="Consolidar solo el conocimiento de este usuario")
+    args = parser.parse_args()
+
+    BabyKnowledgeService.consolidate_knowledge(user_id=args.user_id)
@@ -1,4 +1,5 @@
 # src/main.py
+import asyncio
 import os
 from pathlib import Path
 from dotenv import load_dotenv
@@ -8,11 +9,38 @@ env_path = Path(__file__).resolve().parent.parent / '.env'
 load_dotenv(dotenv_path=env_path, override=True)
 
 # Now import other modules
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from src.routes import chat
+from src.services.reference_data_service import reference_data
+from src.jobs.knowledge_consolidation import KNOWLEDGE_CONSOLIDATION_INTERVAL_HOURS, run_consolidation_loop
 
-app = FastAPI(title="Sol Local Chat Proxy")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Precargar tablas de referencia (profile_category, ...) y refrescarlas en segundo plano
+    await reference_data.warmup()
+    reference_data.start_refresh()
+
+    # Consolidación periódica de conocimiento duplicado
+    consolidation_task = None
+    if KNOWLEDGE_CONSOLIDATION_INTERVAL_HOURS > 0:
+        consolidation_task = asyncio.create_task(run_consolidation_loop())
+
+    yield
+
+    if consolidation_task:
+        # Esperar a que termine la escritura en curso antes de cerrar el cliente de Supabase
+        consolidation_task.cancel()
+        try:
+            await consolidation_task
+        except asyncio.CancelledError:
+            pass
+    await reference_data.stop_refresh()
+
+
+app = FastAPI(title="Sol Local Chat Proxy", lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
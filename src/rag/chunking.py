@@ -0,0 +1,149 @@
+# src/rag/chunking.py
+"""
+Extracción de texto y chunking de PDFs. Sin clientes ni variables de entorno para que
+los procesos del pool de ingesta puedan usarlo sin inicializar Supabase ni OpenAI.
+"""
+import hashlib
+from bisect import bisect_right
+from itertools import islice
+from typing import Dict, Iterable, Iterator, List, Tuple
+
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+from pypdf import PdfReader
+
+CHUNK_SIZE = 1200
+CHUNK_OVERLAP = 150
+# Cuánto texto se acumula antes de partirlo en el modo streaming (en múltiplos de CHUNK_SIZE)
+STREAM_BUFFER_CHUNKS = 8
+
+
+def file_hash(path) -> str:
+    """sha256 del archivo, leído por bloques."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def chunk_hash(text: str) -> str:
+    """sha256 del chunk ya limpio: identifica el contenido que se embebe."""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+def pdf_to_text(path):
+    reader = PdfReader(path)
+    pages = [p.extract_text() or "" for p in reader.pages]
+    return "\n\n".join(pages)
+
+def clean_text(text: str) -> str:
+    """Limpia saltos de línea múltiples y espacios extra"""
+    return " ".join(text.split())
+
+def chunk(text):
+    splitter = RecursiveCharacterTextSplitter(
+        chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP, separators=["\n\n", "\n", " ", ""]
+    )
+    return splitter.split_text(text)
+
+def iter_pages(path) -> Iterator[Tuple[int, str]]:
+    """
+    Páginas del PDF de a una (número desde 1, texto). pypdf parsea cada página al
+    pedirla, así que no se arma el texto completo del documento.
+    """
+    reader = PdfReader(path)
+    for number, page in enumerate(reader.pages, start=1):
+        yield number, page.extract_text() or ""
+
+def iter_chunks(
+    pages: Iterable[Tuple[int, str]],
+    chunk_size: int = CHUNK_SIZE,
+    chunk_overlap: int = CHUNK_OVERLAP,
+) -> Iterator[Tuple[str, int]]:
+    """
+    Chunks (texto limpio, página donde empieza) a medida que se llenan.
+
+    Acumula páginas en un buffer acotado y lo parte con el mismo splitter que `chunk`.
+    Emite todos los chunks menos el último y conserva el buffer desde el inicio de ese
+    último, así el solapamiento se mantiene entre páginas y la memoria no depende del
+    tamaño del documento.
+    """
+    splitter = RecursiveCharacterTextSplitter(
+        chunk_size=chunk_size,
+        chunk_overlap=chunk_overlap,
+        separators=["\n\n", "\n", " ", ""],
+        add_start_index=True,
+    )
+    flush_at = chunk_size * STREAM_BUFFER_CHUNKS
+    buffer = ""
+    # Offsets del buffer donde empieza cada página (ordenados) y su número
+    page_starts: List[int] = []
+    page_numbers: List[int] = []
+
+    def page_at(offset: int) -> int:
+        return page_numbers[max(0, bisect_right(page_starts, offset) - 1)]
+
+    def split(final: bool):
+        nonlocal buffer, page_starts, page_numbers
+        docs = splitter.create_documents([buffer])
+        ready = docs if final else docs[:-1]
+        for doc in ready:
+            cleaned = clean_text(doc.page_content)
+            if cleaned:
+                yield cleaned, page_at(doc.metadata["start_index"])
+        if final or len(docs) < 2:
+            return
+        keep_from = docs[-1].metadata["start_index"]
+        buffer = buffer[keep_from:]
+        current_page = page_at(keep_from)
+        kept = [(start - keep_from, number) for start, number in zip(page_starts, page_numbers) if start > keep_from]
+        page_starts = [0] + [start for start, _ in kept]
+        page_numbers = [current_page] + [number for _, number in kept]
+
+    for number, text in pages:
+        if buffer:
+            buffer += "\n\n"
+        page_starts.append(len(buffer))
+        page_numbers.append(number)
+        buffer += text
+        if len(buffer) >= flush_at:
+            yield from split(final=False)
+
+    if buffer.strip():
+        yield from split(final=True)
+
+def iter_document_chunks(path, source_name, category, version, ref=False, source_hash=None) -> Iterator[Tuple[str, Dict]]:
+    """
+    (texto, metadata) de cada chunk del PDF, en streaming. La metadata lleva la página,
+    el hash del archivo y el del chunk para la ingesta incremental.
+    """
+    source_hash = source_hash or file_hash(path)
+    for index, (text, page) in enumerate(iter_chunks(iter_pages(path))):
+        yield text, {
+            "source": source_name,
+            "type": "pdf",
+            "chunk": index,
+            "page": page,
+            "category": category,
+            "version": version,
+            "ref": ref,
+            "file_hash": source_hash,
+            "chunk_hash": chunk_hash(text),
+        }
+
+def batched(items: Iterable, size: int) -> Iterator[List]:
+    """Lotes de `size` elementos sin materializar el iterable."""
+    iterator = iter(items)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+def prepare_document(path, source_name, category, version, ref=False, source_hash=None) -> Tuple[List[str], List[Dict]]:
+    """
+    Extrae, chunkea y limpia un PDF completo. Retorna (textos, metadatas) listos para el vectorstore.
+    """
+    texts, metas = [], []
+    for text, metadata in iter_document_chunks(path, source_name, category, version, ref, source_hash):
+        texts.append(text)
+        metas.append(metadata)
+    return texts, metas
@@ -0,0 +1,198 @@
+# src/rag/citations.py
+"""
+Citas (autores, instituciones y libros) extraídas de los documentos de referencia.
+
+La ingesta corre los patrones una sola vez sobre los chunks de cada documento ref=True
+y guarda el resultado en ingest_manifest.citations. Al responder una consulta de
+referencias, ReferenceDetector arma la respuesta con una búsqueda por fuente en vez de
+correr las regex sobre todos los chunks en cada request.
+"""
+import re
+import threading
+import time
+from typing import Dict, Iterable, List, Optional
+
+# Elementos que se guardan por tipo (la respuesta muestra menos)
+CITATIONS_MAX_PER_KIND = 25
+CITATION_KINDS = ("authors", "institutions", "books")
+
+_AUTHOR_PATTERNS = [
+    re.compile(r'\bde\s+([A-Z][a-záéíóúñ]{2,})\s+([A-Z][a-záéíóúñ]{2,})\b'),  # de Nombre Apellido
+    re.compile(r'\bdel\s+([A-Z][a-záéíóúñ]{2,})\s+([A-Z][a-záéíóúñ]{2,})\b'),  # del Nombre Apellido
+    re.compile(r'\b([A-Z][a-záéíóúñ]{2,})\s+([A-Z][a-záéíóúñ]{2,})\b'),  # Nombre Apellido general
+    re.compile(r'\b([A-Z][a-záéíóúñ]{2,})\s+y\s+([A-Z][a-záéíóúñ]{2,})\b'),  # Nombre y Apellido
+]
+
+# Palabras a excluir (no son nombres de autores)
+_EXCLUDED_AUTHOR_WORDS = {
+    'Essential', 'Oil', 'Safety', 'Guide', 'Health', 'Care', 'Professionals',
+    'European', 'Medicines', 'Agency', 'American', 'Herbal', 'Products', 'Association',
+    'Council', 'International', 'National', 'Alliance', 'Aromatherapy', 'Holistic'
+}
+
+_INSTITUTION_PATTERNS = [
+    re.compile(p, re.IGNORECASE) for p in (
+        r'\b(European Medicines Agency)\s*\([^)]*\)?',
+        r'\b(American Herbal Products Association)\s*\([^)]*\)?',
+        r'\b(National Association for Holistic Aromatherapy)\s*\([^)]*\)?',
+        r'\b(Alliance of International Aromatherapists)\s*\([^)]*\)?',
+        r'\b(American Academy of Pediatrics)\b',
+        r'\b(American Psychological Association)\b',
+        r'\b(World Health Organization)\b',
+        r'\b(Mindsight Institute)\b',
+        r'\b([A-Z][a-záéíóúñ\s]{15,80}(?:Agency|Association|Council|Institute|Organization|Academy))\b',
+    )
+]
+
+_BOOK_PATTERNS = [
+    re.compile(p, re.IGNORECASE) for p in (
+        r'del libro\s+"([^"]+)"',
+        r'en el libro\s+"([^"]+)"',
+        r'libro\s+"([^"]+)"',
+        r'"([^"]{15,100})"(?:\s*(?:de|del|por)\s+[A-Z][a-záéíóúñ]+)',  # Títulos entre comillas seguidos de autor
+        r'(?:según|en|del|como indica|menciona)\s+([A-Z][^.]{15,80}(?:Manual|Guide|Handbook|Book|Guía|Tratado|Estudio))',
+        r'([A-Z][^.]{15,80}:\s*[A-Z][^.]{10,60})',  # Títulos con subtítulos
+        r'en\s+"([^"]{15,100})"',  # Cualquier título entre comillas después de "en"
+        r'trabajo\s+"([^"]+)"',  # Referencias a trabajos específicos
+        r'investigación\s+"([^"]+)"',  # Referencias a investigaciones específicas
+        r'guías oficiales de\s+([^.]{10,60})',  # Referencias a guías oficiales
+        r'recomendaciones de\s+(la\s+)?([A-Z][^.]{15,80}(?:Association|Academy|Organization|Institute))',
+    )
+]
+
+_TRAILING_ACRONYM = re.compile(r'\s*\([^)]*\)$')
+_EDGE_PUNCTUATION = re.compile(r'^\W+|\W+$')
+_TRAILING_ELLIPSIS = re.compile(r'\s*\.\.\.$')
+
+
+def _unique(items: Iterable[str]) -> List[str]:
+    return list(dict.fromkeys(items))
+
+
+def _find_authors(text: str) -> List[str]:
+    authors = []
+    for pattern in _AUTHOR_PATTERNS:
+        for first, last in pattern.findall(text):
+            full_name = f"{first} {last}"
+            if len(full_name) > 5 and not any(word in _EXCLUDED_AUTHOR_WORDS for word in full_name.split()):
+                authors.append(full_name)
+    return authors
+
+
+def _find_institutions(text: str) -> List[str]:
+    institutions = []
+    for pattern in _INSTITUTION_PATTERNS:
+        for match in pattern.findall(text):
+            if len(match.strip()) > 5:
+                institution = _TRAILING_ACRONYM.sub('', match.strip())
+                if len(institution) > 100:
+                    institution = institution[:97] + "..."
+                institutions.append(institution)
+    return institutions
+
+
+def _find_books(text: str) -> List[str]:
+    books = []
+    for pattern in _BOOK_PATTERNS:
+        for match in pattern.findall(text):
+            if isinstance(match, tuple):
+                # Para patrones con dos grupos, tomar el más relevante
+                match = match[1] if len(match) > 1 and match[1] else match[0]
+            if len(match.strip()) <= 10:
+                continue
+            book = _EDGE_PUNCTUATION.sub('', match.strip())
+            book = _TRAILING_ELLIPSIS.sub('', book)
+            if (10 < len(book) < 150
+                    and not book.lower().startswith(('del ', 'de ', 'la ', 'el '))
+                    and not book.endswith(('...', 'A...'))):
+                books.append(book)
+    return books
+
+
+def extract_citations(texts: Iterable[str]) -> Dict[str, List[str]]:
+    """Autores, instituciones y libros mencionados en los textos, sin repetir y en orden de aparición."""
+    content = " ".join(texts)
+    return {
+        "authors": _unique(_find_authors(content))[:CITATIONS_MAX_PER_KIND],
+        "institutions": _unique(_find_institutions(content))[:CITATIONS_MAX_PER_KIND],
+        "books": _unique(_find_books(content))[:CITATIONS_MAX_PER_KIND],
+    }
+
+
+def merge_citations(citations: Iterable[Dict[str, List[str]]]) -> Dict[str, List[str]]:
+    merged = {kind: [] for kind in CITATION_KINDS}
+    for entry in citations:
+        for kind in CITATION_KINDS:
+            merged[kind].extend(entry.get(kind) or [])
+    return {kind: _unique(items)[:CITATIONS_MAX_PER_KIND] for kind, items in merged.items()}
+
+
+def dedupe_similar(titles: List[str]) -> List[str]:
+    """Descarta títulos que son variantes parciales de otro ya incluido."""
+    kept = []
+    for title in titles:
+        if not any(
+            (title.lower() in existing.lower() or existing.lower() in title.lower())
+            and abs(len(title) - len(existing)) < 10
+            for existing in kept
+        ):
+            kept.append(title)
+    return kept
+
+
+class CitationCollector:
+    """Acumula citas de un documento que llega por lotes (los chunks se solapan, así que
+    las menciones que cruzan el borde de un lote aparecen completas en el siguiente)."""
+
+    def __init__(self):
+        self._batches: List[Dict[str, List[str]]] = []
+
+    def add_texts(self, texts: Iterable[str]) -> None:
+        self._batches.append(extract_citations(texts))
+
+    def result(self) -> Dict[str, List[str]]:
+        return merge_citations(self._batches)
+
+
+class CitationIndex:
+    """
+    Citas por fuente de la versión activa del corpus, leídas de ingest_manifest en una
+    sola consulta y cacheadas en memoria hasta que cambia la versión activa.
+    """
+
+    def __init__(self, client, active_version, refresh_seconds: float = None):
+        self.client = client
+        self.active_version = active_version
+        self.refresh_seconds = active_version.refresh_seconds if refresh_seconds is None else refresh_seconds
+        self._lock = threading.Lock()
+        self._corpus_version: Optional[str] = None
+        self._by_source: Optional[Dict[str, Dict[str, List[str]]]] = None
+        self._loaded_at = 0.0
+
+    def _load(self, corpus_version: Optional[str]) -> Dict[str, Dict[str, List[str]]]:
+        rows = self.client.table("ingest_manifest")\
+            .select("source, citations")\
+            .eq("corpus_version", corpus_version or "")\
+            .not_.is_("citations", "null")\
+            .execute().data or []
+        by_source: Dict[str, List[Dict[str, List[str]]]] = {}
+        for row in rows:
+            by_source.setdefault(row["source"], []).append(row["citations"])
+        # Varias versiones de metadata de un mismo archivo se combinan
+        return {source: merge_citations(entries) for source, entries in by_source.items()}
+
+    def get(self, source: str) -> Optional[Dict[str, List[str]]]:
+        """Citas de la fuente, o None si no se extrajeron (no es ref o no se re-ingirió)."""
+        corpus_version = self.active_version.get()
+        with self._lock:
+            stale = time.monotonic() - self._loaded_at > self.refresh_seconds
+            if self._by_source is None or corpus_version != self._corpus_version or stale:
+                try:
+                    self._by_source = self._load(corpus_version)
+                    self._corpus_version = corpus_version
+                    print(f"📚 [CITAS] {len(self._by_source)} fuentes con citas (corpus {corpus_version or 'sin versionar'})")
+                except Exception as e:
+                    print(f"⚠️ [CITAS] No se pudieron leer las citas: {e}")
+                    self._by_source = self._by_source or {}
+                self._loaded_at = time.monotonic()
+            return self._by_source.get(source)
@@ -0,0 +1,196 @@
+# src/rag/corpus_manifest.py
+"""
+Manifiesto del corpus a ingerir (YAML o JSON) y checkpoint local de la ingesta.
+
+Formato del manifiesto:
+
+    defaults:            # opcional, se aplica a cada documento
+      version: 1
+    documents:
+      - path: docs/1/Siestas.pdf
+        name: Siestas.pdf
+        category: Sueño y descanso
+        version: 1        # opcional (default: KNOWLEDGE_VERSION)
+        ref: false        # opcional
+        enabled: true     # opcional, false lo deja fuera de la corrida
+"""
+import fnmatch
+import json
+import os
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import yaml
+
+INGEST_CHECKPOINT_PATH = os.getenv(
+    "INGEST_CHECKPOINT_PATH",
+    str(Path(__file__).resolve().parents[2] / ".cache" / "ingest_checkpoint.json"),
+)
+
+
+@dataclass
+class CorpusDocument:
+    path: str
+    name: str
+    category: str
+    version: Optional[Any] = None
+    ref: bool = False
+    enabled: bool = True
+
+    @property
+    def key(self) -> str:
+        return f"{self.name.lower().strip()}@{self.version}"
+
+    def as_dict(self) -> Dict:
+        return {
+            "path": self.path,
+            "name": self.name,
+            "category": self.category,
+            "version": self.version,
+            "ref": self.ref,
+        }
+
+
+def load_corpus_manifest(path: str, default_version: Optional[str] = None) -> List[CorpusDocument]:
+    """
+    Lee el manifiesto y valida cada entrada. Las rutas relativas se resuelven
+    contra la carpeta del manifiesto.
+    """
+    manifest_path = Path(path)
+    with open(manifest_path, encoding="utf-8") as f:
+        if manifest_path.suffix.lower() == ".json":
+            data = json.load(f)
+        else:
+            data = yaml.safe_load(f) or {}
+
+    defaults = data.get("defaults") or {}
+    documents = []
+    seen = set()
+    for position, entry in enumerate(data.get("documents") or [], start=1):
+        entry = {**defaults, **entry}
+        missing = [field for field in ("path", "name", "category") if not entry.get(field)]
+        if missing:
+            raise ValueError(f"Documento #{position} del manifiesto sin {', '.join(missing)}")
+
+        doc_path = Path(entry["path"])
+        if not doc_path.is_absolute():
+            doc_path = manifest_path.parent / doc_path
+        version = entry.get("version")
+        document = CorpusDocument(
+            path=str(doc_path),
+            name=entry["name"],
+            category=entry["category"],
+            version=version if version is not None else default_version,
+            ref=bool(entry.get("ref", False)),
+            enabled=bool(entry.get("enabled", True)),
+        )
+        if document.key in seen:
+            raise ValueError(f"Documento duplicado en el manifiesto: {document.key}")
+        seen.add(document.key)
+        documents.append(document)
+    return documents
+
+
+def filter_documents(documents: List[CorpusDocument], only: Optional[List[str]] = None) -> List[CorpusDocument]:
+    """
+    Documentos habilitados; con `only`, los que coinciden por nombre o ruta
+    (se aceptan comodines: --only '*_ref.pdf' 'docs/4/*').
+    """
+    selected = [doc for doc in documents if doc.enabled]
+    if not only:
+        return selected
+    patterns = [pattern.lower() for pattern in only]
+    return [
+        doc for doc in selected
+        if any(
+            fnmatch.fnmatch(doc.name.lower(), pattern) or fnmatch.fnmatch(doc.path.lower(), f"*{pattern}")
+            for pattern in patterns
+        )
+    ]
+
+
+class IngestCheckpoint:
+    """
+    Estado de la ingesta por documento en un JSON local: documentos terminados con su
+    hash de archivo y, para el que estaba en curso, cuántos lotes y chunks se subieron.
+    Se escribe de forma atómica (archivo temporal + rename) después de cada lote.
+
+    Lo que ya está en `documents` lo decide el hash de cada chunk: al reanudar, los lotes
+    subidos se vuelven a chunkear pero no se re-embeben.
+    """
+
+    def __init__(self, path: str = None):
+        self.path = Path(path or INGEST_CHECKPOINT_PATH)
+        self._lock = threading.Lock()
+        self.documents: Dict[str, Dict] = {}
+        if self.path.exists():
+            try:
+                self.documents = json.loads(self.path.read_text(encoding="utf-8")).get("documents", {})
+            except (OSError, ValueError) as e:
+                print(f"⚠️ [CHECKPOINT] No se pudo leer {self.path} ({e}), se empieza de cero")
+
+    def _save(self) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_suffix(".tmp")
+        tmp_path.write_text(json.dumps({"documents": self.documents}, ensure_ascii=False, indent=2), encoding="utf-8")
+        os.replace(tmp_path, self.path)
+
+    def is_done(self, key: str, file_hash: str) -> bool:
+        entry = self.documents.get(key) or {}
+        return entry.get("status") == "done" and entry.get("file_hash") == file_hash
+
+    def resume_point(self, key: str, file_hash: str) -> int:
+        """Lotes ya subidos de un documento interrumpido con el mismo archivo."""
+        entry = self.documents.get(key) or {}
+        if entry.get("status") == "in_progress" and entry.get("file_hash") == file_hash:
+            return max(entry.get("batches_done", 0), entry.get("resumed_from", 0))
+        return 0
+
+    def start(self, key: str, file_hash: str) -> int:
+        """Marca el documento en curso. Retorna los lotes que ya estaban subidos (0 si es nuevo)."""
+        with self._lock:
+            resumed_from = self.resume_point(key, file_hash)
+            self.documents[key] = {
+                "status": "in_progress",
+                "file_hash": file_hash,
+                "batches_done": 0,
+                "chunks_done": 0,
+                "resumed_from": resumed_from,
+                "updated_at": time.time(),
+            }
+            self._save()
+            return resumed_from
+
+    def batch_done(self, key: str, chunks: int) -> None:
+        with self._lock:
+            entry = self.documents[key]
+            entry["batches_done"] = entry.get("batches_done", 0) + 1
+            entry["chunks_done"] = entry.get("chunks_done", 0) + chunks
+            entry["updated_at"] = time.time()
+            self._save()
+
+    def finish(self, key: str, file_hash: str, chunks: int) -> None:
+        with self._lock:
+            self.documents[key] = {
+                "status": "done",
+                "file_hash": file_hash,
+                "chunks": chunks,
+                "updated_at": time.time(),
+            }
+            self._save()
+
+    def fail(self, key: str, error: str) -> None:
+        with self._lock:
+            # Un documento a medias queda "in_progress" para reanudarlo en la próxima corrida
+            entry = self.documents.get(key) or {"status": "failed"}
+            entry.update(error=error, updated_at=time.time())
+            self.documents[key] = entry
+            self._save()
+
+    def reset(self) -> None:
+        with self._lock:
+            self.documents = {}
+            self._save()
@@ -0,0 +1,221 @@
+# src/rag/corpus_versions.py
+"""
+Versiones del corpus de `documents`: la ingesta arma una versión en staging, la valida
+y recién entonces la activa en una sola transacción (activate_corpus_version). Las
+búsquedas filtran por la versión activa, así nunca mezclan chunks de dos versiones.
+
+Ciclo de una publicación:
+    1. begin: crea la versión en staging clonando la activa en el servidor (filas con
+       embeddings incluidos, sin re-embeber) o retoma la staging de una corrida cortada.
+    2. La ingesta incremental aplica solo los cambios dentro de la staging.
+    3. validate: documentos completos, conteos de chunks y que el corpus no se achique.
+    4. activate + gc: se activa y enseguida se borran en bloque las versiones que ya no
+       se conservan, para que documents vuelva a tener una sola copia del corpus.
+
+Las funciones SQL están en supabase/migrations/20261019000400_corpus_versions.sql.
+"""
+import os
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Optional, Tuple
+
+CORPUS_VERSIONS_TABLE = "corpus_versions"
+MANIFEST_TABLE = "ingest_manifest"
+
+# Cada cuánto las búsquedas vuelven a consultar la versión activa
+CORPUS_VERSION_REFRESH_SECONDS = float(os.getenv("CORPUS_VERSION_REFRESH_SECONDS", "60"))
+# Versiones retiradas que se conservan para poder volver atrás. Cada una es una copia
+# completa de documents con embeddings: agranda el índice vectorial y, como las
+# búsquedas filtran por versión, puede hacer que devuelvan menos de k resultados.
+CORPUS_KEEP_VERSIONS = int(os.getenv("CORPUS_KEEP_VERSIONS", "0"))
+# Fracción máxima de chunks que puede perder una versión nueva sin --allow-shrink
+CORPUS_MAX_SHRINK = float(os.getenv("CORPUS_MAX_SHRINK", "0.2"))
+
+
+def new_version_label() -> str:
+    return datetime.now(timezone.utc).strftime("%Y%m%d%H%M%S")
+
+
+class ActiveCorpusVersion:
+    """
+    Versión activa del corpus con cache en memoria. None si todavía no se publicó
+    ninguna (las búsquedas usan solo las filas previas al versionado).
+    Si Supabase falla se sigue usando el último valor conocido.
+    """
+
+    def __init__(self, client, refresh_seconds: float = None):
+        self.client = client
+        self.refresh_seconds = CORPUS_VERSION_REFRESH_SECONDS if refresh_seconds is None else refresh_seconds
+        self._lock = threading.Lock()
+        self._version: Optional[str] = None
+        self._expires_at = 0.0
+
+    def get(self) -> Optional[str]:
+        now = time.monotonic()
+        if now < self._expires_at:
+            return self._version
+        with self._lock:
+            if now < self._expires_at:
+                return self._version
+            try:
+                rows = self.client.table(CORPUS_VERSIONS_TABLE)\
+                    .select("version")\
+                    .eq("status", "active")\
+                    .limit(1)\
+                    .execute().data or []
+                version = rows[0]["version"] if rows else None
+                if version != self._version:
+                    print(f"📚 [CORPUS] Versión activa: {version or 'sin versionar'}")
+                self._version = version
+            except Exception as e:
+                print(f"⚠️ [CORPUS] No se pudo leer la versión activa ({e}), se usa {self._version or 'sin versionar'}")
+            self._expires_at = time.monotonic() + self.refresh_seconds
+            return self._version
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._expires_at = 0.0
+
+
+class CorpusPublisher:
+    """Operaciones de publicación sobre `corpus_versions`, `documents` e `ingest_manifest`."""
+
+    def __init__(self, client, table_name: str = "documents"):
+        self.client = client
+        self.table_name = table_name
+
+    def _version_with_status(self, status: str) -> Optional[Dict]:
+        rows = self.client.table(CORPUS_VERSIONS_TABLE)\
+            .select("version, status, chunk_count, created_at, activated_at")\
+            .eq("status", status)\
+            .limit(1)\
+            .execute().data or []
+        return rows[0] if rows else None
+
+    def active(self) -> Optional[Dict]:
+        return self._version_with_status("active")
+
+    def staging(self) -> Optional[Dict]:
+        return self._version_with_status("staging")
+
+    def begin(self, label: str = None) -> Tuple[str, bool]:
+        """
+        Retorna (versión en staging, retomada). Si quedó una staging de una corrida
+        anterior se sigue sobre ella; si no, se crea clonando la versión activa.
+        """
+        staging = self.staging()
+        if staging:
+            if label and label != staging["version"]:
+                raise ValueError(
+                    f"Ya hay una versión en staging ({staging['version']}): publicarla o descartarla antes de crear {label}"
+                )
+            print(f"⏯️ [CORPUS] Retomando la versión en staging {staging['version']}")
+            return staging["version"], True
+
+        label = label or new_version_label()
+        active = self.active()
+        self.client.table(CORPUS_VERSIONS_TABLE).insert({"version": label, "status": "staging"}).execute()
+        cloned = self.client.rpc(
+            "clone_corpus_version",
+            {"p_from": active["version"] if active else None, "p_to": label},
+        ).execute().data
+        origin = active["version"] if active else "filas sin versionar"
+        print(f"🧬 [CORPUS] Staging {label} creada desde {origin}: {cloned or 0} chunks clonados")
+        return label, False
+
+    def completed(self, corpus_version: Optional[str]) -> Dict[Tuple[str, str], Dict]:
+        """Documentos completos de una versión según ingest_manifest, por (source, version)."""
+        rows = self.client.table(MANIFEST_TABLE)\
+            .select("source, version, file_hash, chunk_count, category, ref, citations")\
+            .eq("corpus_version", corpus_version or "")\
+            .execute().data or []
+        return {(row["source"], str(row["version"])): row for row in rows}
+
+    def count_rows(self, corpus_version: str, source: str = None, version: str = None) -> int:
+        query = self.client.table(self.table_name)\
+            .select("id", count="exact")\
+            .eq("metadata->>corpus_version", corpus_version)
+        if source is not None:
+            query = query.eq("metadata->>source", source).eq("metadata->>version", str(version))
+        return query.limit(1).execute().count or 0
+
+    def remove_documents(self, corpus_version: str, keys: Iterable[Tuple[str, str]]) -> List[Tuple[str, str]]:
+        """Saca de la versión los documentos que ya no están en el manifiesto."""
+        removed = []
+        for source, version in keys:
+            self.client.table(self.table_name)\
+                .delete()\
+                .eq("metadata->>corpus_version", corpus_version)\
+                .eq("metadata->>source", source)\
+                .eq("metadata->>version", str(version))\
+                .execute()
+            self.client.table(MANIFEST_TABLE)\
+                .delete()\
+                .eq("corpus_version", corpus_version)\
+                .eq("source", source)\
+                .eq("version", str(version))\
+                .execute()
+            removed.append((source, version))
+            print(f"🗑️ [CORPUS] {source} v{version} fuera de la versión {corpus_version}")
+        return removed
+
+    def validate(
+        self,
+        corpus_version: str,
+        expected: Iterable[Tuple[str, str]],
+        allow_shrink: bool = False,
+        max_shrink: float = None,
+    ) -> List[str]:
+        """
+        Problemas que impiden activar la versión (lista vacía si está lista): cada
+        documento esperado tiene que estar completo con todos sus chunks, y el total
+        no puede caer más de `max_shrink` respecto de la versión activa.
+        """
+        max_shrink = CORPUS_MAX_SHRINK if max_shrink is None else max_shrink
+        problems = []
+        completed = self.completed(corpus_version)
+        for source, version in expected:
+            entry = completed.get((source, str(version)))
+            if entry is None:
+                problems.append(f"{source} v{version} no terminó de ingerirse")
+                continue
+            stored = self.count_rows(corpus_version, source, version)
+            if stored != entry["chunk_count"]:
+                problems.append(f"{source} v{version}: {stored} chunks guardados, se esperaban {entry['chunk_count']}")
+
+        total = self.count_rows(corpus_version)
+        if total == 0:
+            problems.append("la versión no tiene chunks")
+        active = self.active()
+        if active and active.get("chunk_count") and not allow_shrink:
+            floor = int(active["chunk_count"] * (1 - max_shrink))
+            if total < floor:
+                problems.append(
+                    f"la versión tiene {total} chunks y la activa {active['chunk_count']} "
+                    f"(más de {max_shrink:.0%} menos, usar --allow-shrink si es intencional)"
+                )
+        return problems
+
+    def activate(self, corpus_version: str) -> Dict:
+        result = self.client.rpc("activate_corpus_version", {"p_version": corpus_version}).execute().data or {}
+        print(
+            f"🚀 [CORPUS] Versión {corpus_version} activa ({result.get('chunk_count')} chunks), "
+            f"anterior: {result.get('previous') or 'sin versionar'}"
+        )
+        return result
+
+    def discard(self, corpus_version: str) -> None:
+        """Descarta una staging; sus filas se borran en el próximo gc."""
+        self.client.table(CORPUS_VERSIONS_TABLE)\
+            .update({"status": "discarded"})\
+            .eq("version", corpus_version)\
+            .eq("status", "staging")\
+            .execute()
+        print(f"🗑️ [CORPUS] Staging {corpus_version} descartada")
+
+    def gc(self, keep: int = None) -> int:
+        keep = CORPUS_KEEP_VERSIONS if keep is None else keep
+        deleted = self.client.rpc("gc_corpus_versions", {"p_keep": keep}).execute().data or 0
+        print(f"🧹 [CORPUS] {deleted} chunks de versiones viejas borrados (se conservan {keep} anteriores)")
+        return deleted
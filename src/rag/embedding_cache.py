@@ -0,0 +1,267 @@
+# src/rag/embedding_cache.py
+"""
+Cache persistente de embeddings direccionado por contenido: (modelo, sha256 del texto)
+→ vector. Vive en un SQLite local, se comparte entre la ingesta y las consultas, y
+desaloja las entradas menos usadas cuando supera el tamaño máximo.
+"""
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+EMBEDDING_CACHE_ENABLED = os.getenv("EMBEDDING_CACHE_ENABLED", "true").lower() == "true"
+EMBEDDING_CACHE_PATH = os.getenv(
+    "EMBEDDING_CACHE_PATH",
+    str(Path(__file__).resolve().parents[2] / ".cache" / "embeddings.sqlite"),
+)
+EMBEDDING_CACHE_MAX_MB = float(os.getenv("EMBEDDING_CACHE_MAX_MB", "512"))
+# Cada cuánto se escribe en bloque el último uso de los aciertos (no en cada consulta)
+EMBEDDING_CACHE_TOUCH_SECONDS = float(os.getenv("EMBEDDING_CACHE_TOUCH_SECONDS", "60"))
+
+# Al desalojar se baja hasta esta fracción del máximo para no desalojar en cada escritura
+_EVICT_TARGET_RATIO = 0.9
+
+
+def text_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def _as_stored(vector: List[float]) -> List[float]:
+    return np.asarray(vector, dtype=np.float32).tolist()
+
+
+class EmbeddingCache:
+    """
+    Tabla SQLite (model, text_hash) → vector float32. Thread-safe dentro del proceso;
+    WAL permite que otros procesos (ej: la API y una ingesta) la compartan.
+    El último uso de los aciertos se acumula en memoria y se escribe en bloque cada
+    `touch_seconds`, al guardar o antes de desalojar: una consulta que acierta no escribe.
+    """
+
+    def __init__(self, path: str = None, max_bytes: int = None, touch_seconds: float = None):
+        self.path = path or EMBEDDING_CACHE_PATH
+        self.max_bytes = int(max_bytes if max_bytes is not None else EMBEDDING_CACHE_MAX_MB * 1024 * 1024)
+        self.touch_seconds = EMBEDDING_CACHE_TOUCH_SECONDS if touch_seconds is None else touch_seconds
+        self._lock = threading.Lock()
+        self._touched: Dict[Tuple[str, str], float] = {}
+        self._touched_flushed_at = time.monotonic()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        if self.path != ":memory:":
+            Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS embeddings (
+                model TEXT NOT NULL,
+                text_hash TEXT NOT NULL,
+                vector BLOB NOT NULL,
+                size INTEGER NOT NULL,
+                last_used REAL NOT NULL,
+                PRIMARY KEY (model, text_hash)
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS embeddings_last_used_idx ON embeddings (last_used)")
+        self._conn.commit()
+        self._total_bytes = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM embeddings").fetchone()[0]
+
+    def _write_touches(self) -> None:
+        """Escribe los últimos usos pendientes (sin commit). Requiere el lock."""
+        if not self._touched:
+            return
+        touched, self._touched = self._touched, {}
+        self._touched_flushed_at = time.monotonic()
+        self._conn.executemany(
+            "UPDATE embeddings SET last_used = ? WHERE model = ? AND text_hash = ?",
+            [(used_at, model, key) for (model, key), used_at in touched.items()],
+        )
+
+    def get_many(self, model: str, hashes: List[str]) -> Dict[str, List[float]]:
+        """Vectores encontrados para esos hashes; registra su último uso."""
+        if not hashes:
+            return {}
+        found: Dict[str, List[float]] = {}
+        unique = list(dict.fromkeys(hashes))
+        with self._lock:
+            # Consultas por bloques para no pasar el límite de variables de SQLite
+            for start in range(0, len(unique), 500):
+                block = unique[start:start + 500]
+                placeholders = ",".join("?" * len(block))
+                rows = self._conn.execute(
+                    f"SELECT text_hash, vector FROM embeddings WHERE model = ? AND text_hash IN ({placeholders})",
+                    [model, *block],
+                ).fetchall()
+                for key, blob in rows:
+                    found[key] = np.frombuffer(blob, dtype=np.float32).tolist()
+            now = time.time()
+            for key in found:
+                self._touched[(model, key)] = now
+            self.hits += sum(1 for key in hashes if key in found)
+            self.misses += sum(1 for key in hashes if key not in found)
+            if self._touched and time.monotonic() - self._touched_flushed_at >= self.touch_seconds:
+                self._write_touches()
+                self._conn.commit()
+        return found
+
+    def contains_many(self, model: str, hashes: List[str]) -> set:
+        """Hashes presentes, sin contar aciertos ni tocar el último uso."""
+        present = set()
+        unique = list(dict.fromkeys(hashes))
+        with self._lock:
+            for start in range(0, len(unique), 500):
+                block = unique[start:start + 500]
+                placeholders = ",".join("?" * len(block))
+                present.update(key for (key,) in self._conn.execute(
+                    f"SELECT text_hash FROM embeddings WHERE model = ? AND text_hash IN ({placeholders})",
+                    [model, *block],
+                ))
+        return present
+
+    def put_many(self, model: str, vectors: Dict[str, List[float]]) -> None:
+        if not vectors:
+            return
+        now = time.time()
+        rows = []
+        for key, vector in vectors.items():
+            blob = np.asarray(vector, dtype=np.float32).tobytes()
+            rows.append((model, key, blob, len(blob), now))
+        with self._lock:
+            self._write_touches()
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (model, text_hash, vector, size, last_used) VALUES (?, ?, ?, ?, ?)",
+                rows,
+            )
+            self._conn.commit()
+            # Aproximado (un reemplazo cuenta doble); se recalcula exacto al desalojar
+            self._total_bytes += sum(row[3] for row in rows)
+            if self._total_bytes > self.max_bytes:
+                self._evict()
+
+    def _evict(self) -> None:
+        """Borra las entradas menos usadas hasta quedar bajo el objetivo. Requiere el lock."""
+        self._write_touches()
+        self._total_bytes = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM embeddings").fetchone()[0]
+        target = self.max_bytes * _EVICT_TARGET_RATIO
+        if self._total_bytes <= self.max_bytes:
+            return
+        to_free = self._total_bytes - target
+        victims = []
+        freed = 0
+        for model, key, size in self._conn.execute(
+            "SELECT model, text_hash, size FROM embeddings ORDER BY last_used ASC"
+        ):
+            if freed >= to_free:
+                break
+            victims.append((model, key))
+            freed += size
+        self._conn.executemany("DELETE FROM embeddings WHERE model = ? AND text_hash = ?", victims)
+        self._conn.commit()
+        self._total_bytes -= freed
+        self.evictions += len(victims)
+        print(f"🧹 [EMBED-CACHE] Desalojadas {len(victims)} entradas ({freed / 1024 / 1024:.1f} MB)")
+
+    def stats(self) -> Dict:
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+            lookups = self.hits + self.misses
+            return {
+                "entries": entries,
+                "bytes": self._total_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+                "evictions": self.evictions,
+            }
+
+    def close(self) -> None:
+        with self._lock:
+            try:
+                self._write_touches()
+                self._conn.commit()
+            except sqlite3.Error as e:
+                print(f"⚠️ [EMBED-CACHE] No se pudo guardar el último uso al cerrar: {e}")
+            self._conn.close()
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Envuelve un cliente de embeddings de LangChain: solo llama al modelo para los
+    textos que no están en el cache. Los vectores de documentos y de consultas
+    comparten entradas (text-embedding-3 no distingue entre ambos).
+    """
+
+    def __init__(self, inner: Embeddings, model: str, cache: Optional[EmbeddingCache] = None):
+        self.inner = inner
+        self.model = model
+        self.cache = cache or get_embedding_cache()
+
+    def _lookup(self, hashes: List[str]) -> Dict[str, List[float]]:
+        try:
+            return self.cache.get_many(self.model, hashes)
+        except sqlite3.Error as e:
+            # El cache es opcional: si SQLite falla (bloqueado, disco lleno) se embebe directo
+            print(f"⚠️ [EMBED-CACHE] No se pudo leer el cache, se usa el modelo: {e}")
+            return {}
+
+    def _store(self, vectors: Dict[str, List[float]]) -> None:
+        try:
+            self.cache.put_many(self.model, vectors)
+        except sqlite3.Error as e:
+            print(f"⚠️ [EMBED-CACHE] No se pudo guardar en el cache: {e}")
+
+    def missing_texts(self, texts: List[str]) -> List[str]:
+        """Textos que todavía habría que mandar al modelo (para reservar solo esos tokens)."""
+        hashes = [text_hash(text) for text in texts]
+        try:
+            present = self.cache.contains_many(self.model, hashes)
+        except sqlite3.Error as e:
+            print(f"⚠️ [EMBED-CACHE] No se pudo consultar el cache: {e}")
+            return list(texts)
+        return [text for key, text in zip(hashes, texts) if key not in present]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        hashes = [text_hash(text) for text in texts]
+        cached = self._lookup(hashes)
+
+        missing: Dict[str, str] = {}
+        for key, text in zip(hashes, texts):
+            if key not in cached and key not in missing:
+                missing[key] = text
+        if missing:
+            vectors = self.inner.embed_documents(list(missing.values()))
+            # Misma precisión que lo guardado: un acierto y un fallo devuelven el mismo vector
+            fresh = {key: _as_stored(vector) for key, vector in zip(missing.keys(), vectors)}
+            self._store(fresh)
+            cached.update(fresh)
+        return [cached[key] for key in hashes]
+
+    def embed_query(self, text: str) -> List[float]:
+        key = text_hash(text)
+        cached = self._lookup([key])
+        if key in cached:
+            return cached[key]
+        vector = _as_stored(self.inner.embed_query(text))
+        self._store({key: vector})
+        return vector
+
+
+_shared_cache: Optional[EmbeddingCache] = None
+_shared_cache_lock = threading.Lock()
+
+
+def get_embedding_cache() -> EmbeddingCache:
+    """Cache compartido por todo el proceso (ingesta y retriever usan la misma conexión)."""
+    global _shared_cache
+    with _shared_cache_lock:
+        if _shared_cache is None:
+            _shared_cache = EmbeddingCache()
+        return _shared_cache
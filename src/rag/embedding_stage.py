@@ -0,0 +1,198 @@
+# src/rag/embedding_stage.py
+"""
+Etapa de embeddings de la ingesta: parte los chunks en lotes, los embebe con
+concurrencia acotada respetando el límite de tokens por minuto y los inserta en
+`documents` en bloque. Los lotes que fallan se reintentan con backoff.
+"""
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+from .embedding_cache import EMBEDDING_CACHE_ENABLED, CachedEmbeddings
+from ..utils.admission_control import OpenAIRateLimiter
+from ..utils.resilience import ResiliencePolicy
+from ..utils.tokens import estimate_tokens
+
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "text-embedding-3-small")
+# "openai" o "fake" (embeddings deterministas locales, para tests y pruebas sin red)
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "openai")
+EMBEDDING_DIMENSIONS = int(os.getenv("EMBEDDING_DIMENSIONS", "1536"))
+# Chunks por llamada de embeddings y por insert
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "100"))
+# Llamadas de embeddings simultáneas (compartidas entre todos los documentos)
+EMBEDDING_CONCURRENCY = int(os.getenv("EMBEDDING_CONCURRENCY", "4"))
+# Límites de la cuenta para el modelo de embeddings (distintos a los del chat)
+EMBEDDING_RPM_LIMIT = int(os.getenv("EMBEDDING_RPM_LIMIT", "3000"))
+EMBEDDING_TPM_LIMIT = int(os.getenv("EMBEDDING_TPM_LIMIT", "1000000"))
+EMBEDDING_MAX_ATTEMPTS = int(os.getenv("EMBEDDING_MAX_ATTEMPTS", "5"))
+
+
+class EmbeddingBatchError(Exception):
+    """Un lote agotó sus reintentos."""
+
+
+def build_embeddings(backend: str = None, model: str = None, cache: bool = None, max_retries: int = None):
+    """
+    Cliente de embeddings según EMBEDDING_BACKEND, envuelto en el cache persistente
+    salvo que EMBEDDING_CACHE_ENABLED=false.
+    """
+    backend = (backend or EMBEDDING_BACKEND).lower()
+    if backend == "fake":
+        from langchain_community.embeddings import DeterministicFakeEmbedding
+        inner = DeterministicFakeEmbedding(size=EMBEDDING_DIMENSIONS)
+        model_key = f"fake-{EMBEDDING_DIMENSIONS}"
+    elif backend == "openai":
+        from langchain_openai import OpenAIEmbeddings
+        model_key = model or EMBEDDING_MODEL
+        kwargs = {} if max_retries is None else {"max_retries": max_retries}
+        inner = OpenAIEmbeddings(model=model_key, **kwargs)
+    else:
+        raise ValueError(f"EMBEDDING_BACKEND desconocido: '{backend}'")
+
+    if not (EMBEDDING_CACHE_ENABLED if cache is None else cache):
+        return inner
+    try:
+        return CachedEmbeddings(inner, model_key)
+    except (OSError, sqlite3.Error) as e:
+        print(f"⚠️ [EMBED-CACHE] Cache no disponible ({e}), se usan embeddings sin cache")
+        return inner
+
+
+class EmbeddingStage:
+    """
+    Sube chunks al vectorstore en lotes:
+    - `batch_size` chunks por llamada de embeddings y por insert
+    - como mucho `concurrency` lotes a la vez, compartidos entre todos los documentos
+    - cada llamada reserva sus tokens en un limitador RPM/TPM antes de salir
+    - embedding e insert se reintentan por separado (un insert fallido no re-embebe)
+    - las filas llevan id propio y se hace upsert, así un reintento no duplica
+    """
+
+    def __init__(
+        self,
+        embeddings,
+        client,
+        table_name: str = "documents",
+        batch_size: int = None,
+        concurrency: int = None,
+        rate_limiter: Optional[OpenAIRateLimiter] = None,
+        max_attempts: int = None,
+    ):
+        self.embeddings = embeddings
+        self.client = client
+        self.table_name = table_name
+        self.batch_size = max(1, batch_size or EMBEDDING_BATCH_SIZE)
+        self.concurrency = max(1, concurrency or EMBEDDING_CONCURRENCY)
+        # Ingesta offline: se espera lo necesario en lugar de rechazar
+        self.rate_limiter = rate_limiter or OpenAIRateLimiter(
+            rpm=EMBEDDING_RPM_LIMIT, tpm=EMBEDDING_TPM_LIMIT, max_wait=float("inf")
+        )
+        self.policy = ResiliencePolicy(
+            "embeddings",
+            deadline=600,
+            max_attempts=max_attempts or EMBEDDING_MAX_ATTEMPTS,
+            base_delay=1.0,
+            max_delay=30.0,
+        )
+        self._executor = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="embed")
+        self._stats_lock = threading.Lock()
+        self._stats = {"chunks": 0, "batches": 0, "retries": 0, "failed_batches": 0, "busy_seconds": 0.0}
+        self._started = time.perf_counter()
+
+    def _with_retries(self, label: str, operation):
+        for attempt in range(self.policy.max_attempts):
+            try:
+                return operation()
+            except Exception as e:
+                if attempt >= self.policy.max_attempts - 1:
+                    raise EmbeddingBatchError(f"{label}: {e}") from e
+                delay = self.policy.backoff_delay(attempt)
+                with self._stats_lock:
+                    self._stats["retries"] += 1
+                print(f"🔄 [EMBEDDINGS] {label} falló ({type(e).__name__}) en intento {attempt + 1}, reintentando en {delay:.2f}s")
+                time.sleep(delay)
+
+    def _embed(self, texts: List[str]) -> List[List[float]]:
+        # Con cache solo se reservan los tokens de los textos que van al modelo
+        missing_texts = getattr(self.embeddings, "missing_texts", None)
+        billable = missing_texts(texts) if missing_texts else texts
+        tokens = sum(estimate_tokens(text) for text in billable)
+        if tokens:
+            self.rate_limiter.acquire_sync(tokens)
+        return self.embeddings.embed_documents(texts)
+
+    def _process_batch(self, texts: List[str], metadatas: List[Dict], label: str) -> int:
+        started = time.perf_counter()
+        vectors = self._with_retries(f"{label} embeddings", lambda: self._embed(texts))
+        rows = [
+            {"id": str(uuid.uuid4()), "content": text, "metadata": metadata, "embedding": vector}
+            for text, metadata, vector in zip(texts, metadatas, vectors)
+        ]
+        self._with_retries(
+            f"{label} insert",
+            lambda: self.client.table(self.table_name).upsert(rows).execute(),
+        )
+        with self._stats_lock:
+            self._stats["chunks"] += len(rows)
+            self._stats["batches"] += 1
+            self._stats["busy_seconds"] += time.perf_counter() - started
+        return len(rows)
+
+    def upload(self, texts: List[str], metadatas: List[Dict]) -> int:
+        """
+        Embebe e inserta los chunks de un documento. Lanza EmbeddingBatchError si algún
+        lote agotó sus reintentos (los lotes ya insertados quedan guardados).
+        """
+        if len(texts) != len(metadatas):
+            raise ValueError("texts y metadatas deben tener el mismo largo")
+
+        futures = []
+        for start in range(0, len(texts), self.batch_size):
+            end = start + self.batch_size
+            source = (metadatas[start] or {}).get("source", "?") if metadatas else "?"
+            label = f"{source}[{start}:{min(end, len(texts))}]"
+            futures.append(self._executor.submit(self._process_batch, texts[start:end], metadatas[start:end], label))
+
+        uploaded = 0
+        errors = []
+        for future in futures:
+            try:
+                uploaded += future.result()
+            except EmbeddingBatchError as e:
+                errors.append(str(e))
+        if errors:
+            with self._stats_lock:
+                self._stats["failed_batches"] += len(errors)
+            raise EmbeddingBatchError(f"{len(errors)} lote(s) fallaron: {'; '.join(errors)}")
+        return uploaded
+
+    def stats(self) -> Dict:
+        with self._stats_lock:
+            stats = dict(self._stats)
+        elapsed = time.perf_counter() - self._started
+        stats["busy_seconds"] = round(stats["busy_seconds"], 2)
+        stats["chunks_per_second"] = round(stats["chunks"] / elapsed, 2) if elapsed else 0.0
+        return stats
+
+    def report(self) -> None:
+        stats = self.stats()
+        print(
+            f"📊 [EMBEDDINGS] {stats['chunks']} chunks en {stats['batches']} lotes "
+            f"({stats['chunks_per_second']} chunks/s, {stats['retries']} reintentos, "
+            f"{stats['failed_batches']} lotes fallidos)"
+        )
+        cache = getattr(self.embeddings, "cache", None)
+        if cache is not None:
+            cache_stats = cache.stats()
+            print(
+                f"💾 [EMBED-CACHE] {cache_stats['hits']} aciertos / {cache_stats['misses']} fallos "
+                f"({cache_stats['hit_rate']:.0%}), {cache_stats['entries']} entradas, "
+                f"{cache_stats['bytes'] / 1024 / 1024:.1f} MB"
+            )
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=True)
@@ -0,0 +1,307 @@
+# src/rag/incremental.py
+"""
+Ingesta incremental: compara lo que ya está guardado en `documents` para un
+(source, version) con los chunks recién extraídos, y solo embebe los nuevos.
+Las filas que dejaron de existir en el documento se borran al final.
+
+`ingest_manifest` registra qué archivo y cuántos chunks quedaron completos por
+(source, version): un documento subido a medias nunca se considera al día.
+
+Con `corpus_version` todo se acota a esa versión del corpus (ver corpus_versions.py):
+las filas nuevas la llevan en la metadata y las de otras versiones no se tocan.
+"""
+from collections import defaultdict
+from datetime import datetime, timezone
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+# Filas leídas por página al armar el manifiesto
+MANIFEST_PAGE_SIZE = 1000
+# Ids por request al borrar filas viejas
+DELETE_BATCH_SIZE = 200
+# Filas por llamada a update_documents_metadata
+METADATA_UPDATE_BATCH_SIZE = 500
+
+MANIFEST_TABLE = "ingest_manifest"
+
+# Campos de la metadata que, si cambian, obligan a reemplazar la fila
+_ROW_IDENTITY_FIELDS = ("category", "ref")
+
+
+@dataclass
+class StoredManifest:
+    """Filas de `documents` de un (source, version): id y metadata, sin embeddings."""
+
+    source: str
+    version: str
+    rows: List[Dict] = field(default_factory=list)
+    # Última ingesta completa según ingest_manifest (None si nunca terminó)
+    completed_file_hash: Optional[str] = None
+    completed_chunks: Optional[int] = None
+    # Citas guardadas para documentos ref (None si todavía no se extrajeron)
+    completed_citations: Optional[Dict] = None
+
+    @property
+    def file_hashes(self) -> Set[str]:
+        return {(row.get("metadata") or {}).get("file_hash") for row in self.rows}
+
+    def is_current(self, file_hash: str, category: str, ref: bool) -> bool:
+        """
+        True si la última ingesta completa fue de este mismo archivo, siguen estando
+        todas sus filas y tienen la misma categoría: se puede saltar sin extraerlo.
+        """
+        if not self.rows or self.file_hashes != {file_hash}:
+            return False
+        if self.completed_file_hash != file_hash or self.completed_chunks != len(self.rows):
+            return False
+        return all(
+            (row.get("metadata") or {}).get("chunk_hash")
+            and (row.get("metadata") or {}).get("category") == category
+            and bool((row.get("metadata") or {}).get("ref")) == bool(ref)
+            for row in self.rows
+        )
+
+
+@dataclass
+class IncrementalPlan:
+    """Qué hacer con un documento: índices de chunks a embeber y filas a tocar."""
+
+    new_indices: List[int] = field(default_factory=list)
+    stale_ids: List[str] = field(default_factory=list)
+    # Filas que se conservan pero cuya metadata cambió (ej: índice de chunk corrido)
+    metadata_updates: List[Tuple[str, Dict]] = field(default_factory=list)
+    unchanged: int = 0
+
+
+class ChunkMatcher:
+    """
+    Empareja chunks nuevos con filas guardadas por chunk_hash (respetando repeticiones:
+    dos chunks iguales necesitan dos filas). Las filas sin hash (ingestas previas a los
+    hashes) o con otra categoría se reemplazan. Se puede alimentar por lotes.
+    """
+
+    def __init__(self, manifest: StoredManifest):
+        self._stored_by_hash: Dict[str, List[Dict]] = defaultdict(list)
+        self.stale_ids: List[str] = []
+        for row in manifest.rows:
+            key = (row.get("metadata") or {}).get("chunk_hash")
+            if key:
+                self._stored_by_hash[key].append(row)
+            else:
+                self.stale_ids.append(row["id"])
+
+    def match(self, metadatas: List[Dict]) -> IncrementalPlan:
+        """Plan para un lote; `new_indices` son relativos al lote."""
+        plan = IncrementalPlan()
+        for index, metadata in enumerate(metadatas):
+            candidates = self._stored_by_hash.get(metadata["chunk_hash"])
+            match = None
+            while candidates and match is None:
+                row = candidates.pop(0)
+                stored = row.get("metadata") or {}
+                if all(stored.get(f) == metadata.get(f) for f in _ROW_IDENTITY_FIELDS):
+                    match = row
+                else:
+                    self.stale_ids.append(row["id"])
+            if match is None:
+                plan.new_indices.append(index)
+                continue
+            plan.unchanged += 1
+            if (match.get("metadata") or {}) != metadata:
+                plan.metadata_updates.append((match["id"], metadata))
+        return plan
+
+    def leftover_ids(self) -> List[str]:
+        """Filas que ningún chunk reclamó más las reemplazadas: se borran al final."""
+        leftovers = [row["id"] for rows in self._stored_by_hash.values() for row in rows]
+        return self.stale_ids + leftovers
+
+
+def plan_incremental(metadatas: List[Dict], manifest: StoredManifest) -> IncrementalPlan:
+    """Plan completo de un documento ya chunkeado."""
+    matcher = ChunkMatcher(manifest)
+    plan = matcher.match(metadatas)
+    plan.stale_ids = matcher.leftover_ids()
+    return plan
+
+
+class IncrementalSession:
+    """
+    Ingesta incremental de un documento que llega por lotes (streaming): cada lote sube
+    sus chunks nuevos y `finish` borra lo reemplazado cuando ya está todo arriba.
+    """
+
+    def __init__(self, ingest: "IncrementalIngest", manifest: StoredManifest):
+        self.ingest = ingest
+        self.manifest = manifest
+        self.matcher = ChunkMatcher(manifest)
+        self.result = {"embedded": 0, "unchanged": 0, "deleted": 0, "relabeled": 0}
+        self.chunks = 0
+        self.file_hash: Optional[str] = None
+        self.category: Optional[str] = None
+        self.ref = False
+
+    def add_batch(
+        self,
+        texts: List[str],
+        metadatas: List[Dict],
+        upload: Callable[[List[str], List[Dict]], int],
+    ) -> None:
+        if self.ingest.corpus_version:
+            metadatas = [dict(metadata, corpus_version=self.ingest.corpus_version) for metadata in metadatas]
+        plan = self.matcher.match(metadatas)
+        self.chunks += len(metadatas)
+        if metadatas:
+            self.file_hash = metadatas[0].get("file_hash")
+            self.category = metadatas[0].get("category")
+            self.ref = bool(metadatas[0].get("ref"))
+        if plan.new_indices:
+            upload(
+                [texts[i] for i in plan.new_indices],
+                [metadatas[i] for i in plan.new_indices],
+            )
+        if plan.metadata_updates:
+            self.ingest.update_metadata(plan.metadata_updates)
+        self.result["embedded"] += len(plan.new_indices)
+        self.result["unchanged"] += plan.unchanged
+        self.result["relabeled"] += len(plan.metadata_updates)
+
+    def finish(self, citations: Optional[Dict] = None) -> Dict[str, int]:
+        stale_ids = self.matcher.leftover_ids()
+        if stale_ids:
+            self.ingest.delete_rows(stale_ids)
+        self.result["deleted"] = len(stale_ids)
+        if self.file_hash:
+            self.ingest.mark_complete(
+                self.manifest.source, self.manifest.version, self.file_hash, self.chunks,
+                category=self.category, ref=self.ref, citations=citations,
+            )
+        print(
+            f"♻️ [INCREMENTAL] {self.manifest.source} v{self.manifest.version}: {self.result['embedded']} nuevos, "
+            f"{self.result['unchanged']} sin cambios, {self.result['deleted']} borrados"
+        )
+        return dict(self.result)
+
+
+class IncrementalIngest:
+    """
+    Lee el manifiesto de `documents` y aplica el plan incremental de cada documento.
+    Sin `corpus_version` trabaja sobre las filas previas al versionado del corpus.
+    """
+
+    def __init__(self, client, table_name: str = "documents", corpus_version: Optional[str] = None):
+        self.client = client
+        self.table_name = table_name
+        self.corpus_version = corpus_version
+
+    def for_corpus(self, corpus_version: Optional[str]) -> "IncrementalIngest":
+        """Misma conexión, acotada a otra versión del corpus."""
+        return IncrementalIngest(self.client, self.table_name, corpus_version)
+
+    def _scoped(self, query):
+        if self.corpus_version:
+            return query.eq("metadata->>corpus_version", self.corpus_version)
+        return query.is_("metadata->>corpus_version", "null")
+
+    def load_manifest(self, source: str, version: str) -> StoredManifest:
+        manifest = StoredManifest(source=source, version=version)
+        offset = 0
+        while True:
+            query = self.client.table(self.table_name)\
+                .select("id, metadata")\
+                .eq("metadata->>source", source)\
+                .eq("metadata->>version", str(version))
+            page = self._scoped(query)\
+                .order("id")\
+                .range(offset, offset + MANIFEST_PAGE_SIZE - 1)\
+                .execute().data or []
+            manifest.rows.extend(page)
+            if len(page) < MANIFEST_PAGE_SIZE:
+                break
+            offset += MANIFEST_PAGE_SIZE
+
+        try:
+            completed = self.client.table(MANIFEST_TABLE)\
+                .select("file_hash, chunk_count, citations")\
+                .eq("source", source)\
+                .eq("version", str(version))\
+                .eq("corpus_version", self.corpus_version or "")\
+                .execute().data or []
+        except Exception as e:
+            # Sin la tabla (migración no aplicada) se re-chunkea siempre, pero sigue sin re-embeber
+            print(f"⚠️ [INCREMENTAL] No se pudo leer {MANIFEST_TABLE}: {e}")
+            completed = []
+        if completed:
+            manifest.completed_file_hash = completed[0]["file_hash"]
+            manifest.completed_chunks = completed[0]["chunk_count"]
+            manifest.completed_citations = completed[0].get("citations")
+        return manifest
+
+    def mark_complete(
+        self,
+        source: str,
+        version: str,
+        file_hash: str,
+        chunks: int,
+        category: Optional[str] = None,
+        ref: bool = False,
+        citations: Optional[Dict] = None,
+    ) -> None:
+        """Registra que el documento quedó completo en `documents`."""
+        row = {
+            "source": source,
+            "version": str(version),
+            "corpus_version": self.corpus_version or "",
+            "file_hash": file_hash,
+            "chunk_count": chunks,
+            "category": category,
+            "ref": bool(ref),
+            "completed_at": datetime.now(timezone.utc).isoformat(),
+        }
+        if citations is not None:
+            # Sin citas nuevas el upsert conserva las que ya estaban
+            row["citations"] = citations
+        try:
+            self.client.table(MANIFEST_TABLE).upsert(
+                row,
+                on_conflict="source,version,corpus_version",
+            ).execute()
+        except Exception as e:
+            print(f"⚠️ [INCREMENTAL] No se pudo registrar {source} v{version} en {MANIFEST_TABLE}: {e}")
+
+    def update_metadata(self, updates: List[Tuple[str, Dict]]) -> None:
+        """Reescribe la metadata de filas conservadas con una RPC por bloque (no un PATCH por fila)."""
+        for start in range(0, len(updates), METADATA_UPDATE_BATCH_SIZE):
+            block = updates[start:start + METADATA_UPDATE_BATCH_SIZE]
+            self.client.rpc(
+                "update_documents_metadata",
+                {"p_rows": [{"id": row_id, "metadata": metadata} for row_id, metadata in block]},
+            ).execute()
+
+    def delete_rows(self, ids: List[str]) -> None:
+        for start in range(0, len(ids), DELETE_BATCH_SIZE):
+            self.client.table(self.table_name)\
+                .delete()\
+                .in_("id", ids[start:start + DELETE_BATCH_SIZE])\
+                .execute()
+
+    def start(self, source: str, version: str, manifest: StoredManifest = None) -> IncrementalSession:
+        return IncrementalSession(self, manifest or self.load_manifest(source, version))
+
+    def sync(
+        self,
+        texts: List[str],
+        metadatas: List[Dict],
+        upload: Callable[[List[str], List[Dict]], int],
+        manifest: StoredManifest = None,
+        citations: Optional[Dict] = None,
+    ) -> Dict[str, int]:
+        """
+        Sube solo los chunks nuevos de un documento y después borra los reemplazados,
+        así el documento nunca queda sin contenido durante la ingesta.
+        """
+        if not metadatas:
+            return {"embedded": 0, "unchanged": 0, "deleted": 0, "relabeled": 0}
+        session = self.start(metadatas[0]["source"], metadatas[0]["version"], manifest)
+        session.add_batch(texts, metadatas, upload)
+        return session.finish(citations=citations)
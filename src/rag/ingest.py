@@ -1,11 +1,17 @@
-import os, math
+import os, math, argparse, time
 from supabase import create_client
-from langchain_openai import OpenAIEmbeddings
 from langchain_community.vectorstores import SupabaseVectorStore
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from pypdf import PdfReader
 from pathlib import Path
 from dotenv import load_dotenv
+from ..utils.resilience import supabase_client_options
+from .chunking import batched, file_hash, iter_document_chunks
+from .incremental import IncrementalIngest
+from .ingest_pipeline import INGEST_WORKERS, run_parallel_ingest
+from .embedding_stage import EmbeddingStage, build_embeddings
+from .corpus_manifest import IngestCheckpoint, filter_documents, load_corpus_manifest
+from .corpus_versions import CORPUS_KEEP_VERSIONS, CorpusPublisher
+from .source_index import SourceTerms, SourceTermStats, build_source_index
+from .citations import CitationCollector, extract_citations
 
 def get_supabase_config():
     load_dotenv(dotenv_path=Path(__file__).resolve().parents[2] / '.env')
@@ -19,9 +25,13 @@ def get_supabase_config():
 
 # Initialize variables that will be used by the functions
 SUPABASE_URL, SUPABASE_SERVICE_ROLE_KEY = get_supabase_config()  
-supabase = create_client(SUPABASE_URL, SUPABASE_SERVICE_ROLE_KEY)
-emb = OpenAIEmbeddings(model="text-embedding-3-small")
+supabase = create_client(SUPABASE_URL, SUPABASE_SERVICE_ROLE_KEY, options=supabase_client_options())
+# Los reintentos los maneja EmbeddingStage para no multiplicarlos
+emb = build_embeddings(max_retries=0)
 DEFAULT_METADATA_VERSION = os.getenv("KNOWLEDGE_VERSION", "1.0")
+DEFAULT_CORPUS_MANIFEST = os.getenv(
+    "INGEST_MANIFEST_PATH", str(Path(__file__).resolve().parents[2] / "ingest_manifest.yaml")
+)
 
 vectorstore = SupabaseVectorStore(
     client=supabase,
@@ -30,131 +40,373 @@ vectorstore = SupabaseVectorStore(
     embedding=emb,
 )
 
-def pdf_to_text(path):
-    reader = PdfReader(path)
-    pages = [p.extract_text() or "" for p in reader.pages]
-    return "\n\n".join(pages)
-
-def clean_text(text: str) -> str:
-    """Limpia saltos de línea múltiples y espacios extra"""
-    return " ".join(text.split())
+# Subida en lotes con reintentos y límite de TPM (reemplaza a vectorstore.add_texts)
+embedding_stage = EmbeddingStage(emb, supabase)
+incremental = IncrementalIngest(supabase)
+# Staging, validación y activación de versiones del corpus
+publisher = CorpusPublisher(supabase)
 
-def chunk(text):
-    splitter = RecursiveCharacterTextSplitter(
-        chunk_size=1200, chunk_overlap=150, separators=["\n\n", "\n", " ", ""]
-    )
-    return splitter.split_text(text)
+def _needs_ingest(path, source_name, category, version, ref, source_hash=None, corpus_version=None):
+    """
+    Retorna (hash del archivo, manifiesto guardado), o None si el documento ya está
+    guardado tal cual y se puede saltar sin extraerlo ni embeber nada.
+    """
+    source_hash = source_hash or file_hash(path)
+    manifest = incremental.for_corpus(corpus_version).load_manifest(source_name, version)
+    # Los ref ingeridos antes de extraer citas se re-chunkean (sin re-embeber) para completarlas
+    missing_citations = ref and manifest.completed_citations is None
+    if manifest.is_current(source_hash, category, ref) and not missing_citations:
+        print(f"⏭️ Sin cambios: {source_name} | Versión: {version}")
+        return None
+    return source_hash, manifest
 
-def ingest_pdf(path, source_name, category, version=None, ref=False):
-    raw = pdf_to_text(path)
-    chunks = chunk(raw)
-    cleaned_chunks = [clean_text(c) for c in chunks]
+def _empty_result(source_name, status):
+    return {"name": source_name, "status": status, "chunks": 0, "embedded": 0, "unchanged": 0, "deleted": 0}
 
+def ingest_pdf(path, source_name, category, version=None, ref=False, checkpoint=None, source_hash=None,
+               corpus_version=None, terms=None):
+    """
+    Ingesta un PDF en streaming. Con `checkpoint` registra el avance por lote para
+    poder reanudar una corrida interrumpida. Con `corpus_version` escribe en esa versión
+    del corpus (la staging de publish_corpus). Con `terms` (SourceTerms) cuenta los
+    términos de los chunks para el índice de fuentes. De los documentos ref extrae las
+    citas (citations.py) y las guarda con el documento. Retorna el resultado del documento.
+    """
     source_name = source_name.lower().strip()
     if not category:
         raise ValueError(f"Debe indicar la categoría para '{source_name}'.")
     version = version or DEFAULT_METADATA_VERSION
-    
-    metas = [
-        {
-            "source": source_name,
-            "type": "pdf",
-            "chunk": i,
-            "category": category,
-            "version": version,
-            "ref": ref
-        }
-        for i, _ in enumerate(cleaned_chunks)
-    ]
-    vectorstore.add_texts(texts=cleaned_chunks, metadatas=metas)
+    key = f"{source_name}@{version}"
+
+    pending = _needs_ingest(path, source_name, category, version, ref, source_hash=source_hash,
+                            corpus_version=corpus_version)
+    if pending is None:
+        if checkpoint is not None:
+            checkpoint.finish(key, source_hash or file_hash(path), chunks=0)
+        return _empty_result(source_name, "unchanged")
+    source_hash, manifest = pending
+
+    if checkpoint is not None:
+        resumed_from = checkpoint.start(key, source_hash)
+        if resumed_from:
+            print(f"⏯️ Reanudando {source_name}: {resumed_from} lote(s) ya subidos no se re-embeben")
+
+    # Streaming: páginas y chunks se generan a medida que se suben, la memoria no
+    # depende del tamaño del PDF. Cada flush llena todos los lotes concurrentes del stage.
+    session = incremental.for_corpus(corpus_version).start(source_name, version, manifest=manifest)
+    flush_size = embedding_stage.batch_size * embedding_stage.concurrency
+    total_chunks = 0
+    citations = CitationCollector() if ref else None
+    chunks = iter_document_chunks(path, source_name, category, version, ref, source_hash=source_hash)
+    for batch in batched(chunks, flush_size):
+        texts = [text for text, _ in batch]
+        session.add_batch(texts, [metadata for _, metadata in batch], embedding_stage.upload)
+        if terms is not None:
+            terms.add_texts(texts)
+        if citations is not None:
+            citations.add_texts(texts)
+        total_chunks += len(batch)
+        if checkpoint is not None:
+            checkpoint.batch_done(key, len(batch))
+    result = session.finish(citations=citations.result() if citations is not None else None)
+    if checkpoint is not None:
+        checkpoint.finish(key, source_hash, total_chunks)
+
     ref_text = " (REF)" if ref else ""
-    print(f"✅ Ingestado {len(chunks)} chunks de {source_name}{ref_text} - Categoría: {category} | Versión: {version}")
+    print(f"✅ Ingestado {total_chunks} chunks de {source_name}{ref_text} - Categoría: {category} | Versión: {version}")
+    return {"name": source_name, "status": "ingested", "chunks": total_chunks, **result}
 
-if __name__ == "__main__":
+def ingest_documents(documents, workers=1, checkpoint=None, changed_only=False, corpus_version=None,
+                     term_stats=None):
+    """
+    Ingesta una lista de documentos ({path, name, category, version, ref}) y retorna el reporte.
+    Los documentos sin cambios se saltan y de los modificados solo se embeben los chunks nuevos.
+    Con `changed_only` se saltan, sin consultar Supabase, los que el checkpoint ya registra
+    como terminados con el mismo hash de archivo.
+    Con `term_stats` (SourceTermStats) guarda los términos de los documentos que se leen,
+    así refresh_source_index no vuelve a abrirlos.
+    Con workers > 1 extrae y chunkea en paralelo (un proceso por documento) y sube
+    desde una cola acotada mientras los demás documentos se siguen procesando; en ese
+    modo cada documento se materializa completo en su proceso (usar serial para libros grandes).
+    """
+    started = time.perf_counter()
+    results = []
+    pending_docs = []
+    for doc in documents:
+        name = doc["name"].lower().strip()
+        version = doc.get("version") or DEFAULT_METADATA_VERSION
+        try:
+            source_hash = file_hash(doc["path"])
+        except OSError as e:
+            print(f"❌ {name}: no se pudo leer {doc['path']} ({e})")
+            results.append(_empty_result(name, "failed"))
+            continue
+        if changed_only and checkpoint is not None and checkpoint.is_done(f"{name}@{version}", source_hash):
+            results.append(_empty_result(name, "unchanged"))
+            continue
+        pending_docs.append(dict(doc, name=name, version=version, file_hash=source_hash))
+
+    if workers <= 1:
+        for doc in pending_docs:
+            terms = SourceTerms(doc["file_hash"]) if term_stats is not None and not doc.get("ref") else None
+            try:
+                results.append(ingest_pdf(
+                    doc["path"],
+                    doc["name"],
+                    category=doc["category"],
+                    version=doc["version"],
+                    ref=doc.get("ref", False),
+                    checkpoint=checkpoint,
+                    source_hash=doc["file_hash"],
+                    corpus_version=corpus_version,
+                    terms=terms,
+                ))
+                # Sin cambios no se leyó el PDF: los términos cacheados siguen valiendo
+                if terms is not None and results[-1]["status"] == "ingested":
+                    term_stats.put(doc["name"], terms)
+            except Exception as e:
+                print(f"❌ {doc['name']} falló: {e}")
+                if checkpoint is not None:
+                    checkpoint.fail(f"{doc['name']}@{doc['version']}", str(e))
+                results.append(_empty_result(doc["name"], "failed"))
+    else:
+        manifests = {}
+        parallel_docs = []
+        for doc in pending_docs:
+            pending = _needs_ingest(doc["path"], doc["name"], doc.get("category"), doc["version"],
+                                    doc.get("ref", False), source_hash=doc["file_hash"],
+                                    corpus_version=corpus_version)
+            if pending is None:
+                results.append(_empty_result(doc["name"], "unchanged"))
+                continue
+            manifests[(doc["name"], doc["version"])] = pending[1]
+            parallel_docs.append(doc)
+
+        def upload(prepared):
+            key = f"{prepared.name}@{prepared.version}"
+            source_hash = prepared.metadatas[0]["file_hash"] if prepared.metadatas else None
+            if checkpoint is not None:
+                checkpoint.start(key, source_hash)
+            try:
+                result = incremental.for_corpus(corpus_version).sync(
+                    prepared.texts,
+                    prepared.metadatas,
+                    embedding_stage.upload,
+                    manifest=manifests.get((prepared.name, prepared.version)),
+                    citations=extract_citations(prepared.texts) if prepared.metadatas and prepared.metadatas[0].get("ref") else None,
+                )
+            except Exception as e:
+                if checkpoint is not None:
+                    checkpoint.fail(key, str(e))
+                results.append(_empty_result(prepared.name, "failed"))
+                raise
+            if checkpoint is not None:
+                checkpoint.finish(key, source_hash, len(prepared.texts))
+            if term_stats is not None and prepared.metadatas and not prepared.metadatas[0].get("ref"):
+                terms = SourceTerms(source_hash)
+                terms.add_texts(prepared.texts)
+                term_stats.put(prepared.name, terms)
+            results.append({"name": prepared.name, "status": "ingested", "chunks": len(prepared.texts), **result})
+
+        if parallel_docs:
+            summary = run_parallel_ingest(parallel_docs, upload, workers=workers)
+            uploaded = {result["name"] for result in results}
+            results.extend(_empty_result(name, "failed") for name in summary["failed"] if name not in uploaded)
+
+    report = _run_report(results, time.perf_counter() - started)
+    embedding_stage.report()
+    return report
+
+def refresh_source_index(documents, term_stats=None, path=None):
     """
-    Define aquí los documentos que querés ingerir.
-    Para cada uno puedes especificar una versión distinta (por ejemplo, "v1", "v2", "2024.10").
-    Si no indicás versión se usará la definida en `DEFAULT_METADATA_VERSION`.
+    Recalcula el índice término → fuente (source_index.py) con todos los documentos
+    no-ref del corpus. Los términos de cada fuente salen del cache si el archivo no
+    cambió; si no, se re-chunkea el PDF (sin embeber nada).
     """
-    DOCUMENTS_TO_INGEST = [
-        # Documentos de referencias con etiqueta ref: true
-        # {"path": "docs/1/referencias/Alteraciones_del_sueño_ref.pdf", "name": "Alteraciones_del_sueño_ref.pdf", "category": "Sueño y descanso", "version": 1, "ref": True},
-        # {"path": "docs/1/referencias/Bedtime_ref.pdf", "name": "Bedtime_ref.pdf", "category": "Sueño y descanso", "version": 1, "ref": True},
-        # {"path": "docs/1/referencias/Destete_Lumi_ref.pdf", "name": "Destete_Lumi_ref.pdf", "category": "Alimentación", "version": 1, "ref": True},
-        # {"path": "docs/1/referencias/Dormir_en_su_cuna_ref.pdf", "name": "Dormir_en_su_cuna_ref.pdf", "category": "Sueño y descanso", "version": 1, "ref": True},
-        # {"path": "docs/1/referencias/Estimulacion_sensorial_y_sueño_ref.pdf", "name": "Estimulacion_sensorial_y_sueño_ref.pdf", "category": "Sueño y descanso", "version": 1, "ref": True},
-        # {"path": "docs/1/referencias/Estrategias_destete_nocturno_(12–36meses)_ref.pdf", "name": "Estrategias_destete_nocturno_(12–36meses)_ref.pdf", "category": "Sueño y descanso", "version": 1, "ref": True},
-        # {"path": "docs/1/referencias/Rutina_del_bebé_ref.pdf", "name": "Rutina_del_bebé_ref.pdf", "category": "Rutinas y cuidados", "version": 1, "ref": True},
-        # {"path": "docs/1/referencias/Siestas_ref.pdf", "name": "Siestas_ref.pdf", "category": "Sueño y descanso", "version": 1, "ref": True},
-        # {"path": "docs/1/referencias/Sueño_infantil_ref.pdf", "name": "Sueño_infantil_ref.pdf", "category": "Sueño y descanso", "version": 1, "ref": True},
-        # {"path": "docs/1/referencias/Sueño_infantil_temperatura_ref.pdf", "name": "Sueño_infantil_temperatura_ref.pdf", "category": "Sueño y descanso", "version": 1, "ref": True},
-        # {"path": "docs/1/referencias/Temperamento_y_sueño_ref.pdf", "name": "Temperamento_y_sueño_ref.pdf", "category": "Sueño y descanso", "version": 1, "ref": True},
-        
-        # {"path": "docs/1/Alteraciones_del_sueño.pdf", "name": "Alteraciones_del_sueño.pdf", "category": "Sueño y descanso", "version": 1},
-        # {"path": "docs/1/Bedtime.pdf", "name": "Bedtime.pdf", "category": "Sueño y descanso", "version": 1},
-        # {"path": "docs/1/Destete_Lumi.pdf", "name": "Destete_Lumi.pdf", "category": "Alimentación", "version": 1},
-        # {"path": "docs/1/Dormir_en_su_cuna.pdf", "name": "Dormir_en_su_cuna.pdf", "category": "Sueño y descanso", "version": 1},
-        # {"path": "docs/1/Estimulacion_sensorial_y_sueño.pdf", "name": "Estimulacion_sensorial_y_sueño.pdf", "category": "Sueño y descanso", "version": 1},
-        # {"path": "docs/1/Estrategias_destete_nocturno_(12–36meses).pdf", "name": "Estrategias_destete_nocturno_(12–36meses).pdf", "category": "Sueño y descanso", "version": 1},
-        # {"path": "docs/1/Rutina_del_bebé.pdf", "name": "Rutina_del_bebé.pdf", "category": "Rutinas y cuidados", "version": 1},
-        # {"path": "docs/1/Siestas.pdf", "name": "Siestas.pdf", "category": "Sueño y descanso", "version": 1},
-        # {"path": "docs/1/Sueño_infantil_temperatura.pdf", "name": "Sueño_infantil_temperatura.pdf", "category": "Sueño y descanso", "version": 1},
-        # {"path": "docs/1/Sueño_infantil.pdf", "name": "Sueño_infantil.pdf", "category": "Sueño y descanso", "version": 1},
-        # {"path": "docs/1/Temperamento_y_sueño.pdf", "name": "Temperamento_y_sueño.pdf", "category": "Sueño y descanso", "version": 1},
-        
-        # {"path": "docs/2/AE.pdf", "name": "AE.pdf", "category": "Cuidados diarios", "version": 2},
-        # {"path": "docs/2/Respeto_y_cuidados_RP.pdf", "name": "Respeto_y_cuidados_RP.pdf", "category": "Cuidados diarios", "version": 1},
-        # {"path": "docs/2/Lactancia_Lumi.pdf", "name": "Lactancia_Lumi.pdf", "category": "Cuidados diarios", "version": 1},
-        
-        # Documentos de referencias del área 2 con etiqueta ref: true
-        # {"path": "docs/2/referencias/ae_ref.pdf", "name": "ae_ref.pdf", "category": "Cuidados diarios", "version": 1, "ref": True},
-        # {"path": "docs/2/referencias/child_of_mine_feeding_ref.pdf", "name": "child_of_mine_feeding_ref.pdf", "category": "Alimentación", "version": 1, "ref": True},
-        # {"path": "docs/2/referencias/cuidado_dental_ref.pdf", "name": "cuidado_dental_ref.pdf", "category": "Cuidados diarios", "version": 1, "ref": True},
-        # {"path": "docs/2/referencias/cuidados_corporales_ref.pdf", "name": "cuidados_corporales_ref.pdf", "category": "Cuidados diarios", "version": 1, "ref": True},
-        # {"path": "docs/2/referencias/lactancia_lumi_ref.pdf", "name": "lactancia_lumi_ref.pdf", "category": "Alimentación", "version": 1, "ref": True},
-        # {"path": "docs/2/referencias/lavado_nasal_ref.pdf", "name": "lavado_nasal_ref.pdf", "category": "Cuidados diarios", "version": 1, "ref": True},
-        # {"path": "docs/2/referencias/mi_niño_no_me_come_ref.pdf", "name": "mi_niño_no_me_come_ref.pdf", "category": "Alimentación", "version": 1, "ref": True},
-        # {"path": "docs/2/referencias/nebulizador_ref.pdf", "name": "nebulizador_ref.pdf", "category": "Cuidados diarios", "version": 1, "ref": True},
-        # {"path": "docs/2/referencias/respeto_y_cuidados_ref.pdf", "name": "respeto_y_cuidados_ref.pdf", "category": "Cuidados diarios", "version": 1, "ref": True},
-        # {"path": "docs/2/referencias/toxic_twenty_ref.pdf", "name": "toxic_twenty_ref.pdf", "category": "Cuidados diarios", "version": 1, "ref": True},
-        
-
-        # {"path": "docs/3/Juego_y_autonomia_RP.pdf", "name": "Juego_y_autonomia_RP.pdf", "category": "Autonomía y desarrollo integral", "version": 1},
-        # {"path": "docs/3/Movimiento_libre_RP.pdf", "name": "Movimiento_libre_RP.pdf", "category": "Autonomía y desarrollo integral", "version": 1},
-        
-        # Documentos de referencias del área 3 con etiqueta ref: true
-        {"path": "docs/3/referencias/juego_y_autonomia_ref.pdf", "name": "juego_y_autonomia_ref.pdf", "category": "Autonomía y desarrollo integral", "version": 1, "ref": True},
-        {"path": "docs/3/referencias/libertad_ref.pdf", "name": "libertad_ref.pdf", "category": "Autonomía y desarrollo integral", "version": 1, "ref": True},
-        {"path": "docs/3/referencias/movimiento_libre_rp_ref.pdf", "name": "movimiento_libre_rp_ref.pdf", "category": "Autonomía y desarrollo integral", "version": 1, "ref": True},
-        
-        # {"path": "docs/4/disciplina_sin_lagrimas.pdf", "name": "disciplina_sin_lagrimas.pdf", "category": "Emociones, vínculos y crianza respetuosa", "version": 2},
-        # {"path": "docs/4/el_cerebro_del_niño.pdf", "name": "el_cerebro_del_niño.pdf", "category": "Emociones, vínculos y crianza respetuosa", "version": 2},
-        # {"path": "docs/4/el_poder_de_la_presencia.pdf", "name": "el_poder_de_la_presencia.pdf", "category": "Emociones, vínculos y crianza respetuosa", "version": 2},
-        # {"path": "docs/4/Emociones_y_limites_RP.pdf", "name": "Emociones_y_limites_RP.pdf", "category": "Emociones, vínculos y crianza respetuosa", "version": 1},
-        # {"path": "docs/4/simplicity_parenting.pdf", "name": "simplicity_parenting.pdf", "category": "Emociones, vínculos y crianza respetuosa", "version": 2},
-        
-        # Documentos de referencias del área 4 con etiqueta ref: true
-        # {"path": "docs/4/referencias/disciplina_sin_lagrimas_ref.pdf", "name": "disciplina_sin_lagrimas_ref.pdf", "category": "Emociones, vínculos y crianza respetuosa", "version": 1, "ref": True},
-        # {"path": "docs/4/referencias/el_cerebro_del_nino_ref.pdf", "name": "el_cerebro_del_nino_ref.pdf", "category": "Emociones, vínculos y crianza respetuosa", "version": 1, "ref": True},
-        # {"path": "docs/4/referencias/el_poder_de_la_presencia_ref.pdf", "name": "el_poder_de_la_presencia_ref.pdf", "category": "Emociones, vínculos y crianza respetuosa", "version": 1, "ref": True},
-        {"path": "docs/4/referencias/emociones_y_limites_ref.pdf", "name": "emociones_y_limites_ref.pdf", "category": "Emociones, vínculos y crianza respetuosa", "version": 1, "ref": True},
-        {"path": "docs/4/referencias/emociones_ref.pdf", "name": "emociones_ref.pdf", "category": "Emociones, vínculos y crianza respetuosa", "version": 1, "ref": True},
-        {"path": "docs/4/referencias/limites_ref.pdf", "name": "limites_ref.pdf", "category": "Emociones, vínculos y crianza respetuosa", "version": 1, "ref": True},
-        {"path": "docs/4/referencias/simplicity_parenting_ref.pdf", "name": "simplicity_parenting_ref.pdf", "category": "Emociones, vínculos y crianza respetuosa", "version": 1, "ref": True},
-        
-        # {"path": "docs/5/Tips_viajes_R.pdf", "name": "Tips_viajes_R.pdf", "category": "Viajes con niños", "version": 1},
-        # {"path": "docs/5/Viajes_con_niños_MC.pdf", "name": "Viajes_con_niños_MC.pdf", "category": "Viajes con niños", "version": 1},
-
-        # Documentos de referencias del área 5 con etiqueta ref: true
-        {"path": "docs/5/referencias/tips_viajes_r_ref.pdf", "name": "tips_viajes_r_ref.pdf", "category": "Viajes con niños", "version": 1, "ref": True},
-        {"path": "docs/5/referencias/viajes_con_niños_mc_ref.pdf", "name": "viajes_con_niños_mc_ref.pdf", "category": "Viajes con niños", "version": 1, "ref": True}
-    ]
-
-    for doc in DOCUMENTS_TO_INGEST:
-        ingest_pdf(
-            doc["path"],
-            doc["name"],
-            category=doc["category"],
-            version=doc.get("version"),
-            ref=doc.get("ref", False),
-        )
+    started = time.perf_counter()
+    term_stats = term_stats or SourceTermStats()
+    stats = {}
+    for doc in documents:
+        if doc.get("ref"):
+            continue
+        name = doc["name"].lower().strip()
+        try:
+            source_hash = file_hash(doc["path"])
+        except OSError as e:
+            print(f"⚠️ [SOURCE_INDEX] {name}: no se pudo leer {doc['path']} ({e}), queda fuera del índice")
+            continue
+        terms = term_stats.get(name, source_hash)
+        if terms is None:
+            terms = SourceTerms(source_hash)
+            version = doc.get("version") or DEFAULT_METADATA_VERSION
+            terms.add_texts(
+                text for text, _ in iter_document_chunks(doc["path"], name, doc["category"], version, source_hash=source_hash)
+            )
+            term_stats.put(name, terms)
+        stats[name] = terms
+
+    index = build_source_index(stats)
+    saved_path = index.save(path)
+    term_stats.save()
+    print(f"🧭 [SOURCE_INDEX] {len(index)} términos de {len(index.sources)} fuentes → {saved_path} "
+          f"({round(time.perf_counter() - started, 2)}s)")
+    return index
+
+def _doc_key(doc):
+    return doc["name"].lower().strip(), str(doc.get("version") or DEFAULT_METADATA_VERSION)
+
+def _corpus_has_changes(documents, prune):
+    """
+    True si algún documento difiere de lo publicado en la versión activa (archivo,
+    categoría, ref o citas pendientes) o, con `prune`, si la versión activa tiene documentos que ya no
+    están en el manifiesto. Sin versión activa siempre hay algo que publicar.
+    """
+    active = publisher.active()
+    if not active:
+        return True
+    published = publisher.completed(active["version"])
+    for doc in documents:
+        entry = published.get(_doc_key(doc))
+        try:
+            same_file = entry is not None and entry["file_hash"] == file_hash(doc["path"])
+        except OSError:
+            return True
+        if not same_file or entry.get("category") != doc["category"] or bool(entry.get("ref")) != bool(doc.get("ref")):
+            return True
+        if doc.get("ref") and entry.get("citations") is None:
+            return True
+    return prune and bool(set(published) - {_doc_key(doc) for doc in documents})
+
+def publish_corpus(documents, workers=1, checkpoint=None, changed_only=False, label=None,
+                   publish=True, prune=True, allow_shrink=False, keep=None, term_stats=None):
+    """
+    Ingesta los documentos en una versión staging del corpus y, si valida, la activa
+    de forma atómica y borra las versiones viejas. Con `prune` los documentos que ya
+    no están en la lista se sacan de la versión nueva (no usarlo con --only).
+    Si algo falla la staging queda como está y la próxima corrida la retoma.
+    """
+    if publisher.staging() is None and not _corpus_has_changes(documents, prune):
+        print("⏭️ [CORPUS] La versión activa ya coincide con el manifiesto, no hay nada que publicar")
+        return {"corpus_version": None, "published": False, "failed": []}
+
+    corpus_version, resumed = publisher.begin(label)
+    if checkpoint is not None and not resumed:
+        # El avance guardado era de otra versión del corpus
+        checkpoint.reset()
+    if prune:
+        wanted = {_doc_key(doc) for doc in documents}
+        publisher.remove_documents(corpus_version, [key for key in publisher.completed(corpus_version) if key not in wanted])
+
+    report = ingest_documents(documents, workers=workers, checkpoint=checkpoint,
+                              changed_only=changed_only, corpus_version=corpus_version,
+                              term_stats=term_stats)
+    report.update(corpus_version=corpus_version, published=False)
+    if report["failed"]:
+        print(f"⏸️ [CORPUS] Hubo documentos fallidos, la versión {corpus_version} queda en staging")
+        return report
+
+    problems = publisher.validate(corpus_version, [_doc_key(doc) for doc in documents], allow_shrink=allow_shrink)
+    if problems:
+        print(f"❌ [CORPUS] La versión {corpus_version} no pasó la validación y queda en staging:")
+        for problem in problems:
+            print(f"   - {problem}")
+        report["problems"] = problems
+        return report
+    if not publish:
+        print(f"✅ [CORPUS] Versión {corpus_version} validada, queda en staging (--no-publish)")
+        return report
+
+    publisher.activate(corpus_version)
+    publisher.gc(CORPUS_KEEP_VERSIONS if keep is None else keep)
+    report["published"] = True
+    return report
+
+def _run_report(results, seconds):
+    report = {
+        "documents": len(results),
+        "ingested": sum(1 for r in results if r["status"] == "ingested"),
+        "unchanged": sum(1 for r in results if r["status"] == "unchanged"),
+        "failed": [r["name"] for r in results if r["status"] == "failed"],
+        "chunks": sum(r["chunks"] for r in results),
+        "embedded": sum(r["embedded"] for r in results),
+        "deleted": sum(r["deleted"] for r in results),
+        "seconds": round(seconds, 2),
+    }
+    report["chunks_per_second"] = round(report["chunks"] / seconds, 2) if seconds else 0.0
+    print("📊 [INGEST] Reporte de la corrida")
+    print(f"   Documentos: {report['documents']} ({report['ingested']} ingestados, "
+          f"{report['unchanged']} sin cambios, {len(report['failed'])} fallidos)")
+    print(f"   Chunks: {report['chunks']} procesados, {report['embedded']} embebidos, {report['deleted']} borrados")
+    print(f"   Tiempo: {report['seconds']}s ({report['chunks_per_second']} chunks/s)")
+    if report["failed"]:
+        print(f"   Fallaron: {', '.join(report['failed'])}")
+    return report
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Ingesta de PDFs en el vectorstore desde un manifiesto")
+    parser.add_argument("--manifest", default=DEFAULT_CORPUS_MANIFEST,
+                        help="Manifiesto YAML/JSON con los documentos (path, name, category, version, ref)")
+    parser.add_argument("--only", nargs="+", metavar="NOMBRE",
+                        help="Solo estos documentos (nombre o ruta, acepta comodines)")
+    parser.add_argument("--changed", action="store_true",
+                        help="Saltar sin consultar Supabase los documentos que el checkpoint ya tiene con el mismo hash")
+    parser.add_argument("--reset-checkpoint", action="store_true",
+                        help="Olvidar el avance guardado de corridas anteriores")
+    parser.add_argument("--workers", type=int, default=INGEST_WORKERS,
+                        help="Procesos para extraer y chunkear en paralelo (1 = serial)")
+    parser.add_argument("--corpus-version", metavar="ETIQUETA",
+                        help="Nombre de la versión del corpus a crear (default: fecha y hora UTC)")
+    parser.add_argument("--no-publish", action="store_true",
+                        help="Validar la versión nueva pero dejarla en staging sin activarla")
+    parser.add_argument("--allow-shrink", action="store_true",
+                        help="Activar aunque la versión nueva tenga bastantes menos chunks que la activa")
+    parser.add_argument("--keep-versions", type=int, default=CORPUS_KEEP_VERSIONS,
+                        help="Versiones anteriores que se conservan al activar (para rollback)")
+    parser.add_argument("--discard-staging", action="store_true",
+                        help="Descartar la versión en staging pendiente y salir")
+    parser.add_argument("--source-index-only", action="store_true",
+                        help="Solo regenerar el índice término → fuente, sin ingerir")
+    parser.add_argument("--skip-source-index", action="store_true",
+                        help="No regenerar el índice término → fuente al terminar")
+    args = parser.parse_args()
+
+    if args.discard_staging:
+        staging = publisher.staging()
+        if staging:
+            publisher.discard(staging["version"])
+            publisher.gc(args.keep_versions)
+        raise SystemExit(0)
+
+    manifest_documents = load_corpus_manifest(args.manifest, default_version=DEFAULT_METADATA_VERSION)
+    # El índice de fuentes cubre todo el corpus habilitado, aunque se ingiera con --only
+    full_corpus = [doc.as_dict() for doc in filter_documents(manifest_documents)]
+    term_stats = SourceTermStats()
+    if args.source_index_only:
+        refresh_source_index(full_corpus, term_stats)
+        raise SystemExit(0)
+
+    corpus = filter_documents(manifest_documents, only=args.only)
+    if not corpus:
+        raise SystemExit("No hay documentos para ingerir con esos filtros")
+
+    checkpoint = IngestCheckpoint()
+    if args.reset_checkpoint:
+        checkpoint.reset()
+
+    report = publish_corpus(
+        [doc.as_dict() for doc in corpus],
+        workers=args.workers,
+        checkpoint=checkpoint,
+        changed_only=args.changed,
+        label=args.corpus_version,
+        publish=not args.no_publish,
+        # Con --only la lista es parcial: no se saca nada de la versión nueva
+        prune=not args.only,
+        allow_shrink=args.allow_shrink,
+        keep=args.keep_versions,
+        term_stats=term_stats,
+    )
+    if report["failed"] or report.get("problems"):
+        raise SystemExit(1)
+    if not args.skip_source_index:
+        refresh_source_index(full_corpus, term_stats)
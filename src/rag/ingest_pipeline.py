@@ -0,0 +1,191 @@
+# src/rag/ingest_pipeline.py
+"""
+Pipeline de ingesta en dos etapas: extracción+chunking en un pool de procesos (CPU)
+y subida al vectorstore (red) desde una cola acotada en hilos consumidores.
+No inicializa clientes: la etapa de subida se recibe como callable.
+"""
+import os
+import queue
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional
+
+from .chunking import prepare_document
+
+# Procesos para extraer y chunkear (1 = ingesta serial)
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", "1"))
+# Documentos ya chunkeados que pueden esperar a la etapa de subida
+INGEST_QUEUE_SIZE = int(os.getenv("INGEST_QUEUE_SIZE", "4"))
+# Hilos que suben documentos en paralelo (sus lotes comparten la concurrencia de EmbeddingStage)
+INGEST_UPLOADERS = int(os.getenv("INGEST_UPLOADERS", "2"))
+
+_STOP = object()
+
+
+@dataclass
+class PreparedDocument:
+    """Resultado de la etapa de extracción de un documento."""
+
+    name: str
+    category: str
+    version: str
+    ref: bool
+    texts: List[str] = field(default_factory=list)
+    metadatas: List[Dict] = field(default_factory=list)
+    extract_seconds: float = 0.0
+    error: Optional[str] = None
+
+
+def extract_document(doc: Dict) -> PreparedDocument:
+    """
+    Worker del pool: extrae y chunkea un documento. Debe ser una función de módulo
+    para poder serializarse hacia los procesos hijos.
+    """
+    name = doc["name"].lower().strip()
+    prepared = PreparedDocument(
+        name=name,
+        category=doc.get("category"),
+        version=doc.get("version"),
+        ref=doc.get("ref", False),
+    )
+    started = time.perf_counter()
+    try:
+        if not prepared.category:
+            raise ValueError(f"Debe indicar la categoría para '{name}'.")
+        prepared.texts, prepared.metadatas = prepare_document(
+            doc["path"], name, prepared.category, prepared.version, prepared.ref,
+            source_hash=doc.get("file_hash"),
+        )
+    except Exception as e:
+        prepared.error = str(e)
+    prepared.extract_seconds = time.perf_counter() - started
+    return prepared
+
+
+class IngestProgress:
+    """Contadores de la corrida con reporte de progreso y throughput."""
+
+    def __init__(self, total_documents: int):
+        self.total_documents = total_documents
+        self.documents_done = 0
+        self.chunks_uploaded = 0
+        self.extract_seconds = 0.0
+        self.failed: List[str] = []
+        self.started = time.perf_counter()
+        self._lock = threading.Lock()
+
+    def record_upload(self, prepared: PreparedDocument) -> None:
+        with self._lock:
+            self.documents_done += 1
+            self.chunks_uploaded += len(prepared.texts)
+            self.extract_seconds += prepared.extract_seconds
+            elapsed = time.perf_counter() - self.started
+            ref_text = " (REF)" if prepared.ref else ""
+            print(
+                f"✅ [{self.documents_done}/{self.total_documents}] {prepared.name}{ref_text}: "
+                f"{len(prepared.texts)} chunks - Categoría: {prepared.category} | Versión: {prepared.version} "
+                f"| {self.chunks_uploaded / elapsed if elapsed else 0:.1f} chunks/s"
+            )
+
+    def record_failure(self, prepared: PreparedDocument, stage: str, error: str) -> None:
+        with self._lock:
+            self.documents_done += 1
+            self.failed.append(prepared.name)
+            print(f"❌ [{self.documents_done}/{self.total_documents}] {prepared.name} falló en {stage}: {error}")
+
+    def summary(self) -> Dict:
+        elapsed = time.perf_counter() - self.started
+        return {
+            "documents": self.total_documents,
+            "uploaded": self.documents_done - len(self.failed),
+            "failed": list(self.failed),
+            "chunks": self.chunks_uploaded,
+            "seconds": round(elapsed, 2),
+            "chunks_per_second": round(self.chunks_uploaded / elapsed, 2) if elapsed else 0.0,
+            "extract_seconds": round(self.extract_seconds, 2),
+        }
+
+
+def _upload_consumer(
+    pending: "queue.Queue",
+    upload: Callable[[PreparedDocument], None],
+    progress: IngestProgress,
+) -> None:
+    while True:
+        prepared = pending.get()
+        if prepared is _STOP:
+            return
+        try:
+            upload(prepared)
+            progress.record_upload(prepared)
+        except Exception as e:
+            progress.record_failure(prepared, "subida", str(e))
+
+
+def run_parallel_ingest(
+    documents: List[Dict],
+    upload: Callable[[PreparedDocument], None],
+    workers: int = None,
+    queue_size: int = None,
+    uploaders: int = None,
+    executor_factory: Callable[[int], object] = ProcessPoolExecutor,
+) -> Dict:
+    """
+    Extrae y chunkea `documents` en `workers` procesos mientras `uploaders` hilos suben los ya listos.
+
+    La cola entre etapas está acotada y como mucho hay `workers + queue_size + uploaders`
+    documentos en vuelo: si la subida va más lenta, la extracción se frena en lugar de acumular
+    chunks en memoria. Un documento que falla se reporta y no corta la corrida.
+    """
+    workers = max(1, INGEST_WORKERS if workers is None else workers)
+    queue_size = max(1, INGEST_QUEUE_SIZE if queue_size is None else queue_size)
+    uploaders = max(1, INGEST_UPLOADERS if uploaders is None else uploaders)
+    max_in_flight = workers + queue_size
+
+    progress = IngestProgress(len(documents))
+    pending: "queue.Queue" = queue.Queue(maxsize=queue_size)
+    consumers = [
+        threading.Thread(target=_upload_consumer, args=(pending, upload, progress), daemon=True)
+        for _ in range(uploaders)
+    ]
+    for consumer in consumers:
+        consumer.start()
+    print(f"🚀 [INGEST] {len(documents)} documentos con {workers} procesos y {uploaders} subidas (cola de {queue_size})")
+
+    def hand_off(future) -> None:
+        prepared = future.result()
+        if prepared.error:
+            progress.record_failure(prepared, "extracción", prepared.error)
+        else:
+            # Bloquea si la etapa de subida está saturada (backpressure)
+            pending.put(prepared)
+
+    try:
+        with executor_factory(workers) as executor:
+            in_flight = set()
+            for doc in documents:
+                while len(in_flight) >= max_in_flight:
+                    done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        hand_off(future)
+                in_flight.add(executor.submit(extract_document, doc))
+            while in_flight:
+                done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    hand_off(future)
+    finally:
+        for _ in consumers:
+            pending.put(_STOP)
+        for consumer in consumers:
+            consumer.join()
+
+    summary = progress.summary()
+    print(
+        f"📊 [INGEST] {summary['uploaded']}/{summary['documents']} documentos, {summary['chunks']} chunks "
+        f"en {summary['seconds']}s ({summary['chunks_per_second']} chunks/s)"
+    )
+    if summary["failed"]:
+        print(f"⚠️ [INGEST] Fallaron: {', '.join(summary['failed'])}")
+    return summary
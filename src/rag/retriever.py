@@ -1,11 +1,14 @@
 # src/rag/retriever.py
 import os
 from supabase import create_client
-from langchain_openai import ChatOpenAI, OpenAIEmbeddings
+from langchain_openai import ChatOpenAI
 from langchain_community.vectorstores import SupabaseVectorStore
 from langchain.prompts import ChatPromptTemplate
 from langchain.schema.runnable import RunnablePassthrough
 from dotenv import load_dotenv
+from ..utils.resilience import supabase_client_options
+from .embedding_stage import build_embeddings
+from .corpus_versions import ActiveCorpusVersion
 from pathlib import Path
 
 def get_supabase_config():
@@ -19,14 +22,56 @@ def get_supabase_config():
     return supabase_url, supabase_key
 
 SUPABASE_URL, SUPABASE_SERVICE_ROLE_KEY = get_supabase_config()  
-supabase = create_client(SUPABASE_URL, SUPABASE_SERVICE_ROLE_KEY)
-emb = OpenAIEmbeddings(model="text-embedding-3-small")
+supabase = create_client(SUPABASE_URL, SUPABASE_SERVICE_ROLE_KEY, options=supabase_client_options())
+# Embeddings de consultas con el mismo cache persistente que la ingesta
+emb = build_embeddings()
 
-vs = SupabaseVectorStore(
+class VersionedSupabaseVectorStore(SupabaseVectorStore):
+    """
+    SupabaseVectorStore que limita match_documents a la versión activa del corpus:
+    todas las búsquedas (similarity_search, retriever, filtros por source) ven una
+    sola versión aunque haya otra ingiriéndose en staging. Antes de la primera
+    publicación solo se ven las filas sin corpus_version (no la staging clonada).
+    """
+
+    def __init__(self, *args, active_version: ActiveCorpusVersion, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._active_version = active_version
+
+    def match_args(self, query, filter):
+        corpus_version = self._active_version.get()
+        if corpus_version:
+            filter = {**(filter or {}), "corpus_version": corpus_version}
+        return super().match_args(query, filter)
+
+    def _unversioned_filter(self, postgrest_filter):
+        """Sin versión activa, agrega al and=(...) de PostgREST el filtro de filas sin versionar."""
+        if self._active_version.get():
+            return postgrest_filter
+        unversioned = "metadata->>corpus_version.is.null"
+        return f"{postgrest_filter},{unversioned}" if postgrest_filter else unversioned
+
+    def similarity_search_by_vector_with_relevance_scores(self, query, k, filter=None, postgrest_filter=None,
+                                                          score_threshold=None):
+        return super().similarity_search_by_vector_with_relevance_scores(
+            query, k, filter=filter, postgrest_filter=self._unversioned_filter(postgrest_filter),
+            score_threshold=score_threshold,
+        )
+
+    def similarity_search_by_vector_returning_embeddings(self, query, k, filter=None, postgrest_filter=None):
+        return super().similarity_search_by_vector_returning_embeddings(
+            query, k, filter=filter, postgrest_filter=self._unversioned_filter(postgrest_filter),
+        )
+
+
+active_corpus_version = ActiveCorpusVersion(supabase)
+
+vs = VersionedSupabaseVectorStore(
     client=supabase,
     table_name="documents",
     query_name="match_documents",
     embedding=emb,
+    active_version=active_corpus_version,
 )
 
 retriever = vs.as_retriever(search_kwargs={"k": 8})  
@@ -0,0 +1,107 @@
+# src/rag/source_chunks.py
+"""
+Todos los chunks de una fuente sin pasar por la búsqueda vectorial: un select filtrado
+por metadata (sin embeddings ni match_documents) y un cache en memoria por fuente que
+se invalida cuando cambia la versión activa del corpus.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+# Fuentes que se mantienen en memoria (LRU)
+SOURCE_CHUNK_CACHE_MAX_SOURCES = int(os.getenv("SOURCE_CHUNK_CACHE_MAX_SOURCES", "64"))
+# Vencimiento de cada fuente cacheada (cubre las re-ingestas sin versión de corpus)
+SOURCE_CHUNK_CACHE_TTL_SECONDS = float(os.getenv("SOURCE_CHUNK_CACHE_TTL_SECONDS", "600"))
+# Filas por página del select
+SOURCE_CHUNKS_PAGE_SIZE = 1000
+
+
+def _chunk_order(row: Dict) -> Tuple:
+    metadata = row.get("metadata") or {}
+    return str(metadata.get("version", "")), metadata.get("chunk") or 0
+
+
+class SourceChunkStore:
+    """
+    Chunks ({content, metadata}) de una fuente de la versión activa, ordenados por chunk.
+    Las fuentes sin filas también se cachean (el fallback _ref.pdf → .pdf pregunta por
+    archivos que no existen).
+    """
+
+    def __init__(
+        self,
+        client,
+        active_version,
+        table_name: str = "documents",
+        max_sources: int = None,
+        ttl_seconds: float = None,
+    ):
+        self.client = client
+        self.active_version = active_version
+        self.table_name = table_name
+        self.max_sources = max_sources or SOURCE_CHUNK_CACHE_MAX_SOURCES
+        self.ttl_seconds = SOURCE_CHUNK_CACHE_TTL_SECONDS if ttl_seconds is None else ttl_seconds
+        self._lock = threading.Lock()
+        self._cache: "OrderedDict[str, Tuple[float, List[Dict]]]" = OrderedDict()
+        self._corpus_version: Optional[str] = None
+        self.hits = 0
+        self.misses = 0
+
+    def _fetch(self, source: str, corpus_version: Optional[str]) -> List[Dict]:
+        rows = []
+        offset = 0
+        while True:
+            query = self.client.table(self.table_name)\
+                .select("id, content, metadata")\
+                .eq("metadata->>source", source)
+            if corpus_version:
+                query = query.eq("metadata->>corpus_version", corpus_version)
+            else:
+                query = query.is_("metadata->>corpus_version", "null")
+            # Se pagina por id (orden estable) y se ordena por chunk al final
+            page = query.order("id")\
+                .range(offset, offset + SOURCE_CHUNKS_PAGE_SIZE - 1)\
+                .execute().data or []
+            rows.extend({"content": row.get("content", ""), "metadata": row.get("metadata") or {}} for row in page)
+            if len(page) < SOURCE_CHUNKS_PAGE_SIZE:
+                break
+            offset += SOURCE_CHUNKS_PAGE_SIZE
+        rows.sort(key=_chunk_order)
+        return rows
+
+    def get(self, source: str) -> List[Dict]:
+        corpus_version = self.active_version.get()
+        now = time.monotonic()
+        with self._lock:
+            if corpus_version != self._corpus_version:
+                # Publicaron otra versión: todo lo cacheado es de la anterior
+                self._cache.clear()
+                self._corpus_version = corpus_version
+            cached = self._cache.get(source)
+            if cached is not None and now - cached[0] < self.ttl_seconds:
+                self._cache.move_to_end(source)
+                self.hits += 1
+                return cached[1]
+            self.misses += 1
+
+        rows = self._fetch(source, corpus_version)
+        with self._lock:
+            if corpus_version == self._corpus_version:
+                self._cache[source] = (time.monotonic(), rows)
+                self._cache.move_to_end(source)
+                while len(self._cache) > self.max_sources:
+                    self._cache.popitem(last=False)
+        return rows
+
+    def invalidate(self, source: str = None) -> None:
+        with self._lock:
+            if source is None:
+                self._cache.clear()
+            else:
+                self._cache.pop(source, None)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"sources": len(self._cache), "hits": self.hits, "misses": self.misses}
@@ -0,0 +1,239 @@
+# src/rag/source_index.py
+"""
+Índice término → fuente para enrutar consultas a los PDFs correctos sin mantener
+keywords a mano. Se calcula en la ingesta con pesos BM25 sobre el texto de los chunks
+(cada fuente es un "documento"), normalizado igual que el router: minúsculas, sin
+acentos y sin stopwords de español, inglés y portugués.
+
+El artefacto (JSON comprimido) se carga al iniciar el servidor; las keywords de
+keywords_rag siguen teniendo prioridad como overrides manuales.
+
+Para no re-leer todos los PDFs en cada corrida, los conteos de términos por fuente
+se guardan en un cache local junto con el hash del archivo del que salieron.
+"""
+import gzip
+import json
+import math
+import os
+import re
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from src.utils.message_analyzer import fold_text
+
+_ROOT = Path(__file__).resolve().parents[2]
+SOURCE_INDEX_PATH = os.getenv("SOURCE_INDEX_PATH", str(_ROOT / "source_index.json.gz"))
+SOURCE_TERMS_CACHE_PATH = os.getenv("SOURCE_TERMS_CACHE_PATH", str(_ROOT / ".cache" / "source_terms.json.gz"))
+# Fuentes que se guardan por término (las de mayor peso)
+SOURCE_INDEX_MAX_SOURCES_PER_TERM = int(os.getenv("SOURCE_INDEX_MAX_SOURCES_PER_TERM", "5"))
+# Puntaje mínimo (suma de pesos BM25) para que el índice elija una fuente
+SOURCE_INDEX_MIN_SCORE = float(os.getenv("SOURCE_INDEX_MIN_SCORE", "2.5"))
+
+INDEX_FORMAT = 1
+BM25_K1 = 1.2
+BM25_B = 0.75
+# Términos que aparecen en más de esta fracción de las fuentes no sirven para enrutar
+MAX_SOURCE_FRACTION = 0.5
+# Fuentes por debajo de esta fracción del mejor puntaje se descartan
+RELATIVE_SCORE_CUTOFF = 0.5
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+# Ya sin acentos (se comparan contra texto plegado)
+_STOPWORDS = frozenset("""
+a al algo algun alguna algunas alguno algunos ante antes aqui asi aun cada casi como con contra cual
+cuales cuando de del desde donde dos el ella ellas ello ellos en entre era eran es esa esas ese eso
+esos esta estaba estan estar estas este esto estos fue fueron ha habia han hasta hay la las le les lo
+los mas me mi mis mismo muy nada ni no nos nosotros o otra otras otro otros para pero poco por porque
+puede pueden que quien se sea segun ser si sido sin sobre solo su sus tambien tan tanto te tener
+tiene tienen todo todos tu tus un una uno unos usted y ya yo
+about after all also an and any are as at be because been before being both but by can could did
+do does each for from had has have he her here him his how if in into is it its just more most my
+no not now of on one only or other our out over same she should so some such than that the their
+them then there these they this those through to too under up very was we were what when where which
+while who why will with would you your
+ao aos as com da das de dele dela deles delas depois do dos ela elas ele eles em entre essa essas
+esse esses esta estao este estes eu foi for ha isso isto ja lhe mais mas mesmo muito na nas nao nem
+no nos num numa o os ou para pela pelas pelo pelos por qual quando que quem se sem ser seu seus sua
+suas sao tambem tem uma um voce voces
+""".split())
+
+
+def normalize_token(token: str) -> str:
+    """Plural simple (siestas → siesta) para que consulta e índice coincidan."""
+    if len(token) > 4 and token.endswith("s") and not token.endswith("ss"):
+        return token[:-1]
+    return token
+
+
+def tokenize(text: str) -> List[str]:
+    tokens = []
+    for token in _TOKEN_RE.findall(fold_text(text)):
+        if len(token) < 3 or token.isdigit() or token in _STOPWORDS:
+            continue
+        tokens.append(normalize_token(token))
+    return tokens
+
+
+@dataclass
+class SourceTerms:
+    """Frecuencia de términos de una fuente y el hash del archivo del que salió."""
+
+    file_hash: Optional[str] = None
+    length: int = 0
+    tf: Counter = field(default_factory=Counter)
+
+    def add_texts(self, texts: Iterable[str]) -> None:
+        for text in texts:
+            tokens = tokenize(text)
+            self.length += len(tokens)
+            self.tf.update(tokens)
+
+
+class SourceTermStats:
+    """Cache local de SourceTerms por fuente (gzip JSON)."""
+
+    def __init__(self, path: str = None):
+        self.path = Path(path or SOURCE_TERMS_CACHE_PATH)
+        self.sources: Dict[str, SourceTerms] = {}
+        if self.path.exists():
+            try:
+                with gzip.open(self.path, "rt", encoding="utf-8") as f:
+                    data = json.load(f)
+                self.sources = {
+                    source: SourceTerms(entry.get("file_hash"), entry.get("length", 0), Counter(entry.get("tf", {})))
+                    for source, entry in data.get("sources", {}).items()
+                }
+            except (OSError, ValueError) as e:
+                print(f"⚠️ [SOURCE_INDEX] No se pudo leer {self.path} ({e}), se recalcula")
+
+    def get(self, source: str, file_hash: str) -> Optional[SourceTerms]:
+        terms = self.sources.get(source)
+        return terms if terms is not None and terms.file_hash == file_hash else None
+
+    def put(self, source: str, terms: SourceTerms) -> None:
+        self.sources[source] = terms
+
+    def save(self) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        data = {
+            "sources": {
+                source: {"file_hash": terms.file_hash, "length": terms.length, "tf": dict(terms.tf)}
+                for source, terms in self.sources.items()
+            }
+        }
+        tmp_path = self.path.with_suffix(".tmp")
+        with gzip.open(tmp_path, "wt", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, separators=(",", ":"))
+        os.replace(tmp_path, self.path)
+
+
+class SourceIndex:
+    """Postings término → [(fuente, peso)] ordenados por peso."""
+
+    def __init__(self, sources: List[str], postings: Dict[str, List[Tuple[int, float]]], built_at: float = None):
+        self.sources = sources
+        self.postings = postings
+        self.built_at = built_at
+
+    def __len__(self) -> int:
+        return len(self.postings)
+
+    def route(
+        self,
+        text: str,
+        top: int = 3,
+        min_score: float = None,
+    ) -> List[Tuple[str, float]]:
+        """Fuentes con mayor puntaje para el texto, como mucho `top`."""
+        min_score = SOURCE_INDEX_MIN_SCORE if min_score is None else min_score
+        scores: Dict[int, float] = {}
+        for term in set(tokenize(text)):
+            for source_id, weight in self.postings.get(term, ()):
+                scores[source_id] = scores.get(source_id, 0.0) + weight
+        if not scores:
+            return []
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+        best = ranked[0][1]
+        if best < min_score:
+            return []
+        return [
+            (self.sources[source_id], round(score, 3))
+            for source_id, score in ranked[:top]
+            if score >= best * RELATIVE_SCORE_CUTOFF
+        ]
+
+    def save(self, path: str = None) -> str:
+        path = Path(path or SOURCE_INDEX_PATH)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        data = {
+            "format": INDEX_FORMAT,
+            "built_at": self.built_at,
+            "sources": self.sources,
+            "terms": {term: [[source_id, weight] for source_id, weight in postings] for term, postings in self.postings.items()},
+        }
+        tmp_path = path.with_suffix(".tmp")
+        with gzip.open(tmp_path, "wt", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, separators=(",", ":"))
+        os.replace(tmp_path, path)
+        return str(path)
+
+    @classmethod
+    def load(cls, path: str = None) -> "SourceIndex":
+        with gzip.open(path or SOURCE_INDEX_PATH, "rt", encoding="utf-8") as f:
+            data = json.load(f)
+        if data.get("format") != INDEX_FORMAT:
+            raise ValueError(f"Formato de índice no soportado: {data.get('format')}")
+        postings = {term: [(source_id, weight) for source_id, weight in entries] for term, entries in data["terms"].items()}
+        return cls(data["sources"], postings, built_at=data.get("built_at"))
+
+
+def build_source_index(
+    stats: Dict[str, SourceTerms],
+    max_sources_per_term: int = None,
+) -> SourceIndex:
+    """BM25 con cada fuente como documento; se descartan términos presentes en una sola
+    ocurrencia de todo el corpus o en demasiadas fuentes."""
+    max_sources_per_term = max_sources_per_term or SOURCE_INDEX_MAX_SOURCES_PER_TERM
+    sources = sorted(source for source, terms in stats.items() if terms.length)
+    total = len(sources)
+    if not total:
+        return SourceIndex([], {}, built_at=time.time())
+    avg_length = sum(stats[source].length for source in sources) / total
+
+    by_term: Dict[str, List[Tuple[int, int]]] = {}
+    for source_id, source in enumerate(sources):
+        for term, count in stats[source].tf.items():
+            by_term.setdefault(term, []).append((source_id, count))
+
+    postings = {}
+    max_sources = max(1, int(total * MAX_SOURCE_FRACTION)) if total > 2 else total
+    for term, entries in by_term.items():
+        if len(entries) > max_sources or sum(count for _, count in entries) < 2:
+            continue
+        idf = math.log(1 + (total - len(entries) + 0.5) / (len(entries) + 0.5))
+        weighted = []
+        for source_id, count in entries:
+            norm = 1 - BM25_B + BM25_B * stats[sources[source_id]].length / avg_length
+            weighted.append((source_id, round(idf * count * (BM25_K1 + 1) / (count + BM25_K1 * norm), 3)))
+        weighted.sort(key=lambda item: item[1], reverse=True)
+        postings[term] = weighted[:max_sources_per_term]
+    return SourceIndex(sources, postings, built_at=time.time())
+
+
+def load_source_index(path: str = None) -> Optional[SourceIndex]:
+    """Índice del disco, o None si todavía no se generó (el router usa solo las keywords)."""
+    path = path or SOURCE_INDEX_PATH
+    if not Path(path).exists():
+        print(f"⚠️ [SOURCE_INDEX] No existe {path}: se enruta solo con keywords_rag")
+        return None
+    try:
+        index = SourceIndex.load(path)
+    except (OSError, ValueError, KeyError) as e:
+        print(f"⚠️ [SOURCE_INDEX] No se pudo cargar {path} ({e}): se enruta solo con keywords_rag")
+        return None
+    print(f"🧭 [SOURCE_INDEX] {len(index)} términos de {len(index.sources)} fuentes cargados")
+    return index
@@ -1,9 +1,24 @@
-from src.rag.retriever import vs
+from src.rag.retriever import vs, supabase, active_corpus_version
+from src.rag.source_index import load_source_index
+from src.rag.citations import CitationIndex
+from src.rag.source_chunks import SourceChunkStore
 from collections import defaultdict
-from typing import Tuple, List, Dict, Any
+from typing import Tuple, List, Dict, Any, Optional
 from src.utils import keywords_rag
+from src.utils.message_analyzer import MessageAnalysis, analyze_message, message_analyzer
 import unicodedata
-from rapidfuzz import fuzz
+from rapidfuzz import fuzz, process
+
+RAG_KEYWORD_LIST = list(keywords_rag.keywords)
+
+# Índice término → fuente generado en la ingesta; keywords_rag queda como override manual
+source_index = load_source_index()
+if source_index is not None:
+    _stale_sources = sorted(
+        {src for sources in keywords_rag.keywords.values() for src in sources} - set(source_index.sources)
+    )
+    if _stale_sources:
+        print(f"⚠️ [SOURCE_INDEX] keywords_rag apunta a fuentes que no están en el índice: {_stale_sources}")
 
 
 # Construye un string con metadata de origen para cada chunk recuperado
@@ -30,32 +45,73 @@ def remove_accents(text: str) -> str:
         if unicodedata.category(c) != 'Mn'
     )
 
+# Citas por fuente extraídas en la ingesta (las usa ReferenceDetector)
+citation_index = CitationIndex(supabase, active_corpus_version)
+# Chunks completos por fuente (select por metadata, sin búsqueda vectorial)
+source_chunks = SourceChunkStore(supabase, active_corpus_version)
+
 # Consultar hasta 3 documentos para contexto
-def get_rag_context(query: str, k: int = 20, top_sources: int = 3, search_id: str = "main") -> Tuple[str, List[str]]:
+def match_rag_keywords(analysis: MessageAnalysis) -> List[Tuple[str, float]]:
     """
-    Recupera contexto del RAG combinando los documentos más relevantes.
-    Si se detectan palabras clave, usa solo las fuentes asociadas (con fuzzy matching).
+    Keywords RAG presentes en el mensaje: coincidencia literal (del análisis) o fuzzy
+    (partial_ratio >= 87), en el orden de keywords_rag.keywords.
     """
+    fuzzy_scores = {
+        index: score
+        for _, score, index in process.extract(
+            analysis.folded,
+            message_analyzer.folded_keywords,
+            scorer=fuzz.partial_ratio,
+            processor=None,
+            score_cutoff=87,
+            limit=None,
+        )
+    }
+    exact_indexes = set(analysis.rag_keyword_indexes)
+
+    matched = []
+    for index, keyword in enumerate(RAG_KEYWORD_LIST):
+        if index in fuzzy_scores or index in exact_indexes:
+            similarity = fuzzy_scores.get(index)
+            if similarity is None:
+                similarity = fuzz.partial_ratio(message_analyzer.folded_keywords[index], analysis.folded)
+            matched.append((keyword, similarity))
+    return matched
+
 
-    query_norm = remove_accents(query.lower())
+def route_sources(analysis: MessageAnalysis, top_sources: int = 3, search_id: str = "main") -> List[str]:
+    """
+    Fuentes a consultar para el mensaje: las de keywords_rag si alguna coincide
+    (override manual); si no, las del índice término → fuente. Vacío si ninguno decide.
+    """
     matched_sources = []
-    matched_keywords = []
+    # 🔍 Buscar coincidencias literales y "difusas" entre query y keywords
+    matched_keywords = match_rag_keywords(analysis)
+    for keyword, _ in matched_keywords:
+        matched_sources.extend(keywords_rag.keywords[keyword])
+    if matched_sources:
+        matched_sources = list(dict.fromkeys(matched_sources))
+        print(f"🎯 [{search_id.upper()}] Keywords detectadas → {matched_keywords}")
+        return matched_sources
 
-    # 🔍 Buscar coincidencias "difusas" entre query y keywords
-    for keyword, sources in keywords_rag.keywords.items():
-        normalized_keyword = remove_accents(keyword.lower())
+    if source_index is not None:
+        routed = source_index.route(analysis.folded, top=top_sources)
+        if routed:
+            print(f"🧭 [{search_id.upper()}] Índice de fuentes → {routed}")
+            return [source for source, _ in routed]
+    return []
 
-        # Calcula similitud fuzzy (0 a 100)
-        similarity = fuzz.partial_ratio(normalized_keyword, query_norm)
 
-        # Considerar coincidencia si es >= 80
-        if similarity >= 87 or normalized_keyword in query_norm:
-            matched_sources.extend(sources)
-            matched_keywords.append((keyword, similarity))
+def get_rag_context(query: str, k: int = 20, top_sources: int = 3, search_id: str = "main", analysis: Optional[MessageAnalysis] = None) -> Tuple[str, List[str]]:
+    """
+    Recupera contexto del RAG combinando los documentos más relevantes.
+    Si se detectan palabras clave (o el índice de fuentes reconoce los términos),
+    usa solo las fuentes asociadas.
+    """
+    analysis = analysis or analyze_message(query)
+    matched_sources = route_sources(analysis, top_sources, search_id)
 
     if matched_sources:
-        matched_sources = list(dict.fromkeys(matched_sources))
-        print(f"🎯 [{search_id.upper()}] Keywords detectadas → {matched_keywords}")
         print(f"📚 Fuentes asociadas → {matched_sources}")
 
         combined = []
@@ -64,13 +120,13 @@ def get_rag_context(query: str, k: int = 20, top_sources: int = 3, search_id: st
             combined.extend(filtered)
 
         if not combined:
-            print("⚠️ Sin resultados en fuentes keyword, fallback global...")
+            print("⚠️ Sin resultados en las fuentes enrutadas, fallback global...")
             combined = vs.similarity_search(query, k=k)
 
         context = "\n\n".join(_format_chunk_with_source(doc) for doc in combined)
         return context, matched_sources
 
-    # 🔹 Si no hay keywords detectadas, usa búsqueda semántica estándar
+    # 🔹 Si no hay fuentes enrutadas, usa búsqueda semántica estándar
     results = vs.similarity_search(query, k=k)
     if not results:
         return "", []
@@ -92,11 +148,11 @@ def get_rag_context(query: str, k: int = 20, top_sources: int = 3, search_id: st
     context = "\n\n".join(_format_chunk_with_source(doc) for doc in combined)
     return context, best_sources
 
-def get_rag_context_simple(query: str, k: int = 20, top_sources: int = 3, search_id: str = "main") -> str:
+def get_rag_context_simple(query: str, k: int = 20, top_sources: int = 3, search_id: str = "main", analysis: Optional[MessageAnalysis] = None) -> str:
     """
     Versión simple que solo retorna el contexto (para compatibilidad hacia atrás).
     """
-    context, sources = get_rag_context(query, k, top_sources, search_id)
+    context, sources = get_rag_context(query, k, top_sources, search_id, analysis=analysis)
     return context
 
 async def get_all_reference_chunks_from_file(source_file: str, search_id: str = "references") -> List[Dict[str, Any]]:
@@ -112,13 +168,9 @@ async def get_all_reference_chunks_from_file(source_file: str, search_id: str =
         List[Dict]: Lista de chunks con metadata completa
     """
     try:
-        # Buscar todos los chunks de este archivo específico usando un filtro amplio
-        # Usamos una query muy genérica para obtener todos los chunks del archivo
-        all_chunks = vs.similarity_search(
-            "información contenido documento", 
-            k=1000,  # Número alto para obtener todos los chunks
-            filter={"source": source_file}
-        )
+        # Todos los chunks del archivo por metadata (sin embeber una query ni escanear vectores),
+        # ordenados por chunk y cacheados hasta que cambia la versión del corpus
+        all_chunks = source_chunks.get(source_file)
         
         print(f"🔍 [{search_id.upper()}] Encontrados {len(all_chunks)} chunks totales en {source_file}")
         
@@ -128,16 +180,17 @@ async def get_all_reference_chunks_from_file(source_file: str, search_id: str =
         
         # Convertir a formato dict
         all_chunks_data = []
-        for doc in all_chunks:
+        for row in all_chunks:
+            metadata = row["metadata"]
             chunk_data = {
-                "content": doc.page_content,
-                "metadata": doc.metadata,
-                "source": doc.metadata.get("source", "unknown"),
-                "ref": doc.metadata.get("ref", False),
-                "type": doc.metadata.get("type", "unknown"),
-                "chunk": doc.metadata.get("chunk", 0),
-                "version": doc.metadata.get("version", 1),
-                "category": doc.metadata.get("category", "General")
+                "content": row["content"],
+                "metadata": metadata,
+                "source": metadata.get("source", "unknown"),
+                "ref": metadata.get("ref", False),
+                "type": metadata.get("type", "unknown"),
+                "chunk": metadata.get("chunk", 0),
+                "version": metadata.get("version", 1),
+                "category": metadata.get("category", "General")
             }
             all_chunks_data.append(chunk_data)
         
@@ -1,7 +1,7 @@
 # src/routes/chat.py
 import os
+import time
 import httpx
-import unicodedata
 from fastapi import APIRouter, Depends, HTTPException
 from datetime import datetime
 from pathlib import Path
@@ -9,32 +9,33 @@ from typing import List
 from ..models.chat import ChatRequest, KnowledgeConfirmRequest, ProfileKeywordsConfirmRequest
 from ..auth import get_current_user
 from src.rag.utils import get_rag_context, get_rag_context_simple
-from src.utils.date_utils import calcular_edad, calcular_meses
 from src.utils.lang import detect_lang
-from src.state.session_store import get_lang, set_lang
+from src.state.session_store import get_lang, set_lang, get_baby_name, set_baby_name
 from src.prompts.system.build_system_prompt_for_lumi import build_system_prompt_for_lumi
-from src.utils.keywords_rag import TEMPLATE_KEYWORDS, TEMPLATE_FILES, KEYWORDS_PROFILE_ES, detect_profile_keywords, print_detected_keywords_summary
+from src.utils.keywords_rag import TEMPLATE_FILES, detect_profile_keywords
 from ..rag.retriever import supabase
-from ..utils.knowledge_detector import KnowledgeDetector
 from ..services.knowledge_service import BabyKnowledgeService
 from ..utils.knowledge_cache import confirmation_cache
-from ..utils.routine_detector import RoutineDetector
 from ..services.routine_service import RoutineService
 from ..utils.routine_cache import routine_confirmation_cache
 from ..utils.reference_detector import ReferenceDetector
 from ..utils.source_cache import source_cache
 from ..services.profile_service import BabyProfileService
+from ..services.context_snapshot_service import ContextSnapshotService
+from ..utils.admission_control import AdmissionRejected, admission_controller
+from ..utils.openai_client import create_chat_completion
+from ..utils.model_router import ModelRouter
+from ..utils.fast_path import build_fast_path_response
+from ..utils.message_analyzer import MessageAnalysis, analyze_message
+from ..utils.knowledge_selector import select_relevant_knowledge
+from ..utils.resilience import CircuitOpenError, DeadlineExceededError
 from ..services.chat_service import (
     handle_knowledge_confirmation,
     handle_routine_confirmation,
     detect_routine_in_user_message,
     detect_routine_in_response,
     detect_knowledge_in_message,
-    build_system_prompt,
-    ROUTINE_KEYWORDS,
-    NIGHT_WEANING_KEYWORDS,
-    PARTNER_KEYWORDS,
-    BEHAVIOR_KEYWORDS
+    build_system_prompt
 )
 
 router = APIRouter()
@@ -54,40 +55,6 @@ SECTIONS_DIR = PROMPTS_DIR / "sections"
 TEMPLATES_DIR = PROMPTS_DIR / "templates"
 EXAMPLES_DIR = PROMPTS_DIR / "examples"
 
-GREETING_PHRASES = {
-    "hola",
-    "hola lumi",
-    "hola hola",
-    "buen dia",
-    "buenos dias",
-    "buenas",
-    "buenas tardes",
-    "buenas noches",
-    "hello",
-    "hi",
-    "hey",
-    "saludos",
-    "hola buen dia",
-    "hola buenos dias",
-    "hola buenas",
-    "hola buenas tardes",
-    "hola buenas noches"
-}
-
-def normalize_for_greeting(text: str) -> str:
-    text = unicodedata.normalize("NFD", text.lower())
-    text = "".join(
-        ch
-        if unicodedata.category(ch) != "Mn" and (ch.isalnum() or ch.isspace())
-        else " "
-        for ch in text
-    )
-    return " ".join(text.split())
-
-def is_simple_greeting(message: str) -> bool:
-    normalized = normalize_for_greeting(message)
-    return normalized in GREETING_PHRASES
-
 def load_instruction_dataset():
     """
     Carga el dataset de ejemplos, estos ejemplos fueron tomados desde el GPT de Sol
@@ -156,52 +123,57 @@ def load_system_prompt(section_files=None):
 
     return "\n\n".join(parts)
 
-def detect_consultation_type_and_load_template(message):
+def detect_consultation_type_and_load_template(analysis: MessageAnalysis):
     """
-    Detecta el tipo de consulta y carga el template específico correspondiente.
-    Utiliza keywords multiidioma desde keywords_rag.py
+    Carga el template específico correspondiente al tipo de consulta.
+    Los templates candidatos vienen del análisis del mensaje (keywords multiidioma de keywords_rag.py)
     """
-    message_lower = message.lower()
-    
-    # Iterar sobre cada template y sus keywords
-    for template_key, keywords_by_lang in TEMPLATE_KEYWORDS.items():
-        # Combinar todas las keywords de todos los idiomas
-        all_keywords = []
-        for lang, keywords in keywords_by_lang.items():
-            all_keywords.extend(keywords)
-        
-        # Verificar si alguna keyword está en el mensaje
-        if any(keyword in message_lower for keyword in all_keywords):
-            template_filename = TEMPLATE_FILES.get(template_key)
-            
-            if not template_filename:
-                print(f"⚠️ No se encontró archivo de template para: {template_key}")
-                continue
-            
-            template_path = TEMPLATES_DIR / template_filename
-            
-            if template_path.exists():
-                print(f"🚀 Template detectado: {template_key} ({template_filename})")
-                
-                # Detectar qué idioma activó el template (para logging)
-                detected_lang = None
-                for lang, keywords in keywords_by_lang.items():
-                    if any(kw in message_lower for kw in keywords):
-                        detected_lang = lang
-                        break
-                
-                print(f"   Idioma detectado: {detected_lang}")
-                print(f"   Cargando desde: {template_path}")
-                
-                with open(template_path, "r", encoding="utf-8") as f:
-                    template_name = template_key.replace('_template', '').replace('_', ' ').title()
-                    return f"\n\n## TEMPLATE ESPECÍFICO PARA {template_name.upper()}:\n\n{f.read()}"
-            else:
-                print(f"⚠️ Template no encontrado: {template_path}")
-    
+    for template_key, detected_lang in analysis.template_matches:
+        template_filename = TEMPLATE_FILES.get(template_key)
+
+        if not template_filename:
+            print(f"⚠️ No se encontró archivo de template para: {template_key}")
+            continue
+
+        template_path = TEMPLATES_DIR / template_filename
+
+        if template_path.exists():
+            print(f"🚀 Template detectado: {template_key} ({template_filename})")
+            print(f"   Idioma detectado: {detected_lang}")
+            print(f"   Cargando desde: {template_path}")
+
+            with open(template_path, "r", encoding="utf-8") as f:
+                template_name = template_key.replace('_template', '').replace('_', ' ').title()
+                return f"\n\n## TEMPLATE ESPECÍFICO PARA {template_name.upper()}:\n\n{f.read()}"
+        else:
+            print(f"⚠️ Template no encontrado: {template_path}")
+
     # Si no se detectó ningún template
     return ""
 
+def admission_error(error: AdmissionRejected) -> HTTPException:
+    """Convierte un rechazo de admisión en una respuesta HTTP rápida con Retry-After."""
+    return HTTPException(
+        status_code=error.status_code,
+        detail=error.reason,
+        headers={"Retry-After": str(error.retry_after)},
+    )
+
+async def admit_chat_request(user=Depends(get_current_user)):
+    """
+        Dependencia que aplica control de admisión al endpoint de chat.
+        Ocupa un slot global y uno del usuario mientras dura la solicitud.
+    """
+    try:
+        admitted_at = await admission_controller.acquire(user["id"])
+    except AdmissionRejected as e:
+        raise admission_error(e)
+
+    try:
+        yield user
+    finally:
+        admission_controller.release(user["id"], admitted_at)
+
 def format_llm_output(text):
     """Limpia y formatea la salida del LLM para que sea más natural y legible."""
     # Limpiar exceso de símbolos de markdown
@@ -217,10 +189,12 @@ def format_llm_output(text):
     
     return text
 
-async def get_user_profiles_and_babies(user_id, supabase_client, baby_id=None, babies_data=None):
+async def get_user_profiles_and_babies(user_id, supabase_client, baby_id=None, babies_data=None, message=None):
     """
         Recupera perfiles y bebés del usuario y formatea el contexto.
         Si se proporciona baby_id, limita el contexto a ese bebé.
+        Si se proporciona message, solo incluye el conocimiento relevante para ese mensaje
+        (alergias y salud siempre) dentro de KNOWLEDGE_CONTEXT_BUDGET.
     """
     profiles = supabase_client.table("profiles").select("*").eq("id", user_id).execute()
     if babies_data is None:
@@ -237,65 +211,33 @@ async def get_user_profiles_and_babies(user_id, supabase_client, baby_id=None, b
         else:
             print(f"👶 Bebé seleccionado para contexto: {selected_babies[0]['name']} ({baby_id})")
 
-    # Obtener conocimiento específico
-    if baby_id and selected_babies:
-        baby = selected_babies[0]
-        knowledge_items = await BabyKnowledgeService.get_baby_knowledge(user_id, baby_id)
+    # Snapshot de contexto por bebé (edad/etapa, conocimiento y rutinas ya formateados)
+    snapshots = ContextSnapshotService.get_snapshots(user_id, selected_babies)
+
+    # Conocimiento específico
+    if message is not None:
         knowledge_by_baby = {
-            baby_id: {
-                "baby_name": baby["name"],
-                "knowledge": knowledge_items
-            }
+            snapshot.baby_id: {"baby_name": snapshot.baby_name, "knowledge": snapshot.knowledge}
+            for snapshot in snapshots
         }
+        knowledge_by_baby = select_relevant_knowledge(knowledge_by_baby, message)
+        knowledge_context = BabyKnowledgeService.format_knowledge_for_context(knowledge_by_baby)
     else:
-        knowledge_by_baby = await BabyKnowledgeService.get_all_user_knowledge(user_id)
-    knowledge_context = BabyKnowledgeService.format_knowledge_for_context(knowledge_by_baby)
+        knowledge_context = "\n".join(snapshot.knowledge_block for snapshot in snapshots if snapshot.knowledge_block)
     
-    # Obtener rutinas
-    if baby_id and selected_babies:
-        baby = selected_babies[0]
-        routines_list = await RoutineService.get_user_routines(user_id, baby_id)
-        routines_by_baby = {
-            baby["name"]: routines_list
-        }
+    # Rutinas
+    if baby_id and len(snapshots) == 1:
+        routines_context = snapshots[0].routines_block
     else:
-        routines_by_baby = await RoutineService.get_all_user_routines(user_id)
-    routines_context = RoutineService.format_routines_for_context(routines_by_baby)
+        routines_by_baby = {snapshot.baby_name: snapshot.routines for snapshot in snapshots if snapshot.routines}
+        routines_context = RoutineService.format_routines_for_context(routines_by_baby)
 
     profile_texts = [
         f"- Perfil: {p['name']}, fecha de nacimiento {p['birthdate']}, alimentación: {p.get('feeding', 'N/A')}"
         for p in profiles.data
     ] if profiles.data else []
 
-    baby_texts = []
-    if selected_babies:
-        for b in selected_babies:
-            edad_anios = calcular_edad(b["birthdate"])
-            edad_meses = calcular_meses(b["birthdate"])
-
-            # Determinar etapa de desarrollo
-            etapa_desarrollo = ""
-            if edad_meses <= 6:
-                etapa_desarrollo = "lactante"
-            elif edad_meses <= 12:
-                etapa_desarrollo = "bebé"
-            elif edad_meses <= 24:
-                etapa_desarrollo = "caminador/toddler"
-            elif edad_anios <= 5:
-                etapa_desarrollo = "preescolar"
-            elif edad_anios <= 12:
-                etapa_desarrollo = "escolar"
-            else:
-                etapa_desarrollo = "adolescente"
-
-            baby_texts.append(
-                f"- Bebé: {b['name']}, fecha de nacimiento {b['birthdate']}, "
-                f"edad: {edad_anios} años ({edad_meses} meses aprox.), "
-                f"etapa de desarrollo: {etapa_desarrollo}, "
-                f"alimentación: {b.get('feeding', 'N/A')}, "
-                f"peso: {b.get('weight', 'N/A')} kg, "
-                f"altura: {b.get('height', 'N/A')} cm"
-            )
+    baby_texts = [snapshot.baby_line for snapshot in snapshots]
 
     context = ""
     if profile_texts:
@@ -436,22 +378,39 @@ async def confirm_profile_keywords(
 
 
 @router.post("/api/chat")
-async def chat_openai(payload: ChatRequest, user=Depends(get_current_user)):
+async def chat_openai(payload: ChatRequest, user=Depends(admit_chat_request)):
     if not payload.message.strip():
         raise HTTPException(status_code=400, detail="message required")
 
     user_id = user["id"]
+
+    # Análisis único del mensaje: todas las etapas consumen las mismas señales
+    analysis = analyze_message(payload.message)
     
     # 1️⃣ Detectar idioma desde el primer mensaje
     conversation_id = payload.baby_id or str(user_id)
     lang = get_lang(conversation_id)
 
     if not lang:
-        lang = detect_lang(payload.message)
+        lang = detect_lang(payload.message, analysis=analysis)
         set_lang(conversation_id, lang)
 
     print(f"🌐 Idioma detectado para la conversación: {lang}")
-    
+
+    # ⚡ Fast path: saludos, agradecimientos y despedidas se responden sin DB ni LLM.
+    # Si hay una confirmación pendiente, el mensaje puede ser la respuesta a ella.
+    trivial_intent = analysis.trivial_intent
+    if (
+        trivial_intent
+        and not confirmation_cache.has_pending_confirmation(user_id)
+        and not routine_confirmation_cache.has_pending_confirmation(user_id)
+    ):
+        print(f"⚡ [FAST-PATH] Mensaje trivial ({trivial_intent}) respondido sin DB ni LLM")
+        return {
+            "answer": build_fast_path_response(trivial_intent, lang, get_baby_name(conversation_id)),
+            "usage": {}
+        }
+
     # Obtener información de los bebés del usuario
     babies_response = supabase.table("babies").select("*").eq("user_id", user_id).execute()
     babies_context = babies_response.data or []
@@ -468,6 +427,9 @@ async def chat_openai(payload: ChatRequest, user=Depends(get_current_user)):
         # Usar el primer bebé si no se especificó
         active_baby = babies_context[0]
     
+    if active_baby and active_baby.get('name'):
+        set_baby_name(conversation_id, active_baby['name'])
+
     if active_baby and active_baby.get('birthdate'):
         from ..utils.date_utils import calcular_meses
         baby_age_months = calcular_meses(active_baby['birthdate'])
@@ -479,6 +441,7 @@ async def chat_openai(payload: ChatRequest, user=Depends(get_current_user)):
         lang, 
         age_months=baby_age_months
     )
+    analysis = analysis.with_profile_keywords(detected_profile_keywords)
     if detected_profile_keywords:
         print(f"🔍 [PROFILE KEYWORDS] Se detectaron {len(detected_profile_keywords)} keyword(s) del perfil:")
         for kw in detected_profile_keywords:
@@ -515,7 +478,7 @@ async def chat_openai(payload: ChatRequest, user=Depends(get_current_user)):
             print(f"⚠️ [PROFILE] No se pudo determinar baby_id para keywords")
     
     # Verificar si es una respuesta de confirmación de preferencias (KNOWLEDGE)
-    knowledge_confirmation_result = await handle_knowledge_confirmation(user_id, payload.message)
+    knowledge_confirmation_result = await handle_knowledge_confirmation(user_id, payload.message, babies_context)
     if knowledge_confirmation_result:
         return knowledge_confirmation_result
 
@@ -524,65 +487,43 @@ async def chat_openai(payload: ChatRequest, user=Depends(get_current_user)):
     if routine_confirmation_result:
         return routine_confirmation_result
 
-    message_text = payload.message.strip()
-    simple_greeting = is_simple_greeting(message_text)
-    message_lower = payload.message.lower()
+    message_text = analysis.text
+    simple_greeting = analysis.simple_greeting
 
     # Contexto RAG, perfiles/bebés e historial de conversación
     rag_context = ""
+    consulted_sources = []
     specialized_rag = ""
-    needs_night_weaning = needs_partner = needs_behavior = needs_routine = False
 
     if not simple_greeting:
         print(f"📝 Mensaje del usuario: '{payload.message[:100]}...'")
         
         # Verificar si es una consulta de referencias ANTES de hacer búsqueda RAG
-        is_reference_query = ReferenceDetector.detect_reference_query(payload.message)
+        is_reference_query = ReferenceDetector.detect_reference_query(payload.message, analysis=analysis)
         print(f"🔍 [DEBUG] ¿Es consulta de referencias? {is_reference_query}")
         
         if is_reference_query:
             print(f"🔍 [REFERENCIAS] Detectada consulta de referencias - NO se guardará en cache")
             # Para consultas de referencias, usar búsqueda simple sin guardar en cache
-            rag_context = get_rag_context_simple(payload.message, search_id="reference_query")
+            rag_context = get_rag_context_simple(payload.message, search_id="reference_query", analysis=analysis)
             consulted_sources = []  # No guardar fuentes para consultas de referencias
         else:
             print(f"✅ [CACHE] Consulta normal - SÍ se guardará en cache")
             # Para consultas normales, usar búsqueda completa y guardar en cache
-            rag_context, consulted_sources = get_rag_context(payload.message, search_id="user_query")
+            rag_context, consulted_sources = get_rag_context(payload.message, search_id="user_query", analysis=analysis)
             
             # Guardar las fuentes consultadas en el cache para futuras consultas de referencias
             source_cache.store_sources(user_id, consulted_sources, payload.message, "user_query")
+
+        # Secciones del prompt detectadas en el análisis del mensaje
+        for section_file in analysis.sections:
+            print(f"🧩 Sección {section_file} - keywords: {list(analysis.keywords_for(f'section:{section_file}'))}")
     else:
         is_reference_query = False
         print(f"👋 [DEBUG] Es saludo simple - no se procesa RAG ni cache")
-        
-        needs_night_weaning = any(keyword in message_lower for keyword in NIGHT_WEANING_KEYWORDS)
-        needs_partner = any(keyword in message_lower for keyword in PARTNER_KEYWORDS)
-        needs_behavior = any(keyword in message_lower for keyword in BEHAVIOR_KEYWORDS)
-        needs_routine = any(keyword in message_lower for keyword in ROUTINE_KEYWORDS)
-
-        # Debug detallado de keywords
-        if needs_behavior:
-            detected_behavior_keywords = [kw for kw in BEHAVIOR_KEYWORDS if kw in message_lower]
-            print(f"🎭 BEHAVIOR keywords detectadas: {detected_behavior_keywords}")
-        
-        if needs_routine:
-            detected_routine_keywords = [kw for kw in ROUTINE_KEYWORDS if kw in message_lower]
-            print(f"📅 ROUTINE keywords detectadas: {detected_routine_keywords}")
-
-        print(f"🔍 Keywords detectadas: night_weaning={needs_night_weaning}, partner={needs_partner}, behavior={needs_behavior}, routine={needs_routine}")
-       
-    # Construir lista de secciones adicionales del prompt
-    prompt_sections = []
-    if not simple_greeting:
-        if needs_behavior:
-            prompt_sections.append("behavior.md")
-        if needs_routine:
-            prompt_sections.extend(["routines.md"])
-        if needs_night_weaning:
-            prompt_sections.append("night_weaning.md")
-        if needs_partner:
-            prompt_sections.append("partner_support.md")
+
+    # Secciones adicionales del prompt (las mismas que usa build_system_prompt)
+    prompt_sections = analysis.sections if not simple_greeting else []
 
     # Combinar contextos RAG
     combined_rag_context = f"{rag_context}\n\n--- CONTEXTO ESPECIALIZADO ---\n{specialized_rag}" if specialized_rag else rag_context
@@ -591,7 +532,8 @@ async def chat_openai(payload: ChatRequest, user=Depends(get_current_user)):
         user["id"],
         supabase,
         baby_id=selected_baby_id,
-        babies_data=babies_context
+        babies_data=babies_context,
+        message=payload.message
     )
     filter_by_baby = selected_baby_id is not None
     history = await get_conversation_history(
@@ -605,7 +547,7 @@ async def chat_openai(payload: ChatRequest, user=Depends(get_current_user)):
     lang_directive = build_system_prompt_for_lumi(lang)
     
     # 3️⃣ Construir el prompt general (Lumi + idioma)
-    formatted_system_prompt = await build_system_prompt(payload, user_context, routines_context, combined_rag_context)
+    formatted_system_prompt = await build_system_prompt(payload, user_context, routines_context, combined_rag_context, analysis=analysis)
 
     # 4️⃣ Agregar directiva de idioma de forma más explícita y prioritaria
     formatted_system_prompt = f"""🌐 INSTRUCCIÓN CRÍTICA DE IDIOMA:
@@ -616,7 +558,7 @@ IMPORTANTE: Toda tu respuesta DEBE estar completamente en {lang.upper()}. No use
 {formatted_system_prompt}"""
 
     # Detectar tipo de consulta y agregar template específico
-    specific_template = detect_consultation_type_and_load_template(payload.message)
+    specific_template = detect_consultation_type_and_load_template(analysis)
     if specific_template:
         formatted_system_prompt += specific_template
         print(f"🎯 Template específico detectado y agregado")
@@ -646,57 +588,49 @@ IMPORTANTE: Toda tu respuesta DEBE estar completamente en {lang.upper()}. No use
     user_message_with_lang = f"[Responder en {lang.upper()}] {payload.message}"
     messages.append({"role": "user", "content": user_message_with_lang})
 
+    # Elegir modelo y max_tokens según la complejidad de la consulta
+    routing = ModelRouter.route(
+        message_text,
+        simple_greeting=simple_greeting,
+        sections=prompt_sections,
+        template_detected=bool(specific_template),
+        rag_context=combined_rag_context,
+        rag_sources=consulted_sources,
+    )
+
     body = {
-        "model": OPENAI_MODEL,
+        "model": routing["model"],
         "messages": messages,
-        "max_tokens": 1800,
+        "max_tokens": routing["max_tokens"],
         "temperature": 0.4,
         "top_p": 0.9,
     }
 
-    headers = {"Authorization": f"Bearer {OPENAI_KEY}", "Content-Type": "application/json"}
+    # Llamada a OpenAI con deadline total, reintentos con jitter y circuit breaker
+    started_at = time.monotonic()
+    try:
+        resp = await create_chat_completion(body, hedge=True)
+    except AdmissionRejected as e:
+        raise admission_error(e)
+    except (CircuitOpenError, DeadlineExceededError, httpx.TimeoutException) as e:
+        print(f"⏰ OpenAI no disponible a tiempo: {e}")
+        return {
+            "answer": "Lo siento, el sistema está experimentando demoras. Por favor, intenta reformular tu pregunta de manera más breve o inténtalo de nuevo en unos momentos.",
+            "usage": {}
+        }
+    except Exception as e:
+        print(f"❌ Error inesperado llamando a OpenAI: {e}")
+        return {
+            "answer": "Hubo un problema técnico. Por favor, intenta de nuevo en unos momentos.",
+            "usage": {}
+        }
 
-    # Retry logic con exponential backoff para manejar timeouts
-    max_retries = 3
-    base_timeout = 45.0
-    
-    for attempt in range(max_retries):
-        try:
-            current_timeout = base_timeout + (attempt * 15)  # 45s, 60s, 75s
-            print(f"🔄 Intento {attempt + 1}/{max_retries} - Timeout: {current_timeout}s")
-            
-            async with httpx.AsyncClient(timeout=current_timeout) as client:
-                resp = await client.post("https://api.openai.com/v1/chat/completions", json=body, headers=headers)
-            
-            if resp.status_code >= 300:
-                error_detail = resp.text
-                print(f"❌ Error OpenAI (intento {attempt + 1}): {error_detail}")
-                if attempt == max_retries - 1:  # Último intento
-                    raise HTTPException(status_code=502, detail={"openai_error": error_detail})
-                continue
-            
-            # Si llegamos aquí, la llamada fue exitosa
-            break
-            
-        except httpx.ReadTimeout as e:
-            print(f"⏰ Timeout en intento {attempt + 1}/{max_retries}")
-            if attempt == max_retries - 1:  # Último intento
-                return {
-                    "answer": "Lo siento, el sistema está experimentando demoras. Por favor, intenta reformular tu pregunta de manera más breve o inténtalo de nuevo en unos momentos.",
-                    "usage": {}
-                }
-            # Esperar antes del siguiente intento
-            import asyncio
-            await asyncio.sleep(2 ** attempt)  # 1s, 2s, 4s
-            continue
-        except Exception as e:
-            print(f"❌ Error inesperado en intento {attempt + 1}: {e}")
-            if attempt == max_retries - 1:
-                return {
-                    "answer": "Hubo un problema técnico. Por favor, intenta de nuevo en unos momentos.",
-                    "usage": {}
-                }
-            continue
+    if resp.status_code >= 300:
+        print(f"❌ Error OpenAI ({resp.status_code}): {resp.text}")
+        return {
+            "answer": "Hubo un problema técnico. Por favor, intenta de nuevo en unos momentos.",
+            "usage": {}
+        }
 
     data = resp.json()
     assistant = data.get("choices", [])[0].get("message", {}).get("content", "")
@@ -705,6 +639,7 @@ IMPORTANTE: Toda tu respuesta DEBE estar completamente en {lang.upper()}. No use
     assistant = format_llm_output(assistant)
     
     usage = data.get("usage", {})
+    ModelRouter.log_decision(routing, user_id, usage=usage, latency_ms=int((time.monotonic() - started_at) * 1000))
 
     # Variables para controlar el flujo de detección dual
     routine_detected_and_saved = False
@@ -719,7 +654,8 @@ IMPORTANTE: Toda tu respuesta DEBE estar completamente en {lang.upper()}. No use
         routine_confirmation_message = await detect_routine_in_user_message(
             user_id, 
             payload.message, 
-            babies_context
+            babies_context,
+            analysis=analysis
         )
         
         if routine_confirmation_message:
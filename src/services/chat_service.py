@@ -1,6 +1,7 @@
 # src/services/chat_service.py
 from datetime import datetime
 from pathlib import Path
+from typing import Optional
 from ..rag.retriever import supabase
 from ..services.knowledge_service import BabyKnowledgeService
 from ..utils.knowledge_cache import confirmation_cache
@@ -8,6 +9,7 @@ from ..services.routine_service import RoutineService
 from ..utils.routine_cache import routine_confirmation_cache
 from ..utils.knowledge_detector import KnowledgeDetector
 from ..utils.routine_detector import RoutineDetector
+from ..utils.message_analyzer import MessageAnalysis, analyze_message
 
 # Constantes necesarias para build_system_prompt
 today = datetime.now().strftime("%d/%m/%Y %H:%M")
@@ -17,40 +19,6 @@ SECTIONS_DIR = PROMPTS_DIR / "sections"
 TEMPLATES_DIR = PROMPTS_DIR / "templates"
 EXAMPLES_DIR = PROMPTS_DIR / "examples"
 
-# Keywords copiadas de chat.py
-ROUTINE_KEYWORDS = {
-    "organizar rutina", "organizar la rutina", "ajustar horarios", "cambiar horarios",
-    "estructurar el día", "horarios de comida", "horarios de sueño",
-    "rutina de sueño", "orden del día", "cronograma", "planificar el día",
-    "horarios del bebé", "rutina diaria", "establecer rutina", "fijar horarios",
-    "hacer una rutina", "hacer rutina", "quiero rutina", "crear rutina",
-    "armar rutina", "armar una rutina", "necesito rutina", "rutina para",
-    "una rutina para", "rutina", "horarios", "organizar el día"
-}
-
-NIGHT_WEANING_KEYWORDS = {
-    "tomas nocturnas", "destete nocturno", "desmame nocturno", "disminuir tomas",
-    "reducir tomas", "eliminar tomas nocturnas", "dormir sin mamar",
-    "dormir toda la noche", "no despertar para comer", "destete gradual",
-    "quitar toma nocturna", "destetar por la noche", "no alimentar de noche"
-}
-
-BEHAVIOR_KEYWORDS = {
-    "berrinche", "berrinches", "rabieta", "rabietas", "llanto excesivo",
-    "llanto intenso", "llanto sin razón", "lloriqueo", "capricho", "caprichos",
-    "no obedece", "rebelde", "desafiante", "comportamiento difícil",
-    "conducta", "disciplina", "límites", "reglas", "portarse mal",
-    "mal comportamiento", "agresivo", "agresividad", "golpea", "muerde",
-    "pega", "empuja", "no hace caso", "desobediente"
-}
-
-PARTNER_KEYWORDS = {
-    "pareja", "papá", "papá no", "mi esposo", "mi marido", "mi novio",
-    "mi pareja", "padre", "abuelo", "suegra", "suegro", "familia",
-    "no entiende", "no ayuda", "discutimos", "diferencias", "conflicto",
-    "apoyo", "involucrar", "participar", "roles", "responsabilidades"
-}
-
 # Funciones de utilidad copiadas de chat.py
 def load_instruction_dataset():
     """
@@ -120,49 +88,11 @@ def load_system_prompt(section_files=None):
 
     return "\n\n".join(parts)
 
-def detect_consultation_type_and_load_template(message):
-    """
-        Detecta el tipo de consulta y carga el template específico correspondiente.
-    """
-    message_lower = message.lower()
-    
-    # Mapeo de tipos de consulta y sus templates correspondientes
-    consultation_types = {
-        "pediatra": ["quiero ir al pediatra", "llevar al pediatra", "consulta médica", 
-                    "visita médica", "cita con el doctor", "ir al doctor"],
-        "feeding": ["no quiere comer", "problemas para comer", "rechazo comida", 
-                   "alimentación", "blw", "baby led weaning", "destete"],
-        "sleep": ["no duerme", "problemas de sueño", "dormir", "sueño", "insomnio bebé", 
-                 "despertar nocturno", "regresión del sueño"],
-        "development": ["desarrollo", "hitos", "cuándo camina", "cuándo habla", 
-                       "gatear", "sentarse", "primeras palabras"]
-    }
-    
-    # Detectar tipo de consulta
-    detected_type = None
-    for consultation_type, keywords in consultation_types.items():
-        if any(keyword in message_lower for keyword in keywords):
-            detected_type = consultation_type
-            break
-    
-    if not detected_type:
-        return ""
-    
-    # Buscar template correspondiente
-    template_path = TEMPLATES_DIR / f"{detected_type}.md"
-    
-    if template_path.exists():
-        with open(template_path, "r", encoding="utf-8") as template_file:
-            template_content = template_file.read().strip()
-            return f"\n\n## TEMPLATE ESPECÍFICO - {detected_type.upper()}\n{template_content}"
-    
-    return ""
-
-
-async def handle_knowledge_confirmation(user_id: str, message: str):
+async def handle_knowledge_confirmation(user_id: str, message: str, babies_context: Optional[list] = None):
     """
     Maneja la confirmación de conocimiento pendiente.
     Retorna None si no hay confirmación pendiente, o la respuesta si la hay.
+    `babies_context` son los bebés del usuario ya cargados; si no se pasan se cargan una vez.
     """
     confirmation_response = confirmation_cache.is_confirmation_response(message)
     if confirmation_response is None or not confirmation_cache.has_pending_confirmation(user_id):
@@ -176,29 +106,28 @@ async def handle_knowledge_confirmation(user_id: str, message: str):
 
     if confirmation_response:
         try:
-            saved_items = []
+            if babies_context is None:
+                babies_context = supabase.table("babies").select("*").eq("user_id", user_id).execute().data or []
 
+            items = []
             for knowledge_item in pending_data["knowledge"]:
-                baby_id = await BabyKnowledgeService.find_baby_by_name(
-                    user_id,
+                baby_id = BabyKnowledgeService.resolve_baby_id(
+                    babies_context,
                     knowledge_item.get("baby_name", ""),
                 )
 
                 if baby_id:
-                    knowledge_data = {
+                    items.append({
+                        "baby_id": baby_id,
                         "category": knowledge_item["category"],
                         "subcategory": knowledge_item.get("subcategory"),
                         "title": knowledge_item["title"],
                         "description": knowledge_item["description"],
                         "importance_level": knowledge_item.get("importance_level", 1),
-                    }
+                    })
 
-                    saved_item = await BabyKnowledgeService.save_knowledge(
-                        user_id,
-                        baby_id,
-                        knowledge_data,
-                    )
-                    saved_items.append(saved_item)
+            # Todos los elementos en una sola escritura
+            saved_items = await BabyKnowledgeService.save_knowledge_bulk(user_id, babies_context, items)
 
             confirmation_cache.clear_pending_confirmation(user_id)
 
@@ -239,58 +168,38 @@ async def handle_routine_confirmation(user_id: str, message: str):
     if routine_confirmation_response:  # Usuario confirmó la rutina
         try:
             routine_data = pending_routine_data["routine"]
+            routine_name = routine_data.get("routine_name", "Rutina")
+            routine_summary = routine_data.get("context_summary", "Rutina establecida")
             
-            # Buscar el baby_id basado en el nombre
-            baby_id = await RoutineService.find_baby_by_name(
-                user_id, 
-                routine_data.get("baby_name", "")
+            # Entrada de conocimiento general que acompaña a la rutina
+            knowledge_data = {
+                "category": "rutinas",
+                "subcategory": "estructura diaria",
+                "title": routine_name,
+                "description": routine_summary,
+                "importance_level": 3
+            }
+            
+            # Rutina + actividades + conocimiento en una sola transacción
+            saved_routine = await RoutineService.save_routine_with_knowledge(
+                user_id,
+                routine_data.get("baby_name", ""),
+                routine_data,
+                knowledge_data
             )
             
-            if baby_id:
-                # 1. GUARDAR LA RUTINA en tablas específicas
-                saved_routine = await RoutineService.save_routine(
-                    user_id, 
-                    baby_id, 
-                    routine_data
-                )
-                
-                # 2. TAMBIÉN GUARDAR COMO CONOCIMIENTO GENERAL
-                try:
-                    routine_name = routine_data.get("routine_name", "Rutina")
-                    routine_summary = routine_data.get("context_summary", "Rutina establecida")
-                    
-                    # Crear entrada de conocimiento basada en la rutina
-                    knowledge_data = {
-                        "category": "rutinas",
-                        "subcategory": "estructura diaria",
-                        "title": routine_name,
-                        "description": routine_summary,
-                        "importance_level": 3
-                    }
-                    
-                    # Guardar también en baby_knowledge
-                    await BabyKnowledgeService.save_knowledge(
-                        user_id, 
-                        baby_id, 
-                        knowledge_data
-                    )
-                    
-                    print(f"✅ Rutina guardada en AMBOS sistemas: rutinas + conocimiento")
-                    
-                except Exception as knowledge_error:
-                    print(f"⚠️ Error guardando conocimiento de rutina: {knowledge_error}")
-                    # No fallar si el conocimiento falla, la rutina ya se guardó
-                
-                routine_confirmation_cache.clear_pending_confirmation(user_id)
-                
-                activities_count = saved_routine.get("activities_count", 0)
-                
-                response_text = f"✅ ¡Excelente! He guardado la rutina **{routine_name}** con {activities_count} actividades en el sistema de rutinas y también como conocimiento general. Ahora podré ayudarte mejor con horarios y sugerencias personalizadas."
-                
-                return {"answer": response_text, "usage": {}}
-            else:
-                routine_confirmation_cache.clear_pending_confirmation(user_id)
+            routine_confirmation_cache.clear_pending_confirmation(user_id)
+            
+            if not saved_routine.get("success"):
                 return {"answer": "❌ No pude encontrar el bebé mencionado. Por favor intenta de nuevo.", "usage": {}}
+            
+            print(f"✅ Rutina guardada en AMBOS sistemas: rutinas + conocimiento")
+            
+            activities_count = saved_routine.get("activities_count", 0)
+            
+            response_text = f"✅ ¡Excelente! He guardado la rutina **{routine_name}** con {activities_count} actividades en el sistema de rutinas y también como conocimiento general. Ahora podré ayudarte mejor con horarios y sugerencias personalizadas."
+            
+            return {"answer": response_text, "usage": {}}
                 
         except Exception as e:
             print(f"Error guardando rutina confirmada: {e}")
@@ -302,7 +211,7 @@ async def handle_routine_confirmation(user_id: str, message: str):
         return {"answer": "👌 Entendido, no guardaré esa rutina.", "usage": {}}
 
 
-async def detect_routine_in_user_message(user_id: str, message: str, babies_context: list):
+async def detect_routine_in_user_message(user_id: str, message: str, babies_context: list, analysis: Optional[MessageAnalysis] = None):
     """
     Detecta rutinas en el mensaje del usuario y maneja la confirmación.
     Retorna None si no se detecta rutina, o la respuesta con confirmación si se detecta.
@@ -313,7 +222,8 @@ async def detect_routine_in_user_message(user_id: str, message: str, babies_cont
         # Analizar el mensaje para detectar información de rutinas
         detected_routine = await RoutineDetector.analyze_message(
             message, 
-            babies_context
+            babies_context,
+            analysis=analysis
         )
         print(f"🕐 Rutina detectada: {detected_routine}")
         
@@ -427,14 +337,15 @@ async def detect_knowledge_in_message(user_id: str, message: str, babies_context
             original_message=message
         )
 
-        # Guardar automáticamente conocimiento general sin confirmación
+        # Guardar automáticamente conocimiento general sin confirmación (una sola escritura)
         general_items = [item for item in detected_knowledge if item.get("category") == "general"]
+        general_payloads = []
         for general_item in general_items:
             baby_name = general_item.get("baby_name")
             auto_baby_id = None
 
             if baby_name:
-                auto_baby_id = await BabyKnowledgeService.find_baby_by_name(user_id, baby_name)
+                auto_baby_id = BabyKnowledgeService.resolve_baby_id(babies_context, baby_name)
 
             if not auto_baby_id and selected_baby_id:
                 auto_baby_id = selected_baby_id
@@ -446,24 +357,25 @@ async def detect_knowledge_in_message(user_id: str, message: str, babies_context
                 print(f"⚠️ No se pudo determinar bebé para conocimiento general: {general_item}")
                 continue
 
-            knowledge_payload = {
+            general_payloads.append({
+                "baby_id": auto_baby_id,
                 "category": general_item["category"],
                 "subcategory": general_item.get("subcategory"),
                 "title": general_item.get("title", general_item.get("description", "Contexto general")),
                 "description": general_item.get("description", general_item.get("title", "")),
                 "importance_level": general_item.get("importance_level", 2)
-            }
-
-            saved_general = await BabyKnowledgeService.save_or_update_general_knowledge(
-                user_id,
-                auto_baby_id,
-                knowledge_payload
-            )
+            })
 
-            if saved_general:
-                print(f"🏠 Conocimiento general guardado automáticamente: {knowledge_payload['title']} (baby_id={auto_baby_id})")
-            else:
-                print(f"⚠️ No se pudo guardar conocimiento general: {knowledge_payload}")
+        if general_payloads:
+            try:
+                saved_general = await BabyKnowledgeService.save_knowledge_bulk(
+                    user_id,
+                    babies_context,
+                    general_payloads
+                )
+                print(f"🏠 Conocimiento general guardado automáticamente: {len(saved_general)} elemento(s)")
+            except Exception as general_error:
+                print(f"⚠️ No se pudo guardar conocimiento general: {general_error}")
 
         # Filtrar conocimientos generales para no pedir confirmación
         detected_knowledge = [item for item in detected_knowledge if item.get("category") != "general"]
@@ -488,37 +400,18 @@ async def detect_knowledge_in_message(user_id: str, message: str, babies_context
         return None
 
 
-async def build_system_prompt(payload, user_context, routines_context, combined_rag_context):
+async def build_system_prompt(payload, user_context, routines_context, combined_rag_context, analysis: Optional[MessageAnalysis] = None):
     """
     Construye el prompt del sistema completo con todas las secciones necesarias.
+    El template específico de la consulta lo agrega chat_openai a partir del mismo análisis.
     """
-    message_lower = payload.message.lower()
-    
-    # Determinar qué keywords están presentes
-    needs_behavior = any(keyword in message_lower for keyword in BEHAVIOR_KEYWORDS)
-    needs_routine = any(keyword in message_lower for keyword in ROUTINE_KEYWORDS)
-    needs_night_weaning = any(keyword in message_lower for keyword in NIGHT_WEANING_KEYWORDS)
-    needs_partner = any(keyword in message_lower for keyword in PARTNER_KEYWORDS)
-    
-    # Construir lista de secciones adicionales del prompt
-    prompt_sections = []
-    if needs_behavior:
-        prompt_sections.append("behavior.md")
-    if needs_routine:
-        prompt_sections.extend(["routines.md"])
-    if needs_night_weaning:
-        prompt_sections.append("night_weaning.md")
-    if needs_partner:
-        prompt_sections.append("partner_support.md")
+    analysis = analysis or analyze_message(payload.message)
+
+    # Secciones adicionales del prompt según las keywords presentes
+    prompt_sections = analysis.sections
 
     # Cargar y formatear el prompt maestro
     system_prompt_template = load_system_prompt(prompt_sections)
-    
-    # Detectar tipo de consulta y agregar template específico
-    specific_template = detect_consultation_type_and_load_template(payload.message)
-    if specific_template:
-        system_prompt_template += specific_template
-        print(f"🎯 Template específico detectado y agregado")
 
     instruction_dataset = load_instruction_dataset()
 
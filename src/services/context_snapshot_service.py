@@ -0,0 +1,137 @@
+# src/services/context_snapshot_service.py
+import hashlib
+import json
+from dataclasses import replace
+from datetime import date
+from typing import Dict, List
+
+from ..rag.retriever import supabase
+from ..state.context_snapshots import BabyContextSnapshot, context_snapshots
+from ..utils.date_utils import calcular_edad, calcular_etapa_desarrollo, calcular_meses
+from ..utils.tokens import estimate_tokens
+from .knowledge_service import BabyKnowledgeService
+from .routine_service import RoutineService
+
+
+class ContextSnapshotService:
+    """
+    Arma y mantiene los snapshots de contexto por bebé. En régimen normal cada mensaje
+    lee el snapshot en memoria; las queries de conocimiento y rutinas solo se hacen
+    cuando un servicio invalidó el snapshot o venció su TTL.
+    """
+
+    @staticmethod
+    def _fingerprint(baby: Dict) -> str:
+        return hashlib.sha1(json.dumps(baby, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def _baby_fields(baby: Dict) -> Dict:
+        """
+        Campos derivados de la fila del bebé y de la fecha de hoy.
+        """
+        edad_anios = calcular_edad(baby["birthdate"])
+        edad_meses = calcular_meses(baby["birthdate"])
+        etapa_desarrollo = calcular_etapa_desarrollo(edad_anios, edad_meses)
+
+        baby_line = (
+            f"- Bebé: {baby['name']}, fecha de nacimiento {baby['birthdate']}, "
+            f"edad: {edad_anios} años ({edad_meses} meses aprox.), "
+            f"etapa de desarrollo: {etapa_desarrollo}, "
+            f"alimentación: {baby.get('feeding', 'N/A')}, "
+            f"peso: {baby.get('weight', 'N/A')} kg, "
+            f"altura: {baby.get('height', 'N/A')} cm"
+        )
+        return {
+            "baby_name": baby["name"],
+            "baby_fingerprint": ContextSnapshotService._fingerprint(baby),
+            "age_date": date.today(),
+            "edad_anios": edad_anios,
+            "edad_meses": edad_meses,
+            "etapa_desarrollo": etapa_desarrollo,
+            "baby_line": baby_line,
+        }
+
+    @staticmethod
+    def _build_snapshots(user_id: str, babies: List[Dict]) -> List[BabyContextSnapshot]:
+        """
+        Construye los snapshots de varios bebés con una query de conocimiento y una de rutinas.
+        """
+        baby_ids = [baby["id"] for baby in babies]
+
+        knowledge = supabase.table("baby_knowledge")\
+            .select("*")\
+            .eq("user_id", user_id)\
+            .in_("baby_id", baby_ids)\
+            .eq("is_active", True)\
+            .order("importance_level", desc=True)\
+            .order("created_at", desc=True)\
+            .execute()
+
+        routines = supabase.table("baby_routines").select("""
+                id, user_id, baby_id, name, description, category,
+                confidence_score, detected_from_message, created_at, is_active
+            """)\
+            .eq("user_id", user_id)\
+            .in_("baby_id", baby_ids)\
+            .eq("is_active", True)\
+            .order("created_at", desc=True)\
+            .execute()
+
+        knowledge_by_id: Dict[str, List[Dict]] = {baby_id: [] for baby_id in baby_ids}
+        for item in knowledge.data or []:
+            knowledge_by_id.setdefault(item["baby_id"], []).append(item)
+        routines_by_id: Dict[str, List[Dict]] = {baby_id: [] for baby_id in baby_ids}
+        for routine in routines.data or []:
+            routines_by_id.setdefault(routine["baby_id"], []).append(routine)
+
+        snapshots = []
+        for baby in babies:
+            fields = ContextSnapshotService._baby_fields(baby)
+            knowledge_items = knowledge_by_id[baby["id"]]
+            routines_list = routines_by_id[baby["id"]]
+
+            knowledge_block = BabyKnowledgeService.format_knowledge_for_context({
+                baby["id"]: {"baby_name": baby["name"], "knowledge": knowledge_items}
+            })
+            routines_block = RoutineService.format_routines_for_context({baby["name"]: routines_list})
+
+            snapshot = BabyContextSnapshot(
+                baby_id=baby["id"],
+                user_id=user_id,
+                knowledge=knowledge_items,
+                knowledge_block=knowledge_block,
+                knowledge_tokens=estimate_tokens(knowledge_block),
+                routines=routines_list,
+                routines_block=routines_block,
+                routines_tokens=estimate_tokens(routines_block),
+                **fields
+            )
+            context_snapshots.put(snapshot)
+            snapshots.append(snapshot)
+
+        print(f"📸 [SNAPSHOT] Reconstruidos {len(snapshots)} snapshot(s) de contexto")
+        return snapshots
+
+    @staticmethod
+    def get_snapshots(user_id: str, babies: List[Dict]) -> List[BabyContextSnapshot]:
+        """
+        Snapshots de los bebés pedidos, en el mismo orden. Reconstruye los que faltan
+        y recalcula en memoria la parte del bebé si cambió el día o la fila de `babies`.
+        """
+        snapshots: Dict[str, BabyContextSnapshot] = {}
+        missing = []
+        for baby in babies:
+            snapshot = context_snapshots.get(baby["id"])
+            if snapshot is None:
+                missing.append(baby)
+                continue
+            if snapshot.age_date != date.today() or snapshot.baby_fingerprint != ContextSnapshotService._fingerprint(baby):
+                snapshot = replace(snapshot, **ContextSnapshotService._baby_fields(baby))
+                context_snapshots.put(snapshot)
+            snapshots[baby["id"]] = snapshot
+
+        if missing:
+            for snapshot in ContextSnapshotService._build_snapshots(user_id, missing):
+                snapshots[snapshot.baby_id] = snapshot
+
+        return [snapshots[baby["id"]] for baby in babies]
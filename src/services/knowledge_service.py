@@ -1,6 +1,11 @@
 # src/services/knowledge_service.py
 from typing import Dict, List, Optional
 from ..rag.retriever import supabase
+from ..state.context_snapshots import context_snapshots
+from ..utils.knowledge_dedup import cluster_near_duplicates, find_duplicate
+
+# Nombres genéricos que se asocian al primer bebé del usuario
+GENERIC_BABY_NAMES = ["el bebé", "el bebe", "mi bebé", "mi bebe", "el niño", "la niña"]
 
 class BabyKnowledgeService:
     """
@@ -44,10 +49,11 @@ class BabyKnowledgeService:
                 "importance_level": knowledge_data.get("importance_level", 1)
             }
             
-            result = supabase.table("baby_knowledge").insert(insert_data).execute()
+            # Si ya existe un dato equivalente se actualiza en lugar de duplicarlo
+            saved = BabyKnowledgeService._write_deduplicated(user_id, [insert_data])
             
-            if result.data:
-                return result.data[0]
+            if saved:
+                return saved[0]
             else:
                 raise Exception("No se pudo guardar el conocimiento")
                 
@@ -55,6 +61,178 @@ class BabyKnowledgeService:
             print(f"Error guardando conocimiento: {e}")
             raise e
 
+    @staticmethod
+    def resolve_baby_id(babies: List[Dict], baby_name: Optional[str]) -> Optional[str]:
+        """
+        Equivalente en memoria de find_baby_by_name sobre la lista de bebés ya cargada
+        (ilike '%nombre%', y el primer bebé para nombres genéricos como "el bebé").
+        """
+        if not babies or baby_name is None:
+            return None
+        
+        name_lower = baby_name.lower()
+        for baby in babies:
+            if name_lower in (baby.get("name") or "").lower():
+                return baby["id"]
+        
+        if name_lower in GENERIC_BABY_NAMES:
+            return babies[0]["id"]
+        
+        return None
+    
+    @staticmethod
+    async def save_knowledge_bulk(
+        user_id: str,
+        babies: List[Dict],
+        items: List[Dict]
+    ) -> List[Dict]:
+        """
+        Guarda varios elementos de conocimiento con una sola escritura.
+        
+        La propiedad de los bebés se verifica una vez contra `babies` (los bebés del
+        usuario ya cargados), en lugar de una query por elemento. Cada fila debe traer
+        su `user_id`: un bebé sin dueño explícito no se considera del usuario.
+        
+        Args:
+            user_id: ID del usuario
+            babies: Bebés del usuario (filas de `babies` con `id` y `user_id`)
+            items: Elementos con baby_id + category, subcategory, title, description, importance_level
+                   (los duplicados de datos ya guardados actualizan la fila existente)
+        
+        Returns:
+            Filas guardadas o actualizadas
+        """
+        owned_ids = {baby["id"] for baby in babies if baby.get("user_id") == user_id}
+        
+        rows = []
+        for item in items:
+            if item.get("baby_id") not in owned_ids:
+                print(f"⚠️ El bebé {item.get('baby_id')} no pertenece al usuario, se omite: {item.get('title')}")
+                continue
+            rows.append({
+                "user_id": user_id,
+                "baby_id": item["baby_id"],
+                "category": item["category"],
+                "subcategory": item.get("subcategory"),
+                "title": item["title"],
+                "description": item["description"],
+                "importance_level": item.get("importance_level", 1)
+            })
+        
+        if not rows:
+            return []
+        
+        return BabyKnowledgeService._write_deduplicated(user_id, rows)
+    
+    @staticmethod
+    def _write_deduplicated(user_id: str, rows: List[Dict]) -> List[Dict]:
+        """
+        Deduplicación al escribir: compara cada fila con el conocimiento activo del mismo
+        bebé y categoría (hash del título normalizado + similitud con rapidfuzz) y con las
+        demás filas del lote. Los duplicados actualizan la fila existente (descripción nueva,
+        importancia máxima) y el resto se inserta. Una lectura y como mucho dos escrituras.
+        """
+        existing = supabase.table("baby_knowledge")\
+            .select("*")\
+            .eq("user_id", user_id)\
+            .eq("is_active", True)\
+            .in_("baby_id", sorted({row["baby_id"] for row in rows}))\
+            .in_("category", sorted({row["category"] for row in rows}))\
+            .execute()
+        existing_rows = existing.data or []
+        
+        updates: Dict[str, Dict] = {}
+        new_rows: List[Dict] = []
+        for row in rows:
+            duplicate = find_duplicate(row, list(updates.values()) + existing_rows)
+            if duplicate is not None:
+                merged = updates.get(duplicate["id"], duplicate)
+                updates[duplicate["id"]] = {
+                    **{key: merged[key] for key in ("id", "user_id", "baby_id", "category", "title")},
+                    "subcategory": row.get("subcategory") or merged.get("subcategory"),
+                    "description": row["description"],
+                    "importance_level": max(row.get("importance_level") or 1, merged.get("importance_level") or 1)
+                }
+                print(f"🔁 Conocimiento duplicado, se actualiza el existente: '{row['title']}' ≈ '{merged['title']}'")
+                continue
+            
+            in_batch = find_duplicate(row, new_rows)
+            if in_batch is not None:
+                in_batch["description"] = row["description"]
+                in_batch["importance_level"] = max(row.get("importance_level") or 1, in_batch.get("importance_level") or 1)
+                continue
+            
+            new_rows.append(dict(row))
+        
+        saved = []
+        if updates:
+            result = supabase.table("baby_knowledge").upsert(list(updates.values()), on_conflict="id").execute()
+            saved.extend(result.data or [])
+        if new_rows:
+            result = supabase.table("baby_knowledge").insert(new_rows).execute()
+            saved.extend(result.data or [])
+        
+        context_snapshots.invalidate(baby_ids={row["baby_id"] for row in rows})
+        print(f"💾 Conocimiento guardado: {len(new_rows)} nuevos, {len(updates)} actualizados")
+        return saved
+    
+    @staticmethod
+    def consolidate_knowledge(user_id: Optional[str] = None, page_size: int = 1000) -> Dict[str, int]:
+        """
+        Fusiona duplicados y casi-duplicados ya guardados (mismo bebé y categoría).
+        En cada grupo se conserva el dato más reciente con la importancia máxima del
+        grupo y los demás se desactivan (borrado lógico).
+        
+        Args:
+            user_id: Limitar a un usuario (None = todos)
+            page_size: Tamaño de página al leer baby_knowledge
+        
+        Returns:
+            Dict con groups (grupos fusionados) y deactivated (filas desactivadas)
+        """
+        items: List[Dict] = []
+        offset = 0
+        while True:
+            query = supabase.table("baby_knowledge")\
+                .select("*")\
+                .eq("is_active", True)
+            if user_id:
+                query = query.eq("user_id", user_id)
+            page = query.order("id").range(offset, offset + page_size - 1).execute().data or []
+            items.extend(page)
+            if len(page) < page_size:
+                break
+            offset += page_size
+        
+        by_group: Dict[tuple, List[Dict]] = {}
+        for item in items:
+            by_group.setdefault((item["baby_id"], item["category"]), []).append(item)
+        
+        keepers = []
+        deactivate_ids = []
+        for group_items in by_group.values():
+            for cluster in cluster_near_duplicates(group_items):
+                if len(cluster) < 2:
+                    continue
+                keeper = dict(cluster[0])
+                keeper.pop("babies", None)
+                keeper["importance_level"] = max(item.get("importance_level") or 1 for item in cluster)
+                keepers.append(keeper)
+                deactivate_ids.extend(item["id"] for item in cluster[1:])
+        
+        if keepers:
+            supabase.table("baby_knowledge").upsert(keepers, on_conflict="id").execute()
+        for start in range(0, len(deactivate_ids), page_size):
+            supabase.table("baby_knowledge")\
+                .update({"is_active": False})\
+                .in_("id", deactivate_ids[start:start + page_size])\
+                .execute()
+        
+        if keepers:
+            context_snapshots.invalidate(baby_ids={keeper["baby_id"] for keeper in keepers})
+        print(f"🧹 Consolidación de conocimiento: {len(keepers)} grupos fusionados, {len(deactivate_ids)} filas desactivadas")
+        return {"groups": len(keepers), "deactivated": len(deactivate_ids)}
+    
     @staticmethod
     async def get_baby_knowledge(user_id: str, baby_id: str, category: str = None) -> List[Dict]:
         """
@@ -136,6 +314,7 @@ class BabyKnowledgeService:
                 .eq("user_id", user_id)\
                 .execute()
             
+            context_snapshots.invalidate(user_id=user_id)
             return result.data[0] if result.data else None
             
         except Exception as e:
@@ -154,6 +333,7 @@ class BabyKnowledgeService:
                 .eq("user_id", user_id)\
                 .execute()
             
+            context_snapshots.invalidate(user_id=user_id)
             return bool(result.data)
             
         except Exception as e:
@@ -252,6 +432,7 @@ class BabyKnowledgeService:
                     .eq("id", knowledge_id)\
                     .execute()
 
+                context_snapshots.invalidate(baby_ids=[baby_id])
                 return result.data[0] if result.data else None
 
             # Si no existe, guardar como nuevo
@@ -277,7 +458,7 @@ class BabyKnowledgeService:
                 return result.data[0]["id"]
             
             # Si no encuentra por nombre exacto, buscar el primero (caso "el bebé")
-            if baby_name.lower() in ["el bebé", "el bebe", "mi bebé", "mi bebe", "el niño", "la niña"]:
+            if baby_name.lower() in GENERIC_BABY_NAMES:
                 all_babies = supabase.table("babies")\
                     .select("id")\
                     .eq("user_id", user_id)\
@@ -1,7 +1,8 @@
 # src/services/profile_service.py
 from typing import Dict, List, Optional
 from ..rag.retriever import supabase
-from ..utils.keywords_rag import KEYWORDS_PROFILE_ES, KEYWORDS_PROFILE_EN, KEYWORDS_PROFILE_PT
+from ..utils.keywords_rag import PROFILE_TRANSLATIONS
+from .reference_data_service import reference_data, normalize_reference_key
 
 class BabyProfileService:
     """
@@ -12,14 +13,18 @@ class BabyProfileService:
     - baby_profile_value: Valores traducidos (vinculado a profile_id de baby_profile)
     """
     
-    # Cache para categorías (evitar múltiples queries)
-    _category_cache: Dict[str, str] = {}
+    @staticmethod
+    def _load_category_map() -> Dict[str, str]:
+        """
+        Mapa nombre de categoría normalizado (minúsculas) → UUID, desde la tabla
+        profile_category precargada en reference_data (se refresca periódicamente).
+        """
+        return reference_data.table("profile_category").as_dict()
     
     @staticmethod
     async def _get_category_id(category_name: str) -> Optional[str]:
         """
-        Obtiene el UUID de una categoría desde profile_category.
-        Usa cache para evitar múltiples queries.
+        Obtiene el UUID de una categoría desde profile_category (sin distinguir mayúsculas).
         
         Args:
             category_name: Nombre de la categoría (ej: 'sleep and rest')
@@ -27,84 +32,57 @@ class BabyProfileService:
         Returns:
             UUID de la categoría o None si no existe
         """
-        # Verificar cache primero
-        if category_name in BabyProfileService._category_cache:
-            return BabyProfileService._category_cache[category_name]
-        
-        try:
-            # Intentar diferentes formatos de capitalización
-            # Opciones: 'Sleep and rest', 'Sleep And Rest', 'sleep and rest'
-            
-            # Primero intentar con capitalize (Sleep and rest)
-            db_category_name = category_name.capitalize()
-            
-            result = supabase.table("profile_category")\
-                .select("id, category")\
-                .ilike("category", db_category_name)\
-                .limit(1)\
-                .execute()
-            
-            # Si no encuentra, intentar con title (Sleep And Rest)
-            if not result.data:
-                db_category_name = category_name.title()
-                result = supabase.table("profile_category")\
-                    .select("id, category")\
-                    .ilike("category", db_category_name)\
-                    .limit(1)\
-                    .execute()
-            
-            # Si aún no encuentra, intentar exacto lowercase
-            if not result.data:
-                db_category_name = category_name.lower()
-                result = supabase.table("profile_category")\
-                    .select("id, category")\
-                    .ilike("category", db_category_name)\
-                    .limit(1)\
-                    .execute()
-            
-            if result.data and len(result.data) > 0:
-                category_id = result.data[0]['id']
-                actual_name = result.data[0]['category']
-                # Guardar en cache
-                BabyProfileService._category_cache[category_name] = category_id
-                print(f"✅ [PROFILE] Categoría encontrada: '{actual_name}' (ID: {category_id})")
-                return category_id
-            else:
-                print(f"⚠️ [PROFILE] Categoría '{category_name}' no encontrada en profile_category")
-                print(f"   Se intentó buscar: '{category_name.capitalize()}', '{category_name.title()}', '{category_name.lower()}'")
-                return None
-                
-        except Exception as e:
-            print(f"❌ [PROFILE] Error obteniendo category_id para '{category_name}': {e}")
-            return None
+        category_id = reference_data.get("profile_category", category_name)
+        if not category_id:
+            print(f"⚠️ [PROFILE] Categoría '{category_name}' no encontrada en profile_category")
+        return category_id
     
     @staticmethod
-    def _find_keyword_in_dict(field_path: str, keywords_dict: Dict) -> Optional[str]:
+    def resolve_keyword(kw: Dict) -> Dict:
         """
-        Busca un keyword en un diccionario de keywords anidado siguiendo un path.
+        Completa un keyword que llega solo con su forma (en cualquier idioma) usando el
+        índice inverso de PROFILE_TRANSLATIONS. Si trae category/age_range se usan para
+        acotar; si la forma corresponde a varios fields se toma el primero en orden de
+        recorrido. Los keywords ya completos (o sin forma conocida) se devuelven tal cual.
         
         Args:
-            field_path: Path del campo (ej: 'sleep and rest.0_6.sleep_rhythm.short_cycles')
-            keywords_dict: Diccionario de keywords (KEYWORDS_PROFILE_ES/EN/PT)
+            kw: Dict del keyword (ej: {'keyword': 'short cycles', 'age_range': '0_6'})
         
         Returns:
-            El valor del keyword encontrado o None
+            Dict con category, age_range, subcategory, field, field_key y keyword
         """
-        parts = field_path.split('.')
-        current = keywords_dict
-        
-        for part in parts:
-            if isinstance(current, dict) and part in current:
-                current = current[part]
-            else:
-                return None
-        
-        return current if isinstance(current, str) else None
+        if kw.get('field') and kw.get('category') and kw.get('subcategory') and kw.get('field_key'):
+            return kw
+        keyword = kw.get('keyword')
+        if not keyword:
+            return kw
+        
+        fields = PROFILE_TRANSLATIONS.fields_for(
+            keyword,
+            category=kw.get('category') or None,
+            age_range=kw.get('age_range') or None
+        )
+        fields = [key for key in fields if not kw.get('field') or key[2] == kw['field']]
+        if not fields:
+            return kw
+        
+        category, age_range, field = fields[0]
+        path = field.split('.')
+        return {
+            **kw,
+            'category': category,
+            'age_range': age_range,
+            'subcategory': path[0],
+            'field': field,
+            'field_key': path[-1]
+        }
     
     @staticmethod
     def get_keyword_translations(keyword: str, detected_kw: Dict) -> Dict[str, Optional[str]]:
         """
-        Obtiene las traducciones de un keyword detectado buscando en los 3 diccionarios de idiomas.
+        Obtiene las traducciones de un keyword detectado desde la tabla precalculada
+        PROFILE_TRANSLATIONS (una búsqueda O(1) por (category, age_range, field)).
+        Si el dict no trae el field, se resuelve desde la forma del keyword.
         
         Args:
             keyword: El keyword detectado en cualquier idioma (ej: 'ciclos cortos', 'short cycles')
@@ -113,24 +91,14 @@ class BabyProfileService:
         Returns:
             Dict con {'es': valor_es, 'en': valor_en, 'pt': valor_pt}
         """
-        # Construir path completo: category.age_range.field
-        # ej: 'sleep and rest.0_6.sleepwear.base.short_sleeve_bodysuit'
+        detected_kw = BabyProfileService.resolve_keyword({**detected_kw, 'keyword': detected_kw.get('keyword') or keyword})
+        
+        # ej: ('sleep and rest', '0_6', 'sleepwear.base.short_sleeve_bodysuit')
         category = detected_kw.get('category', '')
         age_range = detected_kw.get('age_range', '')
         field = detected_kw.get('field', '')
         
-        full_path = f"{category}.{age_range}.{field}"
-        
-        # Buscar el valor directamente navegando el path en cada diccionario
-        value_es = BabyProfileService._find_keyword_in_dict(full_path, KEYWORDS_PROFILE_ES)
-        value_en = BabyProfileService._find_keyword_in_dict(full_path, KEYWORDS_PROFILE_EN)
-        value_pt = BabyProfileService._find_keyword_in_dict(full_path, KEYWORDS_PROFILE_PT)
-        
-        return {
-            'es': value_es,
-            'en': value_en,
-            'pt': value_pt
-        }
+        return PROFILE_TRANSLATIONS.translations(category, age_range, field)
     
     @staticmethod
     async def get_or_create_baby_profile(
@@ -269,6 +237,54 @@ class BabyProfileService:
             traceback.print_exc()
             return None
     
+    @staticmethod
+    def _plan_bulk_rows(
+        detected_keywords: List[Dict],
+        category_map: Dict[str, str]
+    ) -> Dict[tuple, Dict]:
+        """
+        Agrupa los keywords por fila de baby_profile (category_id, subcategoría) y
+        combina sus traducciones en orden: igual que el guardado secuencial, el último
+        keyword de una subcategoría gana y los idiomas sin traducción no pisan valores.
+        
+        Returns:
+            {(category_id, subcategory): {'category': str, 'values': {...}, 'keywords': int}}
+        """
+        plan: Dict[tuple, Dict] = {}
+        
+        for kw in detected_keywords:
+            kw = BabyProfileService.resolve_keyword(kw)
+            category = kw.get('category')
+            subcategory = kw.get('subcategory')
+            field_key = kw.get('field_key')
+            field_path = kw.get('field')
+            
+            if not category or not subcategory or not field_key or not field_path:
+                print(f"⚠️ [PROFILE] Keyword incompleto, saltando: {kw}")
+                continue
+            
+            category_id = category_map.get(normalize_reference_key(category))
+            if not category_id:
+                print(f"❌ [PROFILE] No se pudo obtener category_id para '{category}'")
+                continue
+            
+            translations = BabyProfileService.get_keyword_translations(kw.get('keyword'), kw)
+            print(f"🌍 [PROFILE] Traducciones para {category}.{field_path}:")
+            print(f"   ES: {translations.get('es', 'N/A')}")
+            print(f"   EN: {translations.get('en', 'N/A')}")
+            print(f"   PT: {translations.get('pt', 'N/A')}")
+            
+            entry = plan.setdefault(
+                (category_id, subcategory),
+                {'category': category, 'values': {}, 'keywords': 0}
+            )
+            for lang in ('es', 'en', 'pt'):
+                if translations.get(lang) is not None:
+                    entry['values'][f"value_{lang}"] = translations[lang]
+            entry['keywords'] += 1
+        
+        return plan
+    
     @staticmethod
     async def save_detected_keywords(
         baby_id: str,
@@ -279,6 +295,11 @@ class BabyProfileService:
         Guarda múltiples keywords detectados del perfil.
         Automáticamente busca y guarda las traducciones en los 3 idiomas.
         
+        Usa dos upserts masivos sin importar cuántos keywords lleguen:
+        1. baby_profile (on_conflict baby_id, category_id, key) → devuelve los ids
+        2. baby_profile_value (on_conflict baby_profile_id)
+        Las categorías salen del mapa precargado de profile_category.
+        
         Estructura de guardado:
         - baby_profile.key: Guarda solo la subcategoría base (ej: 'sleep_location')
         - baby_profile_value: Guarda los valores traducidos asociados
@@ -294,9 +315,79 @@ class BabyProfileService:
         Returns:
             Número de keywords guardados exitosamente
         """
+        if not detected_keywords:
+            return 0
+        
+        category_map = BabyProfileService._load_category_map()
+        plan = BabyProfileService._plan_bulk_rows(detected_keywords, category_map)
+        if not plan:
+            return 0
+        
+        try:
+            # 1️⃣ Upsert de todas las filas de baby_profile en una llamada
+            profile_rows = [
+                {"baby_id": baby_id, "category_id": category_id, "key": subcategory}
+                for category_id, subcategory in plan
+            ]
+            profiles = supabase.table("baby_profile")\
+                .upsert(profile_rows, on_conflict="baby_id,category_id,key")\
+                .execute()
+            
+            profile_ids = {
+                (row["category_id"], row["key"]): row["id"]
+                for row in profiles.data or []
+            }
+            
+            # 2️⃣ Upsert de todos los valores. PostgREST exige las mismas columnas en cada
+            # fila de un upsert masivo; se agrupa por idiomas presentes (normalmente un grupo)
+            # para no borrar traducciones existentes con NULL.
+            value_groups: Dict[tuple, List[Dict]] = {}
+            saved_count = 0
+            for key, entry in plan.items():
+                profile_id = profile_ids.get(key)
+                if not profile_id or not entry['values']:
+                    continue
+                columns = tuple(sorted(entry['values']))
+                value_groups.setdefault(columns, []).append({
+                    "baby_profile_id": profile_id,
+                    **entry['values']
+                })
+                saved_count += entry['keywords']
+            
+            for rows in value_groups.values():
+                supabase.table("baby_profile_value")\
+                    .upsert(rows, on_conflict="baby_profile_id")\
+                    .execute()
+            
+        except Exception as e:
+            print(f"⚠️ [PROFILE] Upsert masivo falló ({e}), guardando keyword por keyword")
+            return await BabyProfileService._save_detected_keywords_sequential(
+                baby_id=baby_id,
+                detected_keywords=detected_keywords,
+                lang=lang
+            )
+        
+        if saved_count > 0:
+            print(f"✅ [PROFILE] Total guardados/actualizados: {saved_count} keywords en 3 idiomas "
+                  f"({len(profile_rows)} perfiles, {1 + len(value_groups)} llamadas)")
+        
+        return saved_count
+    
+    @staticmethod
+    async def _save_detected_keywords_sequential(
+        baby_id: str,
+        detected_keywords: List[Dict],
+        lang: str = 'es'
+    ) -> int:
+        """
+        Guardado keyword por keyword (varias queries por keyword).
+        Se usa como respaldo si el upsert masivo falla, por ejemplo si la base
+        todavía no tiene los índices únicos que requiere on_conflict.
+        """
         saved_count = 0
         
         for kw in detected_keywords:
+            kw = BabyProfileService.resolve_keyword(kw)  # Completa keywords que llegan solo con su forma
             category = kw.get('category')  # ej: 'sleep and rest'
             subcategory = kw.get('subcategory')  # ej: 'sleep_rhythm', 'sleepwear'
             field_key = kw.get('field_key')  # ej: 'short_cycles', 'short_sleeve_bodysuit'
@@ -0,0 +1,170 @@
+# src/services/reference_data_service.py
+import asyncio
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from ..rag.retriever import supabase
+
+# Cada cuánto se recargan las tablas de referencia (segundos)
+REFERENCE_DATA_REFRESH_SECONDS = float(os.getenv("REFERENCE_DATA_REFRESH_SECONDS", "900"))
+# Ante una clave desconocida se recarga la tabla, como mucho una vez por este intervalo
+REFERENCE_DATA_MISS_REFRESH_SECONDS = float(os.getenv("REFERENCE_DATA_MISS_REFRESH_SECONDS", "60"))
+
+
+def normalize_reference_key(value: Any) -> str:
+    """
+    Normaliza una clave para búsquedas sin distinguir mayúsculas ni espacios extra
+    ('Sleep and rest', 'sleep AND  rest ' → 'sleep and rest').
+    """
+    return " ".join(str(value).split()).lower()
+
+
+class ReferenceTable:
+    """
+    Copia en memoria de una tabla pequeña de referencia (ej: profile_category).
+    Se carga completa en una sola query y se reemplaza de forma atómica al refrescar;
+    si una recarga falla se conservan los datos anteriores.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        loader: Callable[[], List[Dict]],
+        key_column: str,
+        value_column: Optional[str] = "id",
+    ):
+        self.name = name
+        self.key_column = key_column
+        self.value_column = value_column
+        self._loader = loader
+        self._lock = threading.Lock()
+        self._rows: List[Dict] = []
+        self._by_key: Dict[str, Any] = {}
+        self.loaded_at: Optional[float] = None
+        self._last_attempt: Optional[float] = None
+
+    def refresh(self) -> bool:
+        with self._lock:
+            self._last_attempt = time.monotonic()
+            try:
+                rows = list(self._loader() or [])
+            except Exception as e:
+                print(f"❌ [REFERENCE-DATA] Error recargando '{self.name}': {e}")
+                return False
+
+            by_key = {}
+            for row in rows:
+                key = row.get(self.key_column)
+                if key is None:
+                    continue
+                by_key[normalize_reference_key(key)] = row[self.value_column] if self.value_column else row
+
+            self._rows = rows
+            self._by_key = by_key
+            self.loaded_at = time.monotonic()
+
+        print(f"✅ [REFERENCE-DATA] '{self.name}' cargada: {len(by_key)} filas")
+        return True
+
+    def _can_retry(self) -> bool:
+        """Recargas fuera del refresco periódico: como mucho una por intervalo."""
+        last_attempt = self._last_attempt
+        return last_attempt is None or time.monotonic() - last_attempt >= REFERENCE_DATA_MISS_REFRESH_SECONDS
+
+    def ensure_loaded(self) -> None:
+        # Si la primera carga falló no se reintenta en cada request, sino con el mismo backoff
+        if self.loaded_at is None and self._can_retry():
+            self.refresh()
+
+    def get(self, key: Any, default: Any = None) -> Any:
+        self.ensure_loaded()
+        normalized = normalize_reference_key(key)
+        if normalized in self._by_key:
+            return self._by_key[normalized]
+
+        # Clave desconocida: puede haberse agregado en la base después de la última carga
+        if self._can_retry() and self.refresh():
+            return self._by_key.get(normalized, default)
+        return default
+
+    def as_dict(self) -> Dict[str, Any]:
+        self.ensure_loaded()
+        return dict(self._by_key)
+
+    def rows(self) -> List[Dict]:
+        self.ensure_loaded()
+        return list(self._rows)
+
+
+class ReferenceDataService:
+    """
+    Registro compartido de tablas de referencia: se precargan al iniciar la app
+    y se refrescan periódicamente en segundo plano.
+    """
+
+    def __init__(self, refresh_seconds: float = REFERENCE_DATA_REFRESH_SECONDS):
+        self.refresh_seconds = refresh_seconds
+        self._tables: Dict[str, ReferenceTable] = {}
+        self._refresh_task: Optional[asyncio.Task] = None
+
+    def register(
+        self,
+        name: str,
+        key_column: str,
+        value_column: Optional[str] = "id",
+        table: Optional[str] = None,
+        columns: str = "*",
+        loader: Optional[Callable[[], List[Dict]]] = None,
+    ) -> ReferenceTable:
+        """
+        Registra una tabla. Por defecto se lee de Supabase `table` (o `name`) con `columns`.
+        """
+        if loader is None:
+            source = table or name
+
+            def loader():
+                return supabase.table(source).select(columns).execute().data
+
+        reference_table = ReferenceTable(name, loader, key_column, value_column)
+        self._tables[name] = reference_table
+        return reference_table
+
+    def table(self, name: str) -> ReferenceTable:
+        return self._tables[name]
+
+    def get(self, name: str, key: Any, default: Any = None) -> Any:
+        return self._tables[name].get(key, default)
+
+    def refresh_all(self) -> Dict[str, bool]:
+        return {name: table.refresh() for name, table in self._tables.items()}
+
+    async def warmup(self) -> Dict[str, bool]:
+        """Carga todas las tablas sin bloquear el event loop."""
+        return await asyncio.to_thread(self.refresh_all)
+
+    async def _refresh_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.refresh_seconds)
+            await self.warmup()
+
+    def start_refresh(self) -> None:
+        if self._refresh_task is None and self.refresh_seconds > 0:
+            self._refresh_task = asyncio.create_task(self._refresh_loop())
+
+    async def stop_refresh(self) -> None:
+        if self._refresh_task is not None:
+            self._refresh_task.cancel()
+            try:
+                await self._refresh_task
+            except asyncio.CancelledError:
+                pass
+            self._refresh_task = None
+
+
+# Instancia global compartida
+reference_data = ReferenceDataService()
+
+# Categorías del perfil: nombre normalizado → UUID
+reference_data.register("profile_category", key_column="category", columns="id, category")
@@ -1,9 +1,28 @@
 #src/services/routine_service.py
 from typing import List, Dict, Any, Optional
+from postgrest.exceptions import APIError
 from ..rag.retriever import supabase
+from ..state.context_snapshots import context_snapshots
+from .knowledge_service import BabyKnowledgeService
+
+# Código de PostgREST cuando la función RPC no existe (migración sin aplicar)
+RPC_NOT_FOUND_CODE = "PGRST202"
 
 class RoutineService:
     
+    @staticmethod
+    def _routine_fields(routine_data: Dict) -> Dict:
+        """
+        Columnas de baby_routines a partir de la rutina detectada.
+        """
+        return {
+            "name": routine_data.get("routine_name", "Rutina"),
+            "description": routine_data.get("context_summary", ""),
+            "category": routine_data.get("routine_type", "daily"),
+            "confidence_score": routine_data.get("confidence", 0.7),
+            "detected_from_message": routine_data.get("detected_from_message", "")
+        }
+    
     @staticmethod
     async def save_routine(user_id: str, baby_id: str, routine_data: Dict) -> Dict:
         """
@@ -14,11 +33,7 @@ class RoutineService:
             routine_insert = {
                 "user_id": user_id,
                 "baby_id": baby_id,
-                "name": routine_data.get("routine_name", "Rutina"),
-                "description": routine_data.get("context_summary", ""),
-                "category": routine_data.get("routine_type", "daily"),
-                "confidence_score": routine_data.get("confidence", 0.7),
-                "detected_from_message": routine_data.get("detected_from_message", ""),
+                **RoutineService._routine_fields(routine_data),
                 "approved_at": "NOW()"  # Se aprueba inmediatamente al guardar
             }
             
@@ -58,6 +73,7 @@ class RoutineService:
                 raise Exception("Error insertando actividades de rutina")
             
             print(f"✅ Guardadas {len(activities_result.data)} actividades de rutina")
+            context_snapshots.invalidate(baby_ids=[baby_id])
             
             return {
                 "success": True,
@@ -71,6 +87,93 @@ class RoutineService:
             print(f"❌ Error en save_routine: {e}")
             raise e
     
+    @staticmethod
+    async def save_routine_with_knowledge(
+        user_id: str,
+        baby_name: str,
+        routine_data: Dict,
+        knowledge_data: Optional[Dict] = None
+    ) -> Dict:
+        """
+        Guarda la rutina, sus actividades y la entrada espejo en baby_knowledge en una
+        sola llamada a la función SQL save_routine_with_knowledge (una transacción:
+        si algo falla no quedan rutinas huérfanas). La función también resuelve el bebé
+        por nombre dentro de los bebés del usuario.
+        
+        Returns:
+            Dict con success, baby_id, routine_id, routine_name, activities_count,
+            activities y knowledge_id. success=False si no se encontró el bebé.
+        """
+        activities = routine_data.get("activities", [])
+        if not activities:
+            raise Exception("No hay actividades para guardar")
+        
+        params = {
+            "p_user_id": user_id,
+            "p_baby_name": baby_name or "",
+            "p_routine": RoutineService._routine_fields(routine_data),
+            "p_activities": [
+                {
+                    "time_start": activity["time_start"],
+                    "time_end": activity.get("time_end"),
+                    "activity": activity["activity"],
+                    "details": activity.get("details", ""),
+                    "activity_type": activity.get("activity_type", "care"),
+                    "order_index": activity.get("order_index", i + 1)
+                }
+                for i, activity in enumerate(activities)
+            ],
+            "p_knowledge": knowledge_data
+        }
+        
+        try:
+            result = supabase.rpc("save_routine_with_knowledge", params).execute()
+        except APIError as e:
+            # La función corre en una sola transacción: si Postgres o PostgREST devolvieron
+            # un error no quedó nada escrito y se puede repetir por el camino anterior
+            # (migración sin aplicar, aplicada a medias o rota)
+            if e.code == RPC_NOT_FOUND_CODE:
+                print("⚠️ Función save_routine_with_knowledge no disponible, guardando paso a paso")
+            else:
+                print(f"⚠️ Error en save_routine_with_knowledge ({e.code}: {e.message}), guardando paso a paso")
+            return await RoutineService._save_routine_with_knowledge_sequential(
+                user_id, baby_name, routine_data, knowledge_data
+            )
+        
+        saved = result.data or {}
+        if saved.get("success"):
+            context_snapshots.invalidate(baby_ids=[saved.get("baby_id")])
+            print(f"✅ Rutina {saved.get('routine_id')} guardada con {saved.get('activities_count', 0)} actividades (1 llamada)")
+        return saved
+    
+    @staticmethod
+    async def _save_routine_with_knowledge_sequential(
+        user_id: str,
+        baby_name: str,
+        routine_data: Dict,
+        knowledge_data: Optional[Dict] = None
+    ) -> Dict:
+        """
+        Camino anterior (varias llamadas), para bases sin la función SQL.
+        """
+        baby_id = await RoutineService.find_baby_by_name(user_id, baby_name or "")
+        if not baby_id:
+            return {"success": False, "error": "baby_not_found"}
+        
+        saved = await RoutineService.save_routine(user_id, baby_id, routine_data)
+        saved["baby_id"] = baby_id
+        saved["knowledge_id"] = None
+        
+        if knowledge_data:
+            try:
+                knowledge = await BabyKnowledgeService.save_knowledge(user_id, baby_id, knowledge_data)
+                saved["knowledge_id"] = knowledge.get("id")
+            except Exception as knowledge_error:
+                print(f"⚠️ Error guardando conocimiento de rutina: {knowledge_error}")
+                # No fallar si el conocimiento falla, la rutina ya se guardó
+        
+        return saved
+    
     @staticmethod
     async def get_user_routines(user_id: str, baby_id: str = None) -> List[Dict]:
         """
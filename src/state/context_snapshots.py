@@ -0,0 +1,82 @@
+# src/state/context_snapshots.py
+import os
+import threading
+import time
+from dataclasses import dataclass, field
+from datetime import date
+from typing import Dict, Iterable, List, Optional
+
+# Vida máxima de un snapshot aunque nadie lo invalide. La invalidación solo llega al
+# proceso que escribió: con varios workers de uvicorn este TTL es el máximo que otro
+# worker puede seguir usando un contexto viejo (ej: sin una alergia recién guardada)
+CONTEXT_SNAPSHOT_TTL_SECONDS = float(os.getenv("CONTEXT_SNAPSHOT_TTL_SECONDS", "60"))
+
+
+@dataclass
+class BabyContextSnapshot:
+    """
+    Contexto desnormalizado de un bebé listo para el prompt: datos del bebé con su
+    edad y etapa, y los bloques de conocimiento y rutinas ya formateados con sus tokens.
+    """
+
+    baby_id: str
+    user_id: str
+    baby_name: str
+    baby_fingerprint: str
+    # Campos que dependen de la fecha: se recalculan cuando cambia el día
+    age_date: date
+    edad_anios: int
+    edad_meses: int
+    etapa_desarrollo: str
+    baby_line: str
+    knowledge: List[Dict] = field(default_factory=list)
+    knowledge_block: str = ""
+    knowledge_tokens: int = 0
+    routines: List[Dict] = field(default_factory=list)
+    routines_block: str = ""
+    routines_tokens: int = 0
+    built_at: float = field(default_factory=time.monotonic)
+
+
+class ContextSnapshotStore:
+    """
+    Cache en memoria de snapshots por bebé. Los servicios que escriben conocimiento
+    o rutinas lo invalidan; el TTL cubre cambios hechos desde otros procesos.
+    """
+
+    def __init__(self, ttl_seconds: float = CONTEXT_SNAPSHOT_TTL_SECONDS):
+        self.ttl_seconds = ttl_seconds
+        self._snapshots: Dict[str, BabyContextSnapshot] = {}
+        self._lock = threading.Lock()
+
+    def get(self, baby_id: str) -> Optional[BabyContextSnapshot]:
+        with self._lock:
+            snapshot = self._snapshots.get(baby_id)
+            if snapshot is None:
+                return None
+            if time.monotonic() - snapshot.built_at > self.ttl_seconds:
+                del self._snapshots[baby_id]
+                return None
+            return snapshot
+
+    def put(self, snapshot: BabyContextSnapshot) -> None:
+        with self._lock:
+            self._snapshots[snapshot.baby_id] = snapshot
+
+    def invalidate(self, baby_ids: Iterable[str] = (), user_id: Optional[str] = None) -> None:
+        """
+        Descarta los snapshots de esos bebés, o de todos los bebés del usuario.
+        Sin argumentos descarta todo.
+        """
+        baby_ids = set(baby_ids)
+        with self._lock:
+            if not baby_ids and user_id is None:
+                self._snapshots.clear()
+                return
+            for baby_id, snapshot in list(self._snapshots.items()):
+                if baby_id in baby_ids or (user_id is not None and snapshot.user_id == user_id):
+                    del self._snapshots[baby_id]
+
+
+# Instancia global
+context_snapshots = ContextSnapshotStore()
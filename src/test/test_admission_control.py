@@ -0,0 +1,90 @@
+"""
+Tests del control de admisión y del limitador de tasa de OpenAI
+"""
+import asyncio
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+from src.utils.admission_control import (
+    AdmissionController,
+    AdmissionRejected,
+    OpenAIRateLimiter,
+    TokenBucket,
+)
+
+
+def test_token_bucket_wait_time():
+    bucket = TokenBucket(capacity=10, refill_per_second=10)
+    assert bucket.wait_time(5) == 0.0
+
+    bucket.consume(10)
+    # Sin tokens: consumir 5 requiere ~0.5s de recarga
+    assert 0.4 < bucket.wait_time(5) <= 0.5
+
+
+def test_rate_limiter_rejects_when_wait_exceeds_max():
+    limiter = OpenAIRateLimiter(rpm=60, tpm=600, max_wait=1.0)
+    limiter.acquire_sync(600)
+
+    with pytest.raises(AdmissionRejected) as exc_info:
+        limiter.acquire_sync(600)
+
+    assert exc_info.value.status_code == 429
+    assert exc_info.value.retry_after >= 1
+
+
+def test_per_user_limit_rejects_with_429():
+    async def scenario():
+        controller = AdmissionController(max_concurrent=4, max_per_user=1, max_queue=4, queue_timeout=1)
+        admitted_at = await controller.acquire("user-a")
+
+        with pytest.raises(AdmissionRejected) as exc_info:
+            await controller.acquire("user-a")
+        assert exc_info.value.status_code == 429
+
+        # Otro usuario sigue siendo admitido
+        other_admitted_at = await controller.acquire("user-b")
+        controller.release("user-b", other_admitted_at)
+        controller.release("user-a", admitted_at)
+
+        assert controller.get_stats()["active_users"] == 0
+
+    asyncio.run(scenario())
+
+
+def test_full_queue_rejects_with_503():
+    async def scenario():
+        controller = AdmissionController(max_concurrent=1, max_per_user=5, max_queue=1, queue_timeout=5)
+        admitted_at = await controller.acquire("user-a")
+
+        waiter = asyncio.create_task(controller.acquire("user-b"))
+        await asyncio.sleep(0)
+
+        with pytest.raises(AdmissionRejected) as exc_info:
+            await controller.acquire("user-c")
+        assert exc_info.value.status_code == 503
+
+        controller.release("user-a", admitted_at)
+        waiter_admitted_at = await waiter
+        controller.release("user-b", waiter_admitted_at)
+
+    asyncio.run(scenario())
+
+
+def test_queue_timeout_rejects_with_503():
+    async def scenario():
+        controller = AdmissionController(max_concurrent=1, max_per_user=5, max_queue=5, queue_timeout=0.05)
+        admitted_at = await controller.acquire("user-a")
+
+        with pytest.raises(AdmissionRejected) as exc_info:
+            await controller.acquire("user-b")
+        assert exc_info.value.status_code == 503
+        assert controller.get_stats()["waiting_requests"] == 0
+
+        controller.release("user-a", admitted_at)
+
+    asyncio.run(scenario())
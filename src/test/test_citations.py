@@ -0,0 +1,272 @@
+"""
+Tests de las citas precalculadas por fuente para las consultas de referencias
+"""
+import asyncio
+import os
+import sys
+import uuid
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+os.environ.setdefault("SUPABASE_URL", "http://localhost:54321")
+os.environ.setdefault("SUPABASE_SERVICE_ROLE_KEY", "test")
+os.environ.setdefault("OPENAI_API_KEY", "sk-test")
+
+from src.rag import ingest
+from src.rag.chunking import chunk_hash
+from src.rag.citations import CitationCollector, CitationIndex, extract_citations, merge_citations
+from src.rag.incremental import IncrementalIngest
+from src.utils import reference_detector
+from src.utils.reference_detector import ReferenceDetector
+from src.utils.source_cache import source_cache
+
+REF_TEXT = (
+    'Según la American Academy of Pediatrics, el sueño seguro es prioritario. '
+    'Ver el libro "Disciplina sin lágrimas para padres" de Siegel. '
+    'También los trabajos de Daniel Siegel y Tina Bryson sobre el apego.'
+)
+
+
+def test_extract_citations_finds_authors_institutions_and_books():
+    citations = extract_citations([REF_TEXT])
+
+    assert "Daniel Siegel" in citations["authors"]
+    assert "American Academy of Pediatrics" in citations["institutions"]
+    assert "Disciplina sin lágrimas para padres" in citations["books"]
+    # Palabras de instituciones no cuentan como autores
+    assert not any("American" in author for author in citations["authors"])
+    # Orden estable entre corridas
+    assert extract_citations([REF_TEXT]) == citations
+
+
+def test_collector_merges_batches_without_duplicates():
+    collector = CitationCollector()
+    collector.add_texts(["Estudio de Daniel Siegel."])
+    collector.add_texts(["Otra vez Daniel Siegel y la World Health Organization."])
+
+    result = collector.result()
+    assert result["authors"].count("Daniel Siegel") == 1
+    assert "World Health Organization" in result["institutions"]
+    assert merge_citations([result, {"authors": ["Tina Bryson"]}])["authors"][-1] == "Tina Bryson"
+
+
+def test_format_from_chunks_matches_format_from_citations():
+    chunks = [{"content": REF_TEXT, "ref": True, "source": "cerebro_ref.pdf"}]
+    from_chunks = ReferenceDetector.format_references_response(chunks)
+    from_index = ReferenceDetector.format_citations_response(extract_citations([REF_TEXT]))
+
+    assert from_chunks == from_index
+    assert "• Daniel Siegel" in from_index
+    assert "American Academy of Pediatrics (Academia Americana de Pediatría)" in from_index
+
+
+def test_near_duplicate_books_do_not_reduce_the_five_listed():
+    books = [
+        "Disciplina sin lágrimas para padres",
+        "Disciplina sin lágrimas para padres.",
+        "El cerebro del niño explicado",
+        "Guía de sueño infantil segura",
+        "Manual de lactancia materna",
+        "Crianza respetuosa paso a paso",
+    ]
+    response = ReferenceDetector.format_citations_response({"books": books})
+
+    assert response.count("Disciplina sin lágrimas") == 1
+    assert "Crianza respetuosa paso a paso" in response
+
+
+class FakeQuery:
+    def __init__(self, client, op, payload=None):
+        self.client = client
+        self.op = op
+        self.payload = payload
+        self.filters = {}
+
+    def eq(self, column, value):
+        self.filters[column] = value
+        return self
+
+    def is_(self, column, value):
+        self.filters[column] = None
+        return self
+
+    def in_(self, column, values):
+        return self
+
+    def order(self, column):
+        return self
+
+    def range(self, start, end):
+        return self
+
+    def execute(self):
+        if self.op == "select":
+            data = [
+                dict(row) for row in self.client.rows
+                if all(str(row["metadata"].get(c.split("->>")[1])) == str(v) for c, v in self.filters.items())
+            ]
+            return type("Result", (), {"data": data})()
+        if self.op == "update":
+            for row in self.client.rows:
+                if row["id"] == self.filters.get("id"):
+                    row.update(self.payload)
+        return type("Result", (), {"data": []})()
+
+
+class FakeManifestTable:
+    def __init__(self, client):
+        self.client = client
+        self.filters = {}
+        self.row = None
+
+    def select(self, columns):
+        return self
+
+    def eq(self, column, value):
+        self.filters[column] = value
+        return self
+
+    @property
+    def not_(self):
+        return self
+
+    def is_(self, column, value):
+        return self
+
+    def upsert(self, row, on_conflict=None):
+        self.row = row
+        return self
+
+    def execute(self):
+        if self.row is not None:
+            key = (self.row["source"], self.row["version"], self.row["corpus_version"])
+            # Como el upsert de PostgREST: las columnas que no vienen se conservan
+            self.client.completed[key] = {**self.client.completed.get(key, {}), **self.row}
+            return type("Result", (), {"data": []})()
+        self.client.reads += 1
+        if "source" in self.filters:
+            key = (self.filters["source"], self.filters["version"], self.filters["corpus_version"])
+            found = self.client.completed.get(key)
+            return type("Result", (), {"data": [found] if found else []})()
+        rows = [
+            row for (_, _, corpus), row in self.client.completed.items()
+            if corpus == self.filters["corpus_version"] and row.get("citations") is not None
+        ]
+        return type("Result", (), {"data": rows})()
+
+
+class FakeClient:
+    def __init__(self):
+        self.rows = []
+        self.completed = {}
+        self.reads = 0
+
+    def table(self, name):
+        if name == "ingest_manifest":
+            return FakeManifestTable(self)
+        return self
+
+    def select(self, columns):
+        return FakeQuery(self, "select")
+
+    def update(self, payload):
+        return FakeQuery(self, "update", payload)
+
+
+class FakeStage:
+    batch_size = 10
+    concurrency = 1
+
+    def __init__(self, client):
+        self.client = client
+        self.embedded = []
+
+    def upload(self, texts, metadatas):
+        self.embedded.extend(texts)
+        for text, metadata in zip(texts, metadatas):
+            self.client.rows.append({"id": str(uuid.uuid4()), "content": text, "metadata": metadata})
+        return len(texts)
+
+    def report(self):
+        pass
+
+
+def fake_document_chunks(path, source_name, category, version, ref=False, source_hash=None):
+    for index, text in enumerate([REF_TEXT, "Bibliografía: World Health Organization."]):
+        yield text, {
+            "source": source_name, "type": "pdf", "chunk": index, "page": 1, "category": category,
+            "version": version, "ref": ref, "file_hash": source_hash, "chunk_hash": chunk_hash(text),
+        }
+
+
+def test_ingest_stores_citations_for_ref_documents(monkeypatch):
+    client = FakeClient()
+    stage = FakeStage(client)
+    monkeypatch.setattr(ingest, "incremental", IncrementalIngest(client))
+    monkeypatch.setattr(ingest, "iter_document_chunks", fake_document_chunks)
+    monkeypatch.setattr(ingest, "embedding_stage", stage)
+
+    ingest.ingest_pdf("cerebro_ref.pdf", "cerebro_ref.pdf", "Desarrollo", version="1", ref=True, source_hash="h")
+    ingest.ingest_pdf("cerebro.pdf", "cerebro.pdf", "Desarrollo", version="1", source_hash="h2")
+
+    stored = client.completed[("cerebro_ref.pdf", "1", "")]["citations"]
+    assert "Daniel Siegel" in stored["authors"]
+    assert "World Health Organization" in stored["institutions"]
+    assert "citations" not in client.completed[("cerebro.pdf", "1", "")]
+
+    # Un ref ingerido antes de extraer citas se re-chunkea sin re-embeber
+    client.completed[("cerebro_ref.pdf", "1", "")]["citations"] = None
+    embedded = len(stage.embedded)
+    result = ingest.ingest_pdf("cerebro_ref.pdf", "cerebro_ref.pdf", "Desarrollo", version="1", ref=True, source_hash="h")
+    assert result["status"] == "ingested"
+    assert len(stage.embedded) == embedded
+    assert client.completed[("cerebro_ref.pdf", "1", "")]["citations"] == stored
+
+
+class FakeActiveVersion:
+    refresh_seconds = 60
+
+    def __init__(self, version=None):
+        self.version = version
+
+    def get(self):
+        return self.version
+
+
+def test_citation_index_caches_until_active_version_changes():
+    client = FakeClient()
+    client.completed[("a_ref.pdf", "1", "v1")] = {"source": "a_ref.pdf", "citations": {"authors": ["Ana Pérez"]}}
+    client.completed[("a_ref.pdf", "1", "v2")] = {"source": "a_ref.pdf", "citations": {"authors": ["Luis Gómez"]}}
+    active = FakeActiveVersion("v1")
+    index = CitationIndex(client, active)
+
+    assert index.get("a_ref.pdf")["authors"] == ["Ana Pérez"]
+    assert index.get("otro.pdf") is None
+    assert client.reads == 1
+
+    active.version = "v2"
+    assert index.get("a_ref.pdf")["authors"] == ["Luis Gómez"]
+    assert client.reads == 2
+
+
+def test_reference_query_answers_from_index_without_reading_chunks(monkeypatch):
+    citations = {"authors": ["Daniel Siegel"], "institutions": ["World Health Organization"], "books": []}
+
+    class FakeIndex:
+        def get(self, source):
+            return citations if source == "cerebro.pdf" else None
+
+    async def no_chunks(*args, **kwargs):
+        raise AssertionError("no debería leer chunks si hay citas en el índice")
+
+    monkeypatch.setattr(reference_detector, "citation_index", FakeIndex())
+    monkeypatch.setattr(reference_detector, "get_all_reference_chunks_from_file", no_chunks)
+    user_id = "user-" + uuid.uuid4().hex
+    source_cache.store_sources(user_id, ["cerebro.pdf"], "¿cómo calmar una rabieta?")
+
+    response = asyncio.run(ReferenceDetector.handle_reference_query("¿en qué te basas?", user_id))
+
+    assert "• Daniel Siegel" in response
+    assert "World Health Organization (Organización Mundial de la Salud)" in response
+    assert "rabieta" in response
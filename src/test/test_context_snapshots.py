@@ -0,0 +1,121 @@
+"""
+Tests de los snapshots de contexto por bebé
+"""
+import os
+import sys
+from datetime import date, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+os.environ.setdefault("SUPABASE_URL", "http://localhost:54321")
+os.environ.setdefault("SUPABASE_SERVICE_ROLE_KEY", "test")
+os.environ.setdefault("OPENAI_API_KEY", "sk-test")
+
+from src.services import context_snapshot_service
+from src.services.context_snapshot_service import ContextSnapshotService
+from src.state.context_snapshots import context_snapshots
+from src.utils import date_utils
+
+BABY = {"id": "b1", "user_id": "u1", "name": "Sofía", "birthdate": "2025-01-15", "feeding": "mixta"}
+
+TABLES = {
+    "baby_knowledge": [
+        {"id": "k1", "baby_id": "b1", "category": "alergias", "title": "Alergia al huevo",
+         "description": "Alergia al huevo", "importance_level": 5},
+    ],
+    "baby_routines": [
+        {"id": "r1", "baby_id": "b1", "name": "Rutina de noche", "category": "night", "description": ""},
+    ],
+}
+
+
+class FakeQuery:
+    def __init__(self, client, table):
+        self.client = client
+        self.table = table
+
+    def select(self, *args):
+        return self
+
+    def eq(self, *args):
+        return self
+
+    def in_(self, *args):
+        return self
+
+    def order(self, *args, **kwargs):
+        return self
+
+    def execute(self):
+        self.client.queries.append(self.table)
+        return type("Result", (), {"data": TABLES[self.table]})()
+
+
+class FakeSupabase:
+    def __init__(self):
+        self.queries = []
+
+    def table(self, name):
+        return FakeQuery(self, name)
+
+
+def _setup(monkeypatch):
+    context_snapshots.invalidate()
+    fake = FakeSupabase()
+    monkeypatch.setattr(context_snapshot_service, "supabase", fake)
+    return fake
+
+
+def test_snapshot_is_built_once_and_reused(monkeypatch):
+    fake = _setup(monkeypatch)
+
+    first = ContextSnapshotService.get_snapshots("u1", [BABY])[0]
+    assert fake.queries == ["baby_knowledge", "baby_routines"]
+    assert "Alergia al huevo" in first.knowledge_block
+    assert "Rutina de noche" in first.routines_block
+    assert first.knowledge_tokens > 0 and first.routines_tokens > 0
+
+    second = ContextSnapshotService.get_snapshots("u1", [BABY])[0]
+    assert second is first
+    assert len(fake.queries) == 2
+
+
+def test_baby_row_changes_only_recompute_baby_fields(monkeypatch):
+    fake = _setup(monkeypatch)
+    ContextSnapshotService.get_snapshots("u1", [BABY])
+
+    updated = ContextSnapshotService.get_snapshots("u1", [dict(BABY, weight=9.5)])[0]
+    assert "peso: 9.5 kg" in updated.baby_line
+    assert len(fake.queries) == 2
+
+
+def test_age_fields_recomputed_when_day_changes(monkeypatch):
+    fake = _setup(monkeypatch)
+    before = ContextSnapshotService.get_snapshots("u1", [BABY])[0]
+
+    class NextMonth(date):
+        @classmethod
+        def today(cls):
+            return date.today() + timedelta(days=40)
+
+    # La edad se calcula en date_utils: hay que mover la fecha en los dos módulos
+    monkeypatch.setattr(context_snapshot_service, "date", NextMonth)
+    monkeypatch.setattr(date_utils, "date", NextMonth)
+    snapshot = ContextSnapshotService.get_snapshots("u1", [BABY])[0]
+
+    assert snapshot.age_date == date.today() + timedelta(days=40)
+    assert snapshot.edad_meses > before.edad_meses
+    assert f"({snapshot.edad_meses} meses aprox.)" in snapshot.baby_line
+    assert f"({before.edad_meses} meses aprox.)" not in snapshot.baby_line
+    # Sin volver a consultar conocimiento ni rutinas
+    assert len(fake.queries) == 2
+
+
+def test_invalidation_forces_rebuild(monkeypatch):
+    fake = _setup(monkeypatch)
+    ContextSnapshotService.get_snapshots("u1", [BABY])
+
+    context_snapshots.invalidate(user_id="u1")
+    ContextSnapshotService.get_snapshots("u1", [BABY])
+    assert len(fake.queries) == 4
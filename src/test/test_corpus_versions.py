@@ -0,0 +1,446 @@
+"""
+Tests de la publicación versionada del corpus (staging, validación y activación)
+"""
+import os
+import sys
+import uuid
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+os.environ.setdefault("SUPABASE_URL", "http://localhost:54321")
+os.environ.setdefault("SUPABASE_SERVICE_ROLE_KEY", "test")
+os.environ.setdefault("OPENAI_API_KEY", "sk-test")
+
+from src.rag import ingest
+from src.rag.chunking import chunk_hash
+from src.rag.corpus_versions import ActiveCorpusVersion, CorpusPublisher
+from src.rag.incremental import IncrementalIngest
+from src.rag.retriever import VersionedSupabaseVectorStore
+
+
+class FakeQuery:
+    def __init__(self, client, op, payload=None):
+        self.client = client
+        self.op = op
+        self.payload = payload
+        self.filters = {}
+        self.ids = None
+
+    def eq(self, column, value):
+        self.filters[column] = value
+        return self
+
+    def is_(self, column, value):
+        self.filters[column] = None
+        return self
+
+    def in_(self, column, values):
+        self.ids = set(values)
+        return self
+
+    def order(self, column):
+        return self
+
+    def range(self, start, end):
+        return self
+
+    def _matches(self, row):
+        for column, value in self.filters.items():
+            if column == "id":
+                if row["id"] != value:
+                    return False
+            elif str(row["metadata"].get(column.split("->>")[1])) != str(value):
+                return False
+        return True
+
+    def execute(self):
+        if self.op == "select":
+            data = [dict(row) for row in self.client.rows if self._matches(row)]
+            return type("Result", (), {"data": data})()
+        if self.op == "delete":
+            self.client.rows = [row for row in self.client.rows if row["id"] not in self.ids]
+        if self.op == "update":
+            for row in self.client.rows:
+                if self._matches(row):
+                    row.update(self.payload)
+        return type("Result", (), {"data": []})()
+
+
+class FakeManifestTable:
+    """ingest_manifest: una fila por (source, version, corpus_version)."""
+
+    def __init__(self, client):
+        self.client = client
+        self.filters = {}
+        self.row = None
+
+    def select(self, columns):
+        return self
+
+    def eq(self, column, value):
+        self.filters[column] = value
+        return self
+
+    def upsert(self, row, on_conflict=None):
+        self.row = row
+        return self
+
+    def execute(self):
+        if self.row is not None:
+            key = (self.row["source"], self.row["version"], self.row["corpus_version"])
+            self.client.completed[key] = self.row
+            return type("Result", (), {"data": []})()
+        key = (self.filters["source"], self.filters["version"], self.filters["corpus_version"])
+        found = self.client.completed.get(key)
+        return type("Result", (), {"data": [found] if found else []})()
+
+
+class FakeClient:
+    def __init__(self):
+        self.rows = []
+        self.completed = {}
+
+    def table(self, name):
+        if name == "ingest_manifest":
+            return FakeManifestTable(self)
+        return self
+
+    def select(self, columns):
+        return FakeQuery(self, "select")
+
+    def delete(self):
+        return FakeQuery(self, "delete")
+
+    def update(self, payload):
+        return FakeQuery(self, "update", payload)
+
+    def rpc(self, name, params):
+        """update_documents_metadata"""
+        metadata_by_id = {row["id"]: row["metadata"] for row in params["p_rows"]}
+        for row in self.rows:
+            if row["id"] in metadata_by_id:
+                row["metadata"] = metadata_by_id[row["id"]]
+        return type("Call", (), {"execute": lambda self: type("Result", (), {"data": len(metadata_by_id)})()})()
+
+    def visible(self, corpus_version):
+        """Lo que devolvería match_documents con el filtro de la versión activa."""
+        return sorted(
+            row["content"] for row in self.rows
+            if row["metadata"].get("corpus_version") == corpus_version
+        )
+
+
+class FakePublisher(CorpusPublisher):
+    """Reproduce en memoria las funciones SQL de la migración de versiones."""
+
+    def __init__(self, client):
+        super().__init__(client)
+        self.versions = {}
+        self.counter = 0
+
+    def _version_with_status(self, status):
+        for version, entry in self.versions.items():
+            if entry["status"] == status:
+                return dict(entry, version=version)
+        return None
+
+    def begin(self, label=None):
+        staging = self.staging()
+        if staging:
+            return staging["version"], True
+        self.counter += 1
+        label = label or f"v{self.counter}"
+        active = self.active()
+        origin = active["version"] if active else None
+        for row in list(self.client.rows):
+            if row["metadata"].get("corpus_version") == origin:
+                metadata = dict(row["metadata"], corpus_version=label)
+                self.client.rows.append({"id": str(uuid.uuid4()), "content": row["content"], "metadata": metadata})
+        for (source, version, corpus), entry in list(self.client.completed.items()):
+            if corpus == (origin or ""):
+                self.client.completed[(source, version, label)] = dict(entry, corpus_version=label)
+        self.versions[label] = {"status": "staging", "chunk_count": None}
+        return label, False
+
+    def completed(self, corpus_version):
+        return {
+            (source, version): entry
+            for (source, version, corpus), entry in self.client.completed.items()
+            if corpus == (corpus_version or "")
+        }
+
+    def count_rows(self, corpus_version, source=None, version=None):
+        return sum(
+            1 for row in self.client.rows
+            if row["metadata"].get("corpus_version") == corpus_version
+            and (source is None or (row["metadata"]["source"], str(row["metadata"]["version"])) == (source, str(version)))
+        )
+
+    def remove_documents(self, corpus_version, keys):
+        keys = list(keys)
+        for source, version in keys:
+            self.client.rows = [
+                row for row in self.client.rows
+                if not (row["metadata"].get("corpus_version") == corpus_version
+                        and (row["metadata"]["source"], str(row["metadata"]["version"])) == (source, version))
+            ]
+            self.client.completed.pop((source, version, corpus_version), None)
+        return keys
+
+    def activate(self, corpus_version):
+        for entry in self.versions.values():
+            if entry["status"] == "active":
+                entry["status"] = "retired"
+        self.versions[corpus_version].update(status="active", chunk_count=self.count_rows(corpus_version))
+        return {"active": corpus_version}
+
+    def gc(self, keep=None):
+        keep_versions = {v for v, e in self.versions.items() if e["status"] in ("active", "staging")}
+        retired = [v for v, e in self.versions.items() if e["status"] == "retired"]
+        keep_versions.update(retired[-keep:] if keep else [])
+        before = len(self.client.rows)
+        self.client.rows = [row for row in self.client.rows if row["metadata"].get("corpus_version") in keep_versions]
+        return before - len(self.client.rows)
+
+
+class FakeStage:
+    batch_size = 10
+    concurrency = 1
+
+    def __init__(self, client, fail_on=None):
+        self.client = client
+        self.fail_on = fail_on
+        self.embedded = []
+
+    def upload(self, texts, metadatas):
+        if self.fail_on and any(meta["source"] == self.fail_on for meta in metadatas):
+            raise RuntimeError("conexión perdida")
+        self.embedded.extend(texts)
+        for text, metadata in zip(texts, metadatas):
+            self.client.rows.append({"id": str(uuid.uuid4()), "content": text, "metadata": metadata})
+        return len(texts)
+
+    def report(self):
+        pass
+
+
+CONTENTS = {"a.pdf": ["a0", "a1", "a2"], "b.pdf": ["b0", "b1"]}
+
+
+def fake_document_chunks(path, source_name, category, version, ref=False, source_hash=None):
+    for index, text in enumerate(CONTENTS[source_name]):
+        yield text, {
+            "source": source_name, "type": "pdf", "chunk": index, "page": 1, "category": category,
+            "version": version, "ref": ref, "file_hash": source_hash, "chunk_hash": chunk_hash(text),
+        }
+
+
+DOCS = [
+    {"path": "a.pdf", "name": "a.pdf", "category": "Sueño", "version": "1"},
+    {"path": "b.pdf", "name": "b.pdf", "category": "Sueño", "version": "1"},
+]
+
+
+@pytest.fixture
+def corpus(monkeypatch):
+    client = FakeClient()
+    publisher = FakePublisher(client)
+    hashes = {"a.pdf": "hash-a", "b.pdf": "hash-b"}
+    # Los tests modifican el contenido de los documentos; se restaura al terminar
+    monkeypatch.setitem(CONTENTS, "a.pdf", list(CONTENTS["a.pdf"]))
+    monkeypatch.setitem(CONTENTS, "b.pdf", list(CONTENTS["b.pdf"]))
+    monkeypatch.setattr(ingest, "incremental", IncrementalIngest(client))
+    monkeypatch.setattr(ingest, "publisher", publisher)
+    monkeypatch.setattr(ingest, "iter_document_chunks", fake_document_chunks)
+    monkeypatch.setattr(ingest, "file_hash", lambda path: hashes[path])
+    monkeypatch.setattr(ingest, "embedding_stage", FakeStage(client))
+    return client, publisher, hashes
+
+
+def test_publish_flips_active_version_without_mixing_chunks(corpus, monkeypatch):
+    client, publisher, hashes = corpus
+    first = ingest.publish_corpus(DOCS)
+    assert first["published"] is True
+    assert client.visible("v1") == ["a0", "a1", "a2", "b0", "b1"]
+
+    # a.pdf cambia: la versión nueva solo embebe su chunk nuevo y hasta el flip se sigue sirviendo v1
+    CONTENTS["a.pdf"] = ["a0", "a1", "a3"]
+    hashes["a.pdf"] = "hash-a2"
+    stage = FakeStage(client)
+    monkeypatch.setattr(ingest, "embedding_stage", stage)
+    second = ingest.publish_corpus(DOCS, keep=0)
+
+    assert second["published"] is True
+    assert stage.embedded == ["a3"]
+    assert publisher.active()["version"] == "v2"
+    assert client.visible("v2") == ["a0", "a1", "a3", "b0", "b1"]
+    # Con keep=0 la versión anterior se borró en bloque
+    assert client.visible("v1") == []
+
+
+def test_nothing_to_publish_when_active_matches_manifest(corpus):
+    client, publisher, _ = corpus
+    ingest.publish_corpus(DOCS)
+    report = ingest.publish_corpus(DOCS)
+
+    assert report["corpus_version"] is None
+    assert publisher.staging() is None
+    assert list(publisher.versions) == ["v1"]
+
+
+def test_failed_run_stays_in_staging_and_is_resumed(corpus, monkeypatch):
+    client, publisher, hashes = corpus
+    ingest.publish_corpus(DOCS)
+
+    CONTENTS["b.pdf"] = ["b0", "b2"]
+    hashes["b.pdf"] = "hash-b2"
+    monkeypatch.setattr(ingest, "embedding_stage", FakeStage(client, fail_on="b.pdf"))
+    report = ingest.publish_corpus(DOCS)
+
+    assert report["published"] is False
+    assert report["failed"] == ["b.pdf"]
+    assert publisher.active()["version"] == "v1"
+    assert publisher.staging()["version"] == "v2"
+
+    monkeypatch.setattr(ingest, "embedding_stage", FakeStage(client))
+    report = ingest.publish_corpus(DOCS)
+    assert report["published"] is True
+    assert report["corpus_version"] == "v2"
+    assert client.visible("v2") == ["a0", "a1", "a2", "b0", "b2"]
+
+
+def test_removed_documents_are_pruned_unless_run_is_partial(corpus):
+    client, publisher, _ = corpus
+    ingest.publish_corpus(DOCS)
+
+    # Con --only (prune=False) b.pdf sigue en la versión nueva aunque no esté en la lista
+    ingest.publish_corpus(DOCS[:1], prune=False)
+    assert publisher.active()["version"] == "v1"
+
+    report = ingest.publish_corpus(DOCS[:1], allow_shrink=True)
+    assert report["published"] is True
+    assert client.visible(report["corpus_version"]) == ["a0", "a1", "a2"]
+
+
+def test_validation_blocks_incomplete_or_shrunken_versions(corpus):
+    client, publisher, _ = corpus
+    ingest.publish_corpus(DOCS)
+    staging, _ = publisher.begin()
+
+    # b.pdf perdió filas en la staging
+    client.rows = [
+        row for row in client.rows
+        if not (row["metadata"].get("corpus_version") == staging and row["content"] == "b1")
+    ]
+    problems = publisher.validate(staging, [("a.pdf", "1"), ("b.pdf", "1")])
+    assert any("b.pdf" in problem for problem in problems)
+
+    publisher.remove_documents(staging, [("b.pdf", "1")])
+    problems = publisher.validate(staging, [("a.pdf", "1")], max_shrink=0.2)
+    assert any("allow-shrink" in problem for problem in problems)
+    assert publisher.validate(staging, [("a.pdf", "1")], allow_shrink=True) == []
+
+
+class FakeVersionsClient:
+    def __init__(self, version):
+        self.version = version
+        self.reads = 0
+
+    def table(self, name):
+        return self
+
+    def select(self, columns):
+        return self
+
+    def eq(self, column, value):
+        return self
+
+    def limit(self, n):
+        return self
+
+    def execute(self):
+        self.reads += 1
+        if isinstance(self.version, Exception):
+            raise self.version
+        return type("Result", (), {"data": [{"version": self.version}] if self.version else []})()
+
+
+def test_active_version_is_cached_and_survives_errors():
+    client = FakeVersionsClient("v1")
+    active = ActiveCorpusVersion(client, refresh_seconds=60)
+    assert active.get() == "v1"
+    assert active.get() == "v1"
+    assert client.reads == 1
+
+    client.version = RuntimeError("timeout")
+    active.invalidate()
+    assert active.get() == "v1"
+
+    client.version = "v2"
+    active.invalidate()
+    assert active.get() == "v2"
+
+
+def test_vector_store_filters_by_active_version():
+    active = ActiveCorpusVersion(FakeVersionsClient("v7"))
+    store = VersionedSupabaseVectorStore(
+        client=None, table_name="documents", query_name="match_documents",
+        embedding=None, active_version=active,
+    )
+    assert store.match_args([0.1], {"source": "siestas.pdf"})["filter"] == {
+        "source": "siestas.pdf", "corpus_version": "v7",
+    }
+    assert store.match_args([0.1], None)["filter"] == {"corpus_version": "v7"}
+
+
+class FakeParams(dict):
+    def set(self, key, value):
+        return FakeParams(self, **{key: value})
+
+
+class FakeRpcClient:
+    """Registra los parámetros PostgREST de la llamada a match_documents."""
+
+    def __init__(self):
+        self.calls = []
+
+    def rpc(self, name, args):
+        client = self
+
+        class Builder:
+            params = FakeParams()
+
+            def execute(self):
+                client.calls.append((args, dict(self.params)))
+                return type("Result", (), {"data": []})()
+
+        return Builder()
+
+
+def test_vector_store_without_active_version_sees_only_unversioned_rows():
+    client = FakeRpcClient()
+    legacy = VersionedSupabaseVectorStore(
+        client=client, table_name="documents", query_name="match_documents",
+        embedding=None, active_version=ActiveCorpusVersion(FakeVersionsClient(None)),
+    )
+    assert "filter" not in legacy.match_args([0.1], None)
+
+    # La staging clonada durante la primera publicación no se mezcla con las filas previas
+    legacy.similarity_search_by_vector_with_relevance_scores([0.1], 4, filter={"source": "siestas.pdf"})
+    args, params = client.calls[-1]
+    assert args["filter"] == {"source": "siestas.pdf"}
+    assert params["and"] == "(metadata->>corpus_version.is.null)"
+
+    legacy.similarity_search_by_vector_with_relevance_scores([0.1], 4, postgrest_filter="metadata->>ref.eq.true")
+    assert client.calls[-1][1]["and"] == "(metadata->>ref.eq.true,metadata->>corpus_version.is.null)"
+
+    versioned = VersionedSupabaseVectorStore(
+        client=client, table_name="documents", query_name="match_documents",
+        embedding=None, active_version=ActiveCorpusVersion(FakeVersionsClient("v7")),
+    )
+    versioned.similarity_search_by_vector_with_relevance_scores([0.1], 4)
+    args, params = client.calls[-1]
+    assert args["filter"] == {"corpus_version": "v7"} and "and" not in params
@@ -0,0 +1,146 @@
+"""
+Tests del cache persistente de embeddings
+"""
+import os
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+os.environ.setdefault("SUPABASE_URL", "http://localhost:54321")
+os.environ.setdefault("SUPABASE_SERVICE_ROLE_KEY", "test")
+os.environ.setdefault("OPENAI_API_KEY", "sk-test")
+
+from src.rag.embedding_cache import CachedEmbeddings, EmbeddingCache, text_hash
+from src.rag.embedding_stage import EmbeddingStage, build_embeddings
+
+
+class CountingEmbeddings:
+    def __init__(self):
+        self.inner = build_embeddings("fake", cache=False)
+        self.embedded = []
+
+    def embed_documents(self, texts):
+        self.embedded.extend(texts)
+        return self.inner.embed_documents(texts)
+
+    def embed_query(self, text):
+        self.embedded.append(text)
+        return self.inner.embed_query(text)
+
+
+def test_cached_embeddings_only_embed_misses(tmp_path):
+    inner = CountingEmbeddings()
+    cached = CachedEmbeddings(inner, "fake", cache=EmbeddingCache(str(tmp_path / "cache.sqlite")))
+
+    first = cached.embed_documents(["a", "b", "a"])
+    second = cached.embed_documents(["b", "c"])
+
+    assert inner.embedded == ["a", "b", "c"]
+    assert first[0] == first[2]
+    assert second[0] == first[1]
+    stats = cached.cache.stats()
+    assert stats["entries"] == 3
+    assert stats["hits"] == 1
+    assert stats["misses"] == 4
+
+
+def test_query_and_documents_share_entries(tmp_path):
+    inner = CountingEmbeddings()
+    cached = CachedEmbeddings(inner, "fake", cache=EmbeddingCache(str(tmp_path / "cache.sqlite")))
+
+    cached.embed_documents(["¿Cuánto duerme un bebé?"])
+    vector = cached.embed_query("¿Cuánto duerme un bebé?")
+
+    assert inner.embedded == ["¿Cuánto duerme un bebé?"]
+    assert len(vector) == len(inner.inner.embed_query("x"))
+
+
+def test_cache_persists_across_instances_and_is_keyed_by_model(tmp_path):
+    path = str(tmp_path / "cache.sqlite")
+    EmbeddingCache(path).put_many("model-a", {text_hash("hola"): [0.5, 0.25]})
+
+    reopened = EmbeddingCache(path)
+    assert reopened.get_many("model-a", [text_hash("hola")]) == {text_hash("hola"): [0.5, 0.25]}
+    assert reopened.get_many("model-b", [text_hash("hola")]) == {}
+
+
+def test_eviction_drops_least_recently_used(tmp_path):
+    # Cada vector de 4 floats ocupa 16 bytes; máximo 3 entradas
+    cache = EmbeddingCache(str(tmp_path / "cache.sqlite"), max_bytes=48)
+    cache.put_many("m", {"old": [0.0] * 4})
+    cache.put_many("m", {"used": [1.0] * 4})
+    cache.put_many("m", {"mid": [2.0] * 4})
+    cache.get_many("m", ["old"])  # "old" pasa a ser el más reciente
+
+    cache.put_many("m", {"new": [3.0] * 4})
+
+    # Se baja al 90% del máximo: salen las dos menos usadas
+    remaining = set(cache.get_many("m", ["old", "used", "mid", "new"]))
+    assert remaining == {"old", "new"}
+    assert cache.stats()["evictions"] == 2
+    assert cache.stats()["bytes"] <= 48
+
+
+def test_hits_write_last_used_in_batches(tmp_path):
+    cache = EmbeddingCache(str(tmp_path / "cache.sqlite"), touch_seconds=3600)
+    cache.put_many("m", {"a": [0.0] * 4})
+    before = cache._conn.execute("SELECT last_used FROM embeddings").fetchone()[0]
+
+    for _ in range(5):
+        cache.get_many("m", ["a"])
+    # Los aciertos no escriben hasta el próximo flush
+    assert cache._conn.execute("SELECT last_used FROM embeddings").fetchone()[0] == before
+
+    cache.put_many("m", {"b": [1.0] * 4})
+    assert cache._conn.execute("SELECT last_used FROM embeddings WHERE text_hash = 'a'").fetchone()[0] > before
+
+
+def test_cache_errors_fall_back_to_the_model(tmp_path):
+    import sqlite3
+
+    class BrokenCache:
+        def get_many(self, model, hashes):
+            raise sqlite3.OperationalError("database is locked")
+
+        def contains_many(self, model, hashes):
+            raise sqlite3.OperationalError("database is locked")
+
+        def put_many(self, model, vectors):
+            raise sqlite3.OperationalError("disk I/O error")
+
+    inner = CountingEmbeddings()
+    cached = CachedEmbeddings(inner, "fake", cache=BrokenCache())
+
+    assert len(cached.embed_query("hola")) == len(inner.inner.embed_query("hola"))
+    assert len(cached.embed_documents(["a", "b"])) == 2
+    assert inner.embedded == ["hola", "a", "b"]
+    assert cached.missing_texts(["a", "b"]) == ["a", "b"]
+
+
+def test_stage_reserves_tokens_only_for_uncached_texts(tmp_path):
+    reserved = []
+
+    class RecordingLimiter:
+        def acquire_sync(self, tokens):
+            reserved.append(tokens)
+
+    class NullClient:
+        def table(self, name):
+            return self
+
+        def upsert(self, rows):
+            return self
+
+        def execute(self):
+            return None
+
+    cached = CachedEmbeddings(CountingEmbeddings(), "fake", cache=EmbeddingCache(str(tmp_path / "cache.sqlite")))
+    stage = EmbeddingStage(cached, NullClient(), batch_size=10, concurrency=1, rate_limiter=RecordingLimiter())
+
+    stage.upload(["a" * 40], [{}])
+    stage.upload(["a" * 40, "b" * 8], [{}, {}])
+    stage.upload(["a" * 40, "b" * 8], [{}, {}])
+
+    assert reserved == [10, 2]
+    stage.close()
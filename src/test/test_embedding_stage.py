@@ -0,0 +1,167 @@
+"""
+Tests de la etapa de embeddings en lotes de la ingesta
+"""
+import os
+import sys
+import threading
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+os.environ.setdefault("SUPABASE_URL", "http://localhost:54321")
+os.environ.setdefault("SUPABASE_SERVICE_ROLE_KEY", "test")
+os.environ.setdefault("OPENAI_API_KEY", "sk-test")
+
+from src.rag import embedding_stage
+from src.rag.embedding_stage import EmbeddingBatchError, EmbeddingStage, build_embeddings
+from src.utils.admission_control import OpenAIRateLimiter
+
+
+class FakeQuery:
+    def __init__(self, client, table, rows):
+        self.client = client
+        self.table = table
+        self.rows = rows
+
+    def execute(self):
+        with self.client.lock:
+            if self.client.insert_failures:
+                self.client.insert_failures -= 1
+                raise RuntimeError("connection reset")
+            self.client.upserts.append((self.table, self.rows))
+
+
+class FakeTable:
+    def __init__(self, client, name):
+        self.client = client
+        self.name = name
+
+    def upsert(self, rows):
+        return FakeQuery(self.client, self.name, rows)
+
+
+class FakeClient:
+    def __init__(self, insert_failures=0):
+        self.upserts = []
+        self.insert_failures = insert_failures
+        self.lock = threading.Lock()
+
+    def table(self, name):
+        return FakeTable(self, name)
+
+
+class CountingEmbeddings:
+    def __init__(self, failures=0):
+        self.inner = build_embeddings("fake", cache=False)
+        self.calls = []
+        self.failures = failures
+        self.lock = threading.Lock()
+
+    def embed_documents(self, texts):
+        with self.lock:
+            self.calls.append(len(texts))
+            if self.failures:
+                self.failures -= 1
+                raise RuntimeError("429 rate limit")
+        return self.inner.embed_documents(texts)
+
+
+@pytest.fixture(autouse=True)
+def no_backoff_sleep(monkeypatch):
+    monkeypatch.setattr(embedding_stage.time, "sleep", lambda seconds: None)
+
+
+def chunks(n, source="guia"):
+    texts = [f"texto {i}" for i in range(n)]
+    metas = [{"source": source, "chunk": i} for i in range(n)]
+    return texts, metas
+
+
+def make_stage(embeddings, client, **kwargs):
+    limiter = OpenAIRateLimiter(rpm=10_000, tpm=10_000_000, max_wait=float("inf"))
+    return EmbeddingStage(embeddings, client, rate_limiter=limiter, **kwargs)
+
+
+def test_fake_backend_is_deterministic():
+    embeddings = build_embeddings("fake", cache=False)
+    first = embeddings.embed_documents(["hola"])[0]
+    assert len(first) == embedding_stage.EMBEDDING_DIMENSIONS
+    assert first == embeddings.embed_documents(["hola"])[0]
+
+
+def test_upload_splits_into_batches_and_bulk_inserts():
+    embeddings = CountingEmbeddings()
+    client = FakeClient()
+    stage = make_stage(embeddings, client, batch_size=4, concurrency=2)
+
+    texts, metas = chunks(10)
+    assert stage.upload(texts, metas) == 10
+
+    assert sorted(embeddings.calls) == [2, 4, 4]
+    assert len(client.upserts) == 3
+    rows = [row for _, batch in client.upserts for row in batch]
+    assert {row["content"] for row in rows} == set(texts)
+    assert all(table == "documents" for table, _ in client.upserts)
+    assert all(len(row["embedding"]) == embedding_stage.EMBEDDING_DIMENSIONS for row in rows)
+    assert len({row["id"] for row in rows}) == 10
+
+    stats = stage.stats()
+    assert stats["chunks"] == 10
+    assert stats["batches"] == 3
+    stage.close()
+
+
+def test_failed_embedding_is_retried_without_duplicates():
+    embeddings = CountingEmbeddings(failures=2)
+    client = FakeClient()
+    stage = make_stage(embeddings, client, batch_size=5, concurrency=1)
+
+    stage.upload(*chunks(5))
+
+    assert embeddings.calls == [5, 5, 5]
+    assert len(client.upserts) == 1
+    assert stage.stats()["retries"] == 2
+    stage.close()
+
+
+def test_failed_insert_does_not_re_embed():
+    embeddings = CountingEmbeddings()
+    client = FakeClient(insert_failures=1)
+    stage = make_stage(embeddings, client, batch_size=5, concurrency=1)
+
+    stage.upload(*chunks(5))
+
+    assert embeddings.calls == [5]
+    assert len(client.upserts) == 1
+    stage.close()
+
+
+def test_exhausted_batch_raises_after_other_batches_finish():
+    embeddings = CountingEmbeddings(failures=3)
+    client = FakeClient()
+    stage = make_stage(embeddings, client, batch_size=5, concurrency=1, max_attempts=3)
+
+    with pytest.raises(EmbeddingBatchError):
+        stage.upload(*chunks(10))
+
+    # El primer lote agotó sus intentos; el segundo se insertó igual
+    assert len(client.upserts) == 1
+    assert stage.stats()["failed_batches"] == 1
+    stage.close()
+
+
+def test_rate_limiter_receives_estimated_tokens():
+    reserved = []
+
+    class RecordingLimiter:
+        def acquire_sync(self, tokens):
+            reserved.append(tokens)
+
+    stage = EmbeddingStage(CountingEmbeddings(), FakeClient(), batch_size=2, concurrency=1,
+                           rate_limiter=RecordingLimiter())
+    stage.upload(["a" * 40, "b" * 40, "c" * 8], [{}, {}, {}])
+
+    assert sorted(reserved) == [2, 20]
+    stage.close()
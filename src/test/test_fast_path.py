@@ -0,0 +1,38 @@
+"""
+Tests del fast path para saludos y mensajes triviales
+"""
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+from src.utils.fast_path import (
+    build_fast_path_response,
+    classify_trivial_message,
+    is_simple_greeting,
+)
+
+
+def test_classify_trivial_messages():
+    assert classify_trivial_message("¡Hola Lumi!") == "greeting"
+    assert classify_trivial_message("Buenos días 😊") == "greeting"
+    assert classify_trivial_message("Muchas gracias!!") == "thanks"
+    assert classify_trivial_message("Obrigada") == "thanks"
+    assert classify_trivial_message("see you later") == "farewell"
+
+
+def test_real_questions_are_not_trivial():
+    assert classify_trivial_message("hola, mi bebé no duerme bien") is None
+    assert classify_trivial_message("gracias, ¿y cuántas siestas necesita?") is None
+    assert classify_trivial_message("   ") is None
+    assert not is_simple_greeting("hola, tengo una duda")
+
+
+def test_response_uses_language_and_baby_name():
+    assert "Sofía" in build_fast_path_response("greeting", "es", "Sofía")
+    assert build_fast_path_response("thanks", "en").startswith("You're very welcome")
+    assert build_fast_path_response("farewell", "pt", "Leo") == "Até logo! 🌙 Um abraço para você e para Leo."
+
+
+def test_unknown_language_falls_back_to_spanish():
+    assert build_fast_path_response("thanks", "fr").startswith("¡Con mucho gusto!")
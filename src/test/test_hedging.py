@@ -0,0 +1,194 @@
+"""
+Tests del hedging de solicitudes lentas
+"""
+import asyncio
+import sys
+from pathlib import Path
+
+import httpx
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+from src.utils.hedging import HedgeBudget, LatencyTracker, run_hedged
+
+
+def test_latency_tracker_percentile_and_default():
+    tracker = LatencyTracker(window=100, min_samples=10, default_delay=20.0)
+    assert tracker.hedge_delay(95, min_delay=1.0) == 20.0
+
+    for value in range(1, 101):
+        tracker.record(float(value))
+    assert tracker.percentile(95) == 95.0
+    assert tracker.percentile(50) == 50.0
+    assert tracker.hedge_delay(50, min_delay=60.0) == 60.0
+
+
+def test_hedge_budget_caps_ratio():
+    budget = HedgeBudget(ratio=0.05)
+    allowed = 0
+    for _ in range(200):
+        budget.record_request()
+        if budget.try_acquire():
+            allowed += 1
+    assert allowed == 10
+    assert budget.get_stats()["hedge_ratio"] == 0.05
+
+
+def test_slow_primary_is_hedged_and_cancelled():
+    calls = []
+    cancelled = []
+
+    async def call():
+        index = len(calls)
+        calls.append(index)
+        try:
+            await asyncio.sleep(1.0 if index == 0 else 0.01)
+        except asyncio.CancelledError:
+            cancelled.append(index)
+            raise
+        return index
+
+    async def scenario():
+        budget = HedgeBudget(ratio=1.0)
+        budget.record_request()
+        result = await run_hedged(call, delay=0.02, budget=budget)
+        await asyncio.sleep(0)
+        return result
+
+    assert asyncio.run(scenario()) == 1
+    assert cancelled == [0]
+
+
+def test_no_hedge_without_budget():
+    calls = []
+
+    async def call():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return "ok"
+
+    budget = HedgeBudget(ratio=0.0)
+    assert asyncio.run(run_hedged(call, delay=0.01, budget=budget)) == "ok"
+    assert len(calls) == 1
+
+
+def test_failed_hedge_falls_back_to_primary():
+    calls = []
+
+    async def call():
+        index = len(calls)
+        calls.append(index)
+        if index == 1:
+            raise ConnectionError("hedge failed")
+        await asyncio.sleep(0.05)
+        return "primary"
+
+    budget = HedgeBudget(ratio=1.0)
+    budget.record_request()
+    assert asyncio.run(run_hedged(call, delay=0.01, budget=budget)) == "primary"
+
+
+def test_error_response_does_not_beat_slower_success():
+    calls = []
+
+    async def call():
+        index = len(calls)
+        calls.append(index)
+        if index == 1:
+            await asyncio.sleep(0.01)
+            return 503
+        await asyncio.sleep(0.05)
+        return 200
+
+    budget = HedgeBudget(ratio=1.0)
+    budget.record_request()
+    result = asyncio.run(run_hedged(call, delay=0.01, budget=budget, is_success=lambda status: status == 200))
+    assert result == 200
+
+    # Si las dos responden con error se retorna el error
+    calls.clear()
+
+    async def always_failing():
+        calls.append(1)
+        await asyncio.sleep(0.02)
+        return 503
+
+    budget.record_request()
+    assert asyncio.run(run_hedged(always_failing, delay=0.01, budget=budget, is_success=lambda status: status == 200)) == 503
+    assert len(calls) == 2
+
+
+def test_budget_counts_each_logical_request_once(monkeypatch):
+    from src.utils import openai_client
+    from src.utils.resilience import ResiliencePolicy
+
+    budget = HedgeBudget(ratio=0.5)
+    statuses = iter([503, 503, 200])
+
+    async def fake_post(self, url, **kwargs):
+        return httpx.Response(next(statuses), request=httpx.Request("POST", url))
+
+    async def no_wait(tokens):
+        return None
+
+    monkeypatch.setattr(openai_client, "OPENAI_HEDGING_ENABLED", True)
+    monkeypatch.setattr(openai_client, "openai_hedge_budget", budget)
+    monkeypatch.setattr(openai_client.openai_rate_limiter, "acquire", no_wait)
+    monkeypatch.setattr(httpx.AsyncClient, "post", fake_post)
+    policy = ResiliencePolicy("test", deadline=5, max_attempts=3, base_delay=0.01, max_delay=0.01)
+
+    response = asyncio.run(openai_client.create_chat_completion({"messages": []}, policy=policy, hedge=True))
+    assert response.status_code == 200
+    assert budget.get_stats()["requests"] == 1
+
+
+class _Response:
+    def __init__(self, status_code):
+        self.status_code = status_code
+        self.closed = False
+
+    async def aclose(self):
+        self.closed = True
+
+
+def test_discarded_responses_are_closed():
+    responses = []
+
+    async def call():
+        index = len(responses)
+        response = _Response(503 if index == 1 else 200)
+        responses.append(response)
+        await asyncio.sleep(0.05 if index == 0 else 0.01)
+        return response
+
+    budget = HedgeBudget(ratio=1.0)
+    budget.record_request()
+    result = asyncio.run(run_hedged(call, delay=0.01, budget=budget, is_success=lambda r: r.status_code == 200))
+
+    assert result is responses[0] and not result.closed
+    assert responses[1].closed
+
+
+def test_caller_cancellation_cancels_the_primary():
+    cancelled = []
+
+    async def call():
+        try:
+            await asyncio.sleep(1.0)
+        except asyncio.CancelledError:
+            cancelled.append(True)
+            raise
+        return "ok"
+
+    async def scenario():
+        task = asyncio.ensure_future(run_hedged(call, delay=0.5, budget=HedgeBudget(ratio=1.0)))
+        await asyncio.sleep(0.01)
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+        await asyncio.sleep(0)
+
+    asyncio.run(scenario())
+    assert cancelled == [True]
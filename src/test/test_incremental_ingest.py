@@ -0,0 +1,245 @@
+"""
+Tests de la ingesta incremental por hash de archivo y de chunk
+"""
+import os
+import sys
+import uuid
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+os.environ.setdefault("SUPABASE_URL", "http://localhost:54321")
+os.environ.setdefault("SUPABASE_SERVICE_ROLE_KEY", "test")
+os.environ.setdefault("OPENAI_API_KEY", "sk-test")
+
+from src.rag.chunking import chunk_hash, file_hash
+from src.rag.incremental import IncrementalIngest, StoredManifest, plan_incremental
+
+
+class FakeQuery:
+    def __init__(self, client, op, payload=None):
+        self.client = client
+        self.op = op
+        self.payload = payload
+        self.filters = {}
+        self.ids = None
+        self.bounds = None
+
+    def eq(self, column, value):
+        self.filters[column] = value
+        return self
+
+    def in_(self, column, values):
+        self.ids = set(values)
+        return self
+
+    def is_(self, column, value):
+        # Solo se usa con "null": la fila no debe tener ese campo
+        self.filters[column] = None
+        return self
+
+    def order(self, column):
+        return self
+
+    def range(self, start, end):
+        self.bounds = (start, end)
+        return self
+
+    def _matches(self, row):
+        for column, value in self.filters.items():
+            if column == "id":
+                if row["id"] != value:
+                    return False
+            elif str(row["metadata"].get(column.split("->>")[1])) != str(value):
+                return False
+        return True
+
+    def execute(self):
+        self.client.calls.append(self.op)
+        rows = self.client.rows
+        if self.op == "select":
+            data = [dict(row) for row in rows if self._matches(row)]
+            start, end = self.bounds
+            return type("Result", (), {"data": data[start:end + 1]})()
+        if self.op == "delete":
+            self.client.rows = [row for row in rows if row["id"] not in self.ids]
+        if self.op == "update":
+            for row in rows:
+                if self._matches(row):
+                    row.update(self.payload)
+        return type("Result", (), {"data": []})()
+
+
+class FakeTable:
+    def __init__(self, client):
+        self.client = client
+
+    def select(self, columns):
+        return FakeQuery(self.client, "select")
+
+    def delete(self):
+        return FakeQuery(self.client, "delete")
+
+    def update(self, payload):
+        return FakeQuery(self.client, "update", payload)
+
+
+class FakeManifestTable:
+    """ingest_manifest: una fila por (source, version)."""
+
+    def __init__(self, client):
+        self.client = client
+        self.filters = {}
+        self.row = None
+
+    def select(self, columns):
+        self.filters = {}
+        return self
+
+    def eq(self, column, value):
+        self.filters[column] = value
+        return self
+
+    def upsert(self, row, on_conflict=None):
+        self.row = row
+        return self
+
+    def execute(self):
+        if self.row is not None:
+            self.client.completed[(self.row["source"], self.row["version"])] = self.row
+            self.row = None
+            return type("Result", (), {"data": []})()
+        found = self.client.completed.get((self.filters["source"], self.filters["version"]))
+        return type("Result", (), {"data": [found] if found else []})()
+
+
+class FakeClient:
+    def __init__(self):
+        self.rows = []
+        self.calls = []
+        self.completed = {}
+
+    def table(self, name):
+        if name == "ingest_manifest":
+            return FakeManifestTable(self)
+        return FakeTable(self)
+
+    def rpc(self, name, params):
+        """update_documents_metadata: una llamada por lote."""
+        self.calls.append(name)
+        metadata_by_id = {row["id"]: row["metadata"] for row in params["p_rows"]}
+        for row in self.rows:
+            if row["id"] in metadata_by_id:
+                row["metadata"] = metadata_by_id[row["id"]]
+        return type("Call", (), {"execute": lambda self: type("Result", (), {"data": len(metadata_by_id)})()})()
+
+
+def make_chunks(texts, category="sueño", version="v1"):
+    metas = [
+        {"source": "guia", "type": "pdf", "chunk": i, "category": category, "version": version,
+         "ref": False, "file_hash": "f" + "".join(texts), "chunk_hash": chunk_hash(text)}
+        for i, text in enumerate(texts)
+    ]
+    return list(texts), metas
+
+
+class RecordingUpload:
+    def __init__(self, client):
+        self.client = client
+        self.embedded = []
+
+    def __call__(self, texts, metadatas):
+        self.embedded.extend(texts)
+        for text, metadata in zip(texts, metadatas):
+            self.client.rows.append({"id": str(uuid.uuid4()), "content": text, "metadata": metadata})
+        return len(texts)
+
+
+def test_file_hash_and_chunk_hash_are_stable(tmp_path):
+    path = tmp_path / "doc.pdf"
+    path.write_bytes(b"%PDF contenido")
+    assert file_hash(path) == file_hash(path)
+    assert chunk_hash("hola") == chunk_hash("hola") != chunk_hash("hola!")
+
+
+def test_rerun_on_unchanged_document_embeds_nothing():
+    client = FakeClient()
+    ingest = IncrementalIngest(client)
+    upload = RecordingUpload(client)
+    texts, metas = make_chunks(["a", "b", "c"])
+
+    first = ingest.sync(texts, metas, upload)
+    second = ingest.sync(texts, metas, upload)
+
+    assert first["embedded"] == 3
+    assert second == {"embedded": 0, "unchanged": 3, "deleted": 0, "relabeled": 0}
+    assert upload.embedded == ["a", "b", "c"]
+    assert len(client.rows) == 3
+
+    manifest = ingest.load_manifest("guia", "v1")
+    assert manifest.is_current(metas[0]["file_hash"], "sueño", False)
+    assert not manifest.is_current("otro-hash", "sueño", False)
+
+
+def test_changed_chunk_is_replaced_and_shifted_chunks_relabeled():
+    client = FakeClient()
+    ingest = IncrementalIngest(client)
+    upload = RecordingUpload(client)
+    ingest.sync(*make_chunks(["a", "b", "c"]), upload)
+
+    result = ingest.sync(*make_chunks(["nuevo", "a", "c"]), upload)
+
+    assert upload.embedded[-1:] == ["nuevo"]
+    assert result["embedded"] == 1
+    assert result["deleted"] == 1
+    # "a" y "c" se conservan con el nuevo índice de chunk
+    by_content = {row["content"]: row["metadata"]["chunk"] for row in client.rows}
+    assert by_content == {"nuevo": 0, "a": 1, "c": 2}
+    # Las dos filas corridas se actualizan en una sola llamada
+    assert result["relabeled"] == 2
+    assert client.calls.count("update_documents_metadata") == 1
+    assert "update" not in client.calls
+
+
+def test_other_versions_are_untouched():
+    client = FakeClient()
+    ingest = IncrementalIngest(client)
+    upload = RecordingUpload(client)
+    ingest.sync(*make_chunks(["a", "b"], version="v1"), upload)
+    ingest.sync(*make_chunks(["a"], version="v2"), upload)
+
+    versions = sorted(row["metadata"]["version"] for row in client.rows)
+    assert versions == ["v1", "v1", "v2"]
+
+
+def test_plan_replaces_legacy_rows_and_category_changes():
+    _, metas = make_chunks(["a", "a", "b"])
+    manifest = StoredManifest("guia", "v1", rows=[
+        {"id": "legacy", "metadata": {"source": "guia", "chunk": 0}},
+        {"id": "a1", "metadata": dict(metas[0])},
+        {"id": "b-old-category", "metadata": dict(metas[2], category="salud")},
+    ])
+
+    plan = plan_incremental(metas, manifest)
+
+    # El segundo "a" necesita su propia fila; "b" cambió de categoría
+    assert plan.new_indices == [1, 2]
+    assert sorted(plan.stale_ids) == ["b-old-category", "legacy"]
+    assert plan.unchanged == 1
+    assert not manifest.is_current(metas[0]["file_hash"], "sueño", False)
+
+
+def test_document_interrupted_midway_is_not_current():
+    client = FakeClient()
+    ingest = IncrementalIngest(client)
+    texts, metas = make_chunks(["a", "b", "c"])
+
+    session = ingest.start("guia", "v1")
+    session.add_batch(texts[:2], metas[:2], RecordingUpload(client))
+    # Se cortó antes de finish(): las filas subidas comparten hash de archivo pero faltan chunks
+    assert not ingest.load_manifest("guia", "v1").is_current(metas[0]["file_hash"], "sueño", False)
+
+    session = ingest.start("guia", "v1")
+    session.add_batch(texts, metas, RecordingUpload(client))
+    assert session.finish()["embedded"] == 1
+    assert ingest.load_manifest("guia", "v1").is_current(metas[0]["file_hash"], "sueño", False)
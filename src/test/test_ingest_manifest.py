@@ -0,0 +1,271 @@
+"""
+Tests del manifiesto de corpus, el checkpoint y la ingesta reanudable
+"""
+import os
+import sys
+import uuid
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+os.environ.setdefault("SUPABASE_URL", "http://localhost:54321")
+os.environ.setdefault("SUPABASE_SERVICE_ROLE_KEY", "test")
+os.environ.setdefault("OPENAI_API_KEY", "sk-test")
+
+from src.rag import ingest
+from src.rag.chunking import chunk_hash
+from src.rag.corpus_manifest import IngestCheckpoint, filter_documents, load_corpus_manifest
+from src.rag.incremental import IncrementalIngest
+
+MANIFEST = """
+defaults:
+  category: Sueño y descanso
+documents:
+  - path: docs/1/Siestas.pdf
+    name: Siestas.pdf
+    version: 1
+  - path: docs/1/referencias/Siestas_ref.pdf
+    name: Siestas_ref.pdf
+    version: 1
+    ref: true
+  - path: docs/4/limites.pdf
+    name: limites.pdf
+    category: Emociones, vínculos y crianza respetuosa
+  - path: docs/5/viejo.pdf
+    name: viejo.pdf
+    enabled: false
+"""
+
+
+def test_load_manifest_applies_defaults_and_resolves_paths(tmp_path):
+    manifest_path = tmp_path / "ingest_manifest.yaml"
+    manifest_path.write_text(MANIFEST, encoding="utf-8")
+
+    documents = load_corpus_manifest(str(manifest_path), default_version="1.0")
+
+    assert [doc.name for doc in documents] == ["Siestas.pdf", "Siestas_ref.pdf", "limites.pdf", "viejo.pdf"]
+    assert documents[0].path == str(tmp_path / "docs/1/Siestas.pdf")
+    assert documents[1].ref is True
+    assert documents[2].category == "Emociones, vínculos y crianza respetuosa"
+    assert documents[2].version == "1.0"
+    assert documents[0].key == "siestas.pdf@1"
+
+
+def test_load_manifest_rejects_incomplete_and_duplicated_entries(tmp_path):
+    manifest_path = tmp_path / "m.yaml"
+    manifest_path.write_text("documents:\n  - path: a.pdf\n    name: a.pdf\n", encoding="utf-8")
+    with pytest.raises(ValueError, match="category"):
+        load_corpus_manifest(str(manifest_path))
+
+    manifest_path.write_text(
+        "documents:\n"
+        "  - {path: a.pdf, name: a.pdf, category: x, version: 1}\n"
+        "  - {path: b.pdf, name: A.pdf, category: x, version: 1}\n",
+        encoding="utf-8",
+    )
+    with pytest.raises(ValueError, match="duplicado"):
+        load_corpus_manifest(str(manifest_path))
+
+
+def test_filter_documents_by_name_path_and_enabled(tmp_path):
+    manifest_path = tmp_path / "m.yaml"
+    manifest_path.write_text(MANIFEST, encoding="utf-8")
+    documents = load_corpus_manifest(str(manifest_path))
+
+    assert [doc.name for doc in filter_documents(documents)] == ["Siestas.pdf", "Siestas_ref.pdf", "limites.pdf"]
+    assert [doc.name for doc in filter_documents(documents, only=["*_ref.pdf"])] == ["Siestas_ref.pdf"]
+    assert [doc.name for doc in filter_documents(documents, only=["docs/4/*"])] == ["limites.pdf"]
+    assert filter_documents(documents, only=["viejo.pdf"]) == []
+
+
+def test_repo_manifest_is_valid():
+    repo_manifest = Path(__file__).resolve().parents[2] / "ingest_manifest.yaml"
+    documents = load_corpus_manifest(str(repo_manifest))
+    assert documents
+    assert all(doc.category for doc in documents)
+
+
+class FakeQuery:
+    def __init__(self, client, op, payload=None):
+        self.client = client
+        self.op = op
+        self.payload = payload
+        self.filters = {}
+        self.ids = None
+        self.bounds = (0, 10 ** 9)
+
+    def eq(self, column, value):
+        self.filters[column] = value
+        return self
+
+    def in_(self, column, values):
+        self.ids = set(values)
+        return self
+
+    def is_(self, column, value):
+        # Solo se usa con "null": la fila no debe tener ese campo
+        self.filters[column] = None
+        return self
+
+    def order(self, column):
+        return self
+
+    def range(self, start, end):
+        self.bounds = (start, end)
+        return self
+
+    def _matches(self, row):
+        for column, value in self.filters.items():
+            if column == "id":
+                if row["id"] != value:
+                    return False
+            elif str(row["metadata"].get(column.split("->>")[1])) != str(value):
+                return False
+        return True
+
+    def execute(self):
+        if self.op == "select":
+            data = [dict(row) for row in self.client.rows if self._matches(row)]
+            return type("Result", (), {"data": data[self.bounds[0]:self.bounds[1] + 1]})()
+        if self.op == "delete":
+            self.client.rows = [row for row in self.client.rows if row["id"] not in self.ids]
+        if self.op == "update":
+            for row in self.client.rows:
+                if self._matches(row):
+                    row.update(self.payload)
+        return type("Result", (), {"data": []})()
+
+
+class FakeManifestTable:
+    """ingest_manifest: una fila por (source, version)."""
+
+    def __init__(self, client):
+        self.client = client
+        self.filters = {}
+        self.row = None
+
+    def select(self, columns):
+        self.filters = {}
+        return self
+
+    def eq(self, column, value):
+        self.filters[column] = value
+        return self
+
+    def upsert(self, row, on_conflict=None):
+        self.row = row
+        return self
+
+    def execute(self):
+        if self.row is not None:
+            self.client.completed[(self.row["source"], self.row["version"])] = self.row
+            self.row = None
+            return type("Result", (), {"data": []})()
+        found = self.client.completed.get((self.filters["source"], self.filters["version"]))
+        return type("Result", (), {"data": [found] if found else []})()
+
+
+class FakeClient:
+    def __init__(self):
+        self.rows = []
+        self.completed = {}
+
+    def table(self, name):
+        if name == "ingest_manifest":
+            return FakeManifestTable(self)
+        return self
+
+    def select(self, columns):
+        return FakeQuery(self, "select")
+
+    def delete(self):
+        return FakeQuery(self, "delete")
+
+    def update(self, payload):
+        return FakeQuery(self, "update", payload)
+
+
+class FakeStage:
+    """Sustituto de EmbeddingStage que guarda filas y puede fallar a mitad de corrida."""
+
+    batch_size = 2
+    concurrency = 1
+
+    def __init__(self, client, fail_after=None):
+        self.client = client
+        self.fail_after = fail_after
+        self.embedded = []
+
+    def upload(self, texts, metadatas):
+        if self.fail_after is not None and len(self.embedded) >= self.fail_after:
+            raise RuntimeError("conexión perdida")
+        self.embedded.extend(texts)
+        for text, metadata in zip(texts, metadatas):
+            self.client.rows.append({"id": str(uuid.uuid4()), "content": text, "metadata": metadata})
+        return len(texts)
+
+    def report(self):
+        pass
+
+
+def fake_document_chunks(path, source_name, category, version, ref=False, source_hash=None):
+    for index in range(5):
+        text = f"{source_name} chunk {index}"
+        yield text, {
+            "source": source_name, "type": "pdf", "chunk": index, "page": 1, "category": category,
+            "version": version, "ref": ref, "file_hash": source_hash, "chunk_hash": chunk_hash(text),
+        }
+
+
+@pytest.fixture
+def fake_ingest(monkeypatch):
+    client = FakeClient()
+    monkeypatch.setattr(ingest, "incremental", IncrementalIngest(client))
+    monkeypatch.setattr(ingest, "iter_document_chunks", fake_document_chunks)
+    monkeypatch.setattr(ingest, "file_hash", lambda path: f"hash-{path}")
+    return client
+
+
+DOCS = [
+    {"path": "a.pdf", "name": "a.pdf", "category": "Sueño", "version": 1},
+    {"path": "b.pdf", "name": "b.pdf", "category": "Sueño", "version": 1},
+]
+
+
+def test_interrupted_run_resumes_without_re_embedding(fake_ingest, monkeypatch, tmp_path):
+    checkpoint = IngestCheckpoint(str(tmp_path / "checkpoint.json"))
+
+    # Primera corrida: se cae a mitad de b.pdf (a.pdf tiene 5 chunks, el lote 2 de b falla)
+    crashing = FakeStage(fake_ingest, fail_after=7)
+    monkeypatch.setattr(ingest, "embedding_stage", crashing)
+    report = ingest.ingest_documents(DOCS, checkpoint=checkpoint)
+    assert report["failed"] == ["b.pdf"]
+    assert IngestCheckpoint(checkpoint.path).resume_point("b.pdf@1", "hash-b.pdf") == 1
+
+    # Segunda corrida: a.pdf está terminado y de b.pdf solo se embebe lo que faltaba
+    resumed = FakeStage(fake_ingest)
+    monkeypatch.setattr(ingest, "embedding_stage", resumed)
+    report = ingest.ingest_documents(DOCS, checkpoint=IngestCheckpoint(checkpoint.path))
+
+    assert report["failed"] == []
+    assert resumed.embedded == ["b.pdf chunk 2", "b.pdf chunk 3", "b.pdf chunk 4"]
+    assert len(fake_ingest.rows) == 10
+    assert report["unchanged"] == 1
+    assert report["embedded"] == 3
+
+
+def test_changed_filter_skips_documents_finished_with_same_hash(fake_ingest, monkeypatch, tmp_path):
+    checkpoint = IngestCheckpoint(str(tmp_path / "checkpoint.json"))
+    monkeypatch.setattr(ingest, "embedding_stage", FakeStage(fake_ingest))
+    ingest.ingest_documents(DOCS, checkpoint=checkpoint)
+
+    def no_manifest(*args, **kwargs):
+        raise AssertionError("--changed no debería consultar Supabase")
+
+    monkeypatch.setattr(ingest.incremental, "load_manifest", no_manifest)
+    report = ingest.ingest_documents(DOCS, checkpoint=checkpoint, changed_only=True)
+
+    assert report["unchanged"] == 2
+    assert report["embedded"] == 0
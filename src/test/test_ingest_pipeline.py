@@ -0,0 +1,119 @@
+"""
+Tests del pipeline de ingesta paralelo (extracción en procesos + subida desde cola acotada)
+"""
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+os.environ.setdefault("SUPABASE_URL", "http://localhost:54321")
+os.environ.setdefault("SUPABASE_SERVICE_ROLE_KEY", "test")
+os.environ.setdefault("OPENAI_API_KEY", "sk-test")
+
+from src.rag import ingest_pipeline
+from src.rag.ingest_pipeline import extract_document, run_parallel_ingest
+
+
+def fake_prepare(path, source_name, category, version, ref=False, source_hash=None):
+    texts = [f"{source_name} chunk {i}" for i in range(3)]
+    metas = [{"source": source_name, "chunk": i, "category": category, "version": version, "ref": ref}
+             for i in range(3)]
+    return texts, metas
+
+
+def docs(n):
+    return [{"path": f"doc{i}.pdf", "name": f"Doc{i}", "category": "sueño", "version": "v1"} for i in range(n)]
+
+
+def test_extract_document_normalizes_name_and_builds_metadata(monkeypatch):
+    monkeypatch.setattr(ingest_pipeline, "prepare_document", fake_prepare)
+
+    prepared = extract_document({"path": "x.pdf", "name": " Guia ", "category": "salud", "version": "v2", "ref": True})
+
+    assert prepared.error is None
+    assert prepared.name == "guia"
+    assert len(prepared.texts) == 3
+    assert prepared.metadatas[0] == {"source": "guia", "chunk": 0, "category": "salud", "version": "v2", "ref": True}
+
+
+def test_extract_document_reports_errors_instead_of_raising():
+    prepared = extract_document({"path": "/no/existe.pdf", "name": "falta", "category": "salud"})
+    assert prepared.error
+    assert prepared.texts == []
+
+    prepared = extract_document({"path": "x.pdf", "name": "sin_categoria"})
+    assert "categoría" in prepared.error
+
+
+def test_run_parallel_ingest_uploads_every_document(monkeypatch):
+    monkeypatch.setattr(ingest_pipeline, "prepare_document", fake_prepare)
+    uploaded = []
+
+    summary = run_parallel_ingest(
+        docs(6), lambda prepared: uploaded.append(prepared.name),
+        workers=3, queue_size=2, executor_factory=ThreadPoolExecutor,
+    )
+
+    assert sorted(uploaded) == [f"doc{i}" for i in range(6)]
+    assert summary["uploaded"] == 6
+    assert summary["chunks"] == 18
+    assert summary["failed"] == []
+
+
+def test_run_parallel_ingest_bounds_documents_in_flight(monkeypatch):
+    started = []
+    lock = threading.Lock()
+
+    def tracking_prepare(*args, **kwargs):
+        with lock:
+            started.append(args[1])
+        return fake_prepare(*args, **kwargs)
+
+    monkeypatch.setattr(ingest_pipeline, "prepare_document", tracking_prepare)
+    release = threading.Event()
+    uploaded = []
+
+    def slow_upload(prepared):
+        release.wait(timeout=5)
+        uploaded.append(prepared.name)
+
+    runner = threading.Thread(
+        target=run_parallel_ingest,
+        args=(docs(10), slow_upload),
+        kwargs={"workers": 2, "queue_size": 1, "uploaders": 1, "executor_factory": ThreadPoolExecutor},
+    )
+    runner.start()
+    time.sleep(0.3)
+    # Subida bloqueada: 1 en el consumidor + 1 en la cola + 1 esperando el put + 2 en el pool
+    assert len(started) <= 5
+    release.set()
+    runner.join(timeout=10)
+    assert len(uploaded) == 10
+
+
+def test_run_parallel_ingest_keeps_going_after_failures(monkeypatch):
+    monkeypatch.setattr(ingest_pipeline, "prepare_document", fake_prepare)
+
+    def upload(prepared):
+        if prepared.name == "doc1":
+            raise RuntimeError("timeout")
+
+    documents = docs(3) + [{"path": "x.pdf", "name": "sin_categoria"}]
+    summary = run_parallel_ingest(documents, upload, workers=2, executor_factory=ThreadPoolExecutor)
+
+    assert summary["uploaded"] == 2
+    assert sorted(summary["failed"]) == ["doc1", "sin_categoria"]
+
+
+def test_run_parallel_ingest_with_process_pool():
+    # Verifica que el worker se puede serializar hacia procesos reales
+    summary = run_parallel_ingest(
+        [{"path": "/no/existe.pdf", "name": "falta", "category": "salud"}],
+        lambda prepared: None,
+        workers=2,
+    )
+    assert summary["failed"] == ["falta"]
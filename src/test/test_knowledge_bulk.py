@@ -0,0 +1,110 @@
+"""
+Tests del guardado en bloque de conocimiento del bebé
+"""
+import asyncio
+import os
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+os.environ.setdefault("SUPABASE_URL", "http://localhost:54321")
+os.environ.setdefault("SUPABASE_SERVICE_ROLE_KEY", "test")
+os.environ.setdefault("OPENAI_API_KEY", "sk-test")
+
+from src.services import knowledge_service
+from src.services.knowledge_service import BabyKnowledgeService
+
+BABIES = [
+    {"id": "b1", "user_id": "u1", "name": "Sofía"},
+    {"id": "b2", "user_id": "u1", "name": "Mateo"},
+]
+
+
+class FakeTable:
+    """Registra cada request de la tabla baby_knowledge (una por execute)."""
+
+    def __init__(self, client, existing):
+        self.client = client
+        self.existing = existing
+        self.operation = None
+        self.payload = None
+
+    def select(self, *args):
+        self.operation = "select"
+        return self
+
+    def eq(self, *args):
+        return self
+
+    def in_(self, *args):
+        return self
+
+    def insert(self, rows):
+        self.operation, self.payload = "insert", rows
+        return self
+
+    def upsert(self, rows, **kwargs):
+        self.operation, self.payload = "upsert", rows
+        return self
+
+    def execute(self):
+        self.client.requests.append((self.operation, self.payload))
+        data = self.existing if self.operation == "select" else self.payload
+        return type("Result", (), {"data": data})()
+
+
+class FakeSupabase:
+    def __init__(self, existing=()):
+        self.requests = []
+        self.existing = list(existing)
+
+    def table(self, name):
+        assert name == "baby_knowledge"
+        return FakeTable(self, self.existing)
+
+
+def _item(baby_id, title, category="alimentacion"):
+    return {"baby_id": baby_id, "category": category, "title": title, "description": title}
+
+
+def test_resolve_baby_id_in_memory():
+    assert BabyKnowledgeService.resolve_baby_id(BABIES, "sofía") == "b1"
+    assert BabyKnowledgeService.resolve_baby_id(BABIES, "Mat") == "b2"
+    assert BabyKnowledgeService.resolve_baby_id(BABIES, "mi bebé") == "b1"
+    assert BabyKnowledgeService.resolve_baby_id(BABIES, "Lucas") is None
+
+
+def test_five_items_cost_one_write(monkeypatch):
+    fake = FakeSupabase()
+    monkeypatch.setattr(knowledge_service, "supabase", fake)
+
+    items = [_item("b1", f"dato {i}") for i in range(4)] + [_item("otro", "ajeno")]
+    saved = asyncio.run(BabyKnowledgeService.save_knowledge_bulk("u1", BABIES, items))
+
+    assert len(saved) == 4
+    assert [operation for operation, _ in fake.requests] == ["select", "insert"]
+    assert all(row["user_id"] == "u1" for row in saved)
+
+
+def test_general_items_update_existing_rows(monkeypatch):
+    fake = FakeSupabase(existing=[{"id": "k1", "user_id": "u1", "baby_id": "b1", "category": "general", "title": "Vive en Lima"}])
+    monkeypatch.setattr(knowledge_service, "supabase", fake)
+
+    items = [_item("b1", "Vive en Lima", "general"), _item("b1", "Tiene un perro", "general")]
+    asyncio.run(BabyKnowledgeService.save_knowledge_bulk("u1", BABIES, items))
+
+    operations = dict((operation, payload) for operation, payload in fake.requests)
+    assert [row["id"] for row in operations["upsert"]] == ["k1"]
+    assert [row["title"] for row in operations["insert"]] == ["Tiene un perro"]
+
+
+def test_babies_without_matching_owner_are_skipped(monkeypatch):
+    fake = FakeSupabase()
+    monkeypatch.setattr(knowledge_service, "supabase", fake)
+
+    babies = BABIES + [{"id": "b3", "name": "Sin dueño"}, {"id": "b4", "user_id": "u2", "name": "Ajeno"}]
+    items = [_item("b1", "propio"), _item("b3", "sin dueño"), _item("b4", "ajeno")]
+    saved = asyncio.run(BabyKnowledgeService.save_knowledge_bulk("u1", babies, items))
+
+    assert [row["baby_id"] for row in saved] == ["b1"]
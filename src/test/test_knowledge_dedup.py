@@ -0,0 +1,158 @@
+"""
+Tests de la deduplicación y consolidación del conocimiento del bebé
+"""
+import asyncio
+import os
+import re
+import sys
+import threading
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+os.environ.setdefault("SUPABASE_URL", "http://localhost:54321")
+os.environ.setdefault("SUPABASE_SERVICE_ROLE_KEY", "test")
+os.environ.setdefault("OPENAI_API_KEY", "sk-test")
+
+from src.jobs import knowledge_consolidation
+from src.services import knowledge_service
+from src.services.knowledge_service import BabyKnowledgeService
+from src.utils.knowledge_dedup import (
+    cluster_near_duplicates,
+    find_duplicate,
+    knowledge_title_hash,
+    normalize_knowledge_title,
+    titles_match,
+)
+
+
+def _row(id, title, created_at="2026-01-01", importance=1, category="alimentacion", baby_id="b1"):
+    return {"id": id, "user_id": "u1", "baby_id": baby_id, "category": category, "title": title,
+            "description": title, "importance_level": importance, "created_at": created_at}
+
+
+def test_normalized_hash_ignores_case_accents_and_punctuation():
+    assert knowledge_title_hash("No le gusta el Brócoli!") == knowledge_title_hash("no le gusta el brocoli")
+
+
+def test_fuzzy_match_respects_negations():
+    assert titles_match("Duerme con peluche", "Duerme con su peluche")
+    assert not titles_match("Le gusta el brócoli", "No le gusta el brócoli")
+    assert not titles_match("Alergia al maní", "Alergia a la leche")
+
+
+def test_duplicates_only_within_same_baby_and_category():
+    candidates = [_row("k1", "no le gusta el brocoli", baby_id="b2"), _row("k2", "no le gusta el brocoli", category="salud")]
+    assert find_duplicate(_row(None, "No le gusta el brócoli"), candidates) is None
+
+
+def test_cluster_keeps_most_recent_first():
+    items = [
+        _row("k1", "No le gusta el brócoli", "2026-01-01"),
+        _row("k2", "no le gusta el brocoli", "2026-03-01"),
+        _row("k3", "Le encanta la banana", "2026-02-01"),
+    ]
+    clusters = cluster_near_duplicates(items)
+    assert [[item["id"] for item in cluster] for cluster in clusters] == [["k2", "k1"], ["k3"]]
+
+
+class FakeQuery:
+    def __init__(self, client):
+        self.client = client
+        self.operation = "select"
+        self.payload = None
+        self.bounds = None
+
+    def select(self, *args):
+        return self
+
+    def eq(self, *args):
+        return self
+
+    def in_(self, column, values):
+        self.payload = (self.payload, list(values))
+        return self
+
+    def order(self, *args, **kwargs):
+        return self
+
+    def range(self, start, end):
+        self.bounds = (start, end)
+        return self
+
+    def upsert(self, rows, **kwargs):
+        self.operation, self.payload = "upsert", rows
+        return self
+
+    def update(self, values):
+        self.operation, self.payload = "update", values
+        return self
+
+    def execute(self):
+        self.client.requests.append((self.operation, self.payload))
+        if self.operation == "select":
+            start, end = self.bounds
+            data = self.client.rows[start:end + 1]
+        else:
+            data = self.payload
+        return type("Result", (), {"data": data})()
+
+
+class FakeSupabase:
+    def __init__(self, rows):
+        self.rows = rows
+        self.requests = []
+
+    def table(self, name):
+        return FakeQuery(self)
+
+
+def test_consolidation_merges_near_duplicates(monkeypatch):
+    rows = [
+        _row("k1", "No le gusta el brócoli", "2026-01-01", importance=3),
+        _row("k2", "no le gusta el brocoli", "2026-02-01"),
+        _row("k3", "No le gusta el brocoli.", "2026-03-01"),
+        _row("k4", "Le encanta la banana"),
+    ]
+    fake = FakeSupabase(rows)
+    monkeypatch.setattr(knowledge_service, "supabase", fake)
+
+    result = BabyKnowledgeService.consolidate_knowledge(page_size=2)
+
+    assert result == {"groups": 1, "deactivated": 2}
+    upserts = [payload for operation, payload in fake.requests if operation == "upsert"]
+    assert [(row["id"], row["importance_level"]) for row in upserts[0]] == [("k3", 3)]
+    updates = [payload for operation, payload in fake.requests if operation == "update"]
+    assert updates == [({"is_active": False}, ["k2", "k1"])]
+
+
+def test_cancelled_loop_waits_for_running_consolidation(monkeypatch):
+    finished = threading.Event()
+
+    def slow_consolidation():
+        time.sleep(0.05)
+        finished.set()
+
+    monkeypatch.setattr(knowledge_consolidation.BabyKnowledgeService, "consolidate_knowledge", staticmethod(slow_consolidation))
+
+    async def scenario():
+        task = asyncio.create_task(knowledge_consolidation.run_consolidation_loop(interval_hours=0))
+        await asyncio.sleep(0.01)
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+        return finished.is_set()
+
+    assert asyncio.run(scenario()) is True
+
+
+def test_sql_title_normalization_matches_python():
+    migration = Path(__file__).resolve().parents[2] / "supabase" / "migrations" / "20261019000100_save_routine_with_knowledge.sql"
+    source, target = re.search(r"translate\(lower\(coalesce\(p_title, ''\)\), '([^']+)', '([^']+)'\)", migration.read_text(encoding="utf-8")).groups()
+    assert len(source) == len(target)
+    # Cada letra que el SQL traduce queda igual que en la normalización de Python
+    for accented, plain in zip(source, target):
+        assert normalize_knowledge_title(accented) == plain
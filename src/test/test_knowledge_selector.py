@@ -0,0 +1,52 @@
+"""
+Tests de la selección de conocimiento relevante para el prompt
+"""
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+from src.utils.knowledge_selector import select_relevant_knowledge
+
+
+def _item(category, title, importance=1):
+    return {"category": category, "title": title, "description": title, "importance_level": importance}
+
+
+KNOWLEDGE = {
+    "b1": {
+        "baby_name": "Sofía",
+        "knowledge": [
+            _item("alergias", "Alérgica a la proteína de la leche", 5),
+            _item("juguetes", "Su juguete favorito es un conejo de peluche", 3),
+            _item("alimentacion", "No le gusta el brócoli", 2),
+            _item("rutinas", "Hace dos siestas al día", 2),
+            _item("salud", "Tuvo reflujo los primeros meses", 4),
+        ],
+    }
+}
+
+
+def _titles(selected):
+    return [item["title"] for item in selected["b1"]["knowledge"]]
+
+
+def test_allergies_and_health_are_always_included():
+    selected = select_relevant_knowledge(KNOWLEDGE, "¿Cómo organizo las siestas?", max_items=1)
+    assert _titles(selected) == [
+        "Alérgica a la proteína de la leche",
+        "Hace dos siestas al día",
+        "Tuvo reflujo los primeros meses",
+    ]
+
+
+def test_relevant_items_win_over_important_ones():
+    selected = select_relevant_knowledge(KNOWLEDGE, "ideas para que coma brócoli", max_items=1)
+    assert "No le gusta el brócoli" in _titles(selected)
+    assert "Su juguete favorito es un conejo de peluche" not in _titles(selected)
+
+
+def test_budget_limits_optional_items():
+    selected = select_relevant_knowledge(KNOWLEDGE, "hola", budget_tokens=0, max_items=10)
+    assert {item["category"] for item in selected["b1"]["knowledge"]} == {"alergias", "salud"}
+    assert selected["b1"]["baby_name"] == "Sofía"
@@ -0,0 +1,105 @@
+"""
+Tests del analizador de mensajes: el recorrido único debe detectar lo mismo
+que los escaneos por substring que reemplaza.
+"""
+import os
+import random
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+from src.utils.aho_corasick import AhoCorasick
+from src.utils.keywords_rag import (
+    DIAPER_KEYWORDS,
+    REFERENCE_KEYWORDS,
+    ROUTINE_DETECTION_KEYWORDS,
+    SECTION_KEYWORDS,
+    TEMPLATE_KEYWORDS,
+)
+from src.utils.lang import ENGLISH_MARKERS, PORTUGUESE_MARKERS, SPANISH_MARKERS
+from src.utils.message_analyzer import analyze_message
+
+MESSAGES = [
+    "Mi bebé tiene rabietas y quiero una rutina de sueño para el destete nocturno",
+    "¿De dónde sacaste esa información? ¿Qué fuentes usas?",
+    "Quero ajuda com a rotina do meu filho durante a viagem de férias",
+    "My baby won't nap, I need a schedule for the full day",
+    "Con mi pareja discutimos sobre los límites y la disciplina",
+    "Necesito ideas creativas para presentar verduras en la comida",
+    "Hay que cambiarle el pañal después de la siesta",
+    "hola",
+    "",
+]
+
+
+def test_automaton_matches_substring_semantics():
+    random.seed(7)
+    for _ in range(200):
+        patterns = ["".join(random.choice("ab ") for _ in range(random.randint(1, 4))) for _ in range(8)]
+        text = "".join(random.choice("ab ") for _ in range(40))
+        automaton = AhoCorasick((pattern, index) for index, pattern in enumerate(patterns))
+
+        found = {index for _, _, index in automaton.iter_matches(text)}
+        assert found == {index for index, pattern in enumerate(patterns) if pattern in text}
+
+
+@pytest.mark.parametrize("message", MESSAGES)
+def test_analysis_matches_legacy_scans(message):
+    analysis = analyze_message(message)
+    message_lower = message.lower()
+
+    expected_sections = [
+        section for section, keywords in SECTION_KEYWORDS.items()
+        if any(keyword in message_lower for keyword in keywords)
+    ]
+    assert analysis.sections == expected_sections
+
+    expected_templates = [
+        template_key for template_key, keywords_by_lang in TEMPLATE_KEYWORDS.items()
+        if any(keyword in message_lower for keywords in keywords_by_lang.values() for keyword in keywords)
+    ]
+    assert [key for key, _ in analysis.template_matches] == expected_templates
+
+    assert set(analysis.reference_keywords) == {kw for kw in REFERENCE_KEYWORDS if kw in message_lower}
+    assert set(analysis.routine_keywords) == {kw for kw in ROUTINE_DETECTION_KEYWORDS if kw in message_lower}
+    assert analysis.mentions_diaper == any(token in message_lower for token in DIAPER_KEYWORDS)
+    assert analysis.lang_marker_counts == {
+        "pt": sum(1 for marker in PORTUGUESE_MARKERS if marker in message_lower),
+        "es": sum(1 for marker in SPANISH_MARKERS if marker in message_lower),
+        "en": sum(1 for marker in ENGLISH_MARKERS if marker in message_lower),
+    }
+
+
+def test_analysis_is_immutable():
+    analysis = analyze_message("Hola Lumi")
+    assert analysis.simple_greeting
+
+    with pytest.raises(Exception):
+        analysis.trivial_intent = None
+
+    updated = analysis.with_profile_keywords([{"field": "sleep_rhythm.short_cycles"}])
+    assert analysis.profile_keywords == ()
+    assert updated.profile_keywords[0]["field"] == "sleep_rhythm.short_cycles"
+
+
+@pytest.mark.parametrize("message", MESSAGES)
+def test_rag_keyword_matching_matches_legacy_loop(message):
+    os.environ.setdefault("SUPABASE_URL", "http://localhost:54321")
+    os.environ.setdefault("SUPABASE_SERVICE_ROLE_KEY", "test")
+    os.environ.setdefault("OPENAI_API_KEY", "sk-test")
+    from rapidfuzz import fuzz
+    from src.rag.utils import match_rag_keywords, remove_accents
+    from src.utils import keywords_rag
+
+    query_norm = remove_accents(message.lower())
+    expected = []
+    for keyword in keywords_rag.keywords:
+        normalized_keyword = remove_accents(keyword.lower())
+        similarity = fuzz.partial_ratio(normalized_keyword, query_norm)
+        if similarity >= 87 or normalized_keyword in query_norm:
+            expected.append((keyword, similarity))
+
+    assert match_rag_keywords(analyze_message(message)) == expected
@@ -0,0 +1,57 @@
+"""
+Tests del routing de modelos por complejidad de la consulta
+"""
+import json
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+from src.utils import model_router
+from src.utils.model_router import MODEL_TIERS, ModelRouter
+
+
+def test_greeting_routes_to_light():
+    decision = ModelRouter.route("hola lumi", simple_greeting=True)
+    assert decision["tier"] == "light"
+    assert decision["model"] == MODEL_TIERS["light"]["model"]
+    assert decision["max_tokens"] == MODEL_TIERS["light"]["max_tokens"]
+
+
+def test_short_follow_up_routes_to_light():
+    decision = ModelRouter.route("sí, gracias", rag_context="contexto breve", rag_sources=["Siestas.pdf"])
+    assert decision["tier"] == "light"
+
+
+def test_simple_lookup_routes_to_standard():
+    decision = ModelRouter.route(
+        "¿cuántas siestas debería tomar un bebé de 8 meses al día?",
+        rag_context="x" * 2000,
+        rag_sources=["Siestas.pdf"],
+    )
+    assert decision["tier"] == "standard"
+
+
+def test_template_with_sections_routes_to_complex():
+    decision = ModelRouter.route(
+        "mi hija de 14 meses se despierta varias veces en la noche y quiero dejar la toma nocturna",
+        sections=["night_weaning.md", "routines.md"],
+        template_detected=True,
+        rag_context="x" * 3000,
+        rag_sources=["Destete_Lumi.pdf"],
+    )
+    assert decision["tier"] == "complex"
+    assert decision["max_tokens"] == MODEL_TIERS["complex"]["max_tokens"]
+
+
+def test_log_decision_writes_jsonl(tmp_path, monkeypatch):
+    log_path = tmp_path / "routing.jsonl"
+    monkeypatch.setattr(model_router, "MODEL_ROUTING_LOG", str(log_path))
+
+    decision = ModelRouter.route("hola", simple_greeting=True)
+    ModelRouter.log_decision(decision, "user-1", usage={"total_tokens": 42}, latency_ms=120)
+
+    entry = json.loads(log_path.read_text(encoding="utf-8").strip())
+    assert entry["tier"] == "light"
+    assert entry["usage"]["total_tokens"] == 42
+    assert entry["signals"]["simple_greeting"] is True
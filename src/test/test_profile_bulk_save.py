@@ -0,0 +1,61 @@
+"""
+Tests del armado de filas para el guardado masivo del perfil
+"""
+import os
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+os.environ.setdefault("SUPABASE_URL", "http://localhost:54321")
+os.environ.setdefault("SUPABASE_SERVICE_ROLE_KEY", "test")
+os.environ.setdefault("OPENAI_API_KEY", "sk-test")
+
+from src.services.profile_service import BabyProfileService
+from src.utils.keywords_rag import PROFILE_TRANSLATIONS, detect_profile_keywords
+
+CATEGORY_MAP = {"sleep and rest": "cat-sleep"}
+
+
+def test_plan_groups_keywords_by_subcategory():
+    detected = detect_profile_keywords(
+        "duerme con body de manga corta y pijama de algodón, tiene ciclos cortos",
+        verbose=False,
+        age_months=3,
+    )
+    plan = BabyProfileService._plan_bulk_rows(detected, CATEGORY_MAP)
+
+    assert set(plan) == {("cat-sleep", kw["subcategory"]) for kw in detected}
+    assert sum(entry["keywords"] for entry in plan.values()) == len(detected)
+
+
+def test_last_keyword_wins_without_erasing_missing_languages():
+    first = {"category": "sleep and rest", "age_range": "0_6", "subcategory": "sleep_rhythm",
+             "field": "sleep_rhythm.short_cycles", "field_key": "short_cycles", "keyword": "ciclos cortos"}
+    second = dict(first, field="sleep_rhythm.unknown", field_key="unknown", keyword="x")
+    plan = BabyProfileService._plan_bulk_rows([first, second], CATEGORY_MAP)
+
+    entry = plan[("cat-sleep", "sleep_rhythm")]
+    assert entry["values"]["value_es"] == "ciclos cortos"
+    assert entry["keywords"] == 2
+
+
+def test_plan_skips_incomplete_and_unknown_categories():
+    incomplete = {"category": "sleep and rest", "field": "sleep_rhythm.short_cycles"}
+    unknown = {"category": "daily care", "age_range": "0_6", "subcategory": "bath",
+               "field": "bath.daily", "field_key": "daily", "keyword": "baño"}
+    assert BabyProfileService._plan_bulk_rows([incomplete, unknown], CATEGORY_MAP) == {}
+
+
+def test_plan_resolves_keywords_that_only_carry_a_surface_form():
+    detected = detect_profile_keywords("tiene ciclos cortos", verbose=False, age_months=3)
+    assert detected
+    full = detected[0]
+    english = PROFILE_TRANSLATIONS.translations(full["category"], full["age_range"], full["field"])["en"]
+
+    resolved = BabyProfileService.resolve_keyword({"keyword": english.upper(), "age_range": full["age_range"]})
+    assert {key: resolved[key] for key in full if key != "keyword"} == \
+        {key: full[key] for key in full if key != "keyword"}
+
+    plan = BabyProfileService._plan_bulk_rows([{"keyword": english}], CATEGORY_MAP)
+    assert plan[("cat-sleep", full["subcategory"])]["values"]["value_es"] == full["keyword"]
@@ -0,0 +1,254 @@
+"""
+Paridad del índice plano de keywords del perfil con la implementación recursiva anterior.
+"""
+import random
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+from src.utils.keywords_rag import (
+    KEYWORDS_PROFILE_EN,
+    KEYWORDS_PROFILE_ES,
+    KEYWORDS_PROFILE_PT,
+    PROFILE_KEYWORD_INDEX,
+    detect_profile_keywords,
+    get_age_appropriate_categories,
+    get_age_range_key,
+)
+
+AGES = [None, -1, 0, 3, 6, 7, 12, 18, 24, 36, 48, 60, 84, 120]
+
+
+# Implementación recursiva original (referencia para la paridad)
+def legacy_detect_profile_keywords(message: str, lang: str = 'es', verbose: bool = True, age_months: int = None) -> list:
+    """
+    Detecta keywords del perfil del bebé en el mensaje del usuario.
+    Ahora con estructura jerárquica: categoria_principal > rango_edad > subcategoría > keywords
+    
+    IMPORTANTE: Busca en los 3 idiomas (ES, EN, PT) simultáneamente para evitar problemas
+    de detección de idioma incorrecta.
+    
+    Args:
+        message: El mensaje del usuario
+        lang: Idioma detectado ('es', 'en', 'pt') - usado solo para informar, busca en todos
+        verbose: Si es True, imprime en consola cada keyword detectado
+        age_months: Edad del bebé en meses (REQUERIDO). Si no se provee, no detecta nada.
+    
+    Returns:
+        Lista de diccionarios con información de keywords encontradas
+        Formato: [{'category': str, 'age_range': str, 'field': str, 'field_key': str, 'keyword': str}, ...]
+    """
+    detected_keywords = []
+    detected_categories = set()
+    message_lower = message.lower()
+    
+    # ⚠️ Si no hay edad, retornar lista vacía (no detectar nada por seguridad)
+    if age_months is None:
+        if verbose:
+            print(f"[AGE FILTER] No hay edad del bebé disponible, NO se detectarán keywords del perfil")
+        return []
+    
+    # Obtener rango de edad y categorías permitidas
+    age_range = get_age_range_key(age_months)
+    allowed_categories = get_age_appropriate_categories(age_months)
+    
+    if verbose:
+        print(f"[AGE FILTER] Edad: {age_months} meses -> Rango: {age_range}")
+    
+    # 🌍 Buscar en los 3 idiomas para evitar problemas de detección de idioma
+    keywords_dicts = [
+        ('es', KEYWORDS_PROFILE_ES),
+        ('en', KEYWORDS_PROFILE_EN),
+        ('pt', KEYWORDS_PROFILE_PT)
+    ]
+    
+    def search_in_dict(data, category_path="", main_category=None, current_age_range=None, subcategory=None):
+        """
+        Función recursiva para buscar en diccionarios anidados con estructura jerárquica.
+        
+        Estructura esperada:
+        {
+            'sleep and rest': {
+                '0_6': {
+                    'sleep_rhythm': {
+                        'short_cycles': 'ciclos cortos',
+                        ...
+                    },
+                    'sleepwear': {
+                        'base': {
+                            'short_sleeve_bodysuit': 'con body de manga corta',
+                            ...
+                        },
+                        'mid_layer': {...},
+                        ...
+                    },
+                    ...
+                },
+                ...
+            },
+            ...
+        }
+        
+        Soporta niveles anidados ilimitados y los concatena con punto:
+        - sleepwear.base.short_sleeve_bodysuit
+        - sleepwear.mid_layer.one_piece_sleeper
+        """
+        if isinstance(data, dict):
+            for key, value in data.items():
+                current_path = f"{category_path}.{key}" if category_path else key
+                
+                # Nivel 1: Categoría principal (ej: 'sleep and rest')
+                if not main_category:
+                    # Es una categoría principal
+                    if key in allowed_categories and isinstance(value, dict):
+                        # Buscar dentro de esta categoría
+                        search_in_dict(value, current_path, main_category=key)
+                
+                # Nivel 2: Rango de edad (ej: '0_6', '6_12')
+                elif not current_age_range:
+                    # Verificar si es un rango de edad
+                    if key == age_range and isinstance(value, dict):
+                        # Este es el rango correcto, buscar dentro
+                        search_in_dict(value, current_path, main_category=main_category, current_age_range=key)
+                    elif isinstance(value, dict):
+                        # Seguir buscando otros niveles
+                        search_in_dict(value, current_path, main_category=main_category, current_age_range=current_age_range)
+                
+                # Nivel 3+: Subcategorías y keywords (con soporte para anidación profunda)
+                else:
+                    if isinstance(value, str):
+                        # Es un keyword final
+                        if value.lower() in message_lower:
+                            path_parts = current_path.split('.')
+                            # Remover categoría principal y rango de edad del path
+                            # path_parts = ['sleep and rest', '0_6', 'sleepwear', 'base', 'short_sleeve_bodysuit']
+                            # Queremos: subcategory='sleepwear', field='sleepwear.base.short_sleeve_bodysuit'
+                            
+                            if len(path_parts) >= 3:
+                                # Subcategoría principal (nivel 3)
+                                main_subcategory = path_parts[2]
+                                
+                                # Field completo: concatenar desde subcategoría hasta el final
+                                field_path = '.'.join(path_parts[2:])
+                                
+                                # field_key es la última parte
+                                field_key = path_parts[-1]
+                                
+                                keyword_info = {
+                                    'category': main_category,
+                                    'age_range': current_age_range,
+                                    'subcategory': main_subcategory,
+                                    'field': field_path,  # ej: 'sleepwear.base.short_sleeve_bodysuit'
+                                    'field_key': field_key,  # ej: 'short_sleeve_bodysuit'
+                                    'keyword': value
+                                }
+                                detected_keywords.append(keyword_info)
+                                
+                                # Imprimir categoría detectada
+                                if verbose:
+                                    category_key = f"{main_category}.{main_subcategory}"
+                                    if category_key not in detected_categories:
+                                        print(f">> {main_category} > {current_age_range} > {main_subcategory}")
+                                        detected_categories.add(category_key)
+                    
+                    elif isinstance(value, dict):
+                        # Seguir navegando en niveles más profundos
+                        search_in_dict(value, current_path, main_category=main_category, current_age_range=current_age_range, subcategory=subcategory)
+                    
+                    elif isinstance(value, list):
+                        # Lista de keywords
+                        for item in value:
+                            if isinstance(item, str) and item.lower() in message_lower:
+                                path_parts = current_path.split('.')
+                                
+                                if len(path_parts) >= 3:
+                                    main_subcategory = path_parts[2]
+                                    field_path = '.'.join(path_parts[2:])
+                                    field_key = path_parts[-1]
+                                    
+                                    keyword_info = {
+                                        'category': main_category,
+                                        'age_range': current_age_range,
+                                        'subcategory': main_subcategory,
+                                        'field': field_path,
+                                        'field_key': field_key,
+                                        'keyword': item
+                                    }
+                                    detected_keywords.append(keyword_info)
+                                    
+                                    if verbose:
+                                        category_key = f"{main_category}.{main_subcategory}"
+                                        if category_key not in detected_categories:
+                                            print(f">> {main_category} > {current_age_range} > {main_subcategory}")
+                                            detected_categories.add(category_key)
+    
+    # 🌍 Buscar en todos los idiomas (ES, EN, PT)
+    for lang_code, keywords_dict in keywords_dicts:
+        search_in_dict(keywords_dict)
+    
+    # Eliminar duplicados (puede que un keyword esté en múltiples idiomas)
+    # Usar el campo 'field' como clave única
+    unique_keywords = {}
+    for kw in detected_keywords:
+        field = kw['field']
+        if field not in unique_keywords:
+            unique_keywords[field] = kw
+    
+    detected_keywords = list(unique_keywords.values())
+    
+    return detected_keywords
+
+
+def _all_keywords():
+    keywords = []
+    for age_range in ("0_6", "6_12", "12_24", "24_48", "48_84"):
+        keywords.extend(entry["keyword"] for entry in PROFILE_KEYWORD_INDEX.entries(age_range))
+    return keywords
+
+
+def _messages():
+    random.seed(42)
+    keywords = _all_keywords()
+    messages = [
+        "",
+        "hola",
+        "Mi bebé duerme con body de manga corta y tiene ciclos cortos",
+        "She sleeps in a SHORT SLEEVE BODYSUIT and wakes up a lot",
+        "Ele dorme com body de manga curta no berço",
+    ]
+    for _ in range(150):
+        sample = random.sample(keywords, random.randint(1, 4))
+        filler = random.choice(["", " y además ", " and ", ", "])
+        text = filler.join(sample)
+        messages.append(text.upper() if random.random() < 0.2 else text)
+    return messages
+
+
+@pytest.mark.parametrize("age_months", AGES)
+def test_detection_matches_recursive_implementation(age_months, capsys):
+    for message in _messages():
+        expected = legacy_detect_profile_keywords(message, "es", verbose=True, age_months=age_months)
+        expected_log = capsys.readouterr().out
+
+        detected = detect_profile_keywords(message, "es", verbose=True, age_months=age_months)
+        detected_log = capsys.readouterr().out
+
+        assert detected == expected, message
+        assert detected_log == expected_log, message
+
+
+def _count_leaves(node):
+    if isinstance(node, dict):
+        return sum(_count_leaves(value) for value in node.values())
+    if isinstance(node, list):
+        return sum(1 for item in node if isinstance(item, str))
+    return 1 if isinstance(node, str) else 0
+
+
+def test_index_covers_every_leaf():
+    indexed = sum(len(PROFILE_KEYWORD_INDEX.entries(age_range)) for age_range in ("0_6", "6_12", "12_24", "24_48", "48_84"))
+    expected = sum(_count_leaves(tree) for tree in (KEYWORDS_PROFILE_ES, KEYWORDS_PROFILE_EN, KEYWORDS_PROFILE_PT))
+    assert indexed == expected
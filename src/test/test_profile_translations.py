@@ -0,0 +1,68 @@
+"""
+Tests de la tabla precalculada de traducciones del perfil.
+"""
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+from src.utils.keywords_rag import (
+    KEYWORDS_PROFILE_EN,
+    KEYWORDS_PROFILE_ES,
+    KEYWORDS_PROFILE_PT,
+    PROFILE_KEYWORD_INDEX,
+    PROFILE_TRANSLATIONS,
+)
+
+AGE_RANGES = ("0_6", "6_12", "12_24", "24_48", "48_84")
+DICTS = {"es": KEYWORDS_PROFILE_ES, "en": KEYWORDS_PROFILE_EN, "pt": KEYWORDS_PROFILE_PT}
+
+
+# Búsqueda original por path (referencia para la paridad)
+def legacy_find_keyword_in_dict(field_path, keywords_dict):
+    current = keywords_dict
+    for part in field_path.split('.'):
+        if isinstance(current, dict) and part in current:
+            current = current[part]
+        else:
+            return None
+    return current if isinstance(current, str) else None
+
+
+def _detected_entries():
+    for age_range in AGE_RANGES:
+        yield from PROFILE_KEYWORD_INDEX.entries(age_range)
+
+
+def test_translations_match_path_lookup():
+    for entry in _detected_entries():
+        full_path = f"{entry['category']}.{entry['age_range']}.{entry['field']}"
+        expected = {lang: legacy_find_keyword_in_dict(full_path, tree) for lang, tree in DICTS.items()}
+        assert PROFILE_TRANSLATIONS.translations(entry['category'], entry['age_range'], entry['field']) == expected
+
+
+def test_unknown_field_has_no_translations():
+    assert PROFILE_TRANSLATIONS.translations("sleep and rest", "0_6", "missing.field") == {
+        "es": None, "en": None, "pt": None
+    }
+
+
+def test_missing_translations_report():
+    for row in PROFILE_TRANSLATIONS.missing_translations():
+        full_path = f"{row['category']}.{row['age_range']}.{row['field']}"
+        for lang in row['missing']:
+            assert not legacy_find_keyword_in_dict(full_path, DICTS[lang])
+
+
+def test_reverse_index_resolves_any_language():
+    for entry in _detected_entries():
+        key = (entry['category'], entry['age_range'], entry['field'])
+        assert key in PROFILE_TRANSLATIONS.fields_for(entry['keyword'].upper())
+
+
+def test_reverse_index_can_be_scoped():
+    entry = next(_detected_entries())
+    scoped = PROFILE_TRANSLATIONS.fields_for(entry['keyword'], entry['category'], entry['age_range'])
+    assert scoped and all(key[:2] == (entry['category'], entry['age_range']) for key in scoped)
+    assert PROFILE_TRANSLATIONS.fields_for(entry['keyword'], age_range="no_range") == []
+    assert PROFILE_TRANSLATIONS.fields_for("sin forma conocida") == []
@@ -0,0 +1,92 @@
+"""
+Tests del servicio de tablas de referencia precargadas
+"""
+import asyncio
+import os
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+os.environ.setdefault("SUPABASE_URL", "http://localhost:54321")
+os.environ.setdefault("SUPABASE_SERVICE_ROLE_KEY", "test")
+os.environ.setdefault("OPENAI_API_KEY", "sk-test")
+
+from src.services import reference_data_service
+from src.services.reference_data_service import ReferenceDataService, ReferenceTable
+
+
+class CountingLoader:
+    def __init__(self, rows):
+        self.rows = rows
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        if isinstance(self.rows, Exception):
+            raise self.rows
+        return list(self.rows)
+
+
+def test_lookup_is_case_insensitive_and_loads_once():
+    loader = CountingLoader([{"id": "c1", "category": "Sleep and rest"}])
+    table = ReferenceTable("profile_category", loader, key_column="category")
+
+    assert table.get("sleep and rest") == "c1"
+    assert table.get("SLEEP AND  REST ") == "c1"
+    assert table.as_dict() == {"sleep and rest": "c1"}
+    assert loader.calls == 1
+
+
+def test_failed_refresh_keeps_previous_data():
+    loader = CountingLoader([{"id": "c1", "category": "Daily care"}])
+    table = ReferenceTable("profile_category", loader, key_column="category")
+    assert table.refresh()
+
+    loader.rows = RuntimeError("supabase caído")
+    assert not table.refresh()
+    assert table.get("daily care") == "c1"
+
+
+def test_unknown_key_triggers_rate_limited_reload(monkeypatch):
+    monkeypatch.setattr(reference_data_service, "REFERENCE_DATA_MISS_REFRESH_SECONDS", 0)
+    loader = CountingLoader([])
+    table = ReferenceTable("profile_category", loader, key_column="category")
+    table.refresh()
+
+    loader.rows = [{"id": "c2", "category": "Travel and mobility"}]
+    assert table.get("travel and mobility") == "c2"
+
+    monkeypatch.setattr(reference_data_service, "REFERENCE_DATA_MISS_REFRESH_SECONDS", 3600)
+    calls = loader.calls
+    assert table.get("missing") is None
+    assert loader.calls == calls
+
+
+def test_failed_first_load_is_retried_with_backoff(monkeypatch):
+    monkeypatch.setattr(reference_data_service, "REFERENCE_DATA_MISS_REFRESH_SECONDS", 3600)
+    loader = CountingLoader(RuntimeError("supabase caído"))
+    table = ReferenceTable("profile_category", loader, key_column="category")
+
+    assert table.get("sleep and rest") is None
+    assert table.as_dict() == {}
+    assert table.rows() == []
+    # Los requests siguientes no vuelven a consultar la base
+    assert loader.calls == 1
+
+    monkeypatch.setattr(reference_data_service, "REFERENCE_DATA_MISS_REFRESH_SECONDS", 0)
+    loader.rows = [{"id": "c1", "category": "Sleep and rest"}]
+    assert table.get("sleep and rest") == "c1"
+    assert loader.calls == 2
+
+
+def test_warmup_loads_every_registered_table():
+    service = ReferenceDataService(refresh_seconds=0)
+    categories = CountingLoader([{"id": "c1", "category": "Sleep and rest"}])
+    languages = CountingLoader([{"code": "es", "name": "Español"}])
+    service.register("profile_category", key_column="category", loader=categories)
+    service.register("languages", key_column="code", value_column=None, loader=languages)
+
+    assert asyncio.run(service.warmup()) == {"profile_category": True, "languages": True}
+    assert service.get("languages", "ES") == {"code": "es", "name": "Español"}
+    assert categories.calls == 1
@@ -0,0 +1,183 @@
+"""
+Tests de la política de resiliencia (deadline, reintentos, circuit breaker)
+"""
+import asyncio
+import sys
+import time
+from pathlib import Path
+
+import httpx
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+from src.utils.resilience import (
+    CircuitBreaker,
+    CircuitOpenError,
+    DeadlineExceededError,
+    ResiliencePolicy,
+    ResilientTransport,
+    parse_retry_after,
+)
+from src.utils.admission_control import AdmissionRejected
+
+
+def _response(status_code: int, headers=None) -> httpx.Response:
+    return httpx.Response(status_code, headers=headers or {}, request=httpx.Request("GET", "http://test"))
+
+
+def test_parse_retry_after_headers():
+    assert parse_retry_after(_response(429, {"retry-after": "2"})) == 2.0
+    assert parse_retry_after(_response(429, {"retry-after-ms": "1500"})) == 1.5
+    assert parse_retry_after(_response(429)) is None
+
+
+def test_retries_transient_status_until_success():
+    policy = ResiliencePolicy("test", deadline=5, max_attempts=3, base_delay=0.01, max_delay=0.01)
+    statuses = iter([503, 502, 200])
+    calls = []
+
+    async def operation(timeout):
+        calls.append(timeout)
+        return _response(next(statuses))
+
+    response = asyncio.run(policy.run(operation))
+    assert response.status_code == 200
+    assert len(calls) == 3
+
+
+def test_non_retryable_status_is_returned_immediately():
+    policy = ResiliencePolicy("test", deadline=5, max_attempts=3, base_delay=0.01)
+    calls = []
+
+    def operation(timeout):
+        calls.append(timeout)
+        return _response(400)
+
+    assert policy.run_sync(operation).status_code == 400
+    assert len(calls) == 1
+
+
+def test_non_idempotent_request_is_not_retried_on_500():
+    policy = ResiliencePolicy("test", deadline=5, max_attempts=3, base_delay=0.01)
+    calls = []
+
+    def operation(timeout):
+        calls.append(timeout)
+        return _response(500)
+
+    assert policy.run_sync(operation, idempotent=False).status_code == 500
+    assert len(calls) == 1
+
+
+def test_retry_respects_deadline():
+    policy = ResiliencePolicy("test", deadline=0.6, max_attempts=5, base_delay=0.01)
+    calls = []
+
+    def operation(timeout):
+        calls.append(timeout)
+        # Retry-After mayor que el deadline restante: no se reintenta
+        return _response(429, {"retry-after": "5"})
+
+    assert policy.run_sync(operation).status_code == 429
+    assert len(calls) == 1
+
+    with pytest.raises(DeadlineExceededError):
+        policy.run_sync(operation, deadline=0.1)
+
+
+def test_circuit_breaker_opens_and_recovers():
+    breaker = CircuitBreaker("test", failure_threshold=2, recovery_timeout=0.05)
+    policy = ResiliencePolicy("test", deadline=5, max_attempts=1, breaker=breaker)
+
+    def failing(timeout):
+        raise httpx.ConnectError("down")
+
+    for _ in range(2):
+        with pytest.raises(httpx.ConnectError):
+            policy.run_sync(failing)
+    assert breaker.state == CircuitBreaker.OPEN
+
+    with pytest.raises(CircuitOpenError):
+        policy.run_sync(lambda timeout: _response(200))
+
+    asyncio.run(asyncio.sleep(0.06))
+    assert policy.run_sync(lambda timeout: _response(200)).status_code == 200
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+def test_local_errors_do_not_open_the_circuit():
+    breaker = CircuitBreaker("test", failure_threshold=2, recovery_timeout=30)
+    policy = ResiliencePolicy("test", deadline=5, max_attempts=1, breaker=breaker)
+
+    async def throttled(timeout):
+        # El rate limiter propio rechaza antes de llegar a OpenAI
+        raise AdmissionRejected(429, 1, "tasa de OpenAI")
+
+    for _ in range(3):
+        with pytest.raises(AdmissionRejected):
+            asyncio.run(policy.run(throttled))
+    assert breaker.state == CircuitBreaker.CLOSED
+
+    # 4xx no reintentables tampoco cuentan como fallo del upstream
+    for _ in range(3):
+        assert policy.run_sync(lambda timeout: _response(400)).status_code == 400
+    assert breaker.state == CircuitBreaker.CLOSED
+
+    for _ in range(2):
+        policy.run_sync(lambda timeout: _response(503))
+    assert breaker.state == CircuitBreaker.OPEN
+
+
+def test_throttling_is_neither_success_nor_failure():
+    breaker = CircuitBreaker("test", failure_threshold=2, recovery_timeout=0.01)
+    policy = ResiliencePolicy("test", deadline=5, max_attempts=1, breaker=breaker)
+
+    for _ in range(5):
+        assert policy.run_sync(lambda timeout: _response(429)).status_code == 429
+    assert breaker.state == CircuitBreaker.CLOSED
+
+    # Un 429 entre fallos no reinicia la cuenta
+    policy.run_sync(lambda timeout: _response(503))
+    policy.run_sync(lambda timeout: _response(429))
+    policy.run_sync(lambda timeout: _response(503))
+    assert breaker.state == CircuitBreaker.OPEN
+
+    # En half-open un 429 libera la prueba sin cerrar el circuito
+    time.sleep(0.02)
+    policy.run_sync(lambda timeout: _response(429))
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert policy.run_sync(lambda timeout: _response(200)).status_code == 200
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+def test_local_error_releases_half_open_trial():
+    breaker = CircuitBreaker("test", failure_threshold=1, recovery_timeout=0.01)
+    policy = ResiliencePolicy("test", deadline=5, max_attempts=1, breaker=breaker)
+
+    def failing(timeout):
+        raise httpx.ConnectError("down")
+
+    def bug(timeout):
+        raise ValueError("bug local")
+
+    with pytest.raises(httpx.ConnectError):
+        policy.run_sync(failing)
+    asyncio.run(asyncio.sleep(0.02))
+
+    with pytest.raises(ValueError):
+        policy.run_sync(bug)
+    # La prueba de half-open quedó libre para la siguiente llamada
+    assert policy.run_sync(lambda timeout: _response(200)).status_code == 200
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+def test_resilient_transport_retries_through_httpx_client():
+    statuses = iter([503, 200])
+    transport = ResilientTransport(
+        ResiliencePolicy("test", deadline=5, max_attempts=3, base_delay=0.01, max_delay=0.01),
+        transport=httpx.MockTransport(lambda request: httpx.Response(next(statuses))),
+    )
+
+    with httpx.Client(transport=transport) as client:
+        assert client.get("http://test/rest/v1/babies").status_code == 200
@@ -0,0 +1,172 @@
+"""
+Tests del guardado de rutinas en una sola llamada RPC
+"""
+import asyncio
+import os
+import re
+import sys
+from pathlib import Path
+
+import httpx
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+os.environ.setdefault("SUPABASE_URL", "http://localhost:54321")
+os.environ.setdefault("SUPABASE_SERVICE_ROLE_KEY", "test")
+os.environ.setdefault("OPENAI_API_KEY", "sk-test")
+
+from postgrest.exceptions import APIError
+
+from src.services import routine_service
+from src.services.routine_service import RoutineService
+
+MIGRATION = Path(__file__).resolve().parents[2] / "supabase" / "migrations" / "20261019000100_save_routine_with_knowledge.sql"
+
+ROUTINE = {
+    "baby_name": "Sofía",
+    "routine_name": "Rutina de noche",
+    "context_summary": "Baño, cena y a dormir",
+    "routine_type": "night",
+    "confidence": 0.9,
+    "activities": [
+        {"time_start": "19:00", "activity": "Baño"},
+        {"time_start": "19:30", "time_end": "20:00", "activity": "Cena", "order_index": 5},
+    ],
+}
+
+
+class FakeRpc:
+    def __init__(self, response=None, error=None):
+        self.calls = []
+        self.response = response
+        self.error = error
+
+    def rpc(self, name, params):
+        self.calls.append((name, params))
+        return self
+
+    def execute(self):
+        if self.error:
+            raise self.error
+        return type("Result", (), {"data": self.response})()
+
+
+def test_routine_is_saved_in_a_single_rpc(monkeypatch):
+    fake = FakeRpc(response={"success": True, "routine_id": "r1", "activities_count": 2})
+    monkeypatch.setattr(routine_service, "supabase", fake)
+
+    saved = asyncio.run(RoutineService.save_routine_with_knowledge(
+        "user-1", "Sofía", ROUTINE, {"category": "rutinas", "title": "Rutina de noche"}
+    ))
+
+    assert saved["routine_id"] == "r1"
+    assert len(fake.calls) == 1
+    name, params = fake.calls[0]
+    assert name == "save_routine_with_knowledge"
+    assert params["p_routine"]["category"] == "night"
+    assert [a["order_index"] for a in params["p_activities"]] == [1, 5]
+    assert params["p_knowledge"]["category"] == "rutinas"
+
+
+def test_missing_function_falls_back_to_sequential_path(monkeypatch):
+    fake = FakeRpc(error=APIError({"code": "PGRST202", "message": "function not found"}))
+    monkeypatch.setattr(routine_service, "supabase", fake)
+
+    async def no_baby(user_id, baby_name):
+        return None
+
+    monkeypatch.setattr(RoutineService, "find_baby_by_name", staticmethod(no_baby))
+
+    saved = asyncio.run(RoutineService.save_routine_with_knowledge("user-1", "Sofía", ROUTINE))
+    assert saved == {"success": False, "error": "baby_not_found"}
+
+
+def test_any_rpc_error_falls_back_to_sequential_path(monkeypatch):
+    # Función rota o migración a medias: la transacción se revirtió, no quedó nada escrito
+    fake = FakeRpc(error=APIError({"code": "42601", "message": "syntax error at or near \"if\""}))
+    monkeypatch.setattr(routine_service, "supabase", fake)
+    calls = []
+
+    async def sequential(user_id, baby_name, routine_data, knowledge_data=None):
+        calls.append(baby_name)
+        return {"success": True, "routine_id": "r2"}
+
+    monkeypatch.setattr(RoutineService, "_save_routine_with_knowledge_sequential", staticmethod(sequential))
+
+    saved = asyncio.run(RoutineService.save_routine_with_knowledge("user-1", "Sofía", ROUTINE))
+    assert saved["routine_id"] == "r2"
+    assert calls == ["Sofía"]
+
+
+def test_transport_errors_are_raised_without_retrying_the_writes(monkeypatch):
+    # Sin respuesta no se sabe si la transacción llegó a confirmarse
+    monkeypatch.setattr(routine_service, "supabase", FakeRpc(error=httpx.ReadTimeout("timeout")))
+
+    async def sequential(*args, **kwargs):
+        raise AssertionError("no debería repetir la escritura")
+
+    monkeypatch.setattr(RoutineService, "_save_routine_with_knowledge_sequential", staticmethod(sequential))
+
+    with pytest.raises(httpx.ReadTimeout):
+        asyncio.run(RoutineService.save_routine_with_knowledge("user-1", "Sofía", ROUTINE))
+
+
+def test_activity_fields_sent_are_inserted_by_the_migration(monkeypatch):
+    fake = FakeRpc(response={"success": True})
+    monkeypatch.setattr(routine_service, "supabase", fake)
+    asyncio.run(RoutineService.save_routine_with_knowledge("user-1", "Sofía", ROUTINE))
+
+    sql = MIGRATION.read_text(encoding="utf-8")
+    insert = sql[sql.index("insert into public.routine_activities ("):]
+    columns = {column.strip() for column in insert[insert.index("(") + 1:insert.index(")")].split(",")}
+    for activity in fake.calls[0][1]["p_activities"]:
+        assert set(activity) <= columns
+
+
+def _function_parameters(sql):
+    signature = re.search(r"function public\.save_routine_with_knowledge\((.*?)\)\s*returns", sql, re.S).group(1)
+    return [line.split()[0] for line in signature.split(",") if line.strip()]
+
+
+def test_rpc_params_match_the_sql_function_signature(monkeypatch):
+    fake = FakeRpc(response={"success": True})
+    monkeypatch.setattr(routine_service, "supabase", fake)
+    asyncio.run(RoutineService.save_routine_with_knowledge("user-1", "Sofía", ROUTINE, {"title": "x"}))
+
+    sql = MIGRATION.read_text(encoding="utf-8")
+    assert list(fake.calls[0][1]) == _function_parameters(sql)
+
+    # Las actividades se convierten al tipo de cada columna (time_start puede ser time):
+    # nada de insertar el text de ->> directo en routine_activities
+    insert = sql[sql.index("insert into public.routine_activities"):sql.index("returning *")]
+    assert "jsonb_populate_recordset(\n            null::public.routine_activities" in insert
+    assert "->>'time_start'" not in insert and "->>'time_end'" not in insert
+
+
+def _function_body(sql):
+    start = sql.index("create or replace function public.save_routine_with_knowledge(")
+    body_start = sql.index("as $$", start) + len("as $$")
+    return sql[body_start:sql.index("$$;", body_start)]
+
+
+def test_migration_has_a_single_well_formed_function_body():
+    sql = MIGRATION.read_text(encoding="utf-8")
+    assert sql.count("create or replace function public.save_routine_with_knowledge(") == 1
+    body = _function_body(sql)
+
+    # Un solo bloque begin ... end; con los if balanceados
+    assert len(re.findall(r"^\s*begin\s*$", body, re.M)) == 1
+    assert len(re.findall(r"^end;\s*$", body, re.M)) == 1
+    assert len(re.findall(r"^\s*if\b", body, re.M)) == len(re.findall(r"^\s*end if;", body, re.M))
+
+    assert body.count("insert into public.baby_routines") == 1
+    assert body.count("insert into public.routine_activities") == 1
+    assert body.count("insert into public.baby_knowledge") == 1
+    assert body.count("'success', true") == 1
+
+    # baby_not_found solo dentro del if del bebé, antes de escribir nada
+    not_found = body.index("'baby_not_found'")
+    assert body.count("'baby_not_found'") == 1
+    assert body.rindex("if v_baby_id is null then", 0, not_found) < not_found < body.index("insert into public.baby_routines")
+    assert body.index("end if;", not_found) < body.index("insert into public.baby_routines")
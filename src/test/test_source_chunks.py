@@ -0,0 +1,130 @@
+"""
+Tests de la lectura de chunks por fuente sin búsqueda vectorial
+"""
+import asyncio
+import os
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+os.environ.setdefault("SUPABASE_URL", "http://localhost:54321")
+os.environ.setdefault("SUPABASE_SERVICE_ROLE_KEY", "test")
+os.environ.setdefault("OPENAI_API_KEY", "sk-test")
+
+from src.rag import utils as rag_utils
+from src.rag.source_chunks import SourceChunkStore
+
+
+class FakeQuery:
+    def __init__(self, client):
+        self.client = client
+        self.filters = {}
+        self.bounds = (0, 10 ** 9)
+
+    def select(self, columns):
+        return self
+
+    def eq(self, column, value):
+        self.filters[column] = value
+        return self
+
+    def is_(self, column, value):
+        self.filters[column] = None
+        return self
+
+    def order(self, column):
+        return self
+
+    def range(self, start, end):
+        self.bounds = (start, end)
+        return self
+
+    def execute(self):
+        self.client.selects += 1
+        data = [
+            dict(row) for row in self.client.rows
+            if all(row["metadata"].get(c.split("->>")[1]) == v for c, v in self.filters.items())
+        ]
+        return type("Result", (), {"data": data[self.bounds[0]:self.bounds[1] + 1]})()
+
+
+class FakeClient:
+    def __init__(self, rows):
+        self.rows = rows
+        self.selects = 0
+
+    def table(self, name):
+        return FakeQuery(self)
+
+
+class FakeActiveVersion:
+    def __init__(self, version):
+        self.version = version
+
+    def get(self):
+        return self.version
+
+
+def row(source, chunk, corpus_version="v1", ref=False):
+    return {
+        "id": f"{source}-{corpus_version}-{chunk}",
+        "content": f"{source} #{chunk}",
+        "metadata": {"source": source, "chunk": chunk, "version": "1", "ref": ref, "corpus_version": corpus_version},
+    }
+
+
+def test_fetch_orders_by_chunk_and_scopes_to_active_version():
+    rows = [row("a_ref.pdf", 2), row("a_ref.pdf", 0), row("a_ref.pdf", 1), row("a_ref.pdf", 0, "v0"), row("b.pdf", 0)]
+    store = SourceChunkStore(FakeClient(rows), FakeActiveVersion("v1"))
+
+    chunks = store.get("a_ref.pdf")
+
+    assert [chunk["content"] for chunk in chunks] == ["a_ref.pdf #0", "a_ref.pdf #1", "a_ref.pdf #2"]
+    assert all(chunk["metadata"]["corpus_version"] == "v1" for chunk in chunks)
+
+
+def test_cache_hits_and_invalidates_on_version_change():
+    client = FakeClient([row("a_ref.pdf", 0), row("a_ref.pdf", 0, "v2")])
+    active = FakeActiveVersion("v1")
+    store = SourceChunkStore(client, active)
+
+    store.get("a_ref.pdf")
+    store.get("a_ref.pdf")
+    # Las fuentes inexistentes también se cachean
+    assert store.get("nada_ref.pdf") == []
+    assert store.get("nada_ref.pdf") == []
+    assert client.selects == 2
+    assert store.stats()["hits"] == 2
+
+    active.version = "v2"
+    assert store.get("a_ref.pdf")[0]["metadata"]["corpus_version"] == "v2"
+    assert client.selects == 3
+
+
+def test_lru_keeps_at_most_max_sources():
+    client = FakeClient([row(f"s{i}.pdf", 0) for i in range(3)])
+    store = SourceChunkStore(client, FakeActiveVersion("v1"), max_sources=2)
+
+    for source in ("s0.pdf", "s1.pdf", "s2.pdf", "s0.pdf"):
+        store.get(source)
+
+    assert client.selects == 4
+    assert store.stats()["sources"] == 2
+
+
+def test_reference_chunks_do_not_use_vector_search(monkeypatch):
+    client = FakeClient([row("a_ref.pdf", 1, ref=True), row("a_ref.pdf", 0, ref=True), row("a.pdf", 0)])
+    monkeypatch.setattr(rag_utils, "source_chunks", SourceChunkStore(client, FakeActiveVersion("v1")))
+
+    def no_vector_search(*args, **kwargs):
+        raise AssertionError("no debería embeber ni usar match_documents")
+
+    monkeypatch.setattr(rag_utils.vs, "similarity_search", no_vector_search)
+
+    chunks = asyncio.run(rag_utils.get_all_reference_chunks_from_file("a_ref.pdf"))
+    assert [chunk["chunk"] for chunk in chunks] == [0, 1]
+    assert all(chunk["ref"] is True for chunk in chunks)
+
+    fallback = asyncio.run(rag_utils.get_all_reference_chunks_from_file("a.pdf"))
+    assert [chunk["source"] for chunk in fallback] == ["a.pdf"]
@@ -0,0 +1,110 @@
+"""
+Tests del índice término → fuente generado en la ingesta
+"""
+import os
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+os.environ.setdefault("SUPABASE_URL", "http://localhost:54321")
+os.environ.setdefault("SUPABASE_SERVICE_ROLE_KEY", "test")
+os.environ.setdefault("OPENAI_API_KEY", "sk-test")
+
+from src.rag import ingest
+from src.rag import utils as rag_utils
+from src.rag.source_index import (
+    SourceIndex,
+    SourceTerms,
+    SourceTermStats,
+    build_source_index,
+    load_source_index,
+    tokenize,
+)
+from src.utils.message_analyzer import analyze_message
+
+TEXTS = {
+    "siestas.pdf": ["Las siestas del bebé se acortan. Una siesta corta no es un problema de sueño."],
+    "lactancia.pdf": ["La lactancia materna y el agarre al pecho. Lactancia a demanda, pecho y leche."],
+    "limites.pdf": ["Poner límites con respeto: los límites y las normas dan seguridad al niño."],
+    "alimentacion.pdf": ["Alimentación complementaria: papillas, purés y alimentación autorregulada (BLW)."],
+}
+
+
+def _stats():
+    stats = {}
+    for source, texts in TEXTS.items():
+        terms = SourceTerms(file_hash=f"hash-{source}")
+        terms.add_texts(texts)
+        stats[source] = terms
+    return stats
+
+
+def test_tokenize_folds_accents_stopwords_and_plurals():
+    assert tokenize("Las SIESTAS del bebé") == ["siesta", "bebe"]
+    assert tokenize("Amamentação e sono do bebê") == ["amamentacao", "sono", "bebe"]
+    assert tokenize("The baby's bedtime routines in 2024") == ["baby", "bedtime", "routine"]
+
+
+def test_route_ranks_sources_by_bm25_weight():
+    index = build_source_index(_stats())
+
+    assert [source for source, _ in index.route("¿Por qué mi bebé hace siestas cortas?", min_score=0.5)] == ["siestas.pdf"]
+    assert index.route("dudas con el agarre y la lactancia", min_score=0.5)[0][0] == "lactancia.pdf"
+    # Palabras que no están en el corpus no enrutan a nada
+    assert index.route("hola, ¿cómo estás?", min_score=0.5) == []
+    # Con un puntaje mínimo alto tampoco
+    assert index.route("siesta", min_score=100) == []
+
+
+def test_index_and_term_cache_round_trip(tmp_path):
+    index = build_source_index(_stats())
+    path = index.save(str(tmp_path / "source_index.json.gz"))
+
+    loaded = load_source_index(path)
+    assert loaded.sources == index.sources
+    assert loaded.route("lactancia y pecho", min_score=0.5) == index.route("lactancia y pecho", min_score=0.5)
+    assert load_source_index(str(tmp_path / "no_existe.json.gz")) is None
+
+    stats = SourceTermStats(str(tmp_path / "terms.json.gz"))
+    stats.put("siestas.pdf", _stats()["siestas.pdf"])
+    stats.save()
+    reloaded = SourceTermStats(str(tmp_path / "terms.json.gz"))
+    assert reloaded.get("siestas.pdf", "hash-siestas.pdf").tf["siesta"] == 2
+    assert reloaded.get("siestas.pdf", "otro-hash") is None
+
+
+def test_refresh_reuses_cached_terms_and_skips_ref_documents(tmp_path, monkeypatch):
+    read = []
+
+    def fake_chunks(path, source_name, category, version, ref=False, source_hash=None):
+        read.append(source_name)
+        for text in TEXTS[source_name]:
+            yield text, {"source": source_name}
+
+    monkeypatch.setattr(ingest, "iter_document_chunks", fake_chunks)
+    monkeypatch.setattr(ingest, "file_hash", lambda path: f"hash-{path}")
+    documents = [{"path": name, "name": name, "category": "x", "version": "1"} for name in TEXTS]
+    documents.append({"path": "siestas_ref.pdf", "name": "siestas_ref.pdf", "category": "x", "ref": True})
+    stats = SourceTermStats(str(tmp_path / "terms.json.gz"))
+
+    index = ingest.refresh_source_index(documents, stats, path=str(tmp_path / "index.json.gz"))
+    assert sorted(read) == sorted(TEXTS)
+    assert "siestas_ref.pdf" not in index.sources
+
+    read.clear()
+    ingest.refresh_source_index(documents, SourceTermStats(str(tmp_path / "terms.json.gz")),
+                                path=str(tmp_path / "index.json.gz"))
+    assert read == []
+
+
+def test_manual_keywords_override_the_index(monkeypatch):
+    index = SourceIndex(["lactancia.pdf", "otro.pdf"], {"agarre": [(1, 9.0)], "pezon": [(0, 9.0)]})
+    monkeypatch.setattr(rag_utils, "source_index", index)
+
+    # "lactancia" está en keywords_rag: manda el diccionario manual
+    manual = rag_utils.route_sources(analyze_message("problemas con la lactancia"))
+    assert manual and "otro.pdf" not in manual
+
+    # Sin keywords manuales decide el índice
+    assert rag_utils.route_sources(analyze_message("me duele el pezón")) == ["lactancia.pdf"]
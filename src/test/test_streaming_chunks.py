@@ -0,0 +1,73 @@
+"""
+Tests del chunking en streaming por páginas
+"""
+import os
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+os.environ.setdefault("SUPABASE_URL", "http://localhost:54321")
+os.environ.setdefault("SUPABASE_SERVICE_ROLE_KEY", "test")
+os.environ.setdefault("OPENAI_API_KEY", "sk-test")
+
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+
+from src.rag.chunking import batched, clean_text, iter_chunks
+
+
+def make_pages(count, words_per_page=120):
+    return [
+        (number, " ".join(f"p{number}w{i}" for i in range(words_per_page)))
+        for number in range(1, count + 1)
+    ]
+
+
+def test_chunks_respect_size_and_cover_every_word():
+    pages = make_pages(40)
+    chunks = list(iter_chunks(iter(pages), chunk_size=300, chunk_overlap=50))
+
+    assert all(len(text) <= 300 for text, _ in chunks)
+    emitted = {word for text, _ in chunks for word in text.split()}
+    expected = {word for _, text in pages for word in text.split()}
+    assert emitted == expected
+
+
+def test_streaming_matches_whole_document_chunking():
+    # Mismos chunks (y mismo solapamiento) que partir el texto completo de una vez
+    splitter = RecursiveCharacterTextSplitter(chunk_size=300, chunk_overlap=50, separators=["\n\n", "\n", " ", ""])
+    for count, words in [(30, 120), (25, 37), (10, 400)]:
+        pages = make_pages(count, words)
+        whole = [clean_text(c) for c in splitter.split_text("\n\n".join(text for _, text in pages))]
+        streamed = [text for text, _ in iter_chunks(iter(pages), chunk_size=300, chunk_overlap=50)]
+        assert streamed == whole
+
+
+def test_page_numbers_follow_the_chunk_start():
+    chunks = list(iter_chunks(iter(make_pages(25)), chunk_size=300, chunk_overlap=50))
+
+    pages = [page for _, page in chunks]
+    assert pages == sorted(pages)
+    assert pages[0] == 1
+    assert pages[-1] == 25
+    for text, page in chunks:
+        assert text.split()[0].startswith(f"p{page}w")
+
+
+def test_chunks_are_yielded_before_all_pages_are_read():
+    consumed = []
+
+    def pages():
+        for number, text in make_pages(200):
+            consumed.append(number)
+            yield number, text
+
+    first = next(iter_chunks(pages(), chunk_size=300, chunk_overlap=50))
+
+    assert first[1] == 1
+    assert len(consumed) < 20
+
+
+def test_batched_yields_fixed_size_batches():
+    assert list(batched(range(7), 3)) == [[0, 1, 2], [3, 4, 5], [6]]
+    assert list(batched([], 3)) == []
@@ -0,0 +1,220 @@
+# src/utils/admission_control.py
+import asyncio
+import math
+import os
+import threading
+import time
+from typing import Any, Dict
+
+
+class AdmissionRejected(Exception):
+    """
+    Se lanza cuando una solicitud no puede ser admitida.
+
+    Attributes:
+        status_code: 429 si el límite es del usuario o de la tasa de OpenAI,
+                     503 si el servicio completo está saturado
+        retry_after: segundos sugeridos antes de reintentar (para el header Retry-After)
+        reason: motivo legible para logs y para el detalle del error
+    """
+
+    def __init__(self, status_code: int, retry_after: float, reason: str):
+        super().__init__(reason)
+        self.status_code = status_code
+        self.retry_after = max(1, math.ceil(retry_after))
+        self.reason = reason
+
+
+class TokenBucket:
+    """
+    Token bucket con recarga continua.
+    Las reservas pueden dejar el bucket en negativo (deuda): quien reserva
+    espera el tiempo necesario para pagarla, así el orden de llegada se respeta.
+    """
+
+    def __init__(self, capacity: float, refill_per_second: float):
+        self.capacity = float(capacity)
+        self.refill_per_second = float(refill_per_second)
+        self._tokens = float(capacity)
+        self._updated_at = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        elapsed = now - self._updated_at
+        self._updated_at = now
+        self._tokens = min(self.capacity, self._tokens + elapsed * self.refill_per_second)
+
+    def wait_time(self, amount: float) -> float:
+        """
+        Segundos que habría que esperar para consumir `amount` tokens (sin consumirlos).
+        """
+        self._refill()
+        amount = min(amount, self.capacity)
+        deficit = amount - self._tokens
+        if deficit <= 0:
+            return 0.0
+        return deficit / self.refill_per_second
+
+    def consume(self, amount: float) -> None:
+        self._refill()
+        self._tokens -= min(amount, self.capacity)
+
+
+class OpenAIRateLimiter:
+    """
+    Limita las llamadas a OpenAI según los límites de la cuenta (RPM y TPM).
+    Si la espera necesaria supera `max_wait`, rechaza con 429 en lugar de encolar
+    indefinidamente.
+    """
+
+    def __init__(self, rpm: int, tpm: int, max_wait: float):
+        self._requests = TokenBucket(rpm, rpm / 60.0)
+        self._tokens = TokenBucket(tpm, tpm / 60.0)
+        self.max_wait = max_wait
+        # acquire_sync puede llamarse desde hilos fuera del event loop: lock de threading
+        # (ej: el pool de EmbeddingStage reserva desde varios hilos de ingesta a la vez)
+        self._lock = threading.Lock()
+
+    def _reserve(self, tokens: int) -> float:
+        with self._lock:
+            wait = max(self._requests.wait_time(1), self._tokens.wait_time(tokens))
+            if wait > self.max_wait:
+                raise AdmissionRejected(
+                    429,
+                    wait,
+                    f"Límite de tasa de OpenAI alcanzado (espera estimada {wait:.1f}s)",
+                )
+            self._requests.consume(1)
+            self._tokens.consume(tokens)
+            return wait
+
+    async def acquire(self, tokens: int) -> None:
+        """
+        Reserva capacidad para una llamada de `tokens` tokens (entrada + salida máxima).
+        """
+        wait = self._reserve(tokens)
+        if wait > 0:
+            print(f"🚦 [RATE-LIMIT] Esperando {wait:.2f}s por límite de OpenAI ({tokens} tokens)")
+            await asyncio.sleep(wait)
+
+    def acquire_sync(self, tokens: int) -> None:
+        """
+        Versión bloqueante de `acquire` para código síncrono (ej: ingesta).
+        """
+        wait = self._reserve(tokens)
+        if wait > 0:
+            time.sleep(wait)
+
+
+class AdmissionController:
+    """
+    Control de admisión para el endpoint de chat.
+
+    - Límite global de solicitudes concurrentes en el proceso
+    - Límite de solicitudes concurrentes por usuario (se rechaza al excederlo)
+    - Cola de espera acotada con deadline: si la cola está llena o la espera
+      vence, se responde rápido con 503 + Retry-After en lugar de acumular timeouts
+    """
+
+    def __init__(self, max_concurrent: int, max_per_user: int, max_queue: int, queue_timeout: float):
+        self.max_concurrent = max_concurrent
+        self.max_per_user = max_per_user
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+
+        self._slots = asyncio.Semaphore(max_concurrent)
+        self._active_by_user: Dict[str, int] = {}
+        self._waiting = 0
+        self._rejected = 0
+        # Promedio móvil del tiempo que una solicitud ocupa un slot (para Retry-After)
+        self._avg_service_time = 5.0
+
+    def _estimate_retry_after(self) -> float:
+        queue_position = self._waiting + 1
+        return self._avg_service_time * queue_position / self.max_concurrent
+
+    def _reject(self, status_code: int, retry_after: float, reason: str) -> AdmissionRejected:
+        self._rejected += 1
+        print(f"⛔ [ADMISSION] {reason} (retry_after={math.ceil(retry_after)}s)")
+        return AdmissionRejected(status_code, retry_after, reason)
+
+    async def acquire(self, user_id: str) -> float:
+        """
+        Admite una solicitud del usuario o lanza AdmissionRejected.
+        Retorna el instante de admisión, que debe pasarse a release().
+        """
+        if self._active_by_user.get(user_id, 0) >= self.max_per_user:
+            raise self._reject(
+                429,
+                self._avg_service_time,
+                f"Usuario {user_id[:8]}... excede {self.max_per_user} solicitudes simultáneas",
+            )
+
+        # Reservar el cupo del usuario antes de esperar para que no pueda encolar de más
+        self._active_by_user[user_id] = self._active_by_user.get(user_id, 0) + 1
+
+        try:
+            if self._slots.locked():
+                if self._waiting >= self.max_queue:
+                    raise self._reject(503, self._estimate_retry_after(), "Cola de admisión llena")
+
+                self._waiting += 1
+                try:
+                    await asyncio.wait_for(self._slots.acquire(), timeout=self.queue_timeout)
+                except asyncio.TimeoutError:
+                    raise self._reject(
+                        503,
+                        self._estimate_retry_after(),
+                        f"Espera en cola superó {self.queue_timeout}s",
+                    )
+                finally:
+                    self._waiting -= 1
+            else:
+                await self._slots.acquire()
+        except BaseException:
+            self._release_user(user_id)
+            raise
+
+        return time.monotonic()
+
+    def release(self, user_id: str, admitted_at: float) -> None:
+        """
+        Libera el slot global y el cupo del usuario.
+        """
+        elapsed = time.monotonic() - admitted_at
+        self._avg_service_time = 0.8 * self._avg_service_time + 0.2 * elapsed
+
+        self._slots.release()
+        self._release_user(user_id)
+
+    def _release_user(self, user_id: str) -> None:
+        remaining = self._active_by_user.get(user_id, 0) - 1
+        if remaining > 0:
+            self._active_by_user[user_id] = remaining
+        else:
+            self._active_by_user.pop(user_id, None)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Obtiene estadísticas del control de admisión para debugging."""
+        return {
+            "active_requests": sum(self._active_by_user.values()) - self._waiting,
+            "waiting_requests": self._waiting,
+            "active_users": len(self._active_by_user),
+            "rejected_total": self._rejected,
+            "avg_service_time": round(self._avg_service_time, 2),
+        }
+
+
+# Instancias globales (configurables por variables de entorno)
+admission_controller = AdmissionController(
+    max_concurrent=int(os.getenv("CHAT_MAX_CONCURRENT_REQUESTS", "32")),
+    max_per_user=int(os.getenv("CHAT_MAX_CONCURRENT_PER_USER", "2")),
+    max_queue=int(os.getenv("CHAT_MAX_QUEUED_REQUESTS", "64")),
+    queue_timeout=float(os.getenv("CHAT_QUEUE_TIMEOUT_SECONDS", "10")),
+)
+
+openai_rate_limiter = OpenAIRateLimiter(
+    rpm=int(os.getenv("OPENAI_RPM_LIMIT", "500")),
+    tpm=int(os.getenv("OPENAI_TPM_LIMIT", "30000")),
+    max_wait=float(os.getenv("OPENAI_RATE_LIMIT_MAX_WAIT", "10")),
+)
@@ -0,0 +1,90 @@
+# src/utils/aho_corasick.py
+from collections import deque
+from typing import Dict, Generic, Hashable, Iterable, Iterator, List, Tuple, TypeVar
+
+T = TypeVar("T", bound=Hashable)
+
+
+class AhoCorasick(Generic[T]):
+    """
+    Autómata de Aho-Corasick para buscar muchos patrones en un solo recorrido del texto.
+
+    Cada patrón se registra con un valor asociado (ej: el vocabulario al que pertenece).
+    `iter_matches` reporta todas las ocurrencias, incluidas las superpuestas, con la misma
+    semántica que `patron in texto` para cada patrón.
+    """
+
+    def __init__(self, patterns: Iterable[Tuple[str, T]] = ()):
+        # Nodo 0 = raíz. Cada nodo: transiciones, enlace de falla y valores que terminan ahí
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._terminals: List[List[Tuple[str, T]]] = [[]]
+        self._outputs: List[List[Tuple[str, T]]] = [[]]
+        self._built = False
+
+        for pattern, value in patterns:
+            self.add(pattern, value)
+        self.build()
+
+    def add(self, pattern: str, value: T) -> None:
+        if not pattern:
+            return
+        node = 0
+        for char in pattern:
+            next_node = self._goto[node].get(char)
+            if next_node is None:
+                next_node = len(self._goto)
+                self._goto[node][char] = next_node
+                self._goto.append({})
+                self._fail.append(0)
+                self._terminals.append([])
+            node = next_node
+        self._terminals[node].append((pattern, value))
+        self._built = False
+
+    def build(self) -> None:
+        """
+        Calcula los enlaces de falla (BFS) y propaga las salidas por esos enlaces.
+        """
+        self._outputs = [list(terminal) for terminal in self._terminals]
+        queue = deque()
+        for child in self._goto[0].values():
+            self._fail[child] = 0
+            queue.append(child)
+
+        while queue:
+            node = queue.popleft()
+            for char, child in self._goto[node].items():
+                queue.append(child)
+                fallback = self._fail[node]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                self._fail[child] = self._goto[fallback].get(char, 0)
+                self._outputs[child] = self._outputs[child] + self._outputs[self._fail[child]]
+
+        self._built = True
+
+    def iter_matches(self, text: str) -> Iterator[Tuple[int, str, T]]:
+        """
+        Recorre `text` una vez. Produce (posición_inicial, patrón, valor) por cada ocurrencia.
+        """
+        if not self._built:
+            self.build()
+
+        goto = self._goto
+        fail = self._fail
+        outputs = self._outputs
+        node = 0
+
+        for index, char in enumerate(text):
+            while node and char not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(char, 0)
+            for pattern, value in outputs[node]:
+                yield index - len(pattern) + 1, pattern, value
+
+    def find_values(self, text: str) -> set:
+        """
+        Conjunto de (patrón, valor) presentes en el texto, sin repetir ocurrencias.
+        """
+        return {(pattern, value) for _, pattern, value in self.iter_matches(text)}
@@ -9,4 +9,17 @@ def calcular_edad(birthdate_str: str) -> int:
 def calcular_meses(birthdate_str: str) -> int:
     birthdate = datetime.strptime(birthdate_str, "%Y-%m-%d").date()
     today = date.today()
-    return (today.year - birthdate.year) * 12 + (today.month - birthdate.month) - (today.day < birthdate.day)
\ No newline at end of file
+    return (today.year - birthdate.year) * 12 + (today.month - birthdate.month) - (today.day < birthdate.day)
+
+def calcular_etapa_desarrollo(edad_anios: int, edad_meses: int) -> str:
+    if edad_meses <= 6:
+        return "lactante"
+    elif edad_meses <= 12:
+        return "bebé"
+    elif edad_meses <= 24:
+        return "caminador/toddler"
+    elif edad_anios <= 5:
+        return "preescolar"
+    elif edad_anios <= 12:
+        return "escolar"
+    return "adolescente"
@@ -0,0 +1,185 @@
+# src/utils/fast_path.py
+import random
+import unicodedata
+from typing import Optional
+
+# Frases triviales normalizadas (minúsculas, sin acentos ni puntuación)
+GREETING_PHRASES = {
+    "hola",
+    "hola lumi",
+    "hola hola",
+    "buen dia",
+    "buenos dias",
+    "buenas",
+    "buenas tardes",
+    "buenas noches",
+    "hello",
+    "hi",
+    "hey",
+    "saludos",
+    "hola buen dia",
+    "hola buenos dias",
+    "hola buenas",
+    "hola buenas tardes",
+    "hola buenas noches",
+    "hi lumi",
+    "hello lumi",
+    "good morning",
+    "good afternoon",
+    "good evening",
+    "oi",
+    "oi lumi",
+    "ola",
+    "ola lumi",
+    "bom dia",
+    "boa tarde",
+    "boa noite",
+}
+
+THANKS_PHRASES = {
+    "gracias",
+    "gracias lumi",
+    "muchas gracias",
+    "mil gracias",
+    "muchisimas gracias",
+    "thanks",
+    "thank you",
+    "thanks lumi",
+    "thank you lumi",
+    "thank you so much",
+    "thanks a lot",
+    "obrigado",
+    "obrigada",
+    "obrigado lumi",
+    "obrigada lumi",
+    "muito obrigado",
+    "muito obrigada",
+    "valeu",
+}
+
+FAREWELL_PHRASES = {
+    "chau",
+    "chao",
+    "adios",
+    "hasta luego",
+    "hasta manana",
+    "nos vemos",
+    "bye",
+    "goodbye",
+    "bye lumi",
+    "see you",
+    "see you later",
+    "tchau",
+    "ate logo",
+    "ate mais",
+    "ate amanha",
+}
+
+# Respuestas por intención e idioma. {name} se reemplaza por el nombre del bebé si está en cache.
+FAST_PATH_RESPONSES = {
+    "greeting": {
+        "es": {
+            "named": [
+                "¡Hola! 😊 ¿Cómo están tú y {name} hoy? Cuéntame en qué te puedo acompañar.",
+                "¡Hola! 🌙 ¿Qué tal va todo con {name}? Estoy aquí para lo que necesites.",
+            ],
+            "generic": [
+                "¡Hola! 😊 Soy Lumi. Cuéntame en qué te puedo acompañar hoy.",
+                "¡Hola! 🌙 ¿Cómo va todo? Estoy aquí para lo que necesites.",
+            ],
+        },
+        "en": {
+            "named": [
+                "Hi! 😊 How are you and {name} doing today? Tell me how I can help.",
+                "Hello! 🌙 How is everything going with {name}? I'm here for whatever you need.",
+            ],
+            "generic": [
+                "Hi! 😊 I'm Lumi. Tell me how I can help you today.",
+                "Hello! 🌙 How is everything going? I'm here for whatever you need.",
+            ],
+        },
+        "pt": {
+            "named": [
+                "Oi! 😊 Como você e {name} estão hoje? Me conta como posso ajudar.",
+                "Olá! 🌙 Como vão as coisas com {name}? Estou aqui para o que precisar.",
+            ],
+            "generic": [
+                "Oi! 😊 Eu sou a Lumi. Me conta como posso te ajudar hoje.",
+                "Olá! 🌙 Como vão as coisas? Estou aqui para o que precisar.",
+            ],
+        },
+    },
+    "thanks": {
+        "es": {
+            "named": ["¡Con mucho gusto! 💛 Aquí estaré cuando necesites algo más sobre {name}."],
+            "generic": ["¡Con mucho gusto! 💛 Aquí estaré cuando necesites algo más."],
+        },
+        "en": {
+            "named": ["You're very welcome! 💛 I'm here whenever you need anything else about {name}."],
+            "generic": ["You're very welcome! 💛 I'm here whenever you need anything else."],
+        },
+        "pt": {
+            "named": ["Por nada! 💛 Estou aqui quando precisar de algo mais sobre {name}."],
+            "generic": ["Por nada! 💛 Estou aqui quando precisar de algo mais."],
+        },
+    },
+    "farewell": {
+        "es": {
+            "named": ["¡Hasta pronto! 🌙 Un abrazo para ti y para {name}."],
+            "generic": ["¡Hasta pronto! 🌙 Aquí estaré cuando me necesites."],
+        },
+        "en": {
+            "named": ["See you soon! 🌙 A big hug to you and {name}."],
+            "generic": ["See you soon! 🌙 I'll be here whenever you need me."],
+        },
+        "pt": {
+            "named": ["Até logo! 🌙 Um abraço para você e para {name}."],
+            "generic": ["Até logo! 🌙 Estarei aqui quando precisar."],
+        },
+    },
+}
+
+
+def normalize_for_greeting(text: str) -> str:
+    text = unicodedata.normalize("NFD", text.lower())
+    # Quitar acentos (sin dejar espacio) y reemplazar puntuación/emojis por espacios
+    text = "".join(
+        ch if ch.isalnum() or ch.isspace() else " "
+        for ch in text
+        if unicodedata.category(ch) != "Mn"
+    )
+    return " ".join(text.split())
+
+
+def is_simple_greeting(message: str) -> bool:
+    normalized = normalize_for_greeting(message)
+    return normalized in GREETING_PHRASES
+
+
+def classify_trivial_message(message: str) -> Optional[str]:
+    """
+    Clasifica mensajes triviales que se pueden responder sin RAG, base de datos ni LLM.
+    Retorna 'greeting', 'thanks', 'farewell' o None.
+    """
+    normalized = normalize_for_greeting(message)
+    if not normalized:
+        return None
+    if normalized in GREETING_PHRASES:
+        return "greeting"
+    if normalized in THANKS_PHRASES:
+        return "thanks"
+    if normalized in FAREWELL_PHRASES:
+        return "farewell"
+    return None
+
+
+def build_fast_path_response(intent: str, lang: str, baby_name: Optional[str] = None) -> str:
+    """
+    Arma la respuesta templada para una intención trivial en el idioma de la conversación,
+    personalizada con el nombre del bebé cuando está disponible.
+    """
+    by_lang = FAST_PATH_RESPONSES[intent]
+    templates = by_lang.get(lang) or by_lang["es"]
+    if baby_name:
+        return random.choice(templates["named"]).format(name=baby_name)
+    return random.choice(templates["generic"])
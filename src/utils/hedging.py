@@ -0,0 +1,173 @@
+# src/utils/hedging.py
+import asyncio
+import math
+import os
+import threading
+from collections import deque
+from typing import Awaitable, Callable, Optional, TypeVar
+
+T = TypeVar("T")
+
+
+class LatencyTracker:
+    """
+    Ventana móvil de latencias observadas para calcular el delay de hedging
+    a partir de un percentil (ej: p95).
+    """
+
+    def __init__(self, window: int = 200, min_samples: int = 20, default_delay: float = 20.0):
+        self._samples = deque(maxlen=window)
+        self.min_samples = min_samples
+        self.default_delay = default_delay
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float) -> None:
+        with self._lock:
+            self._samples.append(seconds)
+
+    def percentile(self, pct: float) -> Optional[float]:
+        """
+        Percentil `pct` (0-100) de la ventana, o None si aún no hay suficientes muestras.
+        """
+        with self._lock:
+            if len(self._samples) < self.min_samples:
+                return None
+            ordered = sorted(self._samples)
+        index = min(len(ordered) - 1, max(0, math.ceil(pct / 100.0 * len(ordered)) - 1))
+        return ordered[index]
+
+    def hedge_delay(self, pct: float, min_delay: float) -> float:
+        value = self.percentile(pct)
+        if value is None:
+            return self.default_delay
+        return max(min_delay, value)
+
+
+class HedgeBudget:
+    """
+    Presupuesto global de hedging: cada solicitud aporta `ratio` créditos
+    (ej: 0.05 → como máximo ~5% del tráfico se duplica) y cada hedge consume uno.
+    El acumulado se limita a `max_credits` para que una ráfaga no gaste de golpe
+    lo ahorrado en periodos tranquilos.
+    """
+
+    def __init__(self, ratio: float, max_credits: float = 10.0):
+        self.ratio = ratio
+        self.max_credits = max_credits
+        self._credits = 0.0
+        self._requests = 0
+        self._hedges = 0
+        self._lock = threading.Lock()
+
+    def record_request(self) -> None:
+        with self._lock:
+            self._requests += 1
+            self._credits = min(self.max_credits, self._credits + self.ratio)
+
+    def try_acquire(self) -> bool:
+        with self._lock:
+            if self._credits < 1.0:
+                return False
+            self._credits -= 1.0
+            self._hedges += 1
+            return True
+
+    def get_stats(self):
+        with self._lock:
+            return {
+                "requests": self._requests,
+                "hedges": self._hedges,
+                "hedge_ratio": round(self._hedges / self._requests, 4) if self._requests else 0.0,
+                "credits": round(self._credits, 2),
+            }
+
+
+async def _close_unused(result) -> None:
+    """
+    Libera la conexión de un resultado que no se va a retornar (ej: una httpx.Response
+    perdedora o un error descartado). Los resultados sin `aclose` se ignoran.
+    """
+    aclose = getattr(result, "aclose", None)
+    if aclose is None:
+        return
+    try:
+        await aclose()
+    except Exception as e:
+        print(f"⚠️ [HEDGE] No se pudo cerrar una respuesta descartada: {e}")
+
+
+async def run_hedged(
+    call: Callable[[], Awaitable[T]],
+    delay: float,
+    budget: HedgeBudget,
+    name: str = "openai",
+    is_success: Optional[Callable[[T], bool]] = None,
+) -> T:
+    """
+    Ejecuta `call()`. Si no terminó después de `delay` segundos y el presupuesto
+    lo permite, lanza una segunda llamada idéntica, retorna la primera que
+    responda bien y cancela la otra.
+
+    Un resultado que no pasa `is_success` (ej: una respuesta 429/5xx) cuenta como
+    derrota: se sigue esperando la otra llamada y solo se retorna si ambas fallan.
+    El presupuesto no se alimenta acá: el llamador registra cada solicitud lógica
+    una sola vez con `budget.record_request()` (no cada reintento).
+
+    Al salir (también si se cancela al llamador) se cancelan las llamadas en curso
+    y se cierran las respuestas que no se retornan.
+    """
+    primary = asyncio.ensure_future(call())
+    tasks = [primary]
+    returned_task = None
+
+    try:
+        done, _ = await asyncio.wait({primary}, timeout=delay)
+        if done or not budget.try_acquire():
+            returned_task = primary
+            return await primary
+
+        print(f"🪁 [HEDGE:{name}] Sin respuesta tras {delay:.2f}s, lanzando solicitud duplicada")
+        hedge = asyncio.ensure_future(call())
+        tasks.append(hedge)
+        pending = {primary, hedge}
+        failed_task = None
+        last_error: Optional[BaseException] = None
+
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is not None:
+                    last_error = task.exception()
+                    continue
+                result = task.result()
+                winner = "duplicada" if task is hedge else "original"
+                if is_success is None or is_success(result):
+                    print(f"🪁 [HEDGE:{name}] Ganó la solicitud {winner}")
+                    returned_task = task
+                    return result
+                print(f"🪁 [HEDGE:{name}] La solicitud {winner} respondió con error, esperando la otra")
+                failed_task = task
+        # Ambas fallaron: una respuesta de error le sirve más a la política (Retry-After) que una excepción
+        if failed_task is not None:
+            returned_task = failed_task
+            return failed_task.result()
+        raise last_error
+    finally:
+        for task in tasks:
+            if not task.done():
+                task.cancel()
+            elif task is not returned_task and not task.cancelled() and task.exception() is None:
+                await _close_unused(task.result())
+
+
+# Configuración global del hedging de OpenAI
+OPENAI_HEDGING_ENABLED = os.getenv("OPENAI_HEDGING_ENABLED", "false").lower() in ("1", "true", "yes")
+OPENAI_HEDGE_PERCENTILE = float(os.getenv("OPENAI_HEDGE_PERCENTILE", "95"))
+OPENAI_HEDGE_MIN_DELAY = float(os.getenv("OPENAI_HEDGE_MIN_DELAY", "2"))
+
+openai_latency_tracker = LatencyTracker(
+    default_delay=float(os.getenv("OPENAI_HEDGE_DEFAULT_DELAY", "20")),
+)
+openai_hedge_budget = HedgeBudget(
+    ratio=float(os.getenv("OPENAI_HEDGE_BUDGET", "0.05")),
+)
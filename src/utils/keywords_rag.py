@@ -4,6 +4,7 @@
 from .keywords_profile_es import KEYWORDS_PROFILE_ES
 from .keywords_profile_en import KEYWORDS_PROFILE_EN
 from .keywords_profile_pt import KEYWORDS_PROFILE_PT
+from .aho_corasick import AhoCorasick
 
 # ============================================================================
 # Keywords para RAG (búsqueda de documentos)
@@ -294,6 +295,104 @@ TEMPLATE_FILES = {
     'references_template': 'template_referencias.md'
 }
 
+# ============================================================================
+# 🧩 SECCIONES DEL PROMPT (behavior.md, routines.md, night_weaning.md, partner_support.md)
+# ============================================================================
+ROUTINE_KEYWORDS = {
+    "organizar rutina", "organizar la rutina", "ajustar horarios", "cambiar horarios",
+    "estructurar el día", "horarios de comida", "horarios de sueño",
+    "rutina de sueño", "orden del día", "cronograma", "planificar el día",
+    "horarios del bebé", "rutina diaria", "establecer rutina", "fijar horarios",
+    "hacer una rutina", "hacer rutina", "quiero rutina", "crear rutina",
+    "armar rutina", "armar una rutina", "necesito rutina", "rutina para",
+    "una rutina para", "rutina", "horarios", "organizar el día"
+}
+
+NIGHT_WEANING_KEYWORDS = {
+    "tomas nocturnas", "destete nocturno", "desmame nocturno", "disminuir tomas",
+    "reducir tomas", "eliminar tomas nocturnas", "dormir sin mamar",
+    "dormir toda la noche", "no despertar para comer", "destete gradual",
+    "quitar toma nocturna", "destetar por la noche", "no alimentar de noche"
+}
+
+BEHAVIOR_KEYWORDS = {
+    "berrinche", "berrinches", "rabieta", "rabietas", "llanto excesivo",
+    "llanto intenso", "llanto sin razón", "lloriqueo", "capricho", "caprichos",
+    "no obedece", "rebelde", "desafiante", "comportamiento difícil",
+    "conducta", "disciplina", "límites", "reglas", "portarse mal",
+    "mal comportamiento", "agresivo", "agresividad", "golpea", "muerde",
+    "pega", "empuja", "no hace caso", "desobediente"
+}
+
+PARTNER_KEYWORDS = {
+    "pareja", "papá", "papá no", "mi esposo", "mi marido", "mi novio",
+    "mi pareja", "padre", "abuelo", "suegra", "suegro", "familia",
+    "no entiende", "no ayuda", "discutimos", "diferencias", "conflicto",
+    "apoyo", "involucrar", "participar", "roles", "responsabilidades"
+}
+
+# Orden en que se agregan las secciones al prompt
+SECTION_KEYWORDS = {
+    'behavior.md': BEHAVIOR_KEYWORDS,
+    'routines.md': ROUTINE_KEYWORDS,
+    'night_weaning.md': NIGHT_WEANING_KEYWORDS,
+    'partner_support.md': PARTNER_KEYWORDS,
+}
+
+# ============================================================================
+# 📚 CONSULTAS DE REFERENCIAS / FUENTES
+# ============================================================================
+REFERENCE_KEYWORDS = {
+    "fuentes", "referencias", "bibliografía", "origen de la información", 
+    "de dónde sacaste", "de donde sacaste", "dónde obtuviste", "donde obtuviste",
+    "qué fuentes", "que fuentes", "basado en qué", "basado en que",
+    "según qué autor", "segun que autor", "qué estudios", "que estudios", 
+    "investigaciones", "papers", "artículos", "articulos", "libros", 
+    "evidencia científica", "evidencia cientifica", "respaldo científico", "respaldo cientifico",
+    "autores", "expertos", "especialistas", "pedagogos", "médicos", "medicos",
+    "neurocientíficos", "neurocientificos", "investigadores", 
+    "dónde leíste", "donde leiste", "en qué te basas", "en que te basas",
+    "esa informacion", "esa información", "esta informacion", "esta información", "de donde es esa info"
+}
+
+# ============================================================================
+# 📅 DETECCIÓN DE RUTINAS EN EL MENSAJE DEL USUARIO
+# ============================================================================
+# Palabras clave que indican conversaciones sobre rutinas
+ROUTINE_DETECTION_KEYWORDS = [
+    # Español
+    "rutina", "horario", "cronograma", "agenda",
+    "despertar", "desayuno", "almuerzo", "cena", "siesta",
+    "baño", "leche", "comida",
+    "jardín", "colegio", "actividades", "estudio", "estudiar",
+    "tareas", "deberes", "matemáticas", "lectura", "escritura",
+    "ciencias", "arte", "lunes", "miércoles", "viernes",
+    "después de", "de la tarde", "semana", "establecer", "crear",
+    # Inglés
+    "routine", "schedule", "timetable", "plan", "agenda",
+    "wake up", "breakfast", "lunch", "dinner", "nap",
+    "sleep", "bath", "milk", "meal", "snack",
+    "kindergarten", "school", "activities", "study", "homework",
+    "math", "reading", "writing", "science", "art",
+    "monday", "wednesday", "friday",
+    "afternoon", "evening", "pm", "am",
+    # Portugués
+    "rotina", "horário", "horario", "cronograma", "agenda",
+    "acordar", "despertar", "café da manhã", "cafe da manha", "almoco", "almoço", "jantar", "soneca",
+    "sono", "banho", "leite", "comida",
+    "escola", "creche", "atividades", "atividades", "estudo", "estudar",
+    "tarefas", "deveres", "matemática", "matematica", "leitura", "escrita",
+    "ciências", "ciencias", "arte", "segunda", "quarta", "sexta",
+    "tarde", "manhã", "manha", "rotina diária", "rotina diaria"
+]
+
+# Mensajes sobre cambio de pañal: no se tratan como rutinas
+DIAPER_KEYWORDS = [
+    "pañal", "panal", "diaper", "fralda",
+    "cambiar pañal", "cambiar panal", "cambio de pañal",
+    "cambiarle el pañal", "cambiarle el panal"
+]
+
 # ============================================================================
 # 🔍 FUNCIONES DE DETECCIÓN DE KEYWORDS DEL PERFIL
 # ============================================================================
@@ -353,10 +452,197 @@ def get_age_appropriate_categories(age_months: int) -> set:
     }
 
 
+def _iter_profile_keyword_leaves(keywords_dict: dict):
+    """
+    Recorre un diccionario de keywords del perfil (categoria > rango_edad > subcategoría > ...)
+    y produce cada hoja en orden de definición como (categoria, rango_edad, path, keyword).
+    `path` es la lista de claves desde la subcategoría hasta la hoja.
+    """
+    def walk(node, path):
+        if isinstance(node, dict):
+            for key, value in node.items():
+                yield from walk(value, path + [key])
+        elif isinstance(node, str):
+            yield path, node
+        elif isinstance(node, list):
+            for item in node:
+                if isinstance(item, str):
+                    yield path, item
+
+    for category, ranges in keywords_dict.items():
+        if not isinstance(ranges, dict):
+            continue
+        for age_range, subtree in ranges.items():
+            if not isinstance(subtree, dict):
+                continue
+            for path, keyword in walk(subtree, []):
+                if path:
+                    yield category, age_range, path, keyword
+
+
+class ProfileTranslationTable:
+    """
+    Tabla de traducciones del perfil, generada una sola vez al importar.
+
+    - `(categoria, rango_edad, field)` → `{'es', 'en', 'pt'}` para traducir en O(1)
+      los keywords detectados antes de guardarlos.
+    - `leaves`: todas las hojas (idioma, categoria, rango_edad, path, keyword) en el
+      orden de recorrido ES → EN → PT, de donde se compila el índice del detector.
+    - Índice inverso forma en minúsculas (de cualquier idioma) → posiciones en `leaves`,
+      para resolver a qué fields corresponde un keyword sin recorrer los diccionarios.
+    """
+
+    LANGS = ('es', 'en', 'pt')
+
+    def __init__(self, keywords_dicts):
+        self.leaves = []
+        self._translations = {}
+        self._by_surface = {}
+
+        for lang_code, keywords_dict in keywords_dicts:
+            for category, age_range, path, keyword in _iter_profile_keyword_leaves(keywords_dict):
+                self._by_surface.setdefault(keyword.lower(), []).append(len(self.leaves))
+                self.leaves.append((lang_code, category, age_range, path, keyword))
+
+                key = (category, age_range, '.'.join(path))
+                row = self._translations.setdefault(key, dict.fromkeys(self.LANGS))
+                # Si una hoja es una lista de sinónimos se conserva el primero
+                if row.get(lang_code) is None:
+                    row[lang_code] = keyword
+
+    def __len__(self) -> int:
+        return len(self._translations)
+
+    def translations(self, category: str, age_range: str, field: str) -> dict:
+        """
+        Traducciones de un field. Los idiomas sin traducción (o fields inexistentes) quedan en None.
+        """
+        row = self._translations.get((category, age_range, field))
+        return dict(row) if row else dict.fromkeys(self.LANGS)
+
+    def surfaces(self) -> list:
+        """
+        Formas distintas (en minúsculas) de todos los idiomas.
+        """
+        return list(self._by_surface)
+
+    def leaf_positions(self, surface: str) -> list:
+        """
+        Posiciones en `leaves` de las hojas con esa forma, en orden de recorrido.
+        """
+        return self._by_surface.get(surface.lower(), [])
+
+    def fields_for(self, surface: str, category: str = None, age_range: str = None) -> list:
+        """
+        Fields `(categoria, rango_edad, field)` a los que corresponde una forma en cualquier
+        idioma, en orden de recorrido y sin repetir. Se puede acotar por categoría y rango.
+        """
+        fields = []
+        for position in self.leaf_positions(surface):
+            _, leaf_category, leaf_range, path, _ = self.leaves[position]
+            if category is not None and leaf_category != category:
+                continue
+            if age_range is not None and leaf_range != age_range:
+                continue
+            key = (leaf_category, leaf_range, '.'.join(path))
+            if key not in fields:
+                fields.append(key)
+        return fields
+
+    def missing_translations(self) -> list:
+        """
+        Fields a los que les falta alguna traducción, para validar los diccionarios.
+        Formato: [{'category', 'age_range', 'field', 'missing': ['pt', ...]}, ...]
+        """
+        missing = []
+        for (category, age_range, field), row in self._translations.items():
+            langs = [lang for lang in self.LANGS if not row.get(lang)]
+            if langs:
+                missing.append({
+                    'category': category,
+                    'age_range': age_range,
+                    'field': field,
+                    'missing': langs
+                })
+        return missing
+
+
+class ProfileKeywordIndex:
+    """
+    Índice plano de keywords del perfil, compilado una sola vez al importar.
+
+    Guarda una entrada por hoja de la tabla (patrón en minúsculas + categoría,
+    subcategoría, field y field_key) en el mismo orden en que el recorrido recursivo
+    de ES → EN → PT las visitaba, y por cada rango de edad un autómata con las formas
+    distintas del índice inverso de la tabla: una forma compartida entre idiomas o
+    fields se busca una sola vez y se resuelve a todas sus hojas.
+    """
+
+    def __init__(self, table: ProfileTranslationTable):
+        self._table = table
+        self._entries = []
+        self._entries_by_range = {}
+        surfaces_by_range = {}
+        for lang_code, category, age_range, path, keyword in table.leaves:
+            entry = {
+                'pattern': keyword.lower(),
+                'lang': lang_code,
+                'category': category,
+                'age_range': age_range,
+                'subcategory': path[0],
+                'field': '.'.join(path),  # ej: 'sleepwear.base.short_sleeve_bodysuit'
+                'field_key': path[-1],    # ej: 'short_sleeve_bodysuit'
+                'keyword': keyword
+            }
+            self._entries.append(entry)
+            self._entries_by_range.setdefault(age_range, []).append(entry)
+            surfaces_by_range.setdefault(age_range, set()).add(entry['pattern'])
+
+        self._automata = {}
+        self._always = {}
+        for age_range, surfaces in surfaces_by_range.items():
+            self._automata[age_range] = AhoCorasick((surface, surface) for surface in surfaces if surface)
+            # Un patrón vacío está contenido en cualquier mensaje
+            self._always[age_range] = {''} if '' in surfaces else set()
+
+    def entries(self, age_range: str) -> list:
+        return self._entries_by_range.get(age_range, [])
+
+    def match(self, message_lower: str, age_range: str, allowed_categories: set) -> list:
+        """
+        Entradas presentes en el mensaje, en orden de recorrido (con repeticiones entre idiomas).
+        """
+        automaton = self._automata.get(age_range)
+        if automaton is None:
+            return []
+        surfaces = {surface for _, _, surface in automaton.iter_matches(message_lower)}
+        surfaces.update(self._always[age_range])
+        positions = {
+            position
+            for surface in surfaces
+            for position in self._table.leaf_positions(surface)
+            if self._entries[position]['age_range'] == age_range
+        }
+        return [
+            self._entries[position] for position in sorted(positions)
+            if self._entries[position]['category'] in allowed_categories
+        ]
+
+
+PROFILE_TRANSLATIONS = ProfileTranslationTable([
+    ('es', KEYWORDS_PROFILE_ES),
+    ('en', KEYWORDS_PROFILE_EN),
+    ('pt', KEYWORDS_PROFILE_PT)
+])
+
+PROFILE_KEYWORD_INDEX = ProfileKeywordIndex(PROFILE_TRANSLATIONS)
+
+
 def detect_profile_keywords(message: str, lang: str = 'es', verbose: bool = True, age_months: int = None) -> list:
     """
     Detecta keywords del perfil del bebé en el mensaje del usuario.
-    Ahora con estructura jerárquica: categoria_principal > rango_edad > subcategoría > keywords
+    Estructura jerárquica: categoria_principal > rango_edad > subcategoría > keywords,
+    precompilada en PROFILE_KEYWORD_INDEX (un recorrido lineal del mensaje por consulta).
     
     IMPORTANTE: Busca en los 3 idiomas (ES, EN, PT) simultáneamente para evitar problemas
     de detección de idioma incorrecta.
@@ -371,10 +657,6 @@ def detect_profile_keywords(message: str, lang: str = 'es', verbose: bool = True
         Lista de diccionarios con información de keywords encontradas
         Formato: [{'category': str, 'age_range': str, 'field': str, 'field_key': str, 'keyword': str}, ...]
     """
-    detected_keywords = []
-    detected_categories = set()
-    message_lower = message.lower()
-    
     # ⚠️ Si no hay edad, retornar lista vacía (no detectar nada por seguridad)
     if age_months is None:
         if verbose:
@@ -388,148 +670,30 @@ def detect_profile_keywords(message: str, lang: str = 'es', verbose: bool = True
     if verbose:
         print(f"[AGE FILTER] Edad: {age_months} meses -> Rango: {age_range}")
     
-    # 🌍 Buscar en los 3 idiomas para evitar problemas de detección de idioma
-    keywords_dicts = [
-        ('es', KEYWORDS_PROFILE_ES),
-        ('en', KEYWORDS_PROFILE_EN),
-        ('pt', KEYWORDS_PROFILE_PT)
-    ]
-    
-    def search_in_dict(data, category_path="", main_category=None, current_age_range=None, subcategory=None):
-        """
-        Función recursiva para buscar en diccionarios anidados con estructura jerárquica.
-        
-        Estructura esperada:
-        {
-            'sleep and rest': {
-                '0_6': {
-                    'sleep_rhythm': {
-                        'short_cycles': 'ciclos cortos',
-                        ...
-                    },
-                    'sleepwear': {
-                        'base': {
-                            'short_sleeve_bodysuit': 'con body de manga corta',
-                            ...
-                        },
-                        'mid_layer': {...},
-                        ...
-                    },
-                    ...
-                },
-                ...
-            },
-            ...
-        }
-        
-        Soporta niveles anidados ilimitados y los concatena con punto:
-        - sleepwear.base.short_sleeve_bodysuit
-        - sleepwear.mid_layer.one_piece_sleeper
-        """
-        if isinstance(data, dict):
-            for key, value in data.items():
-                current_path = f"{category_path}.{key}" if category_path else key
-                
-                # Nivel 1: Categoría principal (ej: 'sleep and rest')
-                if not main_category:
-                    # Es una categoría principal
-                    if key in allowed_categories and isinstance(value, dict):
-                        # Buscar dentro de esta categoría
-                        search_in_dict(value, current_path, main_category=key)
-                
-                # Nivel 2: Rango de edad (ej: '0_6', '6_12')
-                elif not current_age_range:
-                    # Verificar si es un rango de edad
-                    if key == age_range and isinstance(value, dict):
-                        # Este es el rango correcto, buscar dentro
-                        search_in_dict(value, current_path, main_category=main_category, current_age_range=key)
-                    elif isinstance(value, dict):
-                        # Seguir buscando otros niveles
-                        search_in_dict(value, current_path, main_category=main_category, current_age_range=current_age_range)
-                
-                # Nivel 3+: Subcategorías y keywords (con soporte para anidación profunda)
-                else:
-                    if isinstance(value, str):
-                        # Es un keyword final
-                        if value.lower() in message_lower:
-                            path_parts = current_path.split('.')
-                            # Remover categoría principal y rango de edad del path
-                            # path_parts = ['sleep and rest', '0_6', 'sleepwear', 'base', 'short_sleeve_bodysuit']
-                            # Queremos: subcategory='sleepwear', field='sleepwear.base.short_sleeve_bodysuit'
-                            
-                            if len(path_parts) >= 3:
-                                # Subcategoría principal (nivel 3)
-                                main_subcategory = path_parts[2]
-                                
-                                # Field completo: concatenar desde subcategoría hasta el final
-                                field_path = '.'.join(path_parts[2:])
-                                
-                                # field_key es la última parte
-                                field_key = path_parts[-1]
-                                
-                                keyword_info = {
-                                    'category': main_category,
-                                    'age_range': current_age_range,
-                                    'subcategory': main_subcategory,
-                                    'field': field_path,  # ej: 'sleepwear.base.short_sleeve_bodysuit'
-                                    'field_key': field_key,  # ej: 'short_sleeve_bodysuit'
-                                    'keyword': value
-                                }
-                                detected_keywords.append(keyword_info)
-                                
-                                # Imprimir categoría detectada
-                                if verbose:
-                                    category_key = f"{main_category}.{main_subcategory}"
-                                    if category_key not in detected_categories:
-                                        print(f">> {main_category} > {current_age_range} > {main_subcategory}")
-                                        detected_categories.add(category_key)
-                    
-                    elif isinstance(value, dict):
-                        # Seguir navegando en niveles más profundos
-                        search_in_dict(value, current_path, main_category=main_category, current_age_range=current_age_range, subcategory=subcategory)
-                    
-                    elif isinstance(value, list):
-                        # Lista de keywords
-                        for item in value:
-                            if isinstance(item, str) and item.lower() in message_lower:
-                                path_parts = current_path.split('.')
-                                
-                                if len(path_parts) >= 3:
-                                    main_subcategory = path_parts[2]
-                                    field_path = '.'.join(path_parts[2:])
-                                    field_key = path_parts[-1]
-                                    
-                                    keyword_info = {
-                                        'category': main_category,
-                                        'age_range': current_age_range,
-                                        'subcategory': main_subcategory,
-                                        'field': field_path,
-                                        'field_key': field_key,
-                                        'keyword': item
-                                    }
-                                    detected_keywords.append(keyword_info)
-                                    
-                                    if verbose:
-                                        category_key = f"{main_category}.{main_subcategory}"
-                                        if category_key not in detected_categories:
-                                            print(f">> {main_category} > {current_age_range} > {main_subcategory}")
-                                            detected_categories.add(category_key)
-    
-    # 🌍 Buscar en todos los idiomas (ES, EN, PT)
-    for lang_code, keywords_dict in keywords_dicts:
-        search_in_dict(keywords_dict)
-    
-    # Eliminar duplicados (puede que un keyword esté en múltiples idiomas)
-    # Usar el campo 'field' como clave única
+    detected_categories = set()
     unique_keywords = {}
-    for kw in detected_keywords:
-        field = kw['field']
-        if field not in unique_keywords:
-            unique_keywords[field] = kw
-    
-    detected_keywords = list(unique_keywords.values())
-    
-    return detected_keywords
+
+    for entry in PROFILE_KEYWORD_INDEX.match(message.lower(), age_range, allowed_categories):
+        # Imprimir categoría detectada
+        if verbose:
+            category_key = f"{entry['category']}.{entry['subcategory']}"
+            if category_key not in detected_categories:
+                print(f">> {entry['category']} > {entry['age_range']} > {entry['subcategory']}")
+                detected_categories.add(category_key)
+
+        # Eliminar duplicados (puede que un keyword esté en múltiples idiomas)
+        # Usar el campo 'field' como clave única
+        if entry['field'] not in unique_keywords:
+            unique_keywords[entry['field']] = {
+                'category': entry['category'],
+                'age_range': entry['age_range'],
+                'subcategory': entry['subcategory'],
+                'field': entry['field'],
+                'field_key': entry['field_key'],
+                'keyword': entry['keyword']
+            }
+
+    return list(unique_keywords.values())
 
 
 def print_detected_keywords_summary(detected_keywords: list):
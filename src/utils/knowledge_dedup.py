@@ -0,0 +1,86 @@
+# src/utils/knowledge_dedup.py
+import hashlib
+import os
+import re
+import unicodedata
+from typing import Dict, Iterable, List, Optional
+
+from rapidfuzz import fuzz
+
+# Similitud mínima (0-100) entre títulos normalizados para considerarlos duplicados
+KNOWLEDGE_DEDUP_THRESHOLD = float(os.getenv("KNOWLEDGE_DEDUP_THRESHOLD", "90"))
+
+# Palabras que invierten el sentido: "le gusta el brócoli" ≠ "no le gusta el brócoli"
+NEGATION_WORDS = {"no", "nunca", "jamas", "ni", "sin", "tampoco", "not", "never", "nao", "nem"}
+
+
+def normalize_knowledge_title(title: str) -> str:
+    """
+    Minúsculas, sin acentos ni puntuación y con espacios colapsados.
+    'No le gusta el Brócoli!' → 'no le gusta el brocoli'
+    """
+    text = unicodedata.normalize("NFD", (title or "").lower())
+    text = "".join(ch for ch in text if unicodedata.category(ch) != "Mn")
+    text = re.sub(r"[^\w\s]", " ", text)
+    return " ".join(text.split())
+
+
+def knowledge_title_hash(title: str) -> str:
+    return hashlib.sha1(normalize_knowledge_title(title).encode("utf-8")).hexdigest()
+
+
+def _negations(normalized_title: str) -> frozenset:
+    return frozenset(word for word in normalized_title.split() if word in NEGATION_WORDS)
+
+
+def titles_match(title_a: str, title_b: str, threshold: float = None) -> bool:
+    """
+    True si dos títulos son el mismo dato: mismo hash normalizado, o similitud
+    (rapidfuzz token_sort_ratio) sobre el umbral con las mismas negaciones.
+    """
+    threshold = KNOWLEDGE_DEDUP_THRESHOLD if threshold is None else threshold
+    normalized_a = normalize_knowledge_title(title_a)
+    normalized_b = normalize_knowledge_title(title_b)
+    if normalized_a == normalized_b:
+        return True
+    if _negations(normalized_a) != _negations(normalized_b):
+        return False
+    return fuzz.token_sort_ratio(normalized_a, normalized_b) >= threshold
+
+
+def find_duplicate(item: Dict, candidates: Iterable[Dict], threshold: float = None) -> Optional[Dict]:
+    """
+    Primer candidato del mismo bebé y categoría cuyo título coincide con el de `item`.
+    """
+    item_hash = knowledge_title_hash(item.get("title", ""))
+    same_group = [
+        candidate for candidate in candidates
+        if candidate.get("baby_id") == item.get("baby_id")
+        and candidate.get("category") == item.get("category")
+    ]
+
+    # Coincidencia exacta por hash antes que la difusa
+    for candidate in same_group:
+        if knowledge_title_hash(candidate.get("title", "")) == item_hash:
+            return candidate
+    for candidate in same_group:
+        if titles_match(item.get("title", ""), candidate.get("title", ""), threshold):
+            return candidate
+    return None
+
+
+def cluster_near_duplicates(items: List[Dict], threshold: float = None) -> List[List[Dict]]:
+    """
+    Agrupa elementos del mismo bebé y categoría con títulos equivalentes.
+    Cada grupo empieza por su representante (el más reciente).
+    """
+    ordered = sorted(items, key=lambda item: item.get("created_at") or "", reverse=True)
+    clusters: List[List[Dict]] = []
+    for item in ordered:
+        representatives = [cluster[0] for cluster in clusters]
+        match = find_duplicate(item, representatives, threshold)
+        if match is None:
+            clusters.append([item])
+        else:
+            next(cluster for cluster in clusters if cluster[0] is match).append(item)
+    return clusters
@@ -1,8 +1,8 @@
 # src/utils/knowledge_detector.py
 import json
-import httpx
 import os
 from typing import Dict, List, Optional, Tuple
+from .openai_client import create_chat_completion
 
 OPENAI_KEY = os.getenv("OPENAI_API_KEY")
 OPENAI_MODEL = os.getenv("OPENAI_MODEL", "gpt-4o-mini")
@@ -147,23 +147,18 @@ class KnowledgeDetector:
         user_message = f"Analiza este mensaje: '{message}'"
 
         try:
-            async with httpx.AsyncClient(timeout=30.0) as client:
-                response = await client.post(
-                    "https://api.openai.com/v1/chat/completions",
-                    json={
-                        "model": OPENAI_MODEL,
-                        "messages": [
-                            {"role": "system", "content": system_prompt},
-                            {"role": "user", "content": user_message}
-                        ],
-                        "max_tokens": 500,
-                        "temperature": 0.1,
-                    },
-                    headers={
-                        "Authorization": f"Bearer {OPENAI_KEY}",
-                        "Content-Type": "application/json"
-                    }
-                )
+            response = await create_chat_completion(
+                {
+                    "model": OPENAI_MODEL,
+                    "messages": [
+                        {"role": "system", "content": system_prompt},
+                        {"role": "user", "content": user_message}
+                    ],
+                    "max_tokens": 500,
+                    "temperature": 0.1,
+                },
+                deadline=30.0
+            )
 
             if response.status_code != 200:
                 print(f"Error en OpenAI API: {response.status_code} - {response.text}")
@@ -0,0 +1,119 @@
+# src/utils/knowledge_selector.py
+import os
+from typing import Dict, List, Set
+
+from .knowledge_dedup import normalize_knowledge_title
+from .tokens import estimate_tokens
+
+# Presupuesto de tokens para el bloque de conocimiento del prompt
+KNOWLEDGE_CONTEXT_BUDGET = int(os.getenv("KNOWLEDGE_CONTEXT_BUDGET", "600"))
+# Máximo de datos no obligatorios por mensaje
+KNOWLEDGE_CONTEXT_MAX_ITEMS = int(os.getenv("KNOWLEDGE_CONTEXT_MAX_ITEMS", "12"))
+
+# Categorías que siempre se incluyen, sin importar la consulta
+ALWAYS_INCLUDE_CATEGORIES = {"alergias", "salud"}
+
+STOPWORDS = {
+    # es
+    "de", "la", "el", "los", "las", "un", "una", "y", "o", "que", "en", "con", "por", "para",
+    "mi", "mis", "su", "sus", "es", "se", "lo", "le", "al", "del", "como", "pero", "muy", "mas",
+    "ya", "me", "te", "nos", "hay", "tiene", "esta", "este", "esto",
+    # en
+    "the", "a", "an", "and", "or", "of", "to", "in", "on", "for", "with", "my", "his", "her",
+    "is", "it", "be", "at", "has", "have",
+    # pt
+    "do", "da", "dos", "das", "um", "uma", "e", "no", "na", "com", "meu", "minha", "ele", "ela",
+}
+
+
+def _terms(text: str) -> Set[str]:
+    """
+    Términos normalizados (sin acentos ni stopwords) recortados a 5 caracteres
+    para que 'brócoli'/'brocolis' o 'siesta'/'siestas' coincidan.
+    """
+    return {
+        word[:5]
+        for word in normalize_knowledge_title(text).split()
+        if len(word) > 2 and word not in STOPWORDS
+    }
+
+
+def _item_text(item: Dict) -> str:
+    return " ".join(
+        str(item.get(field) or "")
+        for field in ("category", "subcategory", "title", "description")
+    )
+
+
+def _item_tokens(item: Dict) -> int:
+    # Aproximación de lo que ocupa el dato formateado en format_knowledge_for_context
+    return estimate_tokens(f"   • {item.get('title', '')} ⭐⭐⭐\n     └─ {item.get('description', '')}")
+
+
+def score_knowledge_item(item: Dict, message_terms: Set[str]) -> float:
+    """
+    Relevancia léxica del dato para el mensaje: fracción de términos del mensaje
+    presentes en el dato, con la importancia como desempate.
+    """
+    if not message_terms:
+        overlap = 0.0
+    else:
+        overlap = len(message_terms & _terms(_item_text(item))) / len(message_terms)
+    return overlap + (item.get("importance_level") or 1) * 0.01
+
+
+def select_relevant_knowledge(
+    knowledge_by_baby: Dict[str, Dict],
+    message: str,
+    budget_tokens: int = None,
+    max_items: int = None,
+) -> Dict[str, Dict]:
+    """
+    Filtra el conocimiento que se inyecta en el prompt:
+    1. Siempre incluye alergias y salud.
+    2. Completa con los datos más relevantes para el mensaje (solapamiento léxico)
+       hasta agotar el presupuesto de tokens o `max_items`.
+
+    Mantiene la estructura {baby_id: {'baby_name', 'knowledge'}} de format_knowledge_for_context
+    y el orden original de los datos dentro de cada bebé.
+    """
+    budget_tokens = KNOWLEDGE_CONTEXT_BUDGET if budget_tokens is None else budget_tokens
+    max_items = KNOWLEDGE_CONTEXT_MAX_ITEMS if max_items is None else max_items
+    message_terms = _terms(message or "")
+
+    selected_ids = set()
+    used_tokens = 0
+    candidates: List[tuple] = []
+
+    for baby_id, baby_info in knowledge_by_baby.items():
+        for position, item in enumerate(baby_info.get("knowledge", [])):
+            key = (baby_id, position)
+            if item.get("category") in ALWAYS_INCLUDE_CATEGORIES:
+                selected_ids.add(key)
+                used_tokens += _item_tokens(item)
+            else:
+                candidates.append((score_knowledge_item(item, message_terms), key, item))
+
+    candidates.sort(key=lambda candidate: candidate[0], reverse=True)
+    picked = 0
+    for _, key, item in candidates:
+        if picked >= max_items:
+            break
+        item_tokens = _item_tokens(item)
+        if used_tokens + item_tokens > budget_tokens:
+            continue
+        selected_ids.add(key)
+        used_tokens += item_tokens
+        picked += 1
+
+    selected = {}
+    for baby_id, baby_info in knowledge_by_baby.items():
+        items = [
+            item for position, item in enumerate(baby_info.get("knowledge", []))
+            if (baby_id, position) in selected_ids
+        ]
+        selected[baby_id] = {**baby_info, "knowledge": items}
+
+    total = sum(len(info.get("knowledge", [])) for info in knowledge_by_baby.values())
+    print(f"🧠 [KNOWLEDGE] {len(selected_ids)}/{total} datos seleccionados (~{used_tokens} tokens)")
+    return selected
@@ -28,7 +28,7 @@ ENGLISH_MARKERS = {
 }
 
 
-def detect_lang(text: str, default: str = "es") -> str:
+def detect_lang(text: str, default: str = "es", analysis=None) -> str:
     """
     Detecta idioma del texto. Devuelve 'es', 'en' o 'pt'.
     
@@ -36,16 +36,21 @@ def detect_lang(text: str, default: str = "es") -> str:
     1. Primero intenta detectar por palabras clave exclusivas (más preciso para frases cortas)
     2. Si no hay coincidencias claras, usa langdetect
     3. Si falla o viene vacío, retorna default
+
+    Si se pasa `analysis` (MessageAnalysis), se usan los conteos de marcadores ya calculados.
     """
     if not text or not text.strip():
         return default
 
-    text_lower = text.lower()
-    
     # 1️⃣ Contar coincidencias con palabras clave de cada idioma
-    pt_count = sum(1 for marker in PORTUGUESE_MARKERS if marker in text_lower)
-    es_count = sum(1 for marker in SPANISH_MARKERS if marker in text_lower)
-    en_count = sum(1 for marker in ENGLISH_MARKERS if marker in text_lower)
+    if analysis is not None:
+        marker_counts = analysis.lang_marker_counts
+        pt_count, es_count, en_count = marker_counts["pt"], marker_counts["es"], marker_counts["en"]
+    else:
+        text_lower = text.lower()
+        pt_count = sum(1 for marker in PORTUGUESE_MARKERS if marker in text_lower)
+        es_count = sum(1 for marker in SPANISH_MARKERS if marker in text_lower)
+        en_count = sum(1 for marker in ENGLISH_MARKERS if marker in text_lower)
     
     # 2️⃣ Si hay coincidencias claras, retornar el idioma con más coincidencias
     max_count = max(pt_count, es_count, en_count)
@@ -0,0 +1,180 @@
+# src/utils/message_analyzer.py
+import unicodedata
+from dataclasses import dataclass, field, replace
+from types import MappingProxyType
+from typing import Dict, Iterable, List, Mapping, Optional, Tuple
+
+from .aho_corasick import AhoCorasick
+from .fast_path import classify_trivial_message
+from .keywords_rag import (
+    DIAPER_KEYWORDS,
+    REFERENCE_KEYWORDS,
+    ROUTINE_DETECTION_KEYWORDS,
+    SECTION_KEYWORDS,
+    TEMPLATE_KEYWORDS,
+    keywords as RAG_KEYWORDS,
+)
+from .lang import ENGLISH_MARKERS, PORTUGUESE_MARKERS, SPANISH_MARKERS
+
+
+def fold_text(text: str) -> str:
+    """Minúsculas y sin acentos (misma normalización que el router de RAG)."""
+    return "".join(
+        c for c in unicodedata.normalize("NFD", text.lower())
+        if unicodedata.category(c) != "Mn"
+    )
+
+
+@dataclass(frozen=True)
+class MessageAnalysis:
+    """
+    Resultado inmutable del análisis de un mensaje. Lo consumen todas las etapas
+    del chat (idioma, fast path, secciones, templates, referencias, RAG, rutinas)
+    para no volver a escanear el texto y para que todas vean las mismas señales.
+    """
+
+    text: str
+    lower: str
+    folded: str
+    trivial_intent: Optional[str]
+    # vocabulario → keywords encontradas, en el orden en que están definidas
+    hits: Mapping[str, Tuple[str, ...]]
+    # índices (en keywords_rag.keywords) de las keywords RAG presentes literalmente
+    rag_keyword_indexes: Tuple[int, ...] = ()
+    # Keywords del perfil del bebé (se agregan cuando se conoce la edad)
+    profile_keywords: Tuple[dict, ...] = field(default=())
+
+    @property
+    def simple_greeting(self) -> bool:
+        return self.trivial_intent == "greeting"
+
+    def keywords_for(self, vocabulary: str) -> Tuple[str, ...]:
+        return self.hits.get(vocabulary, ())
+
+    @property
+    def sections(self) -> List[str]:
+        """Archivos de sección del prompt que aplican, en el orden del prompt."""
+        return [name for name in SECTION_KEYWORDS if self.hits.get(f"section:{name}")]
+
+    @property
+    def template_matches(self) -> List[Tuple[str, Optional[str]]]:
+        """
+        Templates cuyas keywords aparecen, en el orden de TEMPLATE_KEYWORDS,
+        junto al primer idioma que los activó.
+        """
+        matches = []
+        for template_key, keywords_by_lang in TEMPLATE_KEYWORDS.items():
+            found = set(self.hits.get(f"template:{template_key}", ()))
+            if not found:
+                continue
+            lang = next(
+                (lang for lang, kws in keywords_by_lang.items() if found.intersection(kws)),
+                None,
+            )
+            matches.append((template_key, lang))
+        return matches
+
+    @property
+    def template_key(self) -> Optional[str]:
+        matches = self.template_matches
+        return matches[0][0] if matches else None
+
+    @property
+    def reference_keywords(self) -> Tuple[str, ...]:
+        return self.hits.get("reference", ())
+
+    @property
+    def is_reference_query(self) -> bool:
+        return bool(self.reference_keywords)
+
+    @property
+    def routine_keywords(self) -> Tuple[str, ...]:
+        return self.hits.get("routine", ())
+
+    @property
+    def mentions_diaper(self) -> bool:
+        return bool(self.hits.get("diaper"))
+
+    @property
+    def lang_marker_counts(self) -> Dict[str, int]:
+        return {lang: len(self.hits.get(f"lang:{lang}", ())) for lang in ("pt", "es", "en")}
+
+    def with_profile_keywords(self, profile_keywords: Iterable[dict]) -> "MessageAnalysis":
+        return replace(self, profile_keywords=tuple(profile_keywords))
+
+
+class MessageAnalyzer:
+    """
+    Compila todos los vocabularios en un autómata y analiza cada mensaje en un solo
+    recorrido del texto en minúsculas (y otro del texto sin acentos para el RAG).
+    """
+
+    def __init__(
+        self,
+        vocabularies: Mapping[str, Iterable[str]],
+        folded_vocabulary: Iterable[str] = (),
+    ):
+        self._order: Dict[str, Dict[str, int]] = {}
+        patterns = []
+        for vocabulary, words in vocabularies.items():
+            order = self._order.setdefault(vocabulary, {})
+            for word in words:
+                if word not in order:
+                    order[word] = len(order)
+                    patterns.append((word, vocabulary))
+        self._automaton = AhoCorasick(patterns)
+
+        # Keywords RAG normalizadas; varias claves pueden normalizar al mismo texto
+        self.folded_keywords: List[str] = [fold_text(word) for word in folded_vocabulary]
+        self._folded_automaton = AhoCorasick(
+            (folded, index) for index, folded in enumerate(self.folded_keywords)
+        )
+
+    def analyze(self, message: str) -> MessageAnalysis:
+        text = message.strip()
+        lower = message.lower()
+        folded = fold_text(message)
+
+        found: Dict[str, set] = {}
+        for pattern, vocabulary in self._automaton.find_values(lower):
+            found.setdefault(vocabulary, set()).add(pattern)
+
+        hits = {
+            vocabulary: tuple(sorted(words, key=self._order[vocabulary].__getitem__))
+            for vocabulary, words in found.items()
+        }
+        rag_indexes = tuple(sorted(index for _, index in self._folded_automaton.find_values(folded)))
+
+        return MessageAnalysis(
+            text=text,
+            lower=lower,
+            folded=folded,
+            trivial_intent=classify_trivial_message(message),
+            hits=MappingProxyType(hits),
+            rag_keyword_indexes=rag_indexes,
+        )
+
+
+def _build_vocabularies() -> Dict[str, Iterable[str]]:
+    vocabularies: Dict[str, Iterable[str]] = {}
+    for section_file, section_keywords in SECTION_KEYWORDS.items():
+        vocabularies[f"section:{section_file}"] = sorted(section_keywords)
+    for template_key, keywords_by_lang in TEMPLATE_KEYWORDS.items():
+        vocabularies[f"template:{template_key}"] = [
+            keyword for keywords in keywords_by_lang.values() for keyword in keywords
+        ]
+    vocabularies["reference"] = sorted(REFERENCE_KEYWORDS)
+    vocabularies["routine"] = ROUTINE_DETECTION_KEYWORDS
+    vocabularies["diaper"] = DIAPER_KEYWORDS
+    vocabularies["lang:pt"] = sorted(PORTUGUESE_MARKERS)
+    vocabularies["lang:es"] = sorted(SPANISH_MARKERS)
+    vocabularies["lang:en"] = sorted(ENGLISH_MARKERS)
+    return vocabularies
+
+
+# Instancia global: los vocabularios se compilan una sola vez al importar
+message_analyzer = MessageAnalyzer(_build_vocabularies(), folded_vocabulary=RAG_KEYWORDS.keys())
+
+
+def analyze_message(message: str) -> MessageAnalysis:
+    return message_analyzer.analyze(message)
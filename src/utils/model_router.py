@@ -0,0 +1,151 @@
+# src/utils/model_router.py
+import json
+import os
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+DEFAULT_MODEL = os.getenv("OPENAI_MODEL", "gpt-4o")
+
+# Cada tier define el modelo y el máximo de tokens de salida
+MODEL_TIERS: Dict[str, Dict[str, Any]] = {
+    "light": {
+        "model": os.getenv("OPENAI_MODEL_LIGHT", "gpt-4o-mini"),
+        "max_tokens": int(os.getenv("OPENAI_MAX_TOKENS_LIGHT", "400")),
+    },
+    "standard": {
+        "model": os.getenv("OPENAI_MODEL_STANDARD", "gpt-4o-mini"),
+        "max_tokens": int(os.getenv("OPENAI_MAX_TOKENS_STANDARD", "1000")),
+    },
+    "complex": {
+        "model": os.getenv("OPENAI_MODEL_COMPLEX", DEFAULT_MODEL),
+        "max_tokens": int(os.getenv("OPENAI_MAX_TOKENS_COMPLEX", "1800")),
+    },
+}
+
+MODEL_ROUTING_ENABLED = os.getenv("MODEL_ROUTING_ENABLED", "true").lower() in ("1", "true", "yes")
+MODEL_ROUTING_LOG = os.getenv("MODEL_ROUTING_LOG")
+
+# Umbrales de clasificación
+SHORT_MESSAGE_WORDS = 8
+LONG_MESSAGE_WORDS = 40
+VERY_LONG_MESSAGE_WORDS = 80
+LARGE_RAG_CONTEXT_CHARS = 8000
+COMPLEX_SCORE = 3
+
+
+class ModelRouter:
+    """
+    Clasifica cada solicitud en un tier (light / standard / complex) usando
+    señales que ya calcula el endpoint de chat: saludo simple, secciones y
+    template detectados, largo del mensaje y fuerza del contexto RAG.
+    """
+
+    @staticmethod
+    def route(
+        message: str,
+        simple_greeting: bool = False,
+        sections: Optional[List[str]] = None,
+        template_detected: bool = False,
+        rag_context: str = "",
+        rag_sources: Optional[List[str]] = None,
+    ) -> Dict[str, Any]:
+        """
+        Retorna la decisión de routing:
+        {"tier", "model", "max_tokens", "score", "reasons", "signals"}
+        """
+        sections = sections or []
+        rag_sources = rag_sources or []
+        words = len(message.split())
+
+        signals = {
+            "simple_greeting": simple_greeting,
+            "sections": sections,
+            "template_detected": template_detected,
+            "message_words": words,
+            "rag_chars": len(rag_context),
+            "rag_sources": len(rag_sources),
+        }
+
+        if not MODEL_ROUTING_ENABLED:
+            return ModelRouter._decision("complex", 0, ["routing deshabilitado"], signals)
+
+        if simple_greeting:
+            return ModelRouter._decision("light", 0, ["saludo simple"], signals)
+
+        score = 0
+        reasons = []
+
+        if template_detected:
+            score += 2
+            reasons.append("template específico")
+        if sections:
+            score += len(sections)
+            reasons.append(f"{len(sections)} secciones")
+        if words > VERY_LONG_MESSAGE_WORDS:
+            score += 2
+            reasons.append(f"mensaje muy largo ({words} palabras)")
+        elif words > LONG_MESSAGE_WORDS:
+            score += 1
+            reasons.append(f"mensaje largo ({words} palabras)")
+        if len(rag_context) > LARGE_RAG_CONTEXT_CHARS or len(rag_sources) > 2:
+            score += 1
+            reasons.append("contexto RAG amplio")
+        elif words > SHORT_MESSAGE_WORDS and not rag_context:
+            # Sin material de apoyo el modelo tiene que razonar más por su cuenta
+            score += 1
+            reasons.append("sin contexto RAG")
+
+        if score >= COMPLEX_SCORE:
+            tier = "complex"
+        elif score == 0 and words <= SHORT_MESSAGE_WORDS:
+            tier = "light"
+            reasons.append("mensaje corto sin señales")
+        else:
+            tier = "standard"
+
+        return ModelRouter._decision(tier, score, reasons, signals)
+
+    @staticmethod
+    def _decision(tier: str, score: int, reasons: List[str], signals: Dict[str, Any]) -> Dict[str, Any]:
+        config = MODEL_TIERS[tier]
+        return {
+            "tier": tier,
+            "model": config["model"],
+            "max_tokens": config["max_tokens"],
+            "score": score,
+            "reasons": reasons,
+            "signals": signals,
+        }
+
+    @staticmethod
+    def log_decision(
+        decision: Dict[str, Any],
+        user_id: str,
+        usage: Optional[Dict[str, Any]] = None,
+        latency_ms: Optional[int] = None,
+    ) -> None:
+        """
+        Registra la decisión para evaluación offline. Siempre se imprime;
+        si MODEL_ROUTING_LOG está definido también se agrega como línea JSONL.
+        """
+        entry = {
+            "timestamp": datetime.now().isoformat(),
+            "user_id": user_id,
+            "tier": decision["tier"],
+            "model": decision["model"],
+            "max_tokens": decision["max_tokens"],
+            "score": decision["score"],
+            "reasons": decision["reasons"],
+            "signals": decision["signals"],
+            "usage": usage or {},
+            "latency_ms": latency_ms,
+        }
+        line = json.dumps(entry, ensure_ascii=False)
+        print(f"🧭 [ROUTING] {line}")
+
+        if MODEL_ROUTING_LOG:
+            try:
+                with open(MODEL_ROUTING_LOG, "a", encoding="utf-8") as log_file:
+                    log_file.write(line + "\n")
+            except OSError as e:
+                print(f"⚠️ [ROUTING] No se pudo escribir el log de routing: {e}")
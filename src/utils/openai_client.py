@@ -0,0 +1,84 @@
+# src/utils/openai_client.py
+import os
+import time
+from typing import Dict, Optional
+
+import httpx
+
+from .admission_control import openai_rate_limiter
+from .hedging import (
+    OPENAI_HEDGE_MIN_DELAY,
+    OPENAI_HEDGE_PERCENTILE,
+    OPENAI_HEDGING_ENABLED,
+    openai_hedge_budget,
+    openai_latency_tracker,
+    run_hedged,
+)
+from .resilience import ResiliencePolicy, openai_policy
+from .tokens import estimate_messages_tokens
+
+OPENAI_CHAT_COMPLETIONS_URL = "https://api.openai.com/v1/chat/completions"
+
+
+def _headers() -> Dict[str, str]:
+    return {
+        "Authorization": f"Bearer {os.getenv('OPENAI_API_KEY')}",
+        "Content-Type": "application/json",
+    }
+
+
+async def create_chat_completion(
+    body: Dict,
+    *,
+    deadline: Optional[float] = None,
+    policy: ResiliencePolicy = openai_policy,
+    hedge: bool = False,
+) -> httpx.Response:
+    """
+    Envía una solicitud a /v1/chat/completions aplicando el limitador de tasa
+    y la política de resiliencia compartida (deadline, reintentos, circuit breaker).
+
+    Args:
+        body: Body de la solicitud en formato OpenAI chat
+        deadline: Tiempo total máximo en segundos (por defecto el de la política)
+        hedge: Si es True y OPENAI_HEDGING_ENABLED está activo, cada intento que
+               supere el percentil configurado lanza una solicitud duplicada
+               (sujeto al presupuesto global de hedging)
+
+    Returns:
+        La respuesta HTTP final; el llamador revisa el status_code.
+
+    Raises:
+        AdmissionRejected: si el límite de RPM/TPM no deja cupo a tiempo
+        CircuitOpenError / DeadlineExceededError / httpx.HTTPError
+    """
+    estimated_tokens = estimate_messages_tokens(body.get("messages", [])) + body.get("max_tokens", 0)
+    use_hedging = hedge and OPENAI_HEDGING_ENABLED
+
+    async with httpx.AsyncClient() as client:
+        async def post(timeout: float) -> httpx.Response:
+            await openai_rate_limiter.acquire(estimated_tokens)
+            started_at = time.monotonic()
+            response = await client.post(
+                OPENAI_CHAT_COMPLETIONS_URL,
+                json=body,
+                headers=_headers(),
+                timeout=timeout,
+            )
+            if response.status_code == 200:
+                openai_latency_tracker.record(time.monotonic() - started_at)
+            return response
+
+        async def send(timeout: float) -> httpx.Response:
+            if not use_hedging:
+                return await post(timeout)
+            delay = openai_latency_tracker.hedge_delay(OPENAI_HEDGE_PERCENTILE, OPENAI_HEDGE_MIN_DELAY)
+            return await run_hedged(
+                lambda: post(timeout), delay, openai_hedge_budget,
+                is_success=lambda response: response.is_success,
+            )
+
+        if use_hedging:
+            # Una vez por solicitud lógica: los reintentos de la política no suman crédito
+            openai_hedge_budget.record_request()
+        return await policy.run(send, deadline=deadline)
@@ -1,8 +1,11 @@
 # src/utils/reference_detector.py
 import json
 from typing import List, Dict, Any, Optional
-from ..rag.utils import get_rag_context_with_sources, get_all_reference_chunks_from_file
+from ..rag.utils import get_rag_context_with_sources, get_all_reference_chunks_from_file, citation_index
+from ..rag.citations import dedupe_similar, extract_citations, merge_citations
 from .source_cache import source_cache
+from .keywords_rag import REFERENCE_KEYWORDS
+from .message_analyzer import MessageAnalysis, analyze_message
 
 class ReferenceDetector:
     """
@@ -10,26 +13,15 @@ class ReferenceDetector:
     Busca en el RAG registros que contengan metadata 'ref: true' para obtener fuentes específicas.
     """
     
-    REFERENCE_KEYWORDS = {
-        "fuentes", "referencias", "bibliografía", "origen de la información", 
-        "de dónde sacaste", "de donde sacaste", "dónde obtuviste", "donde obtuviste",
-        "qué fuentes", "que fuentes", "basado en qué", "basado en que",
-        "según qué autor", "segun que autor", "qué estudios", "que estudios", 
-        "investigaciones", "papers", "artículos", "articulos", "libros", 
-        "evidencia científica", "evidencia cientifica", "respaldo científico", "respaldo cientifico",
-        "autores", "expertos", "especialistas", "pedagogos", "médicos", "medicos",
-        "neurocientíficos", "neurocientificos", "investigadores", 
-        "dónde leíste", "donde leiste", "en qué te basas", "en que te basas",
-        "esa informacion", "esa información", "esta informacion", "esta información", "de donde es esa info"
-    }
+    REFERENCE_KEYWORDS = REFERENCE_KEYWORDS
     
     @staticmethod
-    def detect_reference_query(message: str) -> bool:
+    def detect_reference_query(message: str, analysis: Optional[MessageAnalysis] = None) -> bool:
         """
         Detecta si el usuario está preguntando por referencias o fuentes.
         """
-        message_lower = message.lower()
-        detected_keywords = [kw for kw in ReferenceDetector.REFERENCE_KEYWORDS if kw in message_lower]
+        analysis = analysis or analyze_message(message)
+        detected_keywords = list(analysis.reference_keywords)
         
         if detected_keywords:
             print(f"🔍 [REFERENCIAS] Keywords detectadas: {detected_keywords}")
@@ -83,147 +75,21 @@ Para obtener referencias específicas sobre un tema particular, puedes preguntar
         
         # Recopilar información de todas las fuentes
         has_ref_chunks = any(chunk.get("ref") is True for chunk in reference_chunks)
-        sources = list(set(chunk.get("source", "").replace('_ref.pdf', '').replace('.pdf', '') for chunk in reference_chunks))
-        
-        # Extraer autores y referencias mencionadas en los chunks
-        all_content = " ".join([chunk.get("content", "") for chunk in reference_chunks])
-        
-        # Buscar patrones de referencias comunes
-        reference_patterns = {
-            "autores": [],
-            "instituciones": [],
-            "estudios": [],
-            "publicaciones": []
-        }
-        
-        # Buscar autores mencionados (nombres propios seguidos de apellidos)
-        import re
-        
-        # Patrones mejorados para detectar referencias académicas
-        # Buscar nombres de autores (nombre + apellido, evitando falsos positivos)
-        author_patterns = [
-            r'\bde\s+([A-Z][a-záéíóúñ]{2,})\s+([A-Z][a-záéíóúñ]{2,})\b',  # de Nombre Apellido  
-            r'\bdel\s+([A-Z][a-záéíóúñ]{2,})\s+([A-Z][a-záéíóúñ]{2,})\b', # del Nombre Apellido
-            r'\b([A-Z][a-záéíóúñ]{2,})\s+([A-Z][a-záéíóúñ]{2,})\b',  # Nombre Apellido general
-            r'\b([A-Z][a-záéíóúñ]{2,})\s+y\s+([A-Z][a-záéíóúñ]{2,})\b'  # Nombre y Apellido
-        ]
-        
-        # Palabras a excluir (no son nombres de autores)
-        excluded_words = {
-            'Essential', 'Oil', 'Safety', 'Guide', 'Health', 'Care', 'Professionals',
-            'European', 'Medicines', 'Agency', 'American', 'Herbal', 'Products', 'Association',
-            'Council', 'International', 'National', 'Alliance', 'Aromatherapy', 'Holistic'
-        }
-        
-        authors_found = []
-        for pattern in author_patterns:
-            matches = re.findall(pattern, all_content)
-            for match in matches:
-                if isinstance(match, tuple):
-                    # Para el patrón "Nombre y Apellido", crear dos autores separados
-                    if ' y ' in f"{match[0]} {match[1]}":
-                        authors_found.append(match[0])
-                        authors_found.append(match[1])
-                    else:
-                        full_name = f"{match[0]} {match[1]}"
-                        # Verificar que no sea una palabra excluida
-                        words = full_name.split()
-                        if not any(word in excluded_words for word in words) and len(full_name) > 5:
-                            authors_found.append(full_name)
-                else:
-                    full_name = match
-                    words = full_name.split()
-                    if not any(word in excluded_words for word in words) and len(full_name) > 5:
-                        authors_found.append(full_name)
-        
-        # Limpiar duplicados y limitar
-        authors_found = list(set(authors_found))[:5]
-        
-        # Buscar instituciones, organizaciones y referencias de libros
-        institution_patterns = [
-            r'\b(European Medicines Agency)\s*\([^)]*\)?',
-            r'\b(American Herbal Products Association)\s*\([^)]*\)?', 
-            r'\b(National Association for Holistic Aromatherapy)\s*\([^)]*\)?',
-            r'\b(Alliance of International Aromatherapists)\s*\([^)]*\)?',
-            r'\b(American Academy of Pediatrics)\b',
-            r'\b(American Psychological Association)\b',
-            r'\b(World Health Organization)\b',
-            r'\b(Mindsight Institute)\b',
-            r'\b([A-Z][a-záéíóúñ\s]{15,80}(?:Agency|Association|Council|Institute|Organization|Academy))\b'
-        ]
-        
-        # Buscar también referencias de libros específicamente
-        book_patterns = [
-            r'del libro\s+"([^"]+)"',
-            r'en el libro\s+"([^"]+)"',
-            r'libro\s+"([^"]+)"',
-            r'"([^"]{15,100})"(?:\s*(?:de|del|por)\s+[A-Z][a-záéíóúñ]+)',  # Títulos entre comillas seguidos de autor
-            r'(?:según|en|del|como indica|menciona)\s+([A-Z][^.]{15,80}(?:Manual|Guide|Handbook|Book|Guía|Tratado|Estudio))',
-            r'([A-Z][^.]{15,80}:\s*[A-Z][^.]{10,60})',  # Títulos con subtítulos
-            r'en\s+"([^"]{15,100})"',  # Cualquier título entre comillas después de "en"
-            r'trabajo\s+"([^"]+)"',  # Referencias a trabajos específicos
-            r'investigación\s+"([^"]+)"',  # Referencias a investigaciones específicas
-            r'guías oficiales de\s+([^.]{10,60})',  # Referencias a guías oficiales
-            r'recomendaciones de\s+(la\s+)?([A-Z][^.]{15,80}(?:Association|Academy|Organization|Institute))',  # Recomendaciones de organizaciones
-        ]
-        
-        institutions_found = []
-        books_found = []
-        
-        # Buscar instituciones
-        for pattern in institution_patterns:
-            matches = re.findall(pattern, all_content, re.IGNORECASE)
-            for match in matches:
-                if isinstance(match, str) and len(match.strip()) > 5:
-                    inst_clean = match.strip()
-                    # Remover siglas entre paréntesis al final
-                    inst_clean = re.sub(r'\s*\([^)]*\)$', '', inst_clean)
-                    # No truncar automáticamente, solo si es excesivamente largo
-                    if len(inst_clean) > 100:
-                        inst_clean = inst_clean[:97] + "..."
-                    institutions_found.append(inst_clean)
-        
-        # Buscar libros y publicaciones
-        for pattern in book_patterns:
-            matches = re.findall(pattern, all_content, re.IGNORECASE)
-            for match in matches:
-                if isinstance(match, tuple):
-                    # Para patrones que devuelven tuplas, tomar el elemento más relevante
-                    book_text = match[1] if len(match) > 1 and match[1] else match[0]
-                else:
-                    book_text = match
-                
-                if isinstance(book_text, str) and len(book_text.strip()) > 10:
-                    book_clean = book_text.strip()
-                    # Limpiar caracteres extraños pero mantener el título completo
-                    book_clean = re.sub(r'^\W+|\W+$', '', book_clean)
-                    # Limpiar referencias incompletas
-                    book_clean = re.sub(r'\s*\.\.\.$', '', book_clean)  # Remover puntos suspensivos al final
-                    
-                    # Validar que sea un título razonable
-                    if (10 < len(book_clean) < 150 and 
-                        not book_clean.lower().startswith(('del ', 'de ', 'la ', 'el ')) and
-                        not book_clean.endswith(('...', 'A...'))):
-                        books_found.append(book_clean)
-        
-        # Limpiar duplicados y mejorar presentación
-        institutions_found = list(set(institutions_found))[:6]
-        books_found = list(set(books_found))[:5]
-        
+
+        # Extraer autores y referencias mencionadas en los chunks (patrones precompilados)
+        citations = extract_citations(chunk.get("content", "") for chunk in reference_chunks)
+        return ReferenceDetector.format_citations_response(citations, has_ref_chunks=has_ref_chunks)
+
+    @staticmethod
+    def format_citations_response(citations: Dict[str, List[str]], has_ref_chunks: bool = True) -> str:
+        """
+        Arma la respuesta a partir de citas ya extraídas ({authors, institutions, books}).
+        """
+        authors_found = citations.get("authors", [])[:5]
+        institutions_found = citations.get("institutions", [])[:6]
         # Limpiar libros duplicados similares
-        books_cleaned = []
-        for book in books_found:
-            # Evitar duplicados parciales
-            is_duplicate = False
-            for existing in books_cleaned:
-                if (book.lower() in existing.lower() or existing.lower() in book.lower()) and abs(len(book) - len(existing)) < 10:
-                    is_duplicate = True
-                    break
-            if not is_duplicate:
-                books_cleaned.append(book)
-        
-        books_found = books_cleaned[:5]
-        
+        books_found = dedupe_similar(citations.get("books", []))[:5]
+
         # Construir respuesta resumida
         response = "📚 **Referencias y fuentes consultadas**\n\n"
         
@@ -289,6 +155,14 @@ Para obtener referencias específicas sobre un tema particular, puedes preguntar
         
         return response
     
+    @staticmethod
+    def _indexed_citations(source_file: str) -> Optional[Dict[str, List[str]]]:
+        """Citas guardadas en la ingesta para la fuente (o su PDF original si es un _ref.pdf)."""
+        citations = citation_index.get(source_file)
+        if citations is None and source_file.endswith('_ref.pdf'):
+            citations = citation_index.get(source_file.replace('_ref.pdf', '.pdf'))
+        return citations
+
     @staticmethod
     async def handle_reference_query(message: str, user_id: str) -> str:
         """
@@ -305,10 +179,22 @@ Para obtener referencias específicas sobre un tema particular, puedes preguntar
             print(f"📋 [REFERENCIAS] Documentos en cache: {cached_sources['sources']}")
             print(f"📋 [REFERENCIAS] Timestamp cache: {cached_sources['timestamp']}")
             
-            # Buscar referencias en los documentos específicos de la respuesta anterior
+            # Citas precalculadas en la ingesta: una búsqueda por fuente, sin regex
+            all_citations = []
+            missing_sources = []
+            for source_file in cached_sources["processed_sources"]:
+                citations = ReferenceDetector._indexed_citations(source_file)
+                if citations is None:
+                    missing_sources.append(source_file)
+                else:
+                    all_citations.append(citations)
+            if all_citations:
+                print(f"⚡ [REFERENCIAS] Citas del índice para {len(all_citations)} fuente(s)")
+
+            # Las fuentes sin citas en el índice se leen de sus chunks como antes
             all_reference_chunks = []
             
-            for source_file, reference_query in cached_sources["processed_sources"].items():
+            for source_file in missing_sources:
                 print(f"🔍 [REFERENCIAS] Obteniendo TODOS los chunks de referencia de {source_file}")
                 
                 # Usar la nueva función que obtiene TODOS los chunks de referencia sin query semántica
@@ -340,9 +226,15 @@ Para obtener referencias específicas sobre un tema particular, puedes preguntar
                 except Exception as e:
                     print(f"❌ Error obteniendo chunks de referencia de {source_file}: {e}")
             
-            if all_reference_chunks:
-                print(f"✅ [REFERENCIAS] Total chunks de referencia encontrados: {len(all_reference_chunks)}")
-                response = ReferenceDetector.format_references_response(all_reference_chunks)
+            if all_citations or all_reference_chunks:
+                has_ref_chunks = bool(all_citations)
+                if all_reference_chunks:
+                    print(f"✅ [REFERENCIAS] Total chunks de referencia encontrados: {len(all_reference_chunks)}")
+                    has_ref_chunks = has_ref_chunks or any(chunk.get("ref") is True for chunk in all_reference_chunks)
+                    all_citations.append(extract_citations(chunk.get("content", "") for chunk in all_reference_chunks))
+                response = ReferenceDetector.format_citations_response(
+                    merge_citations(all_citations), has_ref_chunks=has_ref_chunks
+                )
                 
                 # Agregar contexto sobre de dónde vienen las referencias
                 original_query = cached_sources.get("original_query", "la consulta anterior")
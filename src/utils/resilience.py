@@ -0,0 +1,382 @@
+# src/utils/resilience.py
+import asyncio
+import os
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from typing import Awaitable, Callable, Optional
+
+import httpx
+
+# Respuestas que indican un problema transitorio del upstream
+RETRYABLE_STATUS_CODES = {408, 425, 429, 500, 502, 503, 504}
+
+# Métodos que se pueden repetir sin riesgo de duplicar efectos
+IDEMPOTENT_METHODS = {"GET", "HEAD", "OPTIONS", "PUT", "DELETE"}
+
+# Si queda menos que esto del deadline no vale la pena lanzar otro intento
+MIN_ATTEMPT_SECONDS = 0.5
+
+
+class CircuitOpenError(Exception):
+    """
+    El circuit breaker está abierto: el upstream se considera caído y se falla rápido.
+    """
+
+    def __init__(self, name: str, retry_after: float):
+        super().__init__(f"Circuito '{name}' abierto, reintentar en {retry_after:.1f}s")
+        self.retry_after = retry_after
+
+
+class DeadlineExceededError(Exception):
+    """
+    Se agotó el tiempo total de la solicitud (incluyendo reintentos y esperas).
+    """
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker clásico de tres estados:
+    - closed: las llamadas pasan; se cuentan fallos consecutivos
+    - open: tras `failure_threshold` fallos, se rechaza todo durante `recovery_timeout`
+    - half_open: pasado el cooldown se deja pasar una llamada de prueba
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, name: str, failure_threshold: int = 5, recovery_timeout: float = 30.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        return self._state
+
+    def before_call(self) -> None:
+        """
+        Lanza CircuitOpenError si la llamada no debe intentarse.
+        """
+        with self._lock:
+            if self._state == self.CLOSED:
+                return
+
+            if self._state == self.OPEN:
+                elapsed = time.monotonic() - self._opened_at
+                if elapsed < self.recovery_timeout:
+                    raise CircuitOpenError(self.name, self.recovery_timeout - elapsed)
+                self._state = self.HALF_OPEN
+                self._trial_in_flight = False
+                print(f"🟡 [CIRCUIT:{self.name}] Half-open, permitiendo llamada de prueba")
+
+            if self._trial_in_flight:
+                raise CircuitOpenError(self.name, 1.0)
+            self._trial_in_flight = True
+
+    def record_success(self) -> None:
+        with self._lock:
+            if self._state != self.CLOSED:
+                print(f"🟢 [CIRCUIT:{self.name}] Cerrado, upstream recuperado")
+            self._state = self.CLOSED
+            self._failures = 0
+            self._trial_in_flight = False
+
+    def release(self) -> None:
+        """
+        La llamada no llegó a hablar con el upstream (error local, cancelación):
+        libera la prueba de half-open sin contar éxito ni fallo.
+        """
+        with self._lock:
+            self._trial_in_flight = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            self._trial_in_flight = False
+            if self._state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                if self._state != self.OPEN:
+                    print(f"🔴 [CIRCUIT:{self.name}] Abierto tras {self._failures} fallos consecutivos")
+                self._state = self.OPEN
+                self._opened_at = time.monotonic()
+
+
+def parse_retry_after(response: httpx.Response) -> Optional[float]:
+    """
+    Lee Retry-After (segundos o fecha HTTP) o retry-after-ms de una respuesta.
+    """
+    retry_after_ms = response.headers.get("retry-after-ms")
+    if retry_after_ms:
+        try:
+            return float(retry_after_ms) / 1000.0
+        except ValueError:
+            pass
+
+    retry_after = response.headers.get("retry-after")
+    if not retry_after:
+        return None
+    try:
+        return max(0.0, float(retry_after))
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(retry_after)
+        return max(0.0, retry_at.timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class ResiliencePolicy:
+    """
+    Política reutilizable para llamadas HTTP a servicios externos:
+    - deadline total de la solicitud (los intentos se ajustan al tiempo restante)
+    - reintentos solo ante errores transitorios (timeouts, errores de red, 408/429/5xx)
+    - backoff exponencial con full jitter para evitar thundering herd
+    - circuit breaker para fallar rápido cuando el upstream está caído (un 429 no cuenta)
+    - circuit breaker para fallar rápido cuando el upstream está caído
+    """
+
+    def __init__(
+        self,
+        name: str,
+        *,
+        deadline: float,
+        max_attempts: int = 3,
+        attempt_timeout: Optional[float] = None,
+        base_delay: float = 0.5,
+        max_delay: float = 8.0,
+        breaker: Optional[CircuitBreaker] = None,
+    ):
+        self.name = name
+        self.deadline = deadline
+        self.max_attempts = max_attempts
+        self.attempt_timeout = attempt_timeout or deadline
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.breaker = breaker
+
+    def backoff_delay(self, attempt: int, retry_after: Optional[float] = None) -> float:
+        """
+        Espera antes del siguiente intento. Full jitter: uniforme en [0, min(max, base * 2^n)].
+        Si el upstream envió Retry-After, nunca se espera menos que eso.
+        """
+        jitter = random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+        if retry_after is not None:
+            return retry_after + jitter * 0.1
+        return jitter
+
+    def _is_retryable_error(self, error: Exception, idempotent: bool) -> bool:
+        if isinstance(error, (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)):
+            # La solicitud nunca llegó al servidor
+            return True
+        return idempotent and isinstance(error, httpx.TransportError)
+
+    def _is_upstream_error(self, error: BaseException) -> bool:
+        # Solo los errores de transporte dicen algo del upstream; el resto (AdmissionRejected,
+        # bugs, cancelaciones) no debe abrir el circuito
+        return isinstance(error, httpx.TransportError)
+
+    def _record(self, response: httpx.Response) -> None:
+        if not self.breaker:
+            return
+        if response.status_code == 429:
+            # Throttling: el upstream está vivo pero limita la tasa. No cuenta como fallo
+            # (abriría el circuito por exceso de uso) ni como éxito (no prueba recuperación)
+            self.breaker.release()
+        elif response.status_code in RETRYABLE_STATUS_CODES:
+            self.breaker.record_failure()
+        else:
+            self.breaker.record_success()
+
+    def _plan_next(self, attempt: int, deadline_at: float, response: Optional[httpx.Response]) -> Optional[float]:
+        """
+        Decide si hay otro intento. Retorna la espera en segundos, o None para no reintentar.
+        """
+        if attempt >= self.max_attempts - 1:
+            return None
+        retry_after = parse_retry_after(response) if response is not None else None
+        delay = self.backoff_delay(attempt, retry_after)
+        if time.monotonic() + delay + MIN_ATTEMPT_SECONDS >= deadline_at:
+            print(f"⏳ [{self.name.upper()}] Sin tiempo para otro intento dentro del deadline")
+            return None
+        return delay
+
+    def _attempt_timeout(self, deadline_at: float) -> float:
+        remaining = deadline_at - time.monotonic()
+        if remaining < MIN_ATTEMPT_SECONDS:
+            raise DeadlineExceededError(f"Deadline de {self.deadline}s agotado para '{self.name}'")
+        if self.breaker:
+            self.breaker.before_call()
+        return min(self.attempt_timeout, remaining)
+
+    def _after_error(self, error: BaseException, attempt: int, deadline_at: float, idempotent: bool) -> Optional[float]:
+        """
+        Decide qué hacer tras un intento que lanzó `error`: retorna la espera antes del
+        siguiente intento, o None para relanzarlo.
+        """
+        if not self._is_upstream_error(error):
+            if self.breaker:
+                self.breaker.release()
+            return None
+        if self.breaker:
+            self.breaker.record_failure()
+        if not self._is_retryable_error(error, idempotent):
+            return None
+        delay = self._plan_next(attempt, deadline_at, None)
+        if delay is not None:
+            print(f"🔄 [{self.name.upper()}] {type(error).__name__} en intento {attempt + 1}, reintentando en {delay:.2f}s")
+        return delay
+
+    def _after_response(self, response: httpx.Response, attempt: int, deadline_at: float, idempotent: bool) -> Optional[float]:
+        """
+        Decide qué hacer tras un intento que devolvió `response`: retorna la espera antes
+        del siguiente intento, o None para devolver la respuesta al llamador.
+        """
+        self._record(response)
+        if response.status_code not in RETRYABLE_STATUS_CODES:
+            return None
+        if not idempotent and response.status_code not in (429, 503):
+            return None
+        delay = self._plan_next(attempt, deadline_at, response)
+        if delay is not None:
+            print(f"🔄 [{self.name.upper()}] HTTP {response.status_code} en intento {attempt + 1}, reintentando en {delay:.2f}s")
+        return delay
+
+    async def run(
+        self,
+        operation: Callable[[float], Awaitable[httpx.Response]],
+        *,
+        idempotent: bool = True,
+        deadline: Optional[float] = None,
+    ) -> httpx.Response:
+        """
+        Ejecuta `operation(timeout)` aplicando la política.
+        Retorna la última respuesta (el llamador decide qué hacer con 4xx/5xx finales)
+        o relanza el último error de red si no hubo respuesta.
+        """
+        deadline_at = time.monotonic() + (deadline or self.deadline)
+
+        for attempt in range(self.max_attempts):
+            timeout = self._attempt_timeout(deadline_at)
+            try:
+                response = await operation(timeout)
+            except BaseException as error:
+                delay = self._after_error(error, attempt, deadline_at, idempotent)
+                if delay is None:
+                    raise
+            else:
+                delay = self._after_response(response, attempt, deadline_at, idempotent)
+                if delay is None:
+                    return response
+                await response.aclose()
+
+            await asyncio.sleep(delay)
+
+        raise DeadlineExceededError(f"Reintentos agotados para '{self.name}'")
+
+    def run_sync(
+        self,
+        operation: Callable[[float], httpx.Response],
+        *,
+        idempotent: bool = True,
+        deadline: Optional[float] = None,
+    ) -> httpx.Response:
+        """
+        Versión síncrona de `run` (cliente de Supabase, ingesta).
+        """
+        deadline_at = time.monotonic() + (deadline or self.deadline)
+
+        for attempt in range(self.max_attempts):
+            timeout = self._attempt_timeout(deadline_at)
+            try:
+                response = operation(timeout)
+            except BaseException as error:
+                delay = self._after_error(error, attempt, deadline_at, idempotent)
+                if delay is None:
+                    raise
+            else:
+                delay = self._after_response(response, attempt, deadline_at, idempotent)
+                if delay is None:
+                    return response
+                response.close()
+
+            time.sleep(delay)
+
+        raise DeadlineExceededError(f"Reintentos agotados para '{self.name}'")
+
+
+class ResilientTransport(httpx.BaseTransport):
+    """
+    Transporte httpx síncrono que aplica una ResiliencePolicy a cada request.
+    Permite cubrir todas las llamadas del cliente de Supabase sin tocar cada query.
+    """
+
+    def __init__(self, policy: ResiliencePolicy, transport: Optional[httpx.BaseTransport] = None):
+        self.policy = policy
+        self._transport = transport or httpx.HTTPTransport(http2=True)
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        # Cargar el body en memoria para poder reenviarlo en cada intento
+        request.read()
+
+        def send(timeout: float) -> httpx.Response:
+            request.extensions["timeout"] = httpx.Timeout(timeout).as_dict()
+            return self._transport.handle_request(request)
+
+        return self.policy.run_sync(send, idempotent=request.method in IDEMPOTENT_METHODS)
+
+    def close(self) -> None:
+        self._transport.close()
+
+
+def supabase_client_options(policy: Optional["ResiliencePolicy"] = None):
+    """
+    ClientOptions de Supabase con un cliente httpx que aplica la política de resiliencia.
+    """
+    from supabase import ClientOptions
+
+    http_client = httpx.Client(
+        transport=ResilientTransport(policy or supabase_policy),
+        follow_redirects=True,
+    )
+    return ClientOptions(httpx_client=http_client)
+
+
+# Circuit breakers compartidos por upstream
+openai_breaker = CircuitBreaker(
+    "openai",
+    failure_threshold=int(os.getenv("OPENAI_CIRCUIT_FAILURES", "5")),
+    recovery_timeout=float(os.getenv("OPENAI_CIRCUIT_COOLDOWN", "30")),
+)
+supabase_breaker = CircuitBreaker(
+    "supabase",
+    failure_threshold=int(os.getenv("SUPABASE_CIRCUIT_FAILURES", "5")),
+    recovery_timeout=float(os.getenv("SUPABASE_CIRCUIT_COOLDOWN", "15")),
+)
+
+# Políticas globales
+openai_policy = ResiliencePolicy(
+    "openai",
+    deadline=float(os.getenv("OPENAI_REQUEST_DEADLINE", "60")),
+    max_attempts=int(os.getenv("OPENAI_MAX_ATTEMPTS", "3")),
+    attempt_timeout=float(os.getenv("OPENAI_ATTEMPT_TIMEOUT", "45")),
+    base_delay=1.0,
+    max_delay=8.0,
+    breaker=openai_breaker,
+)
+supabase_policy = ResiliencePolicy(
+    "supabase",
+    deadline=float(os.getenv("SUPABASE_REQUEST_DEADLINE", "15")),
+    max_attempts=int(os.getenv("SUPABASE_MAX_ATTEMPTS", "3")),
+    attempt_timeout=float(os.getenv("SUPABASE_ATTEMPT_TIMEOUT", "10")),
+    base_delay=0.2,
+    max_delay=2.0,
+    breaker=supabase_breaker,
+)
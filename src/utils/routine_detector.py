@@ -1,62 +1,30 @@
 #src/utils/routine_detector.py
 import json
-import httpx
 import os
 from typing import List, Dict, Any, Optional
 from datetime import time
+from .openai_client import create_chat_completion
+from .message_analyzer import MessageAnalysis, analyze_message
 
 class RoutineDetector:
     
     @staticmethod
-    async def analyze_message(message: str, babies_context: List[Dict]) -> Optional[Dict]:
+    async def analyze_message(message: str, babies_context: List[Dict], analysis: Optional[MessageAnalysis] = None) -> Optional[Dict]:
         """
         Analiza un mensaje para detectar información sobre rutinas
         """
-        
-        # Palabras clave que indican conversaciones sobre rutinas
-        routine_keywords = [
-            # Español
-            "rutina", "horario", "cronograma", "agenda",
-            "despertar", "desayuno", "almuerzo", "cena", "siesta",
-            "baño", "leche", "comida",
-            "jardín", "colegio", "actividades", "estudio", "estudiar",
-            "tareas", "deberes", "matemáticas", "lectura", "escritura",
-            "ciencias", "arte", "lunes", "miércoles", "viernes",
-            "después de", "de la tarde", "semana", "establecer", "crear",
-            # Inglés
-            "routine", "schedule", "timetable", "plan", "agenda",
-            "wake up", "breakfast", "lunch", "dinner", "nap",
-            "sleep", "bath", "milk", "meal", "snack",
-            "kindergarten", "school", "activities", "study", "homework",
-            "math", "reading", "writing", "science", "art",
-            "monday", "wednesday", "friday",
-            "afternoon", "evening", "pm", "am",
-            # Portugués
-            "rotina", "horário", "horario", "cronograma", "agenda",
-            "acordar", "despertar", "café da manhã", "cafe da manha", "almoco", "almoço", "jantar", "soneca",
-            "sono", "banho", "leite", "comida",
-            "escola", "creche", "atividades", "atividades", "estudo", "estudar",
-            "tarefas", "deveres", "matemática", "matematica", "leitura", "escrita",
-            "ciências", "ciencias", "arte", "segunda", "quarta", "sexta",
-            "tarde", "manhã", "manha", "rotina diária", "rotina diaria"
-        ]
-
-        message_lower = message.lower()
+        analysis = analysis or analyze_message(message)
+        message_lower = analysis.lower
 
-        diaper_tokens = [
-            "pañal", "panal", "diaper", "fralda",
-            "cambiar pañal", "cambiar panal", "cambio de pañal",
-            "cambiarle el pañal", "cambiarle el panal"
-        ]
-        if any(token in message_lower for token in diaper_tokens):
+        if analysis.mentions_diaper:
             print("🔁 Mensaje identificado como cambio de pañal. Saltando detección de rutinas.")
             return None
         
         # Verificar si hay palabras clave relacionadas con rutinas
-        has_routine_keywords = any(keyword in message_lower for keyword in routine_keywords)
+        has_routine_keywords = bool(analysis.routine_keywords)
         
         print(f"🔍 Mensaje: '{message}'")
-        print(f"🔍 Keywords encontradas: {[k for k in routine_keywords if k in message_lower]}")
+        print(f"🔍 Keywords encontradas: {list(analysis.routine_keywords)}")
         print(f"🔍 Tiene keywords de rutina: {has_routine_keywords}")
         print(f"👥 Bebés disponibles: {[b.get('name', 'Sin nombre') for b in babies_context]}")
         
@@ -171,83 +139,78 @@ Si NO hay información clara de rutina, responde: {{"has_routine_info": false}}
             # print(f"🤖 Enviando prompt a OpenAI...")
             # print(f"🤖 Prompt: {prompt[:500]}...")
                 
-            async with httpx.AsyncClient(timeout=30.0) as client:
-                response = await client.post(
-                    "https://api.openai.com/v1/chat/completions",
-                    headers={
-                        "Authorization": f"Bearer {openai_key}",
-                        "Content-Type": "application/json"
-                    },
-                    json={
-                        "model": os.getenv("OPENAI_MODEL", "gpt-4o"),
-                        "messages": [{"role": "user", "content": prompt}],
-                        "temperature": 0.3,
-                        "max_tokens": 1000
-                    }
-                )
+            response = await create_chat_completion(
+                {
+                    "model": os.getenv("OPENAI_MODEL", "gpt-4o"),
+                    "messages": [{"role": "user", "content": prompt}],
+                    "temperature": 0.3,
+                    "max_tokens": 1000
+                },
+                deadline=30.0
+            )
+            
+            print(f"🤖 Respuesta OpenAI status: {response.status_code}")
+            
+            if response.status_code != 200:
+                print(f"❌ Error en OpenAI API: {response.status_code}")
+                print(f"❌ Response: {response.text}")
+                return None
                 
-                print(f"🤖 Respuesta OpenAI status: {response.status_code}")
+            data = response.json()
+            content = data.get("choices", [{}])[0].get("message", {}).get("content", "")
+            
+            print(f"🤖 Contenido recibido: {content}")
+            
+            # Limpiar markers de código markdown si existen
+            if content.startswith("```json"):
+                content = content.replace("```json", "").replace("```", "").strip()
+            elif content.startswith("```"):
+                content = content.replace("```", "").strip()
+            
+            print(f"🤖 Contenido limpio para JSON: {content[:200]}...")
+            
+            # Parsear respuesta JSON
+            try:
+                result = json.loads(content)
+                print(f"🧠 JSON parseado: {result}")
                 
-                if response.status_code != 200:
-                    print(f"❌ Error en OpenAI API: {response.status_code}")
-                    print(f"❌ Response: {response.text}")
+                if not result.get("has_routine_info", False):
+                    print("❌ OpenAI dice que no hay info de rutina")
                     return None
                     
-                data = response.json()
-                content = data.get("choices", [{}])[0].get("message", {}).get("content", "")
+                # Validar estructura de actividades
+                activities = result.get("activities", [])
+                validated_activities = []
                 
-                print(f"🤖 Contenido recibido: {content}")
+                for i, activity in enumerate(activities):
+                    if activity.get("time_start") and activity.get("activity"):
+                        validated_activities.append({
+                            "time_start": activity["time_start"],
+                            "time_end": activity.get("time_end"),
+                            "activity": activity["activity"],
+                            "details": activity.get("details", ""),
+                            "activity_type": activity.get("activity_type", "care"),
+                            "order_index": i + 1
+                        })
                 
-                # Limpiar markers de código markdown si existen
-                if content.startswith("```json"):
-                    content = content.replace("```json", "").replace("```", "").strip()
-                elif content.startswith("```"):
-                    content = content.replace("```", "").strip()
-                
-                print(f"🤖 Contenido limpio para JSON: {content[:200]}...")
-                
-                # Parsear respuesta JSON
-                try:
-                    result = json.loads(content)
-                    print(f"🧠 JSON parseado: {result}")
-                    
-                    if not result.get("has_routine_info", False):
-                        print("❌ OpenAI dice que no hay info de rutina")
-                        return None
-                        
-                    # Validar estructura de actividades
-                    activities = result.get("activities", [])
-                    validated_activities = []
-                    
-                    for i, activity in enumerate(activities):
-                        if activity.get("time_start") and activity.get("activity"):
-                            validated_activities.append({
-                                "time_start": activity["time_start"],
-                                "time_end": activity.get("time_end"),
-                                "activity": activity["activity"],
-                                "details": activity.get("details", ""),
-                                "activity_type": activity.get("activity_type", "care"),
-                                "order_index": i + 1
-                            })
-                    
-                    if not validated_activities:
-                        return None
-                        
-                    return {
-                        "confidence": result.get("confidence", 0.7),
-                        "routine_type": result.get("routine_type", "daily"),
-                        "routine_name": result.get("routine_name", f"Rutina de {baby_name}"),
-                        "activities": validated_activities,
-                        "baby_name": baby_name,
-                        "context_summary": result.get("context_summary", ""),
-                        "detected_from_message": message
-                    }
-                    
-                except json.JSONDecodeError as e:
-                    print(f"❌ Error parseando JSON de OpenAI: {e}")
-                    print(f"Contenido recibido: {content}")
+                if not validated_activities:
                     return None
                     
+                return {
+                    "confidence": result.get("confidence", 0.7),
+                    "routine_type": result.get("routine_type", "daily"),
+                    "routine_name": result.get("routine_name", f"Rutina de {baby_name}"),
+                    "activities": validated_activities,
+                    "baby_name": baby_name,
+                    "context_summary": result.get("context_summary", ""),
+                    "detected_from_message": message
+                }
+                
+            except json.JSONDecodeError as e:
+                print(f"❌ Error parseando JSON de OpenAI: {e}")
+                print(f"Contenido recibido: {content}")
+                return None
+                
         except Exception as e:
             print(f"❌ Error en RoutineDetector: {e}")
             return None
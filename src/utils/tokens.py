@@ -0,0 +1,29 @@
+# src/utils/tokens.py
+import math
+from typing import Dict, List
+
+# Aproximación estándar de OpenAI: ~4 caracteres por token en texto latino
+CHARS_PER_TOKEN = 4
+
+# Overhead fijo por mensaje en el formato chat (role, separadores)
+TOKENS_PER_MESSAGE = 4
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Estima la cantidad de tokens de un texto sin tokenizarlo.
+    Suficiente para presupuestos y límites de tasa; no usar para facturación.
+    """
+    if not text:
+        return 0
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def estimate_messages_tokens(messages: List[Dict]) -> int:
+    """
+    Estima los tokens de entrada de una lista de mensajes en formato OpenAI chat.
+    """
+    return sum(
+        TOKENS_PER_MESSAGE + estimate_tokens(message.get("content") or "")
+        for message in messages
+    )
@@ -0,0 +1,9 @@
+-- Índices únicos que requiere el upsert masivo de BabyProfileService.save_detected_keywords
+-- (on_conflict "baby_id,category_id,key" y "baby_profile_id").
+-- Si ya existen filas duplicadas, hay que consolidarlas antes de crear los índices.
+
+create unique index if not exists baby_profile_baby_category_key_uidx
+    on public.baby_profile (baby_id, category_id, key);
+
+create unique index if not exists baby_profile_value_profile_uidx
+    on public.baby_profile_value (baby_profile_id);
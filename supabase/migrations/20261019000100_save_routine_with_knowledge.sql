@@ -0,0 +1,154 @@
+-- Guarda una rutina confirmada, sus actividades y la entrada espejo en baby_knowledge
+-- en una sola transacción (RoutineService.save_routine_with_knowledge).
+--
+-- p_baby_name se resuelve igual que RoutineService.find_baby_by_name: ilike '%nombre%'
+-- dentro de los bebés del usuario, lo que además verifica la propiedad del bebé.
+-- Si algo falla, Postgres revierte todo: no quedan rutinas sin actividades.
+
+
+-- Equivalente SQL de normalize_knowledge_title (src/utils/knowledge_dedup.py):
+-- minúsculas, sin acentos ni puntuación y con espacios colapsados.
+create or replace function public.normalize_knowledge_title(p_title text)
+returns text
+language sql
+immutable
+as $$
+    select btrim(regexp_replace(
+        regexp_replace(
+            translate(lower(coalesce(p_title, '')), 'áàâãäéèêëíìîïóòôõöúùûüñç', 'aaaaaeeeeiiiiooooouuuunc'),
+            '[^[:alnum:]_[:space:]]', ' ', 'g'
+        ),
+        '\s+', ' ', 'g'
+    ));
+$$;
+
+
+create or replace function public.save_routine_with_knowledge(
+    p_user_id uuid,
+    p_baby_name text,
+    p_routine jsonb,
+    p_activities jsonb,
+    p_knowledge jsonb default null
+)
+returns jsonb
+language plpgsql
+as $$
+declare
+    v_baby_id uuid;
+    v_routine_id uuid;
+    v_activities jsonb;
+    v_knowledge_id uuid;
+begin
+    select id into v_baby_id
+    from public.babies
+    where user_id = p_user_id
+      and name ilike '%' || coalesce(p_baby_name, '') || '%'
+    limit 1;
+
+    if v_baby_id is null then
+        return jsonb_build_object('success', false, 'error', 'baby_not_found');
+    end if;
+
+    if p_activities is null or jsonb_array_length(p_activities) = 0 then
+        raise exception 'No hay actividades para guardar';
+    end if;
+
+    insert into public.baby_routines (
+        user_id, baby_id, name, description, category,
+        confidence_score, detected_from_message, approved_at
+    )
+    values (
+        p_user_id,
+        v_baby_id,
+        coalesce(p_routine->>'name', 'Rutina'),
+        coalesce(p_routine->>'description', ''),
+        coalesce(p_routine->>'category', 'daily'),
+        coalesce((p_routine->>'confidence_score')::numeric, 0.7),
+        coalesce(p_routine->>'detected_from_message', ''),
+        now()
+    )
+    returning id into v_routine_id;
+
+    with inserted as (
+        insert into public.routine_activities (
+            routine_id, time_start, time_end, activity, details,
+            activity_type, order_index, importance_level
+        )
+        select
+            r.routine_id, r.time_start, r.time_end, r.activity, r.details,
+            r.activity_type, r.order_index, r.importance_level
+        -- jsonb_populate_recordset convierte cada campo al tipo de su columna
+        -- ('19:00' → time, etc.): un INSERT ... SELECT de ->> insertaría text
+        from jsonb_populate_recordset(
+            null::public.routine_activities,
+            (
+                select jsonb_agg(
+                    a.value || jsonb_build_object(
+                        'routine_id', v_routine_id,
+                        'details', coalesce(a.value->>'details', ''),
+                        'activity_type', coalesce(a.value->>'activity_type', 'care'),
+                        'order_index', coalesce((a.value->>'order_index')::int, a.ordinality::int),
+                        'importance_level', 1
+                    )
+                    order by a.ordinality
+                )
+                from jsonb_array_elements(p_activities) with ordinality as a(value, ordinality)
+            )
+        ) as r
+        returning *
+    )
+    select coalesce(jsonb_agg(to_jsonb(inserted) order by inserted.order_index), '[]'::jsonb)
+    into v_activities
+    from inserted;
+
+    if p_knowledge is not null then
+        -- Misma deduplicación que BabyKnowledgeService._write_deduplicated (por título
+        -- normalizado): confirmar dos veces la misma rutina actualiza el dato existente
+        select id into v_knowledge_id
+        from public.baby_knowledge
+        where user_id = p_user_id
+          and baby_id = v_baby_id
+          and is_active
+          and category = p_knowledge->>'category'
+          and public.normalize_knowledge_title(title) = public.normalize_knowledge_title(p_knowledge->>'title')
+        order by created_at desc
+        limit 1
+        for update;
+
+        if v_knowledge_id is not null then
+            update public.baby_knowledge
+            set description = coalesce(p_knowledge->>'description', description),
+                subcategory = coalesce(p_knowledge->>'subcategory', subcategory),
+                importance_level = greatest(
+                    coalesce(importance_level, 1),
+                    coalesce((p_knowledge->>'importance_level')::int, 1)
+                )
+            where id = v_knowledge_id;
+        else
+            insert into public.baby_knowledge (
+                user_id, baby_id, category, subcategory, title, description, importance_level
+            )
+            values (
+                p_user_id,
+                v_baby_id,
+                p_knowledge->>'category',
+                p_knowledge->>'subcategory',
+                p_knowledge->>'title',
+                p_knowledge->>'description',
+                coalesce((p_knowledge->>'importance_level')::int, 1)
+            )
+            returning id into v_knowledge_id;
+        end if;
+    end if;
+
+    return jsonb_build_object(
+        'success', true,
+        'baby_id', v_baby_id,
+        'routine_id', v_routine_id,
+        'routine_name', coalesce(p_routine->>'name', 'Rutina'),
+        'activities_count', jsonb_array_length(v_activities),
+        'activities', v_activities,
+        'knowledge_id', v_knowledge_id
+    );
+end;
+$$;
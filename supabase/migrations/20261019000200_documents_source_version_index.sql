@@ -0,0 +1,5 @@
+-- Índice para leer el manifiesto de la ingesta incremental (IncrementalIngest.load_manifest):
+-- filas de documents por metadata->>source y metadata->>version sin recorrer los embeddings.
+
+create index if not exists documents_metadata_source_version_idx
+    on public.documents ((metadata->>'source'), (metadata->>'version'));
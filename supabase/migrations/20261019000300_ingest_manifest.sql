@@ -0,0 +1,13 @@
+-- Registro de ingestas completas por documento (IncrementalIngest.mark_complete).
+-- Un (source, version) se salta en la próxima ingesta solo si su último registro
+-- coincide con el hash del archivo y con la cantidad de filas en documents, así un
+-- documento que se cortó a mitad de la subida se retoma en lugar de darse por terminado.
+
+create table if not exists public.ingest_manifest (
+    source text not null,
+    version text not null,
+    file_hash text not null,
+    chunk_count integer not null,
+    completed_at timestamptz not null default now(),
+    primary key (source, version)
+);
@@ -0,0 +1,140 @@
+-- Publicación versionada del corpus de documents (src/rag/corpus_versions.py).
+--
+-- Cada fila de documents lleva metadata->>'corpus_version'. La ingesta arma una versión
+-- en 'staging' (clonando la activa y aplicando solo los cambios), la valida y recién
+-- entonces activate_corpus_version la marca 'active' en una sola transacción.
+-- match_documents recibe {"corpus_version": <activa>} como filtro (o, antes de la
+-- primera publicación, metadata->>corpus_version is null), así las consultas nunca
+-- mezclan versiones. gc_corpus_versions borra en bloque las versiones viejas justo
+-- después de activar: mientras dura una publicación documents tiene dos copias del
+-- corpus con embeddings, y cada versión retirada que se conserva suma otra.
+
+create table if not exists public.corpus_versions (
+    version text primary key,
+    status text not null default 'staging'
+        check (status in ('staging', 'active', 'retired', 'discarded')),
+    chunk_count integer,
+    created_at timestamptz not null default now(),
+    activated_at timestamptz
+);
+
+-- Como mucho una versión activa y una en staging
+create unique index if not exists corpus_versions_one_active
+    on public.corpus_versions (status) where status = 'active';
+create unique index if not exists corpus_versions_one_staging
+    on public.corpus_versions (status) where status = 'staging';
+
+create index if not exists documents_metadata_corpus_version_idx
+    on public.documents ((metadata->>'corpus_version'));
+
+-- El registro de ingestas completas pasa a ser por versión del corpus
+alter table public.ingest_manifest add column if not exists corpus_version text not null default '';
+alter table public.ingest_manifest add column if not exists category text;
+alter table public.ingest_manifest add column if not exists ref boolean not null default false;
+alter table public.ingest_manifest drop constraint if exists ingest_manifest_pkey;
+alter table public.ingest_manifest add primary key (source, version, corpus_version);
+
+
+-- Copia las filas (con sus embeddings) y el registro de ingestas de una versión a otra.
+-- p_from null copia las filas previas al versionado (sin corpus_version).
+create or replace function public.clone_corpus_version(p_from text, p_to text)
+returns integer
+language plpgsql
+as $$
+declare
+    v_count integer;
+begin
+    insert into public.documents (id, content, metadata, embedding)
+    select gen_random_uuid(), content, jsonb_set(metadata, '{corpus_version}', to_jsonb(p_to)), embedding
+    from public.documents
+    where (p_from is null and not (metadata ? 'corpus_version'))
+       or metadata->>'corpus_version' = p_from;
+    get diagnostics v_count = row_count;
+
+    insert into public.ingest_manifest (source, version, corpus_version, file_hash, chunk_count, category, ref, completed_at)
+    select source, version, p_to, file_hash, chunk_count, category, ref, completed_at
+    from public.ingest_manifest
+    where corpus_version = coalesce(p_from, '')
+    on conflict (source, version, corpus_version) do nothing;
+
+    return v_count;
+end;
+$$;
+
+
+-- Activa una versión en staging y retira la anterior en la misma transacción.
+create or replace function public.activate_corpus_version(p_version text)
+returns jsonb
+language plpgsql
+as $$
+declare
+    v_previous text;
+    v_count integer;
+begin
+    perform 1 from public.corpus_versions
+    where version = p_version and status = 'staging'
+    for update;
+    if not found then
+        raise exception 'La versión % no está en staging', p_version;
+    end if;
+
+    select count(*) into v_count
+    from public.documents
+    where metadata->>'corpus_version' = p_version;
+
+    update public.corpus_versions
+    set status = 'retired'
+    where status = 'active'
+    returning version into v_previous;
+
+    update public.corpus_versions
+    set status = 'active', activated_at = now(), chunk_count = v_count
+    where version = p_version;
+
+    return jsonb_build_object('active', p_version, 'previous', v_previous, 'chunk_count', v_count);
+end;
+$$;
+
+
+-- Borra en bloque las filas de versiones que ya no se conservan: todo lo que no sea la
+-- activa, la de staging o una de las p_keep retiradas más recientes (para rollback).
+-- Las filas previas al versionado se borran en cuanto hay una versión activa.
+create or replace function public.gc_corpus_versions(p_keep integer default 0)
+returns integer
+language plpgsql
+as $$
+declare
+    v_keep text[];
+    v_has_active boolean;
+    v_deleted integer;
+begin
+    select array_agg(version) into v_keep
+    from (
+        select version from public.corpus_versions where status in ('active', 'staging')
+        union all
+        (
+            select version from public.corpus_versions
+            where status = 'retired'
+            order by activated_at desc nulls last
+            limit greatest(p_keep, 0)
+        )
+    ) kept;
+    v_keep := coalesce(v_keep, '{}');
+    select exists (select 1 from public.corpus_versions where status = 'active') into v_has_active;
+
+    update public.corpus_versions
+    set status = 'discarded'
+    where status = 'retired' and not (version = any (v_keep));
+
+    delete from public.documents
+    where (metadata ? 'corpus_version' and not (metadata->>'corpus_version' = any (v_keep)))
+       or (v_has_active and not (metadata ? 'corpus_version'));
+    get diagnostics v_deleted = row_count;
+
+    delete from public.ingest_manifest
+    where (corpus_version <> '' and not (corpus_version = any (v_keep)))
+       or (v_has_active and corpus_version = '');
+
+    return v_deleted;
+end;
+$$;
@@ -0,0 +1,31 @@
+-- Citas (autores, instituciones, libros) extraídas en la ingesta de cada documento de
+-- referencia (src/rag/citations.py). Viven junto al registro de ingestas completas, así
+-- se clonan, publican y borran con la versión del corpus.
+
+alter table public.ingest_manifest add column if not exists citations jsonb;
+
+
+-- Igual que en 20261019000400_corpus_versions.sql, copiando también las citas.
+create or replace function public.clone_corpus_version(p_from text, p_to text)
+returns integer
+language plpgsql
+as $$
+declare
+    v_count integer;
+begin
+    insert into public.documents (id, content, metadata, embedding)
+    select gen_random_uuid(), content, jsonb_set(metadata, '{corpus_version}', to_jsonb(p_to)), embedding
+    from public.documents
+    where (p_from is null and not (metadata ? 'corpus_version'))
+       or metadata->>'corpus_version' = p_from;
+    get diagnostics v_count = row_count;
+
+    insert into public.ingest_manifest (source, version, corpus_version, file_hash, chunk_count, category, ref, citations, completed_at)
+    select source, version, p_to, file_hash, chunk_count, category, ref, citations, completed_at
+    from public.ingest_manifest
+    where corpus_version = coalesce(p_from, '')
+    on conflict (source, version, corpus_version) do nothing;
+
+    return v_count;
+end;
+$$;
@@ -0,0 +1,16 @@
+-- Actualiza en bloque la metadata de filas de documents que la ingesta incremental
+-- conserva (mismo chunk_hash) pero cuya metadata cambió (índice de chunk, página).
+-- Una llamada por lote en vez de un PATCH por fila (src/rag/incremental.py).
+create or replace function public.update_documents_metadata(p_rows jsonb)
+returns integer
+language sql
+as $$
+    with updated as (
+        update public.documents d
+        set metadata = r.metadata
+        from jsonb_to_recordset(p_rows) as r(id uuid, metadata jsonb)
+        where d.id = r.id
+        returning 1
+    )
+    select count(*)::integer from updated;
+$$;